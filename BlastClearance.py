@@ -1,9 +1,25 @@
 # Investigate the use of the BlockInventory Database to create blast clearance plans
-import shutil
-import arcpy
+import functools
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
+from attribute_writer import add_missing_fields, block_number_lookup, check_append_fields, stamp_attributes
+from blast_config import read_config, spatial_reference_text
+from blast_ids import ArcpyBlastIdAllocator
+from block_input import file_block_entries, list_block_entries, read_block_input, rejected_message
+from block_snapshot import ArcpySnapshotSource, SnapshotSource, export_snapshot, open_current_snapshot
+from block_validation import ArcpyBlockSource, validate_blocks
+from cad_export import CadExportPool, publish_file
+from cad_store import ArtefactStore, export_key
+from conflict_index import ArcpyConflictSource, ConflictIndex, road_id_field
+from geometry_cache import ArcpyBlockGeometrySource, BlockGeometryCache
+from lookup_cache import ArcpyLookupSource, LevelLookupCache
+from master_archive import ArcpyMasterStore, archive_masters, master_lock
+from query_builder import ArcpyBlockStatusSource, block_status_ids_query, fetch_block_status_ids, \
+    in_predicate
+from scratch_workspace import ScratchWorkspace, run_namespace
+from tracing import span, start_tracer
+from upload_queue import UploadQueue
 
 
 # TODO: Export CAD files to survey/dgn to accommodate surveyors
@@ -15,30 +31,45 @@ from pathlib import Path
 # TODO: Test blast clearance ID as hosted table
 # TODO: Investigate hosted feature service (will probably cause delays)
 # TODO: Better use of variables and better parameter names
-# TODO: Read spatial references from files
 # TODO: Temp Features - Add user name to feature name
 # TODO: Investigate Block Dictionary instead of Block Array
 # TODO: Project folder - if scratch.gdb does not exist, create it.
 
 # Functions
 # This functions gets the path where the '.aprx' file is located and returns the working directory
+# Return None outside ArcGIS Pro (command line, resident worker), the configured workspace is used instead
 def new_path():
-    aprx = arcpy.mp.ArcGISProject(r"CURRENT")
+    import arcpy
+
+    try:
+        aprx = arcpy.mp.ArcGISProject(r"CURRENT")
+    except OSError:
+        return None
     pathname = os.path.dirname(aprx.filePath)
     full_path = os.path.abspath(pathname)
     return full_path
 
 
 # This function provides a standard message output to users using ArcGIS Pro
+# The resident worker sets output_listener to stream the messages of a job back to the tool
 def arc_output(message):
+    import arcpy
+
     timestamp = datetime.now().strftime("%H:%M:%S")
     arcpy.AddMessage(f"---{timestamp}: {message} ---")
+    if output_listener is not None:
+        output_listener(message)
+
+
+output_listener = None
 
 
 # This function is used to join two tabled
 # Return the joined feature layer
 # THIS FUNCTION IS NOT USED IN THE CURRENT ITERATION OF THE SCRIPT
 def join_features(table_1, table_2, join_field):
+    import arcpy
+
     joined_table = arcpy.AddJoin_management(table_1, join_field, table_2, join_field, "KEEP_COMMON")
     arc_output(f"{table_1.split('dbo.')[-1]} and {table_2.split('dbo.')[-1]} Tables joined using {join_field}")
 
@@ -46,26 +77,19 @@ def join_features(table_1, table_2, join_field):
 
 
 # This function is used to check whether the blocks exist in the BlockInventory database
-def blocks_check(block_list_input, sde_block_table, search_field_name):
+# All block numbers are checked with batched queries instead of one query per block
+# Return the block array containing the BlockId, Number, CurrentStatusId and LevelId of every block
+def blocks_check(block_list_input, block_source):
+    import arcpy
+
     arc_output("Checking if blocks exist in the Database...")
-    # Empty error list to which all non-existent block numbers are added
-    error_list = []
-    field = [search_field_name]
-
-    # Loop through the blocks as provided by the user
-    for block in block_list_input:
-        # Search criteria
-        where_clause = f"{search_field_name} = '{block}'"
-        # Initiate a Search Cursor
-        with arcpy.da.SearchCursor(sde_block_table, field, where_clause) as row:
-            # Provide output if the block is found in the table
-            try:
-                row.next()
-                arc_output(f"Block {block} Found")
-            # Add block number to the error list if it is not found in the table and provide output to the user
-            except:
-                error_list.append(block)
-                arc_output(f"Block {block} NOT Found")
+    block_array, error_list = validate_blocks(block_list_input, block_source)
+
+    # Provide output for every block found or not found in the table
+    for block in block_array:
+        arc_output(f"Block {block[1]} Found")
+    for block in error_list:
+        arc_output(f"Block {block} NOT Found")
     arc_output("Block Check Completed...")
 
     # If there is any data in the error list, arcgis pro must provide the user with an error message
@@ -82,36 +106,26 @@ def blocks_check(block_list_input, sde_block_table, search_field_name):
             arcpy.AddError(error_string)
         quit()
 
+    return block_array
+
 
 # This function creates the SQL string to select blocks
 # Return the Search String
+# THIS FUNCTION IS NOT USED IN THE CURRENT ITERATION OF THE SCRIPT
 def block_search_sql_query(block_list_input, block_number_field):
-    search_string = ""
-    if len(block_list_input) == 1:
-        search_string += f"{block_number_field} = '{block_list_input[0]}'"
-    else:
-        for count, block in enumerate(block_list_input):
-            if count == 0:
-                search_string += f"{block_number_field} = '{block}' OR "
-            elif count == len(block_list_input) - 1:
-                search_string += f"{block_number_field} = '{block}'"
-            else:
-                search_string += f"{block_number_field} = '{block}' OR "
+    search_string, _ = in_predicate(block_number_field, [str(block) for block in block_list_input],
+                                    parameterised=False)
     return search_string
 
 
 # This function creates the SQL string to Select Block Shapes from the Block Status Table
+# The BlockStatusIds of the (BlockId, StatusId) pairs are looked up in chunks first
 # Return the Search String
-def block_status_sql_query(block_array_p):
-    search_string = "select * from BlockStatus where "
-    if len(block_array_p) == 1:
-        search_string += f"(BlockId = {block_array_p[0][0]} AND StatusId = {block_array_p[0][2]})"
-    else:
-        for count, block in enumerate(block_array_p):
-            if count == len(block_array_p) - 1:
-                search_string += f"(BlockId = {block_array_p[count][0]} AND StatusId = {block_array_p[count][2]})"
-            else:
-                search_string += f"(BlockId = {block_array_p[count][0]} AND StatusId = {block_array_p[count][2]}) OR "
+def block_status_sql_query(block_array_p, sde_block_status_p):
+    block_status_ids = fetch_block_status_ids(block_array_p,
+                                              block_inventory(ArcpyBlockStatusSource(sde_block_status_p)))
+    arc_output(f"{len(block_status_ids)} Block Shapes Found")
+    search_string = block_status_ids_query(block_status_ids)
 
     return search_string
 
@@ -119,6 +133,8 @@ def block_status_sql_query(block_array_p):
 # This function is used to display fields within the selected table
 # This is useful for testing and troubleshooting purposes
 def display_fields(table_p):
+    import arcpy
+
     arcpy.AddMessage(f"Fields in table {table_p}:")
     join_fields = arcpy.ListFields(table_p)
     for field in join_fields:
@@ -127,8 +143,10 @@ def display_fields(table_p):
 
 
 # This function creates the temporary blocks feature class and generates the machine and people clearance zones
-def find_clearance_zones(spatref_p, blocks_p, scratch_machine_p, scratch_people_p, scratch_gdb_p, machine_rad_p,
+def find_clearance_zones(spatref_p, blocks_p, scratch_machine_p, scratch_people_p, scratch_blocks_p, machine_rad_p,
                          people_rad_p, machine_single_p, people_single_p):
+    import arcpy
+
     with arcpy.EnvManager(outputCoordinateSystem=spatref_p):
         # Create the two temporary buffer features
         arc_output("Creating Machine Clearance Buffer")
@@ -140,10 +158,13 @@ def find_clearance_zones(spatref_p, blocks_p, scratch_machine_p, scratch_people_
                                                        "ROUND",
                                                        "ALL", None, "PLANAR")
         arc_output("People Clearance Buffer Created")
-        # Create the temporary block feature
-        arc_output("Creating Temporary Block Feature")
-        temp_block_feature = arcpy.FeatureClassToFeatureClass_conversion(blocks_p, scratch_gdb_p, "TEMP_BLOCKS")
-        arc_output("Temporary Block Feature Created")
+        # Create the temporary block feature, blocks read from the geometry cache already are one
+        if scratch_blocks_p is None:
+            temp_block_feature = blocks_p
+        else:
+            arc_output("Creating Temporary Block Feature")
+            temp_block_feature = arcpy.CopyFeatures_management(blocks_p, scratch_blocks_p)
+            arc_output("Temporary Block Feature Created")
 
         # Drop Polygons to Single Part Features
         arc_output("Drop to Single Part - Initializing")
@@ -160,14 +181,60 @@ def find_clearance_zones(spatref_p, blocks_p, scratch_machine_p, scratch_people_
         return temp_machine_buff, temp_people_buff, temp_block_feature
 
 
+# This function creates the same outputs as find_clearance_zones with the in-memory zone engine (shapely)
+# The block shapes are read once and the single part zones are written directly, no intermediate buffers are stored
+# Shapes from the geometry cache (block_wkb_p) are buffered directly without reading the block feature
+# The zone features have the fields of the clearance master, ORIG_FID is 1 like the single parts of the one
+# dissolved buffer of find_clearance_zones
+def find_clearance_zones_in_memory(spatref_p, blocks_p, scratch_blocks_p, machine_rad_p, people_rad_p, machine_single_p,
+                                   people_single_p, master_clearance_feature_p, block_wkb_p=None):
+    import arcpy
+    from zone_engine import clearance_zones, from_wkb_list
+
+    with arcpy.EnvManager(outputCoordinateSystem=spatref_p):
+        # Create the temporary block feature, blocks read from the geometry cache already are one
+        if scratch_blocks_p is None:
+            temp_block_feature = blocks_p
+        else:
+            arc_output("Creating Temporary Block Feature")
+            temp_block_feature = arcpy.CopyFeatures_management(blocks_p, scratch_blocks_p)
+            arc_output("Temporary Block Feature Created")
+
+        arc_output("Creating Machine and People Clearance Zones in Memory")
+        if block_wkb_p is None:
+            with arcpy.da.SearchCursor(temp_block_feature, ["SHAPE@WKB"]) as cursor:
+                block_wkb_p = [row[0] for row in cursor]
+        block_geometries = from_wkb_list(block_wkb_p)
+        machine_zones, people_zones = clearance_zones(block_geometries, machine_rad_p, people_rad_p)
+        arc_output(f"{len(machine_zones)} Machine and {len(people_zones)} People Clearance Zones Created")
+
+        # Write the single part zones to the scratch feature classes
+        spatial_reference = arcpy.Describe(temp_block_feature).spatialReference
+        zone_features = []
+        for zone_path, zones in ((machine_single_p, machine_zones), (people_single_p, people_zones)):
+            zone_feature = arcpy.CreateFeatureclass_management(os.path.dirname(zone_path),
+                                                               os.path.basename(zone_path), "POLYGON",
+                                                               template=master_clearance_feature_p,
+                                                               spatial_reference=spatial_reference)[0]
+            orig_fid_fields = [field.name for field in arcpy.ListFields(zone_feature, "ORIG_FID")]
+            with arcpy.da.InsertCursor(zone_feature, ["SHAPE@WKB"] + orig_fid_fields) as cursor:
+                for zone in zones:
+                    cursor.insertRow([zone.wkb] + [1] * len(orig_fid_fields))
+            zone_features.append(zone_feature)
+
+        return zone_features[0], zone_features[1], temp_block_feature
+
+
 # This function is used for data management purposes
 # TODO: Elaborate
-def data_management(block_input_feature, equipment_buffer, people_buffer, roads, date_sql_string, elevation_datum_input,
+def data_management(block_input_feature, equipment_buffer, people_buffer, roads, run_datetime, elevation_datum_input,
                     blast_clearance_id, date_string, user, resourced_dir, cad_output_dir, mine_spatial_reference,
-                    master_block_feature, master_clearance_feature, block_array, roads_master_fc):
+                    master_block_feature, master_clearance_feature, block_array, roads_master_fc, scratch_p,
+                    cad_pool_p):
+    import arcpy
+
     # Create lists to enable iteration for adding and calculating fields
     clearance_list = [equipment_buffer, people_buffer]
-    feature_list = [block_input_feature, equipment_buffer, people_buffer, roads]
 
     # Create string to display useful output to user (block feature name)
     block_feature_name = str(block_input_feature).split("\\")[-1]
@@ -178,108 +245,127 @@ def data_management(block_input_feature, equipment_buffer, people_buffer, roads,
     master_buffer_feature_name = str(master_clearance_feature).split("\\")[-1]
     master_roads_feature_name = str(master_roads_fc).split("\\")[-1]
 
-    # Loop through all features and add fields
-    for feature in clearance_list:
-        # Create string to display useful output to user (feature name)
-        feature_name = str(feature).split("\\")[-1]
-        arc_output(f"Adding Fields to {feature_name}")
-        arcpy.AddFields_management(feature, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"],
-                                             ["ClearanceType", "TEXT"], ["Level", "TEXT"]])
-        arc_output(f"Fields added to {feature_name}")
-
-    # Add fields to block feature specifically
-    arc_output(f"Adding Fields to {block_feature_name}")
-    arcpy.AddFields_management(block_input_feature, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"],
-                                                     ["Level", "TEXT"], ["Number", "TEXT"]])
-    arc_output(f"Fields added to {block_feature_name}")
-
-    # Calculate Fields in all features
-    arc_output(f"Calculating Fields")
-    for feature in feature_list:
-        feature_name = str(feature).split("\\")[-1]
-        if feature == block_input_feature:
-            arcpy.CalculateField_management(feature, "Level", "'500'", "PYTHON3")
-            arc_output(f"{feature_name} Level Calculated")
-            calc_block_num(block_array, block_input_feature)
-        elif feature == equipment_buffer:
-            arcpy.CalculateFields_management(feature, "PYTHON3", [["Level", "'501'"], ["ClearanceType", "'Machine'"]])
-            arc_output(f"{feature_name} Level & ClearanceType Calculated")
-        elif feature == people_buffer:
-            arcpy.CalculateFields_management(feature, "PYTHON3", [["Level", "'502'"], ["ClearanceType", "'People'"]])
-            arc_output(f"{feature_name} Level & ClearanceType Calculated")
-        elif feature == roads:
-            arcpy.CalculateField_management(feature, "Level", "'503'", "PYTHON3")
-        arcpy.CalculateField_management(feature, "DateTime", date_sql_string, "PYTHON3")
-        arc_output(f"{feature_name} DateTime Calculated")
-        arcpy.CalculateField_management(feature, "Mine", "'" + elevation_datum_input + "'", "PYTHON3")
-        arc_output(f"{feature_name} Mine Calculated")
-        arcpy.CalculateField_management(feature, "BlastClearId", "'" + blast_clearance_id + "'", "PYTHON3")
-        arc_output(f"{feature_name} BlastClearId Calculated")
-    arc_output(f"Fields Calculated")
+    with span("attribute_calc") as stage:
+        # Loop through all features and add fields
+        for feature in clearance_list:
+            # Create string to display useful output to user (feature name)
+            feature_name = str(feature).split("\\")[-1]
+            arc_output(f"Adding Fields to {feature_name}")
+            add_missing_fields(feature, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"],
+                                         ["ClearanceType", "TEXT"], ["Level", "TEXT"]])
+            arc_output(f"Fields added to {feature_name}")
+
+        # Add fields to block feature specifically, the block feature of the geometry cache has them already
+        arc_output(f"Adding Fields to {block_feature_name}")
+        add_missing_fields(block_input_feature, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"],
+                                                 ["Level", "TEXT"], ["Number", "TEXT"]])
+        arc_output(f"Fields added to {block_feature_name}")
+
+        # Add the fields which do not exist in the road feature yet, the road master gets the ClearanceType of the
+        # clipped roads and the SourceObjectId of the synchronised roads (a fully copied Road_Edge has none)
+        add_missing_fields(roads, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"],
+                                   ["Level", "TEXT"], [road_id_field, "LONG"]])
+        with master_lock(roads_master_fc):
+            add_missing_fields(roads_master_fc, [["ClearanceType", "TEXT"], [road_id_field, "LONG"]])
+        arc_output(f"Fields added to {roads_feature_name}")
+
+        # Calculate Fields in all features with a single update pass per feature
+        arc_output(f"Calculating Fields")
+        common_values = {"BlastClearId": blast_clearance_id, "DateTime": run_datetime,
+                         "Mine": elevation_datum_input}
+        feature_values = [[block_input_feature, {"Level": "500"}, block_number_lookup(block_array)],
+                          [equipment_buffer, {"Level": "501", "ClearanceType": "Machine"}, None],
+                          [people_buffer, {"Level": "502", "ClearanceType": "People"}, None],
+                          [roads, {"Level": "503"}, None]]
+        for feature, values, block_numbers in feature_values:
+            feature_name = str(feature).split("\\")[-1]
+            row_count = stamp_attributes(feature, {**common_values, **values}, block_numbers)
+            stage.rows = (stage.rows or 0) + row_count
+            arc_output(f"{feature_name} {', '.join(list(common_values) + list(values))}"
+                       f"{', Number' if block_numbers is not None else ''} Calculated ({row_count} rows)")
+        arc_output(f"Fields Calculated")
 
     # Call the Create CAD Folders function to create folders, export to CAD and copy CAD files
-    create_cad_folders(date_string_p=date_string,
-                       user_p=user,
-                       blast_id_p=blast_clearance_id,
-                       mine_p=elevation_datum_input,
-                       resources_p=resourced_dir,
-                       cad_output_p=cad_output_dir,
-                       sis_spat_ref_p=mine_spatial_reference,
-                       block_fc_p=block_input_feature,
-                       machine_fc_p=equipment_buffer,
-                       people_fc_p=people_buffer,
-                       roads_fc_p=roads)
-
-    # Append to Master Features
-    arc_output("Appending Features")
-    arcpy.Append_management(block_input_feature, master_block_feature, "TEST")
-    arc_output(f"{block_feature_name} appended to {master_block_feature_name}")
-    arcpy.Append_management(equipment_buffer, master_clearance_feature, "TEST")
-    arc_output(f"{equipment_buffer_feature_name} appended to {master_buffer_feature_name}")
-    arcpy.Append_management(people_buffer, master_clearance_feature, "TEST")
-    arc_output(f"{people_buffer_feature_name} appended to {master_buffer_feature_name}")
-    arc_output("Features Appended")
-    arcpy.Append_management(roads, roads_master_fc, "TEST")
-    arc_output(f"{roads_feature_name} appended to {master_roads_feature_name}")
-    arc_output("Features Appended")
-
-    # Delete Scratch Features
-    arc_output("Deleting Features")
-    arcpy.Delete_management(block_input_feature)
-    arc_output(f"{block_feature_name} Deleted")
-    arcpy.Delete_management(equipment_buffer)
-    arc_output(f"{equipment_buffer_feature_name} Deleted")
-    arcpy.Delete_management(people_buffer)
-    arc_output(f"{people_buffer_feature_name} Deleted")
-    arcpy.Delete_management(roads)
-    arc_output(f"{roads_feature_name} Deleted")
-    arc_output("Features Deleted")
+    # arcpy is not thread-safe: the export runs here, only the file copies continue in the background
+    with span("cad_export"):
+        cad_job = create_cad_folders(date_string_p=date_string,
+                                     user_p=user,
+                                     blast_id_p=blast_clearance_id,
+                                     mine_p=elevation_datum_input,
+                                     resources_p=resourced_dir,
+                                     cad_output_p=cad_output_dir,
+                                     sis_spat_ref_p=mine_spatial_reference,
+                                     block_fc_p=block_input_feature,
+                                     machine_fc_p=equipment_buffer,
+                                     people_fc_p=people_buffer,
+                                     roads_fc_p=roads,
+                                     cad_pool_p=cad_pool_p,
+                                     namespace_p=scratch_p.namespace)
+        if cad_job.export_error is None:
+            arc_output("Features Exported to CAD")
+        else:
+            arcpy.AddError(f"CAD export failed: {cad_job.export_error}")
+
+    with span("append"):
+        # Append to Master Features, every master is locked while a run appends to it
+        arc_output("Appending Features")
+        with master_lock(master_block_feature):
+            check_append_fields(block_input_feature, master_block_feature)
+            arcpy.Append_management(block_input_feature, master_block_feature, "TEST")
+        arc_output(f"{block_feature_name} appended to {master_block_feature_name}")
+        with master_lock(master_clearance_feature):
+            check_append_fields(equipment_buffer, master_clearance_feature)
+            check_append_fields(people_buffer, master_clearance_feature)
+            arcpy.Append_management(equipment_buffer, master_clearance_feature, "TEST")
+            arc_output(f"{equipment_buffer_feature_name} appended to {master_buffer_feature_name}")
+            arcpy.Append_management(people_buffer, master_clearance_feature, "TEST")
+        arc_output(f"{people_buffer_feature_name} appended to {master_buffer_feature_name}")
+        arc_output("Features Appended")
+        with master_lock(roads_master_fc):
+            check_append_fields(roads, roads_master_fc)
+            arcpy.Append_management(roads, roads_master_fc, "TEST")
+        arc_output(f"{roads_feature_name} appended to {master_roads_feature_name}")
+        arc_output("Features Appended")
+
+
+# This function deletes the intermediates of a run, it also runs when a stage of the run failed
+def delete_scratch_features(scratch_p):
+    with span("delete") as stage:
+        arc_output("Deleting Features")
+        for feature_name in scratch_p.cleanup():
+            arc_output(f"{feature_name} Deleted")
+        arc_output("Features Deleted")
+        stage.bytes_written = scratch_p.bytes_written()
+        arc_output(f"Scratch Bytes Written to Disk: {stage.bytes_written}")
 
 
 # This features adds a row to the SishenBlasts table to generate a BlastID
-def get_blast_id(blast_table_p, mine_p, date_p):
-    # Insert a new row to the SishenBlasts Table
-    # The Mine as well as Date and time is added
-    # BlastClearId is automatically set equal to ObjectId by using an attribute rule
-    # TODO: Test to see if attribute rules work on other user's PCs as well
-    with arcpy.da.InsertCursor(blast_table_p, ['Mine', 'DateTime']) as cur:
-        cur.insertRow([mine_p, date_p])
-
-    # Return the latest BlastClearId and provide output to the user
+# BlastClearId is automatically set equal to ObjectId by using an attribute rule, the allocator returns the
+# ObjectId of the inserted (or reserved) row so the row does not have to be looked up again
+# TODO: Test to see if attribute rules work on other user's PCs as well
+def get_blast_id(blast_id_allocator_p, mine_p, date_p):
+    blast_id, user = blast_id_allocator_p.allocate(mine_p, date_p)
     # This ID is used to identify different blast clearance plans
-    where_clause = "DateTime = timestamp " + "'" + date_p + "'"
-    with arcpy.da.SearchCursor(blast_table_p, ['DateTime', 'BlastClearId', 'created_user'], where_clause) as cur:
-        for row in cur:
-            arc_output(f"Blast Clearance ID >>> {row[1]} <<< assigned to user >>> {row[2]} <<<")
-            return str(row[1]), str(row[2])
+    arc_output(f"Blast Clearance ID >>> {blast_id} <<< assigned to user >>> {user} <<<")
+    return blast_id, user
 
 
 # This function is used to create a folder in the correct subfolder where the CAD output of the blast will be saved.
+# The features are exported on this thread, the copies to the folder run on the CAD export pool
+# The features are exported to a reference file in the namespace of the run, which then replaces the shared
+# reference file of the mine (under the lock of the mine) and is copied to the blast folder
+# Return the CAD job, its export is done when it is returned
 def create_cad_folders(date_string_p, user_p, blast_id_p, mine_p, resources_p, cad_output_p, sis_spat_ref_p,
-                       block_fc_p, machine_fc_p, people_fc_p, roads_fc_p):
+                       block_fc_p, machine_fc_p, people_fc_p, roads_fc_p, cad_pool_p, namespace_p):
     year = date_string_p[:4]
     month_num = date_string_p[4:6]
     reference_path = os.path.join(resources_p, "ReferenceFiles")
+    # Staged runs export to the local staging folder, the upload queue writes the files to the network drive
+    upload_queue = cad_pool_p.upload_queue
+    share_reference_path = reference_path
+    if upload_queue is not None:
+        reference_path = os.path.join(upload_queue.staging_dir, "ReferenceFiles")
+        Path(reference_path).mkdir(parents=True, exist_ok=True)
     seed_file_path = os.path.join(resources_p, "BlastSeed.dgn")
     north_mine_cad_name = "BLAST_NORTH_MINE.DGN"
     south_mine_cad_name = "BLAST_SOUTH_MINE.DGN"
@@ -307,18 +393,6 @@ def create_cad_folders(date_string_p, user_p, blast_id_p, mine_p, resources_p, c
         cad_out_file = os.path.join(reference_path, lylyveld_north_cad_name)
         master_blast_file = os.path.join(resources_p, "LylyveldNorthMaster.dgn")
 
-    # Export Blocks and Clearance Zones to relevant CAD file
-    arc_output("Exporting Features to CAD")
-    features_to_export = [block_fc_p, machine_fc_p, people_fc_p, roads_fc_p]
-    with arcpy.EnvManager(outputCoordinateSystem=sis_spat_ref_p):
-        arcpy.ExportCAD_conversion(in_features=features_to_export,
-                                   Output_Type="DGN_V8",
-                                   Output_File=cad_out_file,
-                                   Ignore_FileNames="Ignore_Filenames_in_Tables",
-                                   Append_To_Existing="Overwrite_Existing_Files",
-                                   Seed_File=seed_file_path)
-    arc_output("Features Exported to CAD")
-
     # Depending on the month in which the script was run, choose the relevant month_dir variable to create the folder
     if month_num == "01":
         month_dir = "A_JAN"
@@ -355,45 +429,109 @@ def create_cad_folders(date_string_p, user_p, blast_id_p, mine_p, resources_p, c
     ref_copy_to_name = f"{date_string_p}_ID{blast_id_p}_REF.dgn"
     ref_copy_to_path = os.path.join(save_dir, ref_copy_to_name)
 
-    # Create folder to which blast files will be copied
-    arc_output("Creating Folder")
+    # Create folder to which blast files will be copied, the upload queue creates the folder of staged runs
     arc_output(f"Folder Name: {save_dir}")
-    Path(save_dir).mkdir(parents=True, exist_ok=True)
-    arc_output("Folder Created")
+    if upload_queue is None:
+        arc_output("Creating Folder")
+        Path(save_dir).mkdir(parents=True, exist_ok=True)
+        arc_output("Folder Created")
 
-    # Copy files to folder created in previous step
-    arc_output("Copying Files")
-    shutil.copy(master_blast_file, blast_file_path)
-    shutil.copy(cad_out_file, ref_copy_to_path)
-    arc_output("Files Copied")
+    # Export Blocks and Clearance Zones to relevant CAD file and copy files to folder created in previous step
+    # The reference file is copied before another blast of the same mine can overwrite it
+    features_to_export = [block_fc_p, machine_fc_p, people_fc_p, roads_fc_p]
+
+    # The shared reference file of the mine is replaced by the export of the run (a plain copy, it is overwritten by
+    # every blast)
+    shared_reference_file = os.path.join(share_reference_path, os.path.basename(cad_out_file))
+    cad_out_file = os.path.join(reference_path, f"{os.path.splitext(os.path.basename(cad_out_file))[0]}_"
+                                                f"{namespace_p}.DGN")
+    locked_copies = [[cad_out_file, ref_copy_to_path], [cad_out_file, shared_reference_file, "copy"]]
+
+    arc_output("Exporting Features to CAD and Copying Files (in background)")
+    cad_job = cad_pool_p.submit(name=f"Blast {blast_id_p}",
+                                lock_key=shared_reference_file,
+                                export_function=functools.partial(export_cad_file, features_to_export, cad_out_file,
+                                                                  seed_file_path, sis_spat_ref_p,
+                                                                  cad_pool_p.artefact_store),
+                                locked_copies=locked_copies,
+                                copies=[[master_blast_file, blast_file_path]],
+                                temp_files=[cad_out_file])
+    return cad_job
+
+
+# This function exports the features of a blast to a CAD file
+# The export is skipped when the artefact store holds the export of the same geometry
+def export_cad_file(features_p, cad_out_file_p, seed_file_p, sis_spat_ref_p, artefact_store_p):
+    import arcpy
+
+    if artefact_store_p is not None:
+        geometry_key = cad_export_key(features_p, sis_spat_ref_p, artefact_store_p.digest(seed_file_p))
+        if artefact_store_p.restore_export(geometry_key, cad_out_file_p):
+            return
+    with arcpy.EnvManager(outputCoordinateSystem=sis_spat_ref_p):
+        arcpy.ExportCAD_conversion(in_features=features_p,
+                                   Output_Type="DGN_V8",
+                                   Output_File=cad_out_file_p,
+                                   Ignore_FileNames="Ignore_Filenames_in_Tables",
+                                   Append_To_Existing="Overwrite_Existing_Files",
+                                   Seed_File=seed_file_p)
+    if artefact_store_p is not None:
+        artefact_store_p.record_export(geometry_key, cad_out_file_p)
+
+
+# This function returns the key of a CAD export: a hash of the level and shape of every row of the exported features
+# in the output coordinate system, and of the export settings
+def cad_export_key(features_p, spatial_reference_p, seed_digest_p):
+    import arcpy
+
+    def feature_rows():
+        for feature in features_p:
+            with arcpy.da.SearchCursor(feature, ["Level", "SHAPE@WKB"],
+                                       spatial_reference=spatial_reference_p) as cursor:
+                for level, shape_wkb in cursor:
+                    yield str(level).encode("utf-8") + b"\0" + bytes(shape_wkb or b"")
+
+    return export_key(feature_rows(), spatial_reference_p, seed_digest_p, "DGN_V8")
+
+
+# This function reports the failed CAD exports and file copies of the CAD export pool
+# Return True if there were no failures
+def report_cad_failures(cad_failures):
+    import arcpy
+
+    for job_name, file_name, error in cad_failures:
+        arcpy.AddError(f"{job_name}: {file_name} {error}")
+    return len(cad_failures) == 0
 
 
 # This function find the Elevation Datum name from the BlockInventory Database
-def find_elevation_datum(block_array_p, sde_level_p, sde_elevation_datum_p):
+# The Level and ElevationDatum tables are read through the lookup cache instead of querying the database every run
+def find_elevation_datum(block_array_p, lookup_cache_p):
+    import arcpy
+
     # Find first LevelId in the BlockArray
-    for count, row in enumerate(block_array_p):
-        level_id = block_array_p[count][3]
-        arc_output(f"Level ID: {block_array_p[count][3]}")
-        break
+    level_id = block_array_p[0][3]
+    arc_output(f"Level ID: {level_id}")
 
-    with arcpy.da.SearchCursor(sde_level_p, ["LevelId", "ElevationDatumId"], f"LevelId = {level_id}") as cursor:
-        for row in cursor:
-            elevation_datum_id = row[1]
-            arc_output(f"Elevation Datum ID: {elevation_datum_id}")
-            break
+    if lookup_cache_p.refresh():
+        arc_output("Level and Elevation Datum Lookup Tables Reloaded")
+    mine_names = lookup_cache_p.mine_names(block_array_p)
+    mine_name = mine_names[int(level_id)]
+    arc_output(f"Mine Name: {mine_name}")
 
-    with arcpy.da.SearchCursor(sde_elevation_datum_p, ["ElevationDatumId", "Name"], f"ElevationDatumId = "
-                                                                                    f"{elevation_datum_id}") as cursor:
-        for row in cursor:
-            mine_name = row[1]
-            arc_output(f"Mine Name: {mine_name}")
-            break
+    # Warn the user if the blocks are on levels of different mines
+    if len(set(mine_names.values())) > 1:
+        arcpy.AddWarning(f"Blocks span more than one mine: {', '.join(sorted(set(mine_names.values())))}. "
+                         f"{mine_name} is used.")
 
     return mine_name
 
 
 # This function is used to create an array containing the BlockId, Number, CurrentStatusId and LevelId
+# THIS FUNCTION IS NOT USED IN THE CURRENT ITERATION OF THE SCRIPT (blocks_check returns the block array)
 def make_block_array(block_search_p, sde_block_path_p):
+    import arcpy
+
     block_select_array = []
     with arcpy.da.SearchCursor(sde_block_path_p, ["BlockId", "Number", "CurrentStatusID", "LevelId"],
                                block_search_p) as cursor:
@@ -403,10 +541,12 @@ def make_block_array(block_search_p, sde_block_path_p):
 
 
 # This function is used to create a query layer to find blocks
-def make_block_status_query_layer(sde_p, block_spat_ref_p, sde_block_query_p):
+def make_block_status_query_layer(sde_p, block_spat_ref_p, sde_block_query_p, namespace_p):
+    import arcpy
+
     arc_output("Creating Block Query Layer")
     block_layer = arcpy.MakeQueryLayer_management(input_database=sde_p,
-                                                  out_layer_name="TempBlocks",
+                                                  out_layer_name=f"TempBlocks_{namespace_p}",
                                                   query=sde_block_query_p,
                                                   oid_fields="BlockStatusId",
                                                   shape_type="POLYGON",
@@ -415,166 +555,614 @@ def make_block_status_query_layer(sde_p, block_spat_ref_p, sde_block_query_p):
     return block_layer
 
 
-# This function calculates block numbers based on the block ID
-def calc_block_num(block_array, block_temp_feature):
-    arc_output("Calculating Block Numbers")
-    with arcpy.da.UpdateCursor(block_temp_feature, ["BlockId", "Number"]) as cursor:
-        for row in cursor:
-            for block in block_array:
-                if row[0] == block[0]:
-                    row[1] = str(block[1])
-                    cursor.updateRow(row)
-    arc_output("Block Numbers Calculated")
+# This function creates the temporary block feature from the local geometry cache
+# Only the block shapes which are not cached yet are read from the BlockStatus table
+# The feature has the fields of the block master, so it can be appended with the "TEST" schema type like the query
+# layer copy. The other BlockStatus columns are cached with the shapes.
+# Return the block feature and the list of WKB shapes written to it
+def make_cached_block_feature(block_array_p, geometry_cache_p, scratch_blocks_p, block_spat_ref_p,
+                              master_block_feature_p):
+    import arcpy
+
+    arc_output("Reading Block Shapes from the Geometry Cache")
+    hits_before, misses_before = geometry_cache_p.hits, geometry_cache_p.misses
+    shapes = geometry_cache_p.geometries([[block[0], block[2]] for block in block_array_p])
+    arc_output(f"{len(shapes)} Block Shapes Found ({geometry_cache_p.hits - hits_before} cached, "
+               f"{geometry_cache_p.misses - misses_before} read from BlockInventory)")
+
+    block_feature = arcpy.CreateFeatureclass_management(os.path.dirname(scratch_blocks_p),
+                                                        os.path.basename(scratch_blocks_p), "POLYGON",
+                                                        template=master_block_feature_p,
+                                                        spatial_reference=block_spat_ref_p)[0]
+
+    # Columns of the master found in the BlockStatus attributes, the cached IDs are written from the cache keys and
+    # the blast fields are stamped by data_management
+    cached_fields = ["BlockStatusId", "BlockId", "StatusId"]
+    feature_fields = {field.name.lower(): field.name for field in arcpy.ListFields(block_feature)
+                      if field.type not in ("OID", "Geometry") and field.editable}
+    insert_cached_fields = [field for field in cached_fields if field.lower() in feature_fields]
+    attributes = {block_status_id: {name.lower(): value for name, value in shape_attributes.items()}
+                  for block_status_id, _, shape_attributes in shapes.values()}
+    attribute_names = {name for shape_attributes in attributes.values() for name in shape_attributes}
+    attribute_fields = [field for name, field in feature_fields.items()
+                        if name in attribute_names and field not in cached_fields]
+
+    block_wkb = []
+    with arcpy.da.InsertCursor(block_feature, insert_cached_fields + attribute_fields + ["SHAPE@WKB"]) as cursor:
+        for (block_id, status_id), (block_status_id, shape_wkb, _) in shapes.items():
+            cached_values = {"BlockStatusId": block_status_id, "BlockId": block_id, "StatusId": status_id}
+            cursor.insertRow([cached_values[field] for field in insert_cached_fields]
+                             + [attributes[block_status_id].get(field.lower()) for field in attribute_fields]
+                             + [shape_wkb])
+            block_wkb.append(shape_wkb)
+    arc_output("Temporary Block Feature Created")
+    return block_feature, block_wkb
+
+
+# This function reads the block numbers of a stream of entries (see block_input.py) into one canonical list
+# Malformed block numbers stop the tool before any database is queried
+# Return the list of unique block numbers in the order provided
+def block_input_to_list(entries, source_name):
+    import arcpy
+
+    block_list, rejected, duplicate_count = read_block_input(entries)
+    if len(rejected) > 0:
+        arcpy.AddError(f"{rejected_message(rejected)} in {source_name}.\nPlease correct the block numbers.")
+        quit()
+    duplicates = f", {duplicate_count} Duplicates Removed" if duplicate_count > 0 else ""
+    arc_output(f"{len(block_list)} Blocks Read from {source_name}{duplicates}")
+    return block_list
 
 
-# This function reads a text file with block numbers and adds the numbers to a list.
+# This function reads a text or CSV file with block numbers and adds the numbers to a list.
+# Numbers in a text file are separated by line breaks or commas, an entry with a space is rejected
 # Return the list of block numbers
 def block_file_to_list(blocks_file):
-    with open(blocks_file) as file:
-        block_list = [line.rstrip() for line in file]
+    return block_input_to_list(file_block_entries(blocks_file), os.path.basename(blocks_file))
 
-    for block in block_list:
-        block.replace("/", "")
-    # TODO: Test Printout
-    arc_output(block_list)
-    return block_list
 
+# This function selects the roads in the machine and people clearance zones and clips them to the zones
+# Candidate roads near the blocks come from the road index, the distance of every candidate to the blocks is computed
+# in one vectorised pass (road_impact.py) and only the affected portions are written to the scratch road feature,
+# with the ClearanceType of the zone they are in
+def affected_roads(all_roads, block_input, scratch_roads_fc, machine_radius_p, people_radius_p, zones_p, road_index,
+                   block_wkb_p=None):
+    import arcpy
+    from road_impact import classify_roads
+    from road_index import read_feature_boxes
+    from zone_engine import from_wkb_list
 
-# This function is used to select roads within 2000 meters of the blocks
-def affected_roads(all_roads, block_input, scratch_roads_fc):
     arc_output("Selecting Roads")
-
-    road_select = arcpy.SelectLayerByLocation_management(all_roads, "WITHIN_A_DISTANCE", block_input,
-                                                         "2000 Meters", "NEW_SELECTION", "NOT_INVERT")
-    arc_output("Roads Selected")
+    search_distance = max(float(machine_radius_p), float(people_radius_p))
+
+    if road_index is not None:
+        index_spatial_reference = arcpy.SpatialReference()
+        index_spatial_reference.loadFromString(road_index.spatial_reference)
+        _, block_boxes = read_feature_boxes(block_input, index_spatial_reference)
+        candidate_oids = road_index.candidates(block_boxes, search_distance)
+        arc_output(f"{len(candidate_oids)} Candidate Roads Found in Road Index")
+
+        oid_field = arcpy.Describe(all_roads).OIDFieldName
+        if len(candidate_oids) > 0:
+            candidate_where, _ = in_predicate(oid_field, [int(oid) for oid in candidate_oids], parameterised=False)
+        else:
+            candidate_where = "1 = 0"
+        road_select = arcpy.MakeFeatureLayer_management(all_roads, "CandidateRoads", candidate_where)
+    else:
+        arcpy.AddWarning("Road index not loaded, selecting from all roads")
+        road_select = arcpy.SelectLayerByLocation_management(all_roads, "WITHIN_A_DISTANCE", block_input,
+                                                             f"{search_distance} Meters", "NEW_SELECTION",
+                                                             "NOT_INVERT")
+
+    # Read the candidates in the coordinate system of the blocks and zones
+    block_spatial_reference = arcpy.Describe(block_input).spatialReference
+    if block_wkb_p is None:
+        with arcpy.da.SearchCursor(block_input, ["SHAPE@WKB"]) as cursor:
+            block_wkb_p = [row[0] for row in cursor if row[0] is not None]
+    road_fields = [field.name for field in arcpy.ListFields(all_roads)
+                   if field.editable and field.type not in ("OID", "Geometry", "GlobalID")]
+    with arcpy.da.SearchCursor(road_select, road_fields + ["SHAPE@WKB"],
+                               spatial_reference=block_spatial_reference) as cursor:
+        road_rows = [list(row) for row in cursor if row[-1] is not None]
+
+    classified = classify_roads(from_wkb_list([row[-1] for row in road_rows]), from_wkb_list(block_wkb_p),
+                                machine_radius_p, people_radius_p,
+                                from_wkb_list([zone[1] for zone in zones_p if zone[0] == "Machine"]),
+                                from_wkb_list([zone[1] for zone in zones_p if zone[0] == "People"]))
+    machine_count = len([row for row in classified if row[1] == "Machine"])
+    arc_output(f"{machine_count} Roads in the Machine Zone and {len(classified) - machine_count} in the People Zone")
 
     arc_output("Creating Temp Road Feature")
-    road_feature = arcpy.CopyFeatures_management(road_select, scratch_roads_fc)
+    road_feature = arcpy.CreateFeatureclass_management(os.path.dirname(scratch_roads_fc),
+                                                       os.path.basename(scratch_roads_fc), "POLYLINE",
+                                                       template=all_roads,
+                                                       spatial_reference=block_spatial_reference)[0]
+    add_missing_fields(road_feature, [["ClearanceType", "TEXT"]])
+    with arcpy.da.InsertCursor(road_feature, road_fields + ["ClearanceType", "SHAPE@WKB"]) as cursor:
+        for road, clearance_type, clipped_road in classified:
+            cursor.insertRow(road_rows[road][:-1] + [clearance_type, clipped_road.wkb])
     arc_output("Temp Road Feature Created")
 
     return road_feature
 
+
+# This function loads the road index written by RoadPortalToGeodatabase.py
+# Return the road index, or None if the index file does not exist
+def load_road_index(road_index_p):
+    import arcpy
+    from road_index import RoadIndex
+
+    if not os.path.exists(road_index_p):
+        arcpy.AddWarning(f"Road index {road_index_p} not found")
+        return None
+    arc_output("Loading Road Index")
+    road_index = RoadIndex.load(road_index_p)
+    arc_output(f"Road Index Loaded ({len(road_index.oids)} road segments)")
+    return road_index
+
+
+# This function moves the old records of the master features into the monthly partitions of the archive
+# Return the number of records archived
+def archive_master_features(window_days_p):
+    arc_output("Archiving Old Master Records")
+    master_stores = [ArcpyMasterStore(master_fc, archive_gdb)
+                     for master_fc in (master_blocks_fc, master_clearance_fc, master_roads_fc)]
+    archived = archive_masters(master_stores, window_days_p)
+    for master_name, record_count in archived.items():
+        if record_count > 0:
+            arc_output(f"{record_count} {master_name} Records Archived")
+    return sum(archived.values())
+
+
+# This function opens the local block shape cache, the missing shapes are read from the BlockStatus table
+# Return the geometry cache, None when the cache is turned off (use_block_geometry_cache)
+def open_block_geometry_cache(cache_file_p, cache_bytes_p):
+    if not use_block_geometry_cache:
+        return None
+    geometry_source = block_inventory(ArcpyBlockGeometrySource(block_inventory_sde,
+                                                               block_inventory_db_spatial_reference))
+    return BlockGeometryCache(cache_file_p, geometry_source, cache_bytes_p)
+
+
+# This function returns the source a run reads BlockInventory through: the live source, or with the snapshot
+# source setting a source reading the local snapshot (and the live source when the snapshot is stale)
+def block_inventory(live_source_p):
+    if block_inventory_source != "snapshot":
+        return live_source_p
+    return SnapshotSource(block_snapshot_dir, live_source_p, block_snapshot_max_age_seconds)
+
+
+# This function reports whether BlockInventory is read from the snapshot or live
+def report_block_inventory_source():
+    if block_inventory_source != "snapshot":
+        return
+    snapshot, description = open_current_snapshot(block_snapshot_dir, block_snapshot_max_age_seconds)
+    if snapshot is None:
+        arc_output(f"Reading BlockInventory Live: {description}")
+    else:
+        arc_output(f"Reading {description}")
+
+
+# This function exports the BlockInventory tables to the local snapshot (scheduled: python blast_cli.py snapshot)
+# Return the manifest of the new snapshot version
+def export_block_snapshot():
+    arc_output("Exporting BlockInventory Snapshot")
+    manifest = export_snapshot(ArcpySnapshotSource(block_inventory_sde, block_inventory_db_spatial_reference),
+                               block_snapshot_dir)
+    arc_output(f"BlockInventory Snapshot {manifest['version']} Exported ({manifest['rows']['Block']} blocks, "
+               f"{manifest['rows']['BlockStatus']} block statuses, {manifest['bytes'] / 1024 ** 2:.1f} MB, "
+               f"{manifest['seconds']:.1f}s)")
+    return manifest
+
+
+# This function opens the CAD artefact store and the export pool writing the CAD files through it
+# With a staging folder the CAD files are written locally and uploaded to the network drive in the background
+# Return the CAD export pool
+def open_cad_pool(store_dir_p, hard_links_p, staging_dir_p=None, upload_retries_p=5):
+    artefact_store = ArtefactStore(store_dir_p, hard_links_p)
+    upload_queue = None
+    if staging_dir_p is not None:
+        upload_queue = UploadQueue(staging_dir_p, {"store": artefact_store.materialise, "copy": publish_file},
+                                   upload_retries_p)
+        pending_count = len(upload_queue.pending())
+        if pending_count > 0:
+            arc_output(f"Uploading {pending_count} CAD Files Left by an Earlier Run")
+    return CadExportPool(artefact_store=artefact_store, upload_queue=upload_queue)
+
+
+# This function waits for the background uploads of the CAD files, for at most wait_seconds_p
+# Files which could not be uploaded stay in the upload journal and are uploaded by the next run
+# Return the number of files still waiting for upload
+def wait_for_uploads(cad_pool_p, wait_seconds_p):
+    import arcpy
+
+    if cad_pool_p.upload_queue is None:
+        return 0
+    arc_output("Uploading CAD Files")
+    pending_count = cad_pool_p.upload_queue.drain(wait_seconds_p)
+    for destination_file, error in cad_pool_p.upload_queue.failures.values():
+        arcpy.AddWarning(f"Upload of {destination_file} failed: {error}")
+    if pending_count > 0:
+        arcpy.AddWarning(f"{pending_count} CAD Files are Still Waiting for Upload, they are uploaded by the next run")
+    else:
+        arc_output("CAD Files Uploaded")
+    return pending_count
+
+
+# This function writes the JSON trace of a run, and the cProfile dump when the run was profiled
+# Return the path of the trace file
+def write_run_trace(tracer_p, trace_dir_p):
+    run_name = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.getpid()}"
+    trace_file = tracer_p.write_json(os.path.join(trace_dir_p, f"trace_{run_name}.json"))
+    arc_output(f"Run Trace Written to {trace_file}")
+    profile_file = tracer_p.stop_profile(os.path.join(trace_dir_p, f"profile_{run_name}.prof"))
+    if profile_file is not None:
+        arc_output(f"Run Profile Written to {profile_file}")
+    return trace_file
+
+
+# This function reads the zones of the machine and people clearance features
+# Return the list of [ClearanceType, WKB shape, bounds] zones
+def read_blast_zones(machine_fc_p, people_fc_p):
+    import arcpy
+
+    zones = []
+    for clearance_type, feature in (("Machine", machine_fc_p), ("People", people_fc_p)):
+        with arcpy.da.SearchCursor(feature, ["SHAPE@WKB", "SHAPE@"]) as cursor:
+            for shape_wkb, shape in cursor:
+                if shape is not None:
+                    extent = shape.extent
+                    zones.append([clearance_type, bytes(shape_wkb),
+                                  (extent.XMin, extent.YMin, extent.XMax, extent.YMax)])
+    return zones
+
+
+# This function reads the road IDs of the road feature (the ObjectIds of the roads in the feature service)
+# Return the list of road IDs, empty if the roads have no road ID field
+def read_road_ids(roads_fc_p):
+    import arcpy
+
+    if len(arcpy.ListFields(roads_fc_p, road_id_field)) == 0:
+        return []
+    with arcpy.da.SearchCursor(roads_fc_p, [road_id_field]) as cursor:
+        return [row[0] for row in cursor if row[0] is not None]
+
+
+# This function checks a new blast against the blasts planned in the same shift
+# Blasts appended since the index was loaded (e.g. by other planners) are read from the masters first
+# Return the number of conflicting blasts
+def check_blast_conflicts(conflict_index_p, blast_id_p, run_datetime_p, zones_p, road_ids_p):
+    import arcpy
+
+    window = timedelta(hours=conflict_window_hours)
+    conflict_index_p.load(ArcpyConflictSource(master_clearance_fc, master_roads_fc), run_datetime_p - window,
+                          run_datetime_p + window)
+    zone_conflicts, road_conflicts = conflict_index_p.find_conflicts(blast_id_p, run_datetime_p, zones_p, road_ids_p)
+    for other_blast_id, other_datetime, other_type, new_type in zone_conflicts:
+        arcpy.AddWarning(f"{new_type} clearance zone overlaps the {other_type} clearance zone of blast "
+                         f"{other_blast_id} ({other_datetime.strftime('%Y-%m-%d %H:%M')})")
+    for other_blast_id, shared_road_ids in road_conflicts.items():
+        arcpy.AddWarning(f"{len(shared_road_ids)} roads are also closed by blast {other_blast_id}")
+    conflicting_blasts = {row[0] for row in zone_conflicts} | set(road_conflicts)
+    if len(conflicting_blasts) == 0:
+        arc_output(f"No Conflicting Blasts within {conflict_window_hours} Hours")
+    return len(conflicting_blasts)
+
+
+# This function runs the blast clearance process for one blast whose blocks have been validated
+# The shared lookup cache, road index and geometry cache are passed in so that batch runs only load them once
+# Batch runs pass a blast ID allocator holding a reserved range of IDs, and batch runs and the resident worker
+# keep one conflict index for all their blasts
+# Without a geometry cache the block shapes are read through a query layer
+# The paths and settings are the module variables set by apply_config
+# Return the blast clearance ID and the user
+def process_blast(block_select_array_p, machine_radius_p, people_radius_p, level_lookup_cache_p, road_index_p,
+                  run_datetime_p, cad_pool_p, block_geometry_cache_p=None, blast_id_allocator_p=None,
+                  conflict_index_p=None):
+    import arcpy
+
+    arcpy.env.workspace = workspace
+    arcpy.env.overwriteOutput = True
+    date_string = run_datetime_p.strftime('%Y%m%d%H%M%S')
+    if blast_id_allocator_p is None:
+        blast_id_allocator_p = ArcpyBlastIdAllocator(sis_blasts_table)
+    if conflict_index_p is None:
+        conflict_index_p = ConflictIndex(conflict_window_hours)
+
+    # Find Elevation Datum Name (Mine Name, e.g. North Mine / South Mine / Lylyveld South)
+    with span("elevation_lookup"):
+        mine_input = find_elevation_datum(block_select_array_p, level_lookup_cache_p)
+
+    # Generate a blast ID
+    with span("blast_id") as stage:
+        current_blast_id, current_user = get_blast_id(blast_id_allocator_p=blast_id_allocator_p,
+                                                      mine_p=mine_input,
+                                                      date_p=run_datetime_p)
+        stage.attributes["blast_id"] = current_blast_id
+
+    # The intermediates are named in the namespace of the blast ID and user, so concurrent runs do not collide
+    scratch = ScratchWorkspace(scratch_gdb, scratch_workspace_mode, run_namespace(current_blast_id,
+                                                                                  current_user)).start()
+    try:
+        machine_clear_scratch_fc = scratch.path("TEMP_MACHINE")
+        machine_clear_single_scratch_fc = scratch.path("TEMP_MACHINE_SINGLE")
+        people_clear_scratch_fc = scratch.path("TEMP_PEOPLE")
+        people_clear_single_scratch_fc = scratch.path("TEMP_PEOPLE_SINGLE")
+        temp_block_fc = scratch.path("TEMP_BLOCKS")
+        road_scratch_fc = scratch.path("TEMP_ROADS")
+
+        if block_geometry_cache_p is not None:
+            with span("block_geometry_cache") as stage:
+                selected_blocks, block_wkb = make_cached_block_feature(
+                    block_array_p=block_select_array_p,
+                    geometry_cache_p=block_geometry_cache_p,
+                    scratch_blocks_p=temp_block_fc,
+                    block_spat_ref_p=block_inventory_db_spatial_reference,
+                    master_block_feature_p=master_blocks_fc)
+                stage.rows = len(block_wkb)
+            # The cached block feature is the temporary block feature, it does not have to be copied
+            temp_block_fc = None
+        else:
+            with span("sql_building") as stage:
+                block_shape_search = block_status_sql_query(block_select_array_p, sde_block_status_path)
+                stage.rows = len(block_select_array_p)
+
+            with span("query_layer"):
+                selected_blocks = make_block_status_query_layer(sde_p=block_inventory_sde,
+                                                                block_spat_ref_p=block_inventory_db_spatial_reference,
+                                                                sde_block_query_p=block_shape_search,
+                                                                namespace_p=scratch.namespace)
+                scratch.register(f"TempBlocks_{scratch.namespace}")
+            block_wkb = None
+
+        # Create the buffer & blocks features
+        with span("buffering", engine=clearance_zone_engine):
+            if clearance_zone_engine == "memory":
+                machine_buff, people_buff, temp_block_feature = find_clearance_zones_in_memory(
+                    spatref_p=block_inventory_db_spatial_reference,
+                    blocks_p=selected_blocks,
+                    scratch_blocks_p=temp_block_fc,
+                    machine_rad_p=machine_radius_p,
+                    people_rad_p=people_radius_p,
+                    machine_single_p=machine_clear_single_scratch_fc,
+                    people_single_p=people_clear_single_scratch_fc,
+                    master_clearance_feature_p=master_clearance_fc,
+                    block_wkb_p=block_wkb)
+            else:
+                machine_buff, people_buff, temp_block_feature = find_clearance_zones(
+                    spatref_p=block_inventory_db_spatial_reference,
+                    blocks_p=selected_blocks,
+                    scratch_machine_p=machine_clear_scratch_fc,
+                    scratch_people_p=people_clear_scratch_fc,
+                    scratch_blocks_p=temp_block_fc,
+                    machine_rad_p=machine_radius_p,
+                    people_rad_p=people_radius_p,
+                    machine_single_p=machine_clear_single_scratch_fc,
+                    people_single_p=people_clear_single_scratch_fc)
+
+        # Select the roads in the zones, clipped to the zones
+        with span("road_selection") as stage:
+            blast_zones = read_blast_zones(machine_buff, people_buff)
+            roads = affected_roads(all_roads=all_roads_fc,
+                                   block_input=temp_block_feature,
+                                   scratch_roads_fc=road_scratch_fc,
+                                   machine_radius_p=machine_radius_p,
+                                   people_radius_p=people_radius_p,
+                                   zones_p=blast_zones,
+                                   road_index=road_index_p,
+                                   block_wkb_p=block_wkb)
+            blast_road_ids = read_road_ids(roads)
+            stage.rows = len(blast_road_ids)
+
+        # Check for blasts in the same shift with overlapping zones or shared roads
+        with span("conflict_check") as stage:
+            stage.rows = check_blast_conflicts(conflict_index_p, current_blast_id, run_datetime_p, blast_zones,
+                                               blast_road_ids)
+
+        # Perform some data management tasks, append and export to CAD
+        data_management(block_input_feature=temp_block_feature,
+                        equipment_buffer=machine_buff,
+                        people_buffer=people_buff,
+                        roads=roads,
+                        run_datetime=run_datetime_p,
+                        elevation_datum_input=mine_input,
+                        blast_clearance_id=current_blast_id,
+                        date_string=date_string,
+                        user=current_user,
+                        resourced_dir=resources_dir,
+                        cad_output_dir=cad_output_dir,
+                        mine_spatial_reference=sishen_local_spatial_reference,
+                        master_block_feature=master_blocks_fc,
+                        master_clearance_feature=master_clearance_fc,
+                        block_array=block_select_array_p,
+                        roads_master_fc=master_roads_fc,
+                        scratch_p=scratch,
+                        cad_pool_p=cad_pool_p)
+
+        # The appended blast is checked by the next blasts of a batch or of the resident worker
+        conflict_index_p.add_blast(current_blast_id, run_datetime_p, blast_zones, blast_road_ids)
+    finally:
+        # Delete Scratch Features, also when a stage failed
+        delete_scratch_features(scratch)
+
+    return current_blast_id, current_user
+
+
+# This function sets the paths, spatial references and settings of the tool from the configuration
+# The other tools (batch tool, resident worker, command line) read them from this module
+def apply_config(config_p):
+    global workspace, execution_directory, portal_backup_directory, cad_output_dir, database_dir, resources_dir, \
+        working_gdb, scratch_gdb, archive_gdb, lookup_cache_file, block_geometry_cache_file, \
+        portal_backup_geodatabase, block_inventory_sde, clearance_zone_engine, scratch_workspace_mode, \
+        archive_window_days, use_block_geometry_cache, block_geometry_cache_bytes, trace_dir, profile_run, \
+        conflict_window_hours, cad_artefact_store_dir, cad_hard_links, staging_dir, upload_retries, \
+        upload_wait_seconds, block_inventory_source, block_snapshot_dir, block_snapshot_max_age_seconds, \
+        use_resident_worker, worker_spool_dir, sishen_local_spatial_reference, \
+        block_inventory_db_spatial_reference, sde_block_status_path, sde_level_path, sde_elevation_datum_path, \
+        sde_block_path, sis_blasts_table, master_blocks_fc, master_clearance_fc, master_roads_fc, all_roads_fc, \
+        road_index_file
+
+    # Workspace Variables
+    workspace = config_p.get("paths", "workspace")
+    execution_directory = config_p.get("paths", "execution_directory")
+    portal_backup_directory = config_p.get("paths", "portal_backup_directory")
+    cad_output_dir = config_p.get("paths", "cad_output_directory")
+    database_dir = os.path.join(execution_directory, "Databases")
+    resources_dir = os.path.join(execution_directory, "Resources")
+    working_gdb = os.path.join(database_dir, 'BlastClearance.gdb')
+    scratch_gdb = os.path.join(workspace, 'scratch.gdb')
+    archive_gdb = os.path.join(database_dir, 'Archive.gdb')
+    lookup_cache_file = os.path.join(workspace, 'LookupCache.json')
+    block_geometry_cache_file = os.path.join(workspace, 'BlockGeometryCache.sqlite')
+    portal_backup_geodatabase = os.path.join(portal_backup_directory, "PortalBackups.gdb")
+    block_inventory_sde = config_p.get("paths", "block_inventory_sde")
+    trace_dir = os.path.join(workspace, 'Traces')
+    worker_spool_dir = config_p.get("paths", "worker_spool_directory")
+    cad_artefact_store_dir = config_p.get("paths", "cad_artefact_store")
+    staging_dir = (config_p.get("paths", "staging_directory")
+                   if config_p.getboolean("settings", "stage_cad_output") else None)
+    block_snapshot_dir = config_p.get("paths", "block_snapshot_directory")
+
+    # Settings
+    clearance_zone_engine = config_p.get("settings", "clearance_zone_engine")
+    scratch_workspace_mode = config_p.get("settings", "scratch_workspace_mode")
+    conflict_window_hours = config_p.getfloat("settings", "conflict_window_hours")
+    archive_window_days = config_p.getint("settings", "archive_window_days")
+    use_block_geometry_cache = config_p.getboolean("settings", "use_block_geometry_cache")
+    block_geometry_cache_bytes = config_p.getint("settings", "block_geometry_cache_mb") * 1024 * 1024
+    profile_run = config_p.getboolean("settings", "profile_run")
+    use_resident_worker = config_p.getboolean("settings", "use_resident_worker")
+    cad_hard_links = config_p.getboolean("settings", "cad_hard_links")
+    upload_retries = config_p.getint("settings", "upload_retries")
+    upload_wait_seconds = config_p.getfloat("settings", "upload_wait_seconds")
+    block_inventory_source = config_p.get("settings", "block_inventory_source")
+    block_snapshot_max_age_seconds = config_p.getfloat("settings", "block_snapshot_max_age_hours") * 3600
+
+    # Spatial Reference Variables
+    sishen_local_spatial_reference = spatial_reference_text(config_p, "sishen_local")
+    block_inventory_db_spatial_reference = spatial_reference_text(config_p, "block_inventory")
+
+    # Derived Variables
+    sde_block_status_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.BlockStatus")
+    sde_level_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.Level")
+    sde_elevation_datum_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.ElevationDatum")
+    sde_block_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.Block")
+    sis_blasts_table = os.path.join(working_gdb, "SishenBlasts")
+    master_blocks_fc = os.path.join(working_gdb, "SisBlastBlocks")
+    master_clearance_fc = os.path.join(working_gdb, "SisBlastClearanceZones")
+    master_roads_fc = os.path.join(working_gdb, "SisBlastRoads")
+    all_roads_fc = os.path.join(portal_backup_geodatabase, "Road_Edge")
+    road_index_file = os.path.join(portal_backup_directory, "Road_Edge_index.npz")
+
+
+# This function passes a blast to the resident worker (blast_worker.py) and streams its progress
+# Return the result of the job, None when no worker is running
+# Raise arcpy.ExecuteError when the job failed, or the worker stopped or did not finish it in time
+def submit_to_worker(block_input_p, machine_radius_p, people_radius_p):
+    import arcpy
+    from blast_worker import JobSpool, submit_and_stream
+
+    worker_spool = JobSpool(worker_spool_dir)
+    if not worker_spool.worker_alive():
+        return None
+    job_result = submit_and_stream(worker_spool, {"blocks": list(block_input_p),
+                                                  "machine_radius": machine_radius_p,
+                                                  "people_radius": people_radius_p}, message=arc_output)
+    if job_result is None:
+        raise arcpy.ExecuteError("The blast clearance worker did not finish the job, check the masters before "
+                                 "running the blast again")
+    for error in job_result["errors"]:
+        arcpy.AddError(error)
+    if job_result["status"] != "SUCCESS":
+        raise arcpy.ExecuteError(f"The blast clearance worker failed job {job_result['job_id']}")
+    arc_output(f"Blast {job_result['blast_id']} Completed")
+    return job_result
+
+
+# This function runs the whole blast clearance process for one blast in this process
+# Return the blast clearance ID, the user and True if every CAD file was written and copied
+def run_blast(block_input_p, machine_radius_p, people_radius_p):
+    # Start tracing the stages of the run
+    tracer = start_tracer(message=arc_output)
+    if profile_run:
+        tracer.start_profile()
+
+    try:
+        # Check whether blocks exist in the Blocks table and read the BlockId, Number, CurrentStatusId and LevelId
+        report_block_inventory_source()
+        with span("blocks_check") as blocks_check_stage:
+            block_select_array = blocks_check(block_list_input=block_input_p,
+                                              block_source=block_inventory(ArcpyBlockSource(sde_block_path,
+                                                                                            "Number")))
+            blocks_check_stage.rows = len(block_select_array)
+
+        level_lookup_cache = LevelLookupCache(block_inventory(ArcpyLookupSource(sde_level_path,
+                                                                                sde_elevation_datum_path)),
+                                              lookup_cache_file)
+
+        block_geometry_cache = open_block_geometry_cache(block_geometry_cache_file, block_geometry_cache_bytes)
+        try:
+            cad_pool = open_cad_pool(cad_artefact_store_dir, cad_hard_links, staging_dir, upload_retries)
+            try:
+                blast_id, user = process_blast(block_select_array_p=block_select_array,
+                                               machine_radius_p=machine_radius_p,
+                                               people_radius_p=people_radius_p,
+                                               level_lookup_cache_p=level_lookup_cache,
+                                               road_index_p=load_road_index(road_index_file),
+                                               run_datetime_p=datetime.today().replace(microsecond=0),
+                                               cad_pool_p=cad_pool,
+                                               block_geometry_cache_p=block_geometry_cache)
+            finally:
+                # Completion barrier: make sure every CAD file was written and copied
+                arc_output("Waiting for CAD Files")
+                cad_files_copied = report_cad_failures(cad_pool.shutdown())
+        finally:
+            if block_geometry_cache is not None:
+                block_geometry_cache.close()
+
+        if cad_files_copied:
+            arc_output("Files Copied")
+        wait_for_uploads(cad_pool, upload_wait_seconds)
+
+        # Keep the master features small
+        with span("archive") as archive_stage:
+            archive_stage.rows = archive_master_features(archive_window_days)
+    finally:
+        # Write the trace (and profile) of the run, also when a stage failed
+        write_run_trace(tracer, trace_dir)
+    return blast_id, user, cad_files_copied
+
+
+# This function runs the ArcGIS Pro script tool with the parameters of the tool dialog
+def run_tool():
+    import arcpy
+
+    # User Input Parameters
+    use_file = arcpy.GetParameter(0)
+    block_list = arcpy.GetParameter(1)
+    block_file = arcpy.GetParameterAsText(2)
+    machine_radius_input = arcpy.GetParameterAsText(3)
+    people_radius_input = arcpy.GetParameterAsText(4)
+
+    # The workspace is the folder of the current project unless the configuration sets one
+    apply_config(read_config(default_workspace=new_path()))
+
+    if use_file:
+        block_input = block_file_to_list(block_file)
+    else:
+        block_input = block_input_to_list(list_block_entries(block_list), "the Block List")
+
+    # Thin client: the warm worker runs the blast when it is running
+    if use_resident_worker and submit_to_worker(block_input, machine_radius_input, people_radius_input) is not None:
+        return
+    run_blast(block_input, machine_radius_input, people_radius_input)
+
+
 # Main Program
+# Importing this module only reads the configuration, arcpy is imported by the functions that need it
+apply_config(read_config())
 
-# Workspace Variables
-workspace = new_path()
-arcpy.env.workspace = workspace
-arcpy.env.overwriteOutput = True
-execution_directory = r"S:\Mining\MRM\SURVEY\DME\NEWGME\Blasting Notification\BlastClearancePro"
-portal_backup_directory = r"S:\Mining\MRM\SURVEY\DME\NEWGME\ARC\PORTAL_BACKUPS"
-cad_output_dir = r"S:\Mining\MRM\SURVEY\CurrentData\DGN\Blasting Notification"
-database_dir = os.path.join(execution_directory, "Databases")
-resources_dir = os.path.join(execution_directory, "Resources")
-working_gdb = os.path.join(database_dir, 'BlastClearance.gdb')
-scratch_gdb = os.path.join(workspace, 'scratch.gdb')
-archive_gdb = os.path.join(workspace, 'Archive.gdb')
-portal_backup_geodatabase = os.path.join(portal_backup_directory, "PortalBackups.gdb")
-block_inventory_sde = r"S:\Mining\MRM\SURVEY\DME\NEWGME\ARC\SDE_CONNECTIONS\BlockInventory.sde"
-date_string = datetime.today().strftime('%Y%m%d%H%M%S')
-arc_date_string = datetime.today().strftime('%m/%d/%Y %I:%M:%S %p')
-query_date_string = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-arc_sql_date = "'" + arc_date_string + "'"
-
-# Spatial Reference Variable
-sishen_local_spatial_reference = "PROJCS['Cape_Lo23_Sishen',GEOGCS['GCS_Cape',DATUM['D_Cape'," \
-                                 "SPHEROID['Clarke_1880_Arc',6378249.145,293.466307656]],PRIMEM['Greenwich',0.0]," \
-                                 "UNIT['Degree',0.0174532925199433]],PROJECTION['Transverse_Mercator']," \
-                                 "PARAMETER['False_Easting',50000.0],PARAMETER['False_Northing',3000000.0]," \
-                                 "PARAMETER['Central_Meridian',23.0],PARAMETER['Scale_Factor',1.0]," \
-                                 "PARAMETER['Latitude_Of_Origin',0.0],UNIT['Meter',1.0]];-5573300 -7002000 10000;" \
-                                 "-100000 10000;-100000 10000;0.001;0.001;0.001;IsHighPrecision "
-
-block_inventory_db_spatial_reference = "PROJCS['Cape_Lo23_Sishen_Blocks',GEOGCS['GCS_Cape'," \
-                                       "DATUM['D_Cape',SPHEROID['Clarke_1880_Arc',6378249.145,293.466307656]]," \
-                                       "PRIMEM['Greenwich',0.0],UNIT['Degree',0.0174532925199433]]," \
-                                       "PROJECTION['Transverse_Mercator'],PARAMETER['False_Easting',-50000.0]," \
-                                       "PARAMETER['False_Northing',-3000000.0],PARAMETER['Central_Meridian',23.0]," \
-                                       "PARAMETER['Scale_Factor',-1.0],PARAMETER['Latitude_Of_Origin',0.0]," \
-                                       "UNIT['Meter',1.0]]"
-
-# User Input Parameters
-
-use_file = arcpy.GetParameter(0)
-block_list = arcpy.GetParameter(1)
-block_file = arcpy.GetParameterAsText(2)
-machine_radius_input = arcpy.GetParameterAsText(3)
-people_radius_input = arcpy.GetParameterAsText(4)
-
-if use_file:
-    block_input = block_file_to_list(block_file)
-else:
-    block_input = block_list
-
-# Derived Variables
-sde_block_status_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.BlockStatus")
-sde_level_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.Level")
-sde_elevation_datum_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.ElevationDatum")
-sde_block_path = os.path.join(block_inventory_sde, "BlockInventory.dbo.Block")
-machine_clear_scratch_fc = os.path.join(scratch_gdb, "TEMP_MACHINE")
-machine_clear_single_scratch_fc = os.path.join(scratch_gdb, "TEMP_MACHINE_SINGLE")
-people_clear_scratch_fc = os.path.join(scratch_gdb, "TEMP_PEOPLE")
-people_clear_single_scratch_fc = os.path.join(scratch_gdb, "TEMP_PEOPLE_SINGLE")
-sis_blasts_table = os.path.join(working_gdb, "SishenBlasts")
-temp_block_fc = os.path.join(scratch_gdb, "TEMP_BLOCKS")
-master_blocks_fc = os.path.join(working_gdb, "SisBlastBlocks")
-master_clearance_fc = os.path.join(working_gdb, "SisBlastClearanceZones")
-master_roads_fc = os.path.join(working_gdb, "SisBlastRoads")
-all_roads_fc = os.path.join(portal_backup_geodatabase, "Road_Edge")
-road_scratch_fc = os.path.join(scratch_gdb, "TEMP_ROADS")
-
-# Check whether blocks exist in the Blocks table
-blocks_check(block_list_input=block_input,
-             sde_block_table=sde_block_path,
-             search_field_name="Number")
-
-block_search = block_search_sql_query(block_list_input=block_input,
-                                      block_number_field="Number")
-
-block_select_array = make_block_array(block_search, sde_block_path)
-
-block_shape_search = block_status_sql_query(block_select_array)
-
-selected_blocks = make_block_status_query_layer(sde_p=block_inventory_sde,
-                                                block_spat_ref_p=block_inventory_db_spatial_reference,
-                                                sde_block_query_p=block_shape_search)
-
-# Find Elevation Datum Name (Mine Name, e.g. North Mine / South Mine / Lylyveld South)
-mine_input = find_elevation_datum(block_select_array, sde_level_path, sde_elevation_datum_path)
-
-# Generate a blast ID
-current_blast_id, current_user = get_blast_id(blast_table_p=sis_blasts_table,
-                                              mine_p=mine_input,
-                                              date_p=query_date_string)
-
-# Create the buffer & blocks features
-machine_buff, people_buff, temp_block_feature = find_clearance_zones(spatref_p=block_inventory_db_spatial_reference,
-                                                                     blocks_p=selected_blocks,
-                                                                     scratch_machine_p=machine_clear_scratch_fc,
-                                                                     scratch_people_p=people_clear_scratch_fc,
-                                                                     scratch_gdb_p=scratch_gdb,
-                                                                     machine_rad_p=machine_radius_input,
-                                                                     people_rad_p=people_radius_input,
-                                                                     machine_single_p=machine_clear_single_scratch_fc,
-                                                                     people_single_p=people_clear_single_scratch_fc)
-
-roads = affected_roads(all_roads=all_roads_fc,
-                       block_input=temp_block_feature,
-                       scratch_roads_fc=road_scratch_fc)
-
-# Perform some data management tasks, append and export to CAD
-data_management(block_input_feature=temp_block_feature,
-                equipment_buffer=machine_buff,
-                people_buffer=people_buff,
-                roads=roads,
-                date_sql_string=arc_sql_date,
-                elevation_datum_input=mine_input,
-                blast_clearance_id=current_blast_id,
-                date_string=date_string,
-                user=current_user,
-                resourced_dir=resources_dir,
-                cad_output_dir=cad_output_dir,
-                mine_spatial_reference=sishen_local_spatial_reference,
-                master_block_feature=master_blocks_fc,
-                master_clearance_feature=master_clearance_fc,
-                block_array=block_select_array,
-                roads_master_fc=master_roads_fc)
+# The batch tool (BlastClearanceBatch.py), the command line (blast_cli.py) and the resident worker import this
+# script, the single blast tool only runs when executed directly
+if __name__ == "__main__":
+    run_tool()
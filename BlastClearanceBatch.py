@@ -0,0 +1,206 @@
+# This script runs the blast clearance process for many blasts in a single invocation
+# The blasts are read from a JSON manifest, for example:
+# {
+#     "machine_radius": 300,
+#     "people_radius": 500,
+#     "blasts": [
+#         {"name": "North Pit A", "blocks": ["1234", "1235"]},
+#         {"name": "South Pit B", "block_file": "south_b.txt", "machine_radius": 400, "people_radius": 600}
+#     ]
+# }
+# Block files are text or CSV files (see block_input.py), relative block files are read from the folder of the
+# manifest. Radii of a blast default to the manifest radii, which default to the tool parameters.
+# All blasts are validated in one pass and share the SDE connections, lookup tables, road index, block shape
+# cache and conflict index, so overlapping blasts only read their block shapes once.
+# Every blast still gets its own blast ID, clearance zones, CAD export and master append.
+import json
+import os
+from datetime import datetime, timedelta
+
+import BlastClearance as blast_clearance
+from blast_config import read_config
+from blast_ids import ArcpyBlastIdAllocator
+from block_input import file_block_entries, list_block_entries, read_block_input, rejected_message
+from block_validation import ArcpyBlockSource, validate_block_lists
+from conflict_index import ConflictIndex
+from lookup_cache import ArcpyLookupSource, LevelLookupCache
+from tracing import span, start_tracer
+
+
+# Functions
+# This function reads the blasts from a manifest file
+# Return a list of dictionaries with the name, block list, machine radius and people radius of every blast
+def read_manifest(manifest_file, default_machine_radius=None, default_people_radius=None):
+    with open(manifest_file) as file:
+        manifest = json.load(file)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+    machine_radius = manifest.get("machine_radius", default_machine_radius)
+    people_radius = manifest.get("people_radius", default_people_radius)
+
+    blasts = []
+    for count, blast in enumerate(manifest.get("blasts", [])):
+        name = str(blast.get("name", f"Blast {count + 1}"))
+        if "blocks" in blast:
+            entries = list_block_entries(blast["blocks"], f"{name} blocks")
+        elif "block_file" in blast:
+            entries = file_block_entries(os.path.join(manifest_dir, blast["block_file"]))
+        else:
+            raise ValueError(f"{name}: no blocks or block_file provided")
+        blocks, rejected, _ = read_block_input(entries)
+        if len(rejected) > 0:
+            raise ValueError(f"{name}: {rejected_message(rejected)}")
+
+        blast_machine_radius = blast.get("machine_radius", machine_radius)
+        blast_people_radius = blast.get("people_radius", people_radius)
+        if blast_machine_radius in (None, "") or blast_people_radius in (None, ""):
+            raise ValueError(f"{name}: no machine or people radius provided")
+        blasts.append({"name": name, "blocks": blocks, "machine_radius": blast_machine_radius,
+                       "people_radius": blast_people_radius})
+    return blasts
+
+
+# This function runs all blasts of the manifest
+# Return the report as a list of [blast name, status, details] lists
+def run_batch(blasts):
+    # Validate the blocks of every blast in one pass
+    blast_clearance.arc_output(f"Checking the blocks of {len(blasts)} blasts")
+    blast_clearance.report_block_inventory_source()
+    with span("blocks_check") as stage:
+        validation = validate_block_lists([blast["blocks"] for blast in blasts],
+                                          blast_clearance.block_inventory(
+                                              ArcpyBlockSource(blast_clearance.sde_block_path, "Number")))
+        stage.rows = sum(len(block_array) for block_array, _ in validation)
+    blast_clearance.arc_output("Block Check Completed...")
+
+    # Shared resources are only loaded once
+    level_lookup_cache = LevelLookupCache(blast_clearance.block_inventory(
+                                              ArcpyLookupSource(blast_clearance.sde_level_path,
+                                                                blast_clearance.sde_elevation_datum_path)),
+                                          blast_clearance.lookup_cache_file)
+    road_index = blast_clearance.load_road_index(blast_clearance.road_index_file)
+    block_geometry_cache = blast_clearance.open_block_geometry_cache(blast_clearance.block_geometry_cache_file,
+                                                                     blast_clearance.block_geometry_cache_bytes)
+
+    # Reserve a contiguous range of blast IDs for the blasts whose blocks all exist, the rows a killed batch run left
+    # reserved are removed first
+    blast_id_allocator = ArcpyBlastIdAllocator(blast_clearance.sis_blasts_table)
+    orphan_count = blast_id_allocator.remove_orphans()
+    if orphan_count > 0:
+        blast_clearance.arc_output(f"{orphan_count} Orphaned Blast Clearance IDs Removed")
+    valid_count = len([block_array for block_array, missing_list in validation
+                       if len(block_array) > 0 and len(missing_list) == 0])
+    reserved_ids = blast_id_allocator.reserve(valid_count)
+    if len(reserved_ids) > 0:
+        blast_clearance.arc_output(f"Blast Clearance IDs {reserved_ids[0]} to {reserved_ids[-1]} Reserved")
+
+    # Blasts of the batch are checked against each other as well as against the masters
+    conflict_index = ConflictIndex(blast_clearance.conflict_window_hours)
+
+    # CAD exports of different mines run concurrently while the next blasts are processed
+    cad_pool = blast_clearance.open_cad_pool(blast_clearance.cad_artefact_store_dir, blast_clearance.cad_hard_links,
+                                             blast_clearance.staging_dir, blast_clearance.upload_retries)
+    report_rows_by_job = {}
+
+    report = []
+    previous_datetime = None
+    try:
+        for blast, (block_array, missing_list) in zip(blasts, validation):
+            name = blast["name"]
+            if len(missing_list) > 0:
+                report.append([name, "FAILED", f"Blocks do not exist: {', '.join(missing_list)}"])
+                continue
+            if len(block_array) == 0:
+                report.append([name, "FAILED", "No blocks provided"])
+                continue
+
+            # Every blast gets its own timestamp, it is part of the blast folder and file names
+            run_datetime = datetime.today().replace(microsecond=0)
+            if previous_datetime is not None and run_datetime <= previous_datetime:
+                run_datetime = previous_datetime + timedelta(seconds=1)
+            previous_datetime = run_datetime
+
+            blast_clearance.arc_output(f"Processing {name} ({len(block_array)} blocks)")
+            try:
+                with span("blast", name=name) as stage:
+                    stage.rows = len(block_array)
+                    blast_id, user = blast_clearance.process_blast(block_select_array_p=block_array,
+                                                                   machine_radius_p=blast["machine_radius"],
+                                                                   people_radius_p=blast["people_radius"],
+                                                                   level_lookup_cache_p=level_lookup_cache,
+                                                                   road_index_p=road_index,
+                                                                   run_datetime_p=run_datetime,
+                                                                   cad_pool_p=cad_pool,
+                                                                   block_geometry_cache_p=block_geometry_cache,
+                                                                   blast_id_allocator_p=blast_id_allocator,
+                                                                   conflict_index_p=conflict_index)
+                report.append([name, "SUCCESS", f"Blast Clearance ID {blast_id} ({user})"])
+                report_rows_by_job[f"Blast {blast_id}"] = report[-1]
+            except Exception as error:
+                # process_blast has deleted the intermediates of the failed blast
+                report.append([name, "FAILED", str(error)])
+    finally:
+        # The shared resources are released and the CAD files finished also when the batch is interrupted, every
+        # blast deletes its own intermediates (process_blast)
+        if block_geometry_cache is not None:
+            block_geometry_cache.close()
+
+        # IDs of blasts that failed before their ID was used are given back
+        released_count = blast_id_allocator.release()
+        if released_count > 0:
+            blast_clearance.arc_output(f"{released_count} Unused Blast Clearance IDs Released")
+
+        # Completion barrier: a failed CAD export or copy fails the blast in the report
+        blast_clearance.arc_output("Waiting for CAD Files")
+        for job_name, file_name, error in cad_pool.shutdown():
+            report_row = report_rows_by_job.get(job_name)
+            if report_row is None:
+                report.append([job_name, "FAILED", f"{file_name} {error}"])
+            else:
+                report_row[1] = "FAILED"
+                report_row[2] += f"; {file_name} {error}"
+
+    blast_clearance.wait_for_uploads(cad_pool, blast_clearance.upload_wait_seconds)
+
+    # Keep the master features small
+    with span("archive") as stage:
+        stage.rows = blast_clearance.archive_master_features(blast_clearance.archive_window_days)
+    return report
+
+
+# This function runs the blasts of a manifest and reports the result of every blast
+# Return the number of failed blasts
+def run_manifest(manifest_file, machine_radius=None, people_radius=None):
+    import arcpy
+
+    tracer = start_tracer(message=blast_clearance.arc_output)
+    if blast_clearance.profile_run:
+        tracer.start_profile()
+    try:
+        batch_report = run_batch(read_manifest(manifest_file, machine_radius, people_radius))
+    finally:
+        blast_clearance.write_run_trace(tracer, blast_clearance.trace_dir)
+
+    # Per blast report
+    blast_clearance.arc_output("Batch Report")
+    for blast_name, status, details in batch_report:
+        arcpy.AddMessage(f"{status:<8} {blast_name}: {details}")
+    failed_count = len([row for row in batch_report if row[1] == "FAILED"])
+    if failed_count > 0:
+        arcpy.AddWarning(f"{failed_count} of {len(batch_report)} blasts failed")
+    else:
+        blast_clearance.arc_output(f"All {len(batch_report)} blasts completed")
+    return failed_count
+
+
+# Main Program
+if __name__ == "__main__":
+    import arcpy
+
+    # User Input Parameters
+    manifest_input = arcpy.GetParameterAsText(0)
+    machine_radius_input = arcpy.GetParameterAsText(1)
+    people_radius_input = arcpy.GetParameterAsText(2)
+
+    # The workspace is the folder of the current project unless the configuration sets one
+    blast_clearance.apply_config(read_config(default_workspace=blast_clearance.new_path()))
+    run_manifest(manifest_input, machine_radius_input, people_radius_input)
@@ -13,6 +13,9 @@ import arcpy
 from arcgis import GIS
 import os
 from datetime import datetime
+from portal_backup import BackupEngine
+from road_index import build_road_index
+from road_sync import ArcpyRoadStore, FeatureServiceClient, sync_roads
 
 
 # Functions
@@ -41,21 +44,19 @@ def arc_output(message):
     arcpy.AddMessage(f"---{timestamp}: {message} ---")
 
 
-def download_as_fgdb(item_list, backup_location):
-    for item in item_list:
-        try:
-            if 'View Service' in item.typeKeywords:
-                print(item.title + " is view, not downloading")
-            else:
-                print("Downloading " + item.title)
-                version = datetime.datetime.now().strftime("%d_%b_%Y")
-                result = item.export(item.title + "_" + version, "File Geodatabase")
-                result.download(backup_location)
-                result.delete()
-                print("Successfully downloaded " + item.title)
-        except:
-            print("An error occurred downloading " + item.title)
-    print("The function has completed")
+# This function exports and downloads portal items as file geodatabases on a thread pool
+# Unchanged items are skipped and an interrupted backup resumes from the checkpoint manifest
+# Return a dictionary of item title -> backup result (status, file, bytes, seconds)
+def download_as_fgdb(item_list, backup_location, manifest_file):
+    engine = BackupEngine(backup_location, manifest_file, message=arc_output)
+    results = engine.run(item_list)
+    failed_titles = [title for title, result in results.items() if result["status"] == "failed"]
+    if len(failed_titles) > 0:
+        arcpy.AddWarning(f"Backup failed for: {', '.join(failed_titles)}")
+    downloaded_bytes = sum(result["bytes"] for result in results.values() if result["status"] == "done")
+    arc_output(f"Portal Backup Completed ({downloaded_bytes} bytes downloaded)")
+    return results
+
 
 # Main Program
 
@@ -70,32 +71,52 @@ arcpy.env.workspace = workspace
 arcpy.env.overwriteOutput = True
 backup_geodatabase = os.path.join(workspace, "PortalBackups.gdb")
 road_fc = os.path.join(backup_geodatabase, "Road_Edge")
+road_index_file = os.path.join(workspace, "Road_Edge_index.npz")
+road_sync_state_file = os.path.join(workspace, "Road_Edge_sync.json")
+
+# Road sync mode: "incremental" (only download edited features) or "full" (copy the whole layer)
+road_sync_mode = "incremental"
+
+# Portal services backed up as file geodatabases when backup_portal_services is True
+backup_portal_services = False
+portal_backup_manifest = os.path.join(workspace, "PortalBackupManifest.json")
+search_list = ["Sishen Safety", "Sishen Hydrology", "Sishen Survey", "Sishen Land Use and Land Cover", "Sishen Geology",
+               "Sishen Mining", "Sishen Mining Lease", "Sishen Areas of Responsibility", "Sishen Infrastructure"]
 
 
 # Execute Script
 
 gis, portal_hostname = check_portal()
 
-# search_list = ["Sishen Safety", "Sishen Hydrology", "Sishen Survey", "Sishen Land Use and Land Cover", "Sishen Geology",
-#                "Sishen Mining", "Sishen Mining Lease", "Sishen Areas of Responsibility", "Sishen Infrastructure"]
-# # search_list = "Sishen Geology"
-# export_list = []
-# search_items = gis.content.search(query="Sishen", item_type="Feature Service", max_items=10000)
-
-# for feature_service in search_items:
-#     if feature_service.title in search_list:
-#         arc_output(feature_service)
-#         export_list.append(feature_service)
-#         for layer in feature_service.layers:
-#             arc_output(layer)
-#
-# print(export_list)
-
-
-# Copy Feature later to Feature
-arc_output("Copying Features")
-arcpy.CopyFeatures_management(road_feature_online, road_fc)
-arc_output("Features Copied")
-arc_output("Renaming 'Level_' to 'Level'")
-arcpy.AlterField_management(road_fc, "Level_", "Level")
-arc_output("Renamed 'Level_' to 'Level'")
+# Back up the Sishen feature services
+if backup_portal_services:
+    arc_output("Backing up Portal Services")
+    search_items = gis.content.search(query="Sishen", item_type="Feature Service", max_items=10000)
+    export_list = [feature_service for feature_service in search_items if feature_service.title in search_list]
+    download_as_fgdb(export_list, workspace, portal_backup_manifest)
+
+# Incremental sync: only download the roads added, changed or deleted since the last sync
+# The full copy is used when the road backup does not exist yet or when road_sync_mode is "full"
+if road_sync_mode == "full" or not arcpy.Exists(road_fc):
+    # Copy Feature later to Feature
+    arc_output("Copying Features")
+    arcpy.CopyFeatures_management(road_feature_online, road_fc)
+    arc_output("Features Copied")
+    arc_output("Renaming 'Level_' to 'Level'")
+    arcpy.AlterField_management(road_fc, "Level_", "Level")
+    arc_output("Renamed 'Level_' to 'Level'")
+    # The copied roads do not have SourceObjectIds, the next incremental sync reloads them
+    if os.path.exists(road_sync_state_file):
+        os.remove(road_sync_state_file)
+else:
+    arc_output("Synchronising Roads")
+    road_client = FeatureServiceClient(road_feature_online, token=gis._con.token)
+    layer_spatial_reference = road_client.layer_info().get("extent", {}).get("spatialReference")
+    sync_result = sync_roads(road_client, ArcpyRoadStore(road_fc, layer_spatial_reference), road_sync_state_file)
+    arc_output(f"Roads Synchronised ({sync_result['upserted']} added or changed, {sync_result['deleted']} deleted"
+               f"{', full reload' if sync_result['full'] else ''})")
+
+# Build the spatial index used by BlastClearance.py to find roads near blocks
+arc_output("Building Road Index")
+road_count = build_road_index(road_fc, road_index_file)
+arc_output(f"Road Index Built ({road_count} road segments)")
@@ -0,0 +1,65 @@
+# This module stamps the blast clearance attributes onto a feature class in a single UpdateCursor pass
+# It replaces one CalculateField table scan per field and the nested block loop of calc_block_num
+
+
+# This function creates a dictionary to look up the block number of a BlockId
+# Return a dictionary of BlockId -> Number
+def block_number_lookup(block_array_p):
+    return {block[0]: str(block[1]) for block in block_array_p}
+
+
+# This function adds the fields that do not exist yet in a feature class with a single AddFields call
+# field_specs is a list of [field name, field type] lists
+# Return the list of field names that were added
+def add_missing_fields(feature, field_specs):
+    import arcpy
+
+    existing_fields = [field.name.lower() for field in arcpy.ListFields(feature)]
+    missing_specs = [spec for spec in field_specs if spec[0].lower() not in existing_fields]
+    if len(missing_specs) > 0:
+        arcpy.AddFields_management(feature, missing_specs)
+    return [spec[0] for spec in missing_specs]
+
+
+# This function returns the names (in lower case) of the attribute fields of a feature class that Append compares
+# The ObjectID, the shape and the fields maintained by the geodatabase (e.g. Shape_Length) are left out
+def append_field_names(feature):
+    import arcpy
+
+    return {field.name.lower() for field in arcpy.ListFields(feature)
+            if field.type not in ("OID", "Geometry", "GlobalID") and field.editable}
+
+
+# This function checks that a feature has the same attribute fields as the master it is appended to, as an Append
+# with the "TEST" schema type fails on any difference
+def check_append_fields(feature, master_feature):
+    import arcpy
+
+    feature_fields = append_field_names(feature)
+    master_fields = append_field_names(master_feature)
+    if feature_fields != master_fields:
+        raise arcpy.ExecuteError(f"The fields of {feature} do not match {master_feature}: "
+                                 f"missing {sorted(master_fields - feature_fields)}, "
+                                 f"extra {sorted(feature_fields - master_fields)}")
+
+
+# This function writes constant values and, optionally, block numbers to every row of a feature class
+# values is a dictionary of field name -> value, block_numbers is a dictionary of BlockId -> Number
+# Return the number of rows updated
+def stamp_attributes(feature, values, block_numbers=None):
+    import arcpy
+
+    value_fields = list(values)
+    fields = value_fields + (["BlockId", "Number"] if block_numbers is not None else [])
+    constant_values = [values[field] for field in value_fields]
+    value_count = len(value_fields)
+
+    row_count = 0
+    with arcpy.da.UpdateCursor(feature, fields) as cursor:
+        for row in cursor:
+            row[:value_count] = constant_values
+            if block_numbers is not None:
+                row[value_count + 1] = block_numbers.get(row[value_count], row[value_count + 1])
+            cursor.updateRow(row)
+            row_count += 1
+    return row_count
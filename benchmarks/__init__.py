@@ -0,0 +1,4 @@
+# Benchmark suite for the blast clearance tools
+# synthetic.py generates a synthetic mine, fake_arcpy.py is a SQLite and shapely stand-in for arcpy that the tools run
+# against unchanged, environment.py sets up the folders and geodatabases around the mine, recording.py records live
+# query results and harness.py times the stages.
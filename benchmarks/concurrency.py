@@ -0,0 +1,155 @@
+# This module runs blasts of BlastClearance.py in parallel processes against one environment and checks that no
+# output of a blast was written by another blast
+# The processes share the mine database, the working geodatabase (the master feature classes and SishenBlasts), the
+# scratch geodatabase and the CAD folders, every process runs as its own user and clears its own range of blocks.
+# After the runs the master rows and the blast folder reference file of every blast must hold that blast only.
+# Usage (from the repository folder):
+#     python -m benchmarks.concurrency                          4 processes with 5 blasts each
+#     python -m benchmarks.concurrency --processes 8 --blasts 10
+#     python -m benchmarks.concurrency --scratch memory         intermediates in the memory workspace of every process
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks import fake_arcpy
+from benchmarks.environment import create_environment, environment_paths, load_environment
+from benchmarks.synthetic import block_number, create_mine_database
+
+master_tables = ("SisBlastBlocks", "SisBlastClearanceZones", "SisBlastRoads")
+
+
+# This function runs the blasts of one process, a blast which fails (e.g. reads a scratch feature being rewritten by
+# another process) is recorded as an error
+# Return a list of dictionaries with the blast ID, user and block numbers of every blast, the list of errors and the
+# intermediates left in the memory workspace of the process
+def run_process(config_file, database_path, process_number, blast_count, blocks_per_blast):
+    load_environment(config_file, database_path)
+    import BlastClearance as blast_clearance
+
+    fake_arcpy.editor_user = f"user{process_number}"
+    blasts = []
+    errors = []
+    for blast in range(blast_count):
+        first_block_id = (process_number * blast_count + blast) * blocks_per_blast + 1
+        block_numbers = [block_number(block_id) for block_id in range(first_block_id,
+                                                                      first_block_id + blocks_per_blast)]
+        try:
+            blast_id, user, _ = blast_clearance.run_blast(block_numbers, 300, 500)
+        except Exception as error:
+            errors.append(f"Process {process_number} blast {blast + 1} failed: {type(error).__name__} {error}")
+            continue
+        blasts.append({"blast_id": str(blast_id), "user": user, "blocks": block_numbers})
+    return blasts, errors, feature_classes(None)
+
+
+# This function returns the feature classes and tables of a workspace (None for the memory workspace)
+def feature_classes(workspace):
+    with fake_arcpy._connect(workspace) as connection:
+        rows, _ = connection.query("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return [row[0] for row in rows if row[0] != fake_arcpy.metadata_table]
+
+
+# This function returns the reference file of every blast folder in the CAD folders as a dictionary of blast folder
+# name -> lines
+def reference_files(cad_dir):
+    references = {}
+    for folder, _, file_names in os.walk(cad_dir):
+        for file_name in file_names:
+            if file_name.endswith("_REF.dgn"):
+                with open(os.path.join(folder, file_name)) as file:
+                    references[os.path.basename(folder)] = file.read().splitlines()
+    return references
+
+
+# This function compares the master feature classes, SishenBlasts and the blast folders with the blasts run
+# Return a list of problems (empty when no output was cross-contaminated)
+def check_outputs(working_database_path, cad_dir, blasts):
+    problems = []
+    references = reference_files(cad_dir)
+    connection = sqlite3.connect(working_database_path)
+    try:
+        for blast in blasts:
+            blast_id = blast["blast_id"]
+            created_user = connection.execute("SELECT created_user FROM SishenBlasts WHERE BlastClearId = ?",
+                                              [blast_id]).fetchone()
+            if created_user is None or created_user[0] != blast["user"]:
+                problems.append(f"Blast {blast_id}: SishenBlasts row of {created_user}, run by {blast['user']}")
+            row_counts = {table_name: connection.execute(f"SELECT COUNT(*) FROM {table_name} WHERE BlastClearId = ?",
+                                                         [blast_id]).fetchone()[0]
+                          for table_name in master_tables}
+            numbers = [row[0] for row in connection.execute("SELECT Number FROM SisBlastBlocks WHERE BlastClearId = ?",
+                                                            [blast_id])]
+            if len(numbers) != len(blast["blocks"]) or set(numbers) != set(blast["blocks"]):
+                problems.append(f"Blast {blast_id}: blocks {len(set(numbers) - set(blast['blocks']))} of other "
+                                f"blasts and {len(set(blast['blocks']) - set(numbers))} missing in SisBlastBlocks")
+            if row_counts["SisBlastClearanceZones"] < 2:
+                problems.append(f"Blast {blast_id}: {row_counts['SisBlastClearanceZones']} clearance zones")
+
+            folder_names = [name for name in references if name.endswith(f"_ID{blast_id}_{blast['user']}")]
+            if len(folder_names) != 1:
+                problems.append(f"Blast {blast_id}: {len(folder_names)} blast folders")
+                continue
+            reference_ids = [line.split(" ", 1)[0] for line in references[folder_names[0]]]
+            foreign_count = len([reference_id for reference_id in reference_ids if reference_id != blast_id])
+            if foreign_count > 0:
+                problems.append(f"Blast {blast_id}: {foreign_count} rows of other blasts in the reference file")
+            if len(reference_ids) != sum(row_counts.values()):
+                problems.append(f"Blast {blast_id}: {len(reference_ids)} rows in the reference file, "
+                                f"{sum(row_counts.values())} in the master feature classes")
+    finally:
+        connection.close()
+    return problems
+
+
+# This function runs the blasts of process_count processes at the same time and checks the outputs
+# scratch_mode is the scratch_workspace_mode of the runs, with gdb every process writes its intermediates to the
+# shared scratch geodatabase
+# Return a dictionary with the number of blasts, the seconds, the intermediates left and the problems found
+def stress_test(process_count=4, blast_count=5, blocks_per_blast=20, road_count=5000, scratch_mode="gdb"):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database_path = os.path.join(temp_dir, "mine.sqlite")
+        create_mine_database(database_path, process_count * blast_count * blocks_per_blast, road_count)
+        config_file = create_environment(temp_dir, database_path, {"scratch_workspace_mode": scratch_mode})
+        import BlastClearance as blast_clearance
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(process_count) as pool:
+            results = pool.starmap(run_process, [[config_file, database_path, process_number, blast_count,
+                                                  blocks_per_blast]
+                                                 for process_number in range(process_count)])
+        seconds = time.perf_counter() - start
+        blasts = [blast for blasts, _, _ in results for blast in blasts]
+        problems = [error for _, errors, _ in results for error in errors]
+        problems.extend(check_outputs(fake_arcpy.database_path(blast_clearance.working_gdb),
+                                      environment_paths(temp_dir)["cad_output_directory"], blasts))
+        if len({blast["blast_id"] for blast in blasts}) != len(blasts):
+            problems.append("Blast IDs were allocated twice")
+        scratch_left = feature_classes(blast_clearance.scratch_gdb) + [name for _, _, names in results
+                                                                       for name in names]
+    return {"processes": process_count, "blasts": len(blasts), "seconds": seconds, "scratch_left": scratch_left,
+            "problems": problems}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run blasts in parallel processes and check the outputs")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--blasts", type=int, default=5, help="blasts per process")
+    parser.add_argument("--blocks", type=int, default=20, help="blocks per blast")
+    parser.add_argument("--roads", type=int, default=5000)
+    parser.add_argument("--scratch", choices=["gdb", "memory"], default="gdb", help="scratch workspace mode")
+    arguments = parser.parse_args(argv)
+
+    result = stress_test(arguments.processes, arguments.blasts, arguments.blocks, arguments.roads, arguments.scratch)
+    print(f"{result['blasts']} blasts in {result['processes']} processes: {result['seconds']:.2f}s, "
+          f"{len(result['scratch_left'])} scratch features left, {len(result['problems'])} problems")
+    for problem in result["problems"][:20]:
+        print(f"  {problem}")
+    return 1 if len(result["problems"]) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
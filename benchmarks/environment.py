@@ -0,0 +1,112 @@
+# This module sets up the folders, configuration and geodatabases the blast clearance tools expect around a synthetic
+# mine (see synthetic.py), so that BlastClearance.py runs unchanged against fake_arcpy.py
+# create_environment() is called once, every process running the tools then calls load_environment() to install the
+# fake arcpy, map the BlockInventory connection and portal backup geodatabase to the mine database and apply the
+# configuration.
+import os
+
+from benchmarks import fake_arcpy
+from blast_config import read_config
+
+
+resource_files = ["BlastSeed.dgn", "NorthMaster.dgn", "SouthMaster.dgn", "LylyveldSouthMaster.dgn",
+                  "LylyveldNorthMaster.dgn"]
+
+
+# This function returns the folders of an environment
+def environment_paths(root_dir):
+    return {"workspace": os.path.join(root_dir, "Workspace"),
+            "execution_directory": os.path.join(root_dir, "BlastClearancePro"),
+            "portal_backup_directory": os.path.join(root_dir, "PortalBackups"),
+            "cad_output_directory": os.path.join(root_dir, "CAD"),
+            "block_inventory_sde": os.path.join(root_dir, "BlockInventory.sde"),
+            "worker_spool_directory": os.path.join(root_dir, "Spool")}
+
+
+# This function writes the configuration file of an environment, settings overrides the [settings] options
+# Return the path of the configuration file
+def write_config(root_dir, settings=None):
+    settings = {"upload_wait_seconds": "30", "use_resident_worker": "false", **(settings or {})}
+    config_file = os.path.join(root_dir, "BlastClearance.ini")
+    with open(config_file, "w") as file:
+        file.write("[paths]\n")
+        for option, path in environment_paths(root_dir).items():
+            file.write(f"{option} = {path}\n")
+        file.write("[settings]\n")
+        for option, value in settings.items():
+            file.write(f"{option} = {value}\n")
+    return config_file
+
+
+# This function creates the folders, resource files, scratch geodatabase, master feature classes, SishenBlasts table
+# and road index of an environment around the mine database
+# Return the path of the configuration file
+def create_environment(root_dir, mine_database_path, settings=None):
+    import BlastClearance as blast_clearance
+    from road_index import build_road_index
+
+    paths = environment_paths(root_dir)
+    for option in ("workspace", "portal_backup_directory", "cad_output_directory"):
+        os.makedirs(paths[option], exist_ok=True)
+    resources_dir = os.path.join(paths["execution_directory"], "Resources")
+    os.makedirs(os.path.join(resources_dir, "ReferenceFiles"), exist_ok=True)
+    for file_name in resource_files:
+        with open(os.path.join(resources_dir, file_name), "w") as file:
+            file.write(f"{file_name}\n")
+    with open(paths["block_inventory_sde"], "w") as file:
+        file.write(f"SQLite stand-in: {mine_database_path}\n")
+
+    config_file = write_config(root_dir, settings)
+    arcpy = load_environment(config_file, mine_database_path)
+    database_dir = os.path.dirname(blast_clearance.working_gdb)
+    arcpy.CreateFileGDB_management(database_dir, os.path.basename(blast_clearance.working_gdb))
+    arcpy.CreateFileGDB_management(paths["workspace"], "scratch.gdb")
+
+    create_blast_table(blast_clearance.working_gdb)
+
+    spatial_reference = blast_clearance.block_inventory_db_spatial_reference
+    blast_fields = [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Mine", "TEXT"]]
+    arcpy.CreateFeatureclass_management(blast_clearance.working_gdb, "SisBlastBlocks", "POLYGON",
+                                        spatial_reference=spatial_reference)
+    arcpy.AddFields_management(blast_clearance.master_blocks_fc,
+                               [["BlockId", "LONG"], ["StatusId", "LONG"], ["Tonnes", "DOUBLE"]] + blast_fields +
+                               [["Level", "TEXT"], ["Number", "TEXT"]])
+    arcpy.CreateFeatureclass_management(blast_clearance.working_gdb, "SisBlastClearanceZones", "POLYGON",
+                                        spatial_reference=spatial_reference)
+    arcpy.AddFields_management(blast_clearance.master_clearance_fc,
+                               [["ORIG_FID", "LONG"]] + blast_fields + [["ClearanceType", "TEXT"], ["Level", "TEXT"]])
+    # The road master starts without ClearanceType and SourceObjectId, the tool adds them like it does for an
+    # existing geodatabase
+    arcpy.CreateFeatureclass_management(blast_clearance.working_gdb, "SisBlastRoads", "POLYLINE",
+                                        template=blast_clearance.all_roads_fc, spatial_reference=spatial_reference)
+    arcpy.AddFields_management(blast_clearance.master_roads_fc, blast_fields)
+
+    build_road_index(blast_clearance.all_roads_fc, blast_clearance.road_index_file)
+    return config_file
+
+
+# This function creates the SishenBlasts table in a geodatabase, the trigger plays the part of the attribute rule
+# setting BlastClearId to the ObjectID
+# Return the path of the table
+def create_blast_table(gdb_path):
+    blast_table = os.path.join(gdb_path, "SishenBlasts")
+    fake_arcpy.CreateTable_management(gdb_path, "SishenBlasts")
+    fake_arcpy.AddFields_management(blast_table, [["BlastClearId", "TEXT"], ["Mine", "TEXT"], ["DateTime", "DATE"],
+                                                  ["created_user", "TEXT"]])
+    with fake_arcpy._connect(gdb_path) as connection:
+        connection.execute("CREATE TRIGGER SishenBlasts_BlastClearId AFTER INSERT ON SishenBlasts BEGIN "
+                           "UPDATE SishenBlasts SET BlastClearId = NEW.OBJECTID WHERE OBJECTID = NEW.OBJECTID; END")
+    return blast_table
+
+
+# This function installs the fake arcpy in this process and applies the configuration of an environment
+# Return the fake arcpy module
+def load_environment(config_file, mine_database_path):
+    import BlastClearance as blast_clearance
+
+    arcpy = fake_arcpy.install()
+    fake_arcpy.reset()
+    blast_clearance.apply_config(read_config(config_file))
+    fake_arcpy.register_workspace(blast_clearance.block_inventory_sde, mine_database_path)
+    fake_arcpy.register_workspace(blast_clearance.portal_backup_geodatabase, mine_database_path)
+    return arcpy
@@ -0,0 +1,975 @@
+# This module is a stand-in for the arcpy functions used by the blast clearance tools, so that the tools run unchanged
+# in benchmarks and stress tests without ArcGIS Pro
+# Every workspace is a SQLite database: a file geodatabase folder holds fake.sqlite, other workspaces (e.g. the
+# BlockInventory SDE connection) are mapped to a database with register_workspace() and the memory workspace is one
+# in-process database. A feature class is a table with an OBJECTID primary key and a Shape column holding WKB,
+# geometry operations are done with shapely. Only the parameters the tools pass are supported, spatial references
+# are recorded but never projected.
+# install() puts this module in sys.modules as arcpy, every process (and every test) using it calls install().
+import fnmatch
+import getpass
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import types
+from contextlib import contextmanager
+from datetime import datetime
+
+import shapely
+
+
+# User recorded by editor tracking in the created_user field of new rows
+editor_user = getpass.getuser()
+# Messages of AddMessage, AddWarning and AddError as [severity, message] lists
+messages = []
+shape_field = "Shape"
+oid_field = "OBJECTID"
+metadata_table = "_fake_feature_classes"
+date_format = "%Y-%m-%d %H:%M:%S"
+
+workspace_databases = {}
+_layers = {}
+_memory = {"connection": None, "lock": threading.RLock()}
+
+# Field types by declared column type, the column types written by the tools are the AddField types
+_field_types = {"INTEGER": "Integer", "LONG": "Integer", "SHORT": "SmallInteger", "TEXT": "String",
+                "REAL": "Double", "DOUBLE": "Double", "FLOAT": "Single", "DATE": "Date", "BLOB": "Blob",
+                "GUID": "Guid"}
+_shape_types = {"POLYGON": "Polygon", "POLYLINE": "Polyline", "POINT": "Point", "MULTIPOINT": "Multipoint"}
+
+
+class ExecuteError(Exception):
+    pass
+
+
+# This function makes "import arcpy" return this module
+# Return the module
+def install():
+    module = sys.modules[__name__]
+    sys.modules["arcpy"] = module
+    return module
+
+
+# This function drops the memory workspace, the layers and the messages, e.g. in a forked process
+def reset():
+    _memory["connection"] = None
+    _memory["lock"] = threading.RLock()
+    _layers.clear()
+    messages.clear()
+    env.workspace = None
+    env.overwriteOutput = False
+    env.outputCoordinateSystem = None
+
+
+# This function maps a workspace path (e.g. an SDE connection file) to a SQLite database
+def register_workspace(workspace_path, database_path):
+    workspace_databases[_workspace_key(workspace_path)] = database_path
+
+
+def _workspace_key(workspace_path):
+    return os.path.normcase(os.path.abspath(str(workspace_path)))
+
+
+# This function returns the SQLite database of a workspace
+# Return None for the memory workspace, raise ExecuteError when the path is not a workspace
+def database_path(workspace_path):
+    if workspace_path is None:
+        return None
+    registered = workspace_databases.get(_workspace_key(workspace_path))
+    if registered is not None:
+        return registered
+    if str(workspace_path).lower().endswith(".gdb") and os.path.isdir(workspace_path):
+        return os.path.join(workspace_path, "fake.sqlite")
+    raise ExecuteError(f"ERROR 000732: Workspace {workspace_path} does not exist or is not supported")
+
+
+# Connection class of a workspace, statements on the shared memory database hold its lock
+class _Connection:
+    def __init__(self, workspace):
+        self.memory = workspace is None
+        if self.memory:
+            if _memory["connection"] is None:
+                _memory["connection"] = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            self.connection = _memory["connection"]
+        else:
+            self.connection = sqlite3.connect(database_path(workspace), timeout=60, isolation_level=None)
+
+    def close(self):
+        if not self.memory:
+            self.connection.close()
+
+    @contextmanager
+    def _locked(self):
+        if self.memory:
+            with _memory["lock"]:
+                yield
+        else:
+            yield
+
+    # This function runs a statement
+    # Return the rows, the ObjectId of an inserted row and the number of rows changed
+    def execute(self, query, parameters=()):
+        with self._locked():
+            cursor = self.connection.execute(query, list(parameters))
+            return cursor.fetchall(), cursor.lastrowid, cursor.rowcount
+
+    # This function runs a query
+    # Return the rows and the column names
+    def query(self, query):
+        with self._locked():
+            cursor = self.connection.execute(query)
+            return cursor.fetchall(), [description[0] for description in cursor.description]
+
+    # This function runs a statement for every list of parameters in one transaction
+    def execute_many(self, query, parameter_rows):
+        with self._locked():
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(query, parameter_rows)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    # This function returns the [name, declared type, primary key] of every column of a table, empty when the table
+    # does not exist
+    def columns(self, table):
+        return [[row[1], (row[2] or "").upper(), row[5] == 1]
+                for row in self.execute(f"PRAGMA table_info({_quote(table)})")[0]]
+
+    def metadata(self, table):
+        if len(self.columns(metadata_table)) == 0:
+            return None
+        rows = self.execute(f"SELECT shape_type, spatial_reference FROM {metadata_table} WHERE name = ?", [table])[0]
+        return rows[0] if len(rows) > 0 else None
+
+    def set_metadata(self, table, shape_type, spatial_reference):
+        self.execute(f"CREATE TABLE IF NOT EXISTS {metadata_table} (name TEXT PRIMARY KEY COLLATE NOCASE, "
+                     "shape_type TEXT, spatial_reference TEXT)")
+        self.execute(f"INSERT OR REPLACE INTO {metadata_table} VALUES (?, ?, ?)",
+                     [table, shape_type, spatial_reference])
+
+    def drop(self, table):
+        self.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        if len(self.columns(metadata_table)) > 0:
+            self.execute(f"DELETE FROM {metadata_table} WHERE name = ?", [table])
+
+
+@contextmanager
+def _connect(workspace):
+    connection = _Connection(workspace)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# This function splits a dataset path into its workspace (None for the memory workspace) and table name
+# The table name is the last part of a qualified SDE name (BlockInventory.dbo.BlockStatus -> BlockStatus)
+def _split_path(path):
+    path = str(path)
+    if re.match(r"^memory[\\/]", path, re.IGNORECASE):
+        return None, re.split(r"[\\/]", path, 1)[1]
+    workspace, name = os.path.split(path)
+    if workspace == "" and env.workspace is not None:
+        workspace = env.workspace
+    return workspace, name.split(".")[-1]
+
+
+# This function joins the output location and name of a tool, an out_path of "" keeps the name (memory\NAME)
+def _join(out_path, out_name):
+    return os.path.join(out_path, out_name) if out_path else out_name
+
+
+# Layer class: a view of a table with an optional where clause (also used for plain dataset paths)
+class Layer:
+    def __init__(self, name, workspace, table, where=None, spatial_reference=None):
+        self.name = name
+        self.workspace = workspace
+        self.table = table
+        self.where = where
+        self.spatial_reference = spatial_reference
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<Layer {self.name}>"
+
+
+# Result class returned by the geoprocessing tools
+class Result:
+    def __init__(self, *outputs):
+        self._outputs = list(outputs)
+
+    def __getitem__(self, index):
+        return self._outputs[index]
+
+    def getOutput(self, index):
+        return self._outputs[index]
+
+    def __str__(self):
+        return str(self._outputs[0])
+
+
+# This function returns the layer of a tool input: a Result, a Layer, a layer name or a dataset path
+def _dataset(value):
+    if isinstance(value, Result):
+        value = value[0]
+    if isinstance(value, Layer):
+        return value
+    if str(value) in _layers:
+        return _layers[str(value)]
+    workspace, table = _split_path(value)
+    return Layer(str(value), workspace, table)
+
+
+def _combine_where(*clauses):
+    clauses = [_translate_where(clause) for clause in clauses if clause]
+    if len(clauses) == 0:
+        return None
+    return " AND ".join(f"({clause})" for clause in clauses)
+
+
+# This function translates the file geodatabase date literals of a where clause to the ISO text stored by SQLite
+def _translate_where(where_clause):
+    return re.sub(r"\b(?:date|timestamp)\s+'", "'", str(where_clause), flags=re.IGNORECASE)
+
+
+# Field class as returned by ListFields
+class Field:
+    def __init__(self, name, field_type, editable=True):
+        self.name = name
+        self.baseName = name
+        self.aliasName = name
+        self.type = field_type
+        self.editable = editable
+        self.length = 255 if field_type == "String" else 0
+
+    def __repr__(self):
+        return f"<Field {self.name} {self.type}>"
+
+
+# Index class as returned by ListIndexes
+class Index:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+
+def _field(column):
+    name, declared_type, primary_key = column
+    if primary_key:
+        return Field(name, "OID", False)
+    if name.lower() == shape_field.lower():
+        return Field(name, "Geometry")
+    return Field(name, _field_types.get(declared_type, "String"))
+
+
+def _fields(connection, layer):
+    columns = connection.columns(layer.table)
+    if len(columns) == 0:
+        raise ExecuteError(f"ERROR 000732: Dataset {layer.name} does not exist or is not supported")
+    return [_field(column) for column in columns]
+
+
+# Extent class of a geometry
+class Extent:
+    def __init__(self, x_min, y_min, x_max, y_max):
+        self.XMin = x_min
+        self.YMin = y_min
+        self.XMax = x_max
+        self.YMax = y_max
+
+
+# Geometry class returned by the SHAPE@ token
+class Geometry:
+    def __init__(self, shape_wkb):
+        self.WKB = bytes(shape_wkb)
+        self.shape = shapely.from_wkb(self.WKB)
+
+    @property
+    def extent(self):
+        return Extent(*self.shape.bounds)
+
+    @property
+    def area(self):
+        return self.shape.area
+
+    @property
+    def length(self):
+        return self.shape.length
+
+    @property
+    def WKT(self):
+        return self.shape.wkt
+
+    @property
+    def partCount(self):
+        return len(getattr(self.shape, "geoms", [self.shape]))
+
+
+# This function converts an Esri JSON geometry to a Geometry
+def AsShape(geojson_struct, esri_json=False):
+    if not esri_json:
+        return Geometry(shapely.geometry.shape(geojson_struct).wkb)
+    if "paths" in geojson_struct:
+        return Geometry(shapely.MultiLineString(geojson_struct["paths"]).wkb)
+    if "rings" in geojson_struct:
+        return Geometry(shapely.Polygon(geojson_struct["rings"][0], geojson_struct["rings"][1:]).wkb)
+    return Geometry(shapely.Point(geojson_struct["x"], geojson_struct["y"]).wkb)
+
+
+# Spatial reference class, the text is kept as it is given
+class SpatialReference:
+    def __init__(self, item=None):
+        self.text = ""
+        if isinstance(item, SpatialReference):
+            self.text = item.text
+        elif item is not None:
+            self.text = str(item)
+
+    def loadFromString(self, string):
+        self.text = str(string)
+
+    def exportToString(self):
+        return self.text
+
+    @property
+    def name(self):
+        match = re.match(r"^\w+\[['\"]([^'\"]+)", self.text)
+        return match.group(1) if match else "Unknown"
+
+
+def _spatial_reference_text(spatial_reference):
+    if spatial_reference is None:
+        return ""
+    if isinstance(spatial_reference, SpatialReference):
+        return spatial_reference.text
+    return str(spatial_reference)
+
+
+# Settings class of arcpy.env
+class _Environment:
+    def __init__(self):
+        self.workspace = None
+        self.overwriteOutput = False
+        self.outputCoordinateSystem = None
+
+
+env = _Environment()
+
+
+# Context manager setting environment settings and restoring them on exit
+class EnvManager:
+    def __init__(self, **settings):
+        self.settings = settings
+        self.previous = {}
+
+    def __enter__(self):
+        for name, value in self.settings.items():
+            self.previous[name] = getattr(env, name, None)
+            setattr(env, name, value)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for name, value in self.previous.items():
+            setattr(env, name, value)
+        return False
+
+
+def AddMessage(message):
+    messages.append(["message", str(message)])
+
+
+def AddWarning(message):
+    messages.append(["warning", str(message)])
+
+
+def AddError(message):
+    messages.append(["error", str(message)])
+
+
+# This function maps the field names and tokens of a cursor to columns
+# Return the list of [column, token] pairs and the list of fields by lower case column name
+def _cursor_columns(connection, layer, field_names):
+    fields = _fields(connection, layer)
+    by_name = {field.name.lower(): field for field in fields}
+    shape_columns = [field.name for field in fields if field.type == "Geometry"]
+    oid_columns = [field.name for field in fields if field.type == "OID"]
+    if isinstance(field_names, str):
+        field_names = [field.name for field in fields] if field_names == "*" else [field_names]
+    columns = []
+    for field_name in field_names:
+        token = field_name.upper()
+        if token in ("SHAPE@WKB", "SHAPE@"):
+            if len(shape_columns) == 0:
+                raise ExecuteError(f"{layer.name} has no shape field")
+            columns.append([shape_columns[0], token])
+        elif token == "OID@":
+            columns.append([oid_columns[0], token])
+        elif field_name.lower() in by_name:
+            columns.append([by_name[field_name.lower()].name, None])
+        else:
+            raise RuntimeError(f"Cannot find field '{field_name}'")
+    return columns, by_name
+
+
+def _read_value(value, column, token, by_name):
+    if value is None:
+        return None
+    if token == "SHAPE@":
+        return Geometry(value)
+    if token == "SHAPE@WKB":
+        return bytes(value)
+    if by_name[column.lower()].type == "Date" and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _write_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(date_format)
+    if isinstance(value, Geometry):
+        return value.WKB
+    if isinstance(value, bytearray):
+        return bytes(value)
+    return value
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._close()
+        return False
+
+    def __del__(self):
+        self._close()
+
+    def _close(self):
+        connection = getattr(self, "_connection", None)
+        if connection is not None:
+            connection.close()
+            self._connection = None
+
+
+# Search cursor reading the rows of a table or layer
+class SearchCursor(_Cursor):
+    def __init__(self, in_table, field_names, where_clause=None, spatial_reference=None, explode_to_points=False,
+                 sql_clause=(None, None)):
+        layer = _dataset(in_table)
+        with _connect(layer.workspace) as connection:
+            columns, by_name = _cursor_columns(connection, layer, field_names)
+            self.fields = tuple(field_names) if not isinstance(field_names, str) else tuple(c[0] for c in columns)
+            where = _combine_where(layer.where, where_clause)
+            query = (f"SELECT {', '.join(_quote(column) for column, _ in columns)} FROM {_quote(layer.table)}"
+                     f"{f' WHERE {where}' if where else ''}")
+            if sql_clause is not None and sql_clause[1]:
+                query += f" {sql_clause[1]}"
+            rows = connection.execute(query)[0]
+        self._rows = [tuple(_read_value(value, column, token, by_name) for value, (column, token) in zip(row, columns))
+                      for row in rows]
+        self._position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position >= len(self._rows):
+            raise StopIteration
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def next(self):
+        return self.__next__()
+
+    def reset(self):
+        self._position = 0
+
+
+# Insert cursor adding rows to a table, insertRow returns the ObjectId of the new row
+# Tables with a created_user field get the editor_user in it, as with editor tracking
+class InsertCursor(_Cursor):
+    def __init__(self, in_table, field_names):
+        layer = _dataset(in_table)
+        self._connection = _Connection(layer.workspace)
+        columns, by_name = _cursor_columns(self._connection, layer, field_names)
+        column_names = [column for column, _ in columns]
+        self._editor_tracking = "created_user" in by_name and "created_user" not in [name.lower()
+                                                                                     for name in column_names]
+        if self._editor_tracking:
+            column_names.append(by_name["created_user"].name)
+        self._query = (f"INSERT INTO {_quote(layer.table)} ({', '.join(_quote(name) for name in column_names)}) "
+                       f"VALUES ({', '.join('?' * len(column_names))})")
+        self._field_count = len(columns)
+        self.fields = tuple(field_names)
+
+    def insertRow(self, row):
+        if len(row) != self._field_count:
+            raise RuntimeError(f"The row has {len(row)} values for {self._field_count} fields")
+        values = [_write_value(value) for value in row] + ([editor_user] if self._editor_tracking else [])
+        return self._connection.execute(self._query, values)[1]
+
+
+# Update cursor changing or deleting the rows of a table or layer
+class UpdateCursor(_Cursor):
+    def __init__(self, in_table, field_names, where_clause=None, spatial_reference=None, explode_to_points=False,
+                 sql_clause=(None, None)):
+        layer = _dataset(in_table)
+        self._connection = _Connection(layer.workspace)
+        self._table = layer.table
+        self._columns, by_name = _cursor_columns(self._connection, layer, field_names)
+        self.fields = tuple(field_names)
+        where = _combine_where(layer.where, where_clause)
+        query = (f"SELECT rowid, {', '.join(_quote(column) for column, _ in self._columns)} "
+                 f"FROM {_quote(layer.table)}{f' WHERE {where}' if where else ''}")
+        if sql_clause is not None and sql_clause[1]:
+            query += f" {sql_clause[1]}"
+        self._rows = self._connection.execute(query)[0]
+        self._by_name = by_name
+        self._position = 0
+        self._rowid = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position >= len(self._rows):
+            raise StopIteration
+        row = self._rows[self._position]
+        self._position += 1
+        self._rowid = row[0]
+        return [_read_value(value, column, token, self._by_name)
+                for value, (column, token) in zip(row[1:], self._columns)]
+
+    def next(self):
+        return self.__next__()
+
+    def updateRow(self, row):
+        if self._rowid is None:
+            raise RuntimeError("updateRow called before the cursor was advanced")
+        assignments = ", ".join(f"{_quote(column)} = ?" for column, _ in self._columns)
+        self._connection.execute(f"UPDATE {_quote(self._table)} SET {assignments} WHERE rowid = ?",
+                                 [_write_value(value) for value in row] + [self._rowid])
+
+    def deleteRow(self):
+        if self._rowid is None:
+            raise RuntimeError("deleteRow called before the cursor was advanced")
+        self._connection.execute(f"DELETE FROM {_quote(self._table)} WHERE rowid = ?", [self._rowid])
+
+
+da = types.SimpleNamespace(SearchCursor=SearchCursor, InsertCursor=InsertCursor, UpdateCursor=UpdateCursor)
+
+
+# This function returns the fields of a table or layer
+def ListFields(dataset, wild_card=None, field_type=None):
+    layer = _dataset(dataset)
+    with _connect(layer.workspace) as connection:
+        fields = _fields(connection, layer)
+    if wild_card:
+        fields = [field for field in fields if fnmatch.fnmatch(field.name.lower(), wild_card.lower())]
+    if field_type:
+        fields = [field for field in fields if field.type.lower() == field_type.lower()]
+    return fields
+
+
+# This function returns the attribute indexes of a table (the SQLite index names are prefixed with the table name)
+def ListIndexes(dataset, wild_card=None):
+    layer = _dataset(dataset)
+    indexes = []
+    with _connect(layer.workspace) as connection:
+        by_name = {field.name.lower(): field for field in _fields(connection, layer)}
+        for row in connection.execute(f"PRAGMA index_list({_quote(layer.table)})")[0]:
+            if row[1].startswith("sqlite_autoindex"):
+                continue
+            columns = [info[2] for info in connection.execute(f"PRAGMA index_info({_quote(row[1])})")[0]]
+            name = row[1][len(layer.table) + 1:] if row[1].startswith(f"{layer.table}_") else row[1]
+            indexes.append(Index(name, [by_name[column.lower()] for column in columns]))
+    if wild_card:
+        indexes = [index for index in indexes if fnmatch.fnmatch(index.name.lower(), wild_card.lower())]
+    return indexes
+
+
+# This function returns the feature classes of the current workspace
+def ListFeatureClasses(wild_card=None, feature_type=None, feature_dataset=None):
+    if env.workspace is None:
+        return []
+    try:
+        database = database_path(env.workspace)
+    except ExecuteError:
+        return []
+    if not os.path.exists(database):
+        return []
+    with _connect(env.workspace) as connection:
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")[0]]
+        names = [table for table in tables
+                 if any(column[0].lower() == shape_field.lower() for column in connection.columns(table))]
+    if wild_card:
+        names = [name for name in names if fnmatch.fnmatch(name.lower(), wild_card.lower())]
+    return sorted(names)
+
+
+# Describe class with the properties of a dataset read by the tools
+class _Description:
+    def __init__(self, layer):
+        with _connect(layer.workspace) as connection:
+            fields = _fields(connection, layer)
+            metadata = connection.metadata(layer.table)
+        self.name = layer.table
+        self.catalogPath = layer.name
+        self.fields = fields
+        self.OIDFieldName = next((field.name for field in fields if field.type == "OID"), None)
+        self.shapeType = metadata[0] if metadata is not None else None
+        self.dataType = "FeatureClass" if any(field.type == "Geometry" for field in fields) else "Table"
+        self.spatialReference = SpatialReference(layer.spatial_reference if layer.spatial_reference is not None
+                                                 else (metadata[1] if metadata is not None else ""))
+
+
+def Describe(value):
+    return _Description(_dataset(value))
+
+
+def _table_exists(layer):
+    try:
+        with _connect(layer.workspace) as connection:
+            return len(connection.columns(layer.table)) > 0
+    except (ExecuteError, sqlite3.Error):
+        return False
+
+
+def Exists(dataset):
+    if isinstance(dataset, (Result, Layer)) or str(dataset) in _layers:
+        return _table_exists(_dataset(dataset))
+    workspace, _ = _split_path(dataset)
+    if workspace is not None and os.path.exists(str(dataset)):
+        return True
+    return _table_exists(_dataset(dataset))
+
+
+# This function deletes a layer, a table or a folder (file geodatabase)
+def Delete_management(in_data, data_type=None):
+    if isinstance(in_data, Result):
+        in_data = in_data[0]
+    name = str(in_data)
+    layer = _layers.pop(name, None)
+    if layer is not None:
+        if layer.table.startswith("_layer_"):
+            with _connect(layer.workspace) as connection:
+                connection.drop(layer.table)
+        return Result(True)
+    if _split_path(name)[0] is not None and os.path.isdir(name):
+        shutil.rmtree(name)
+        return Result(True)
+    layer = _dataset(name)
+    with _connect(layer.workspace) as connection:
+        connection.drop(layer.table)
+    return Result(True)
+
+
+def CreateFileGDB_management(out_folder_path, out_name, out_version=None):
+    gdb_path = os.path.join(out_folder_path, out_name if out_name.lower().endswith(".gdb") else f"{out_name}.gdb")
+    os.makedirs(gdb_path, exist_ok=True)
+    return Result(gdb_path)
+
+
+# This function creates an empty table for a new dataset, an existing one is replaced when overwriteOutput is set
+def _create_table(connection, output, table, attribute_columns, shape_type, spatial_reference):
+    if len(connection.columns(table)) > 0:
+        if not env.overwriteOutput:
+            raise ExecuteError(f"ERROR 000258: Output {output} already exists")
+        connection.drop(table)
+    definitions = [f"{_quote(oid_field)} INTEGER PRIMARY KEY"]
+    definitions.extend(f"{_quote(name)} {declared_type}" for name, declared_type in attribute_columns)
+    if shape_type is not None:
+        definitions.append(f"{_quote(shape_field)} BLOB")
+    connection.execute(f"CREATE TABLE {_quote(table)} ({', '.join(definitions)})")
+    connection.set_metadata(table, shape_type, _spatial_reference_text(spatial_reference))
+
+
+# This function returns the [name, declared type] of the attribute columns of a dataset (no ObjectId and shape)
+def _attribute_columns(layer):
+    with _connect(layer.workspace) as connection:
+        columns = connection.columns(layer.table)
+    return [[name, declared_type or "TEXT"] for name, declared_type, primary_key in columns
+            if not primary_key and name.lower() != shape_field.lower()]
+
+
+def CreateFeatureclass_management(out_path, out_name, geometry_type="POLYGON", template=None, has_m=None,
+                                  has_z=None, spatial_reference=None, *args, **kwargs):
+    output = _join(out_path, out_name)
+    layer = _dataset(output)
+    attribute_columns = []
+    templates = template if isinstance(template, (list, tuple)) else [template] if template is not None else []
+    for template_dataset in templates:
+        for column in _attribute_columns(_dataset(template_dataset)):
+            if column[0].lower() not in [name.lower() for name, _ in attribute_columns]:
+                attribute_columns.append(column)
+    if spatial_reference is None and len(templates) > 0:
+        spatial_reference = Describe(templates[0]).spatialReference
+    with _connect(layer.workspace) as connection:
+        _create_table(connection, output, layer.table, attribute_columns,
+                      _shape_types.get(str(geometry_type).upper(), str(geometry_type)), spatial_reference)
+    return Result(output)
+
+
+def CreateTable_management(out_path, out_name, template=None, *args, **kwargs):
+    output = _join(out_path, out_name)
+    layer = _dataset(output)
+    attribute_columns = _attribute_columns(_dataset(template)) if template is not None else []
+    with _connect(layer.workspace) as connection:
+        _create_table(connection, output, layer.table, attribute_columns, None, None)
+    return Result(output)
+
+
+def AddField_management(in_table, field_name, field_type, *args, **kwargs):
+    return AddFields_management(in_table, [[field_name, field_type]])
+
+
+def AddFields_management(in_table, field_description, template=None):
+    layer = _dataset(in_table)
+    with _connect(layer.workspace) as connection:
+        existing = [column[0].lower() for column in connection.columns(layer.table)]
+        for spec in field_description:
+            if spec[0].lower() in existing:
+                AddWarning(f"WARNING 000012: {spec[0]} already exists")
+                continue
+            connection.execute(f"ALTER TABLE {_quote(layer.table)} ADD COLUMN {_quote(spec[0])} {spec[1].upper()}")
+            existing.append(spec[0].lower())
+    return Result(str(in_table))
+
+
+def AddIndex_management(in_table, fields, index_name=None, unique=None, ascending=None):
+    layer = _dataset(in_table)
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    index_name = index_name or f"{'_'.join(fields)}_idx"
+    with _connect(layer.workspace) as connection:
+        connection.execute(f"CREATE {'UNIQUE ' if unique == 'UNIQUE' else ''}INDEX "
+                           f"{_quote(f'{layer.table}_{index_name}')} ON {_quote(layer.table)} "
+                           f"({', '.join(_quote(field) for field in fields)})")
+    return Result(str(in_table))
+
+
+def GetCount_management(in_rows):
+    layer = _dataset(in_rows)
+    where = _combine_where(layer.where)
+    with _connect(layer.workspace) as connection:
+        rows = connection.execute(f"SELECT COUNT(*) FROM {_quote(layer.table)}{f' WHERE {where}' if where else ''}")[0]
+    return Result(str(rows[0][0]))
+
+
+def DeleteRows_management(in_rows):
+    layer = _dataset(in_rows)
+    where = _combine_where(layer.where)
+    with _connect(layer.workspace) as connection:
+        connection.execute(f"DELETE FROM {_quote(layer.table)}{f' WHERE {where}' if where else ''}")
+    return Result(str(in_rows))
+
+
+def TruncateTable_management(in_table):
+    layer = _dataset(in_table)
+    with _connect(layer.workspace) as connection:
+        connection.execute(f"DELETE FROM {_quote(layer.table)}")
+    return Result(str(in_table))
+
+
+def MakeFeatureLayer_management(in_features, out_layer, where_clause=None, *args, **kwargs):
+    source = _dataset(in_features)
+    layer = Layer(out_layer, source.workspace, source.table, _combine_where(source.where, where_clause),
+                  source.spatial_reference)
+    _layers[out_layer] = layer
+    return Result(layer)
+
+
+# This function runs the query of a query layer on the database and keeps the rows in the memory workspace
+# The column types are the types of the queried table
+def MakeQueryLayer_management(input_database, out_layer_name, query, oid_fields=None, shape_type=None, srid=None,
+                              spatial_reference=None):
+    with _connect(input_database) as connection:
+        table_match = re.search(r"\bfrom\s+([\w.]+)", query, re.IGNORECASE)
+        source_types = {}
+        if table_match is not None:
+            source_types = {name.lower(): declared_type
+                            for name, declared_type, _ in connection.columns(table_match.group(1).split(".")[-1])}
+        rows, column_names = connection.query(query)
+
+    table = f"_layer_{out_layer_name}"
+    oid_column = oid_fields.split(",")[0].strip() if oid_fields else None
+    with _connect(None) as connection:
+        connection.drop(table)
+        definitions = [f"{_quote(name)} INTEGER PRIMARY KEY" if oid_column and name.lower() == oid_column.lower()
+                       else f"{_quote(name)} {source_types.get(name.lower(), '')}".strip()
+                       for name in column_names]
+        connection.execute(f"CREATE TABLE {_quote(table)} ({', '.join(definitions)})")
+        connection.set_metadata(table, _shape_types.get(str(shape_type).upper()),
+                                _spatial_reference_text(spatial_reference))
+        if len(rows) > 0:
+            connection.execute_many(f"INSERT INTO {_quote(table)} VALUES ({', '.join('?' * len(column_names))})",
+                                    rows)
+    layer = Layer(out_layer_name, None, table, spatial_reference=_spatial_reference_text(spatial_reference))
+    _layers[out_layer_name] = layer
+    return Result(layer)
+
+
+# This function returns the attribute columns and the [ObjectId, attribute values, shape] rows of a dataset
+def _read_features(layer):
+    with _connect(layer.workspace) as connection:
+        fields = _fields(connection, layer)
+        columns = connection.columns(layer.table)
+        where = _combine_where(layer.where)
+        oid_column = next((field.name for field in fields if field.type == "OID"), "rowid")
+        attribute_names = [field.name for field in fields if field.type not in ("OID", "Geometry")]
+        selected = [oid_column] + attribute_names + [shape_field]
+        rows = connection.execute(f"SELECT {', '.join(_quote(name) for name in selected)} FROM "
+                                  f"{_quote(layer.table)}{f' WHERE {where}' if where else ''}")[0]
+    declared_types = {column[0]: column[1] or "TEXT" for column in columns}
+    return [[name, declared_types[name]] for name in attribute_names], rows
+
+
+# This function creates an output feature class and inserts [attribute values..., shape] rows in one transaction
+def _write_features(output, attribute_columns, rows, shape_type, spatial_reference):
+    layer = _dataset(output)
+    with _connect(layer.workspace) as connection:
+        _create_table(connection, output, layer.table, attribute_columns, shape_type, spatial_reference)
+        if len(rows) > 0:
+            names = [name for name, _ in attribute_columns] + [shape_field]
+            connection.execute_many(f"INSERT INTO {_quote(layer.table)} ({', '.join(_quote(n) for n in names)}) "
+                                    f"VALUES ({', '.join('?' * len(names))})", rows)
+    return Result(output)
+
+
+def CopyFeatures_management(in_features, out_feature_class, *args, **kwargs):
+    source = _dataset(in_features)
+    description = _Description(source)
+    attribute_columns, rows = _read_features(source)
+    return _write_features(out_feature_class, attribute_columns, [row[1:] for row in rows], description.shapeType,
+                           description.spatialReference)
+
+
+def _linear_distance(distance):
+    value, _, unit = str(distance).partition(" ")
+    return float(value) * {"": 1.0, "meters": 1.0, "kilometers": 1000.0}[unit.strip().lower()]
+
+
+# This function buffers features, with the dissolve option ALL the buffers are one feature without attributes
+def Buffer_analysis(in_features, out_feature_class, buffer_distance_or_field, line_side="FULL",
+                    line_end_type="ROUND", dissolve_option="NONE", dissolve_field=None, method="PLANAR"):
+    source = _dataset(in_features)
+    description = _Description(source)
+    attribute_columns, rows = _read_features(source)
+    distance = _linear_distance(buffer_distance_or_field)
+    buffers = shapely.buffer(shapely.from_wkb([row[-1] for row in rows]), distance, quad_segs=32)
+    if str(dissolve_option).upper() == "ALL":
+        union = shapely.union_all(buffers)
+        output_rows = [] if union.is_empty else [[union.wkb]]
+        return _write_features(out_feature_class, [], output_rows, "Polygon", description.spatialReference)
+    output_rows = [list(row[1:-1]) + [distance, row[0], buffer.wkb] for row, buffer in zip(rows, buffers)]
+    return _write_features(out_feature_class, attribute_columns + [["BUFF_DIST", "DOUBLE"], ["ORIG_FID", "LONG"]],
+                           output_rows, "Polygon", description.spatialReference)
+
+
+def MultipartToSinglepart_management(in_features, out_feature_class):
+    source = _dataset(in_features)
+    description = _Description(source)
+    attribute_columns, rows = _read_features(source)
+    output_rows = []
+    for row in rows:
+        shape = shapely.from_wkb(row[-1])
+        for part in getattr(shape, "geoms", [shape]):
+            output_rows.append(list(row[1:-1]) + [row[0], part.wkb])
+    return _write_features(out_feature_class, attribute_columns + [["ORIG_FID", "LONG"]], output_rows,
+                           description.shapeType, description.spatialReference)
+
+
+# This function selects the features of a layer by their location, only WITHIN_A_DISTANCE and INTERSECT are supported
+# Return the layer holding the selection
+def SelectLayerByLocation_management(in_layer, overlap_type="INTERSECT", select_features=None, search_distance=None,
+                                     selection_type="NEW_SELECTION", invert_spatial_relationship="NOT_INVERT"):
+    source = _dataset(in_layer)
+    _, select_rows = _read_features(_dataset(select_features))
+    _, rows = _read_features(source)
+    distance = _linear_distance(search_distance) if overlap_type.upper() == "WITHIN_A_DISTANCE" else 0.0
+    selected = shapely.union_all(shapely.from_wkb([row[-1] for row in select_rows]))
+    within = shapely.distance(shapely.from_wkb([row[-1] for row in rows]), selected) <= distance
+    object_ids = [row[0] for row, match in zip(rows, within) if match != (invert_spatial_relationship == "INVERT")]
+    with _connect(source.workspace) as connection:
+        oid_column = next(field.name for field in _fields(connection, source) if field.type == "OID")
+    selection = f"{_quote(oid_column)} IN ({', '.join(str(int(object_id)) for object_id in object_ids) or 'NULL'})"
+    layer = Layer(str(in_layer), source.workspace, source.table, _combine_where(source.where, selection),
+                  source.spatial_reference)
+    if str(in_layer) in _layers:
+        _layers[str(in_layer)] = layer
+    return Result(layer)
+
+
+# This function appends the rows of the inputs to the target, with the "TEST" schema type the attribute fields must
+# match like they must for arcpy
+def Append_management(inputs, target, schema_type="TEST", *args, **kwargs):
+    target_layer = _dataset(target)
+    with _connect(target_layer.workspace) as connection:
+        target_fields = [field for field in _fields(connection, target_layer)
+                         if field.type not in ("OID", "Geometry") and field.editable]
+    target_names = {field.name.lower(): field.name for field in target_fields}
+    inputs = inputs if isinstance(inputs, (list, tuple)) else [inputs]
+    for input_dataset in inputs:
+        source = _dataset(input_dataset)
+        attribute_columns, rows = _read_features(source)
+        if str(schema_type).upper() == "TEST":
+            with _connect(source.workspace) as connection:
+                source_schema = {(field.name.lower(), field.type) for field in _fields(connection, source)
+                                 if field.type not in ("OID", "Geometry")}
+            if source_schema != {(field.name.lower(), field.type) for field in target_fields}:
+                raise ExecuteError(f"ERROR 000466: {source.name} does not match the schema of target "
+                                   f"{target_layer.name}")
+        positions = [index for index, (name, _) in enumerate(attribute_columns) if name.lower() in target_names]
+        names = [target_names[attribute_columns[index][0].lower()] for index in positions] + [shape_field]
+        output_rows = [[row[1 + index] for index in positions] + [row[-1]] for row in rows]
+        if len(output_rows) > 0:
+            with _connect(target_layer.workspace) as connection:
+                connection.execute_many(f"INSERT INTO {_quote(target_layer.table)} "
+                                        f"({', '.join(_quote(name) for name in names)}) "
+                                        f"VALUES ({', '.join('?' * len(names))})", output_rows)
+    return Result(str(target))
+
+
+# This function writes a text file in place of the CAD file: one line per row with the BlastClearId, Level, Number
+# and the SHA-1 of the shape
+def ExportCAD_conversion(in_features, Output_Type, Output_File, Ignore_FileNames=None, Append_To_Existing=None,
+                         Seed_File=None):
+    in_features = in_features if isinstance(in_features, (list, tuple)) else [in_features]
+    lines = []
+    for feature in in_features:
+        layer = _dataset(feature)
+        with _connect(layer.workspace) as connection:
+            names = {field.name.lower() for field in _fields(connection, layer)}
+        fields = [field if field.lower() in names else None for field in ("BlastClearId", "Level", "Number")]
+        with SearchCursor(layer, [field for field in fields if field is not None] + ["SHAPE@WKB"]) as cursor:
+            for row in cursor:
+                values = iter(row[:-1])
+                lines.append(" ".join(str(next(values)) if field is not None else "None" for field in fields) +
+                             f" {hashlib.sha1(row[-1] or b'').hexdigest()}\n")
+    with open(Output_File, "w") as file:
+        file.writelines(lines)
+    return Result(Output_File)
+
+
+# Project class of the arcpy.mp module, there is no current project outside ArcGIS Pro
+class _ArcGISProject:
+    def __init__(self, aprx_path):
+        raise OSError(f"{aprx_path} is not available outside ArcGIS Pro")
+
+
+mp = types.SimpleNamespace(ArcGISProject=_ArcGISProject)
+management = types.SimpleNamespace(GetCount=GetCount_management, AddField=AddField_management,
+                                   AddFields=AddFields_management, Delete=Delete_management,
+                                   CreateFeatureclass=CreateFeatureclass_management,
+                                   TruncateTable=TruncateTable_management)
@@ -0,0 +1,176 @@
+# This module times every stage of the BlastClearance.py pipeline on a synthetic mine and flags regressions
+# run_blast of the tool runs unchanged against fake_arcpy.py (SQLite and shapely in place of arcpy), the seconds per
+# stage are the totals of the run trace. The baseline holds the timings of the default grid.
+# Usage (from the repository folder):
+#     python -m benchmarks.harness                      time the full grid and compare with the baseline
+#     python -m benchmarks.harness --quick              small grid for a quick check
+#     python -m benchmarks.harness --save-baseline      store the timings as the new baseline
+#     python -m benchmarks.harness --replay fixtures    time a blast recorded with recording.record_live_fixtures
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import tracing
+from benchmarks.environment import create_environment
+from benchmarks.recording import create_replay_database, fixture_file_names, read_fixture
+from benchmarks.synthetic import blast_block_numbers, create_mine_database
+from block_snapshot import SqliteSnapshotSource, export_snapshot
+
+
+stage_names = ["blocks_check", "elevation_lookup", "blast_id", "block_geometry_cache", "buffering", "road_selection",
+               "conflict_check", "attribute_calc", "cad_export", "append", "delete", "archive"]
+default_block_counts = (1, 10, 100, 1000, 5000)
+default_road_counts = (1000, 10000, 100000, 500000)
+quick_block_counts = (1, 100)
+quick_road_counts = (1000, 10000)
+# Blocks of the synthetic mine, the same for every grid so that quick runs compare with the baseline of the full grid
+mine_block_count = 2 * max(default_block_counts)
+default_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# A stage regressed when it is slower than the baseline by more than the tolerance and by more than min_seconds
+default_tolerance = 0.5
+default_min_seconds = 0.005
+
+
+# This function times the tool for every combination of blast size and road network size
+# A mine of mine_block_count blocks (or more for a larger blast) is generated per road network size, settings
+# overrides the [settings] options of the configuration (e.g. clearance_zone_engine)
+# Return a list of dictionaries with the block count, road count and the seconds per stage (fastest of repeat runs)
+# With snapshot=True BlockInventory is read from a snapshot exported from the mine database
+def run_suite(block_counts=default_block_counts, road_counts=default_road_counts, repeat=3, settings=None,
+              snapshot=False, message=print):
+    results = []
+    total_block_count = max(mine_block_count, 2 * max(block_counts))
+    for road_count in road_counts:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            database_path = os.path.join(temp_dir, "mine.sqlite")
+            create_mine_database(database_path, total_block_count, road_count)
+            run_settings = dict(settings or {})
+            if snapshot:
+                run_settings["block_inventory_source"] = "snapshot"
+            create_environment(temp_dir, database_path, run_settings)
+            if snapshot:
+                import BlastClearance as blast_clearance
+
+                export_snapshot(SqliteSnapshotSource(database_path), blast_clearance.block_snapshot_dir)
+            for block_count in block_counts:
+                stages = time_tool(blast_block_numbers(block_count, total_block_count), repeat)
+                results.append({"blocks": block_count, "roads": road_count, "stages": stages})
+                message(f"{block_count:>6} blocks {road_count:>7} roads: {sum(stages.values()):.3f}s")
+    return results
+
+
+# This function times the tool for a blast recorded from the live database
+# The roads are synthetic, around the extent of the recorded blocks
+def run_replay(fixture_dir, road_counts=default_road_counts, repeat=3, settings=None, message=print):
+    block_numbers = read_fixture(fixture_file_names(fixture_dir)["blast"])["blocks"]
+    results = []
+    for road_count in road_counts:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            database_path = os.path.join(temp_dir, "mine.sqlite")
+            create_replay_database(fixture_dir, database_path, road_count)
+            create_environment(temp_dir, database_path, settings)
+            stages = time_tool(block_numbers, repeat)
+            results.append({"blocks": len(block_numbers), "roads": road_count, "stages": stages})
+            message(f"{len(block_numbers):>6} recorded blocks {road_count:>7} roads: {sum(stages.values()):.3f}s")
+    return results
+
+
+# This function runs the tool (run_blast of BlastClearance.py) repeat times and keeps the fastest time of every stage
+# of the run traces
+def time_tool(block_numbers, repeat, machine_radius=300, people_radius=500):
+    import BlastClearance as blast_clearance
+
+    runs = []
+    for _ in range(repeat):
+        # Every run starts with a cold lookup cache, as the first run of the day does
+        if os.path.exists(blast_clearance.lookup_cache_file):
+            os.remove(blast_clearance.lookup_cache_file)
+        blast_clearance.run_blast(block_numbers, machine_radius, people_radius)
+        runs.append(tracing.active_tracer.totals())
+    return {name: min(run.get(name, 0.0) for run in runs) for name in stage_names}
+
+
+# This function returns the baseline key of a result
+def result_key(result):
+    return f"{result['blocks']}x{result['roads']}"
+
+
+def read_baseline(baseline_file):
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file) as file:
+        return json.load(file)
+
+
+# This function stores the results as the baseline, existing entries for other sizes are kept
+def save_baseline(results, baseline_file):
+    baseline = read_baseline(baseline_file)
+    baseline.update({result_key(result): result["stages"] for result in results})
+    with open(baseline_file, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+    return baseline_file
+
+
+# This function compares the results with the baseline
+# Return a list of [key, stage, baseline seconds, seconds] lists for every regressed stage
+def find_regressions(results, baseline, tolerance=default_tolerance, min_seconds=default_min_seconds):
+    regressions = []
+    for result in results:
+        baseline_stages = baseline.get(result_key(result))
+        if baseline_stages is None:
+            continue
+        for name, seconds in result["stages"].items():
+            baseline_seconds = baseline_stages.get(name)
+            if baseline_seconds is None:
+                continue
+            if seconds > baseline_seconds * (1.0 + tolerance) and seconds - baseline_seconds > min_seconds:
+                regressions.append([result_key(result), name, baseline_seconds, seconds])
+    return regressions
+
+
+# This function prints the seconds per stage of every result
+def print_results(results):
+    print(f"{'Blocks':>6} {'Roads':>7} " + " ".join(f"{name[:12]:>12}" for name in stage_names))
+    for result in results:
+        print(f"{result['blocks']:>6} {result['roads']:>7} " +
+              " ".join(f"{result['stages'][name]:>12.4f}" for name in stage_names))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Time the blast clearance pipeline on synthetic data")
+    parser.add_argument("--quick", action="store_true", help="small grid of blast and road network sizes")
+    parser.add_argument("--blocks", type=int, nargs="+", help="blast sizes (blocks)")
+    parser.add_argument("--roads", type=int, nargs="+", help="road network sizes (segments)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--replay", help="folder with fixtures recorded from the live database")
+    parser.add_argument("--zone-engine", choices=["arcpy", "memory"], help="clearance zone engine of the runs")
+    parser.add_argument("--snapshot", action="store_true", help="read BlockInventory from a local snapshot")
+    parser.add_argument("--baseline", default=default_baseline_file)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=default_tolerance)
+    options = parser.parse_args(arguments)
+
+    block_counts = options.blocks or (quick_block_counts if options.quick else default_block_counts)
+    road_counts = options.roads or (quick_road_counts if options.quick else default_road_counts)
+    settings = {"clearance_zone_engine": options.zone_engine} if options.zone_engine else None
+    if options.replay:
+        results = run_replay(options.replay, road_counts, options.repeat, settings)
+    else:
+        results = run_suite(block_counts, road_counts, options.repeat, settings, options.snapshot)
+    print_results(results)
+
+    if options.save_baseline:
+        print(f"Baseline saved to {save_baseline(results, options.baseline)}")
+        return 0
+
+    regressions = find_regressions(results, read_baseline(options.baseline), options.tolerance)
+    for key, name, baseline_seconds, seconds in regressions:
+        print(f"REGRESSION {key} {name}: {baseline_seconds:.4f}s -> {seconds:.4f}s")
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# This module times the BlockStatus lookup of a blast with the previous OR chain where clause against the chunked
+# IN (...) predicates of query_builder.py, on a SQLite stand-in for the BlockStatus table
+# Very long OR chains exceed the SQLite expression depth limit, they are reported as failed.
+# Usage (from the repository folder):
+#     python -m benchmarks.query_predicates                       10 to 5000 blocks
+#     python -m benchmarks.query_predicates --blocks 100 20000 --repeat 5
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from query_builder import SqliteBlockStatusSource, default_chunk_size, default_max_workers, fetch_block_status_ids
+
+
+default_block_counts = (10, 100, 1000, 5000)
+
+
+# This function creates the previous OR chain predicate, it is only kept for benchmarking purposes
+def or_chain_predicate(pairs):
+    return " OR ".join(f"(BlockId = {pair[0]} AND StatusId = {pair[1]})" for pair in pairs)
+
+
+# This function creates a SQLite stand-in for the BlockStatus table with a number of statuses per block
+def create_benchmark_database(database_path, block_count, statuses_per_block=3):
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE BlockStatus (BlockStatusId INTEGER PRIMARY KEY, BlockId INTEGER, "
+                       "StatusId INTEGER)")
+    connection.execute("CREATE INDEX BlockStatus_BlockId ON BlockStatus (BlockId, StatusId)")
+    rows = []
+    for block_id in range(1, block_count + 1):
+        for status in range(statuses_per_block):
+            rows.append((block_id * statuses_per_block + status, block_id, block_id * 10 + status))
+    connection.executemany("INSERT INTO BlockStatus VALUES (?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+
+
+# This function times the OR chain predicate against the chunked predicate for different numbers of blocks
+# Return a list of (block count, OR chain seconds, chunked seconds) tuples, None if the OR chain failed
+def benchmark(block_counts=default_block_counts, repeat=3, chunk_size=default_chunk_size,
+              max_workers=default_max_workers):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database_path = os.path.join(temp_dir, "BlockInventory.sqlite")
+        create_benchmark_database(database_path, max(block_counts))
+        source = SqliteBlockStatusSource(database_path)
+
+        for block_count in block_counts:
+            block_array = [[block_id, str(block_id), block_id * 10 + 1, 1] for block_id in range(1, block_count + 1)]
+            pairs = [(block[0], block[2]) for block in block_array]
+
+            connection = sqlite3.connect(database_path)
+            or_chain_time = None
+            try:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    connection.execute("SELECT BlockStatusId FROM BlockStatus WHERE " +
+                                       or_chain_predicate(pairs)).fetchall()
+                or_chain_time = (time.perf_counter() - start) / repeat
+            except sqlite3.OperationalError:
+                # Very long OR chains exceed the SQLite expression depth limit
+                pass
+            finally:
+                connection.close()
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fetch_block_status_ids(block_array, source, chunk_size, max_workers)
+            chunked_time = (time.perf_counter() - start) / repeat
+            results.append((block_count, or_chain_time, chunked_time))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the OR chain against the chunked IN predicates")
+    parser.add_argument("--blocks", type=int, nargs="+", default=list(default_block_counts))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size)
+    parser.add_argument("--workers", type=int, default=default_max_workers)
+    arguments = parser.parse_args(argv)
+
+    print(f"{'Blocks':>8} {'OR chain (s)':>14} {'Chunked IN (s)':>16}")
+    for count, or_time, in_time in benchmark(arguments.blocks, arguments.repeat, arguments.chunk_size,
+                                             arguments.workers):
+        or_text = f"{or_time:.5f}" if or_time is not None else "failed"
+        print(f"{count:>8} {or_text:>14} {in_time:>16.5f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
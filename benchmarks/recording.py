@@ -0,0 +1,152 @@
+# This module records the query results of the data sources used by the tool and replays them offline
+# A recording source wraps a live source (e.g. ArcpyBlockSource) and stores every call and its result in a JSON
+# fixture, create_replay_database() loads the recorded rows into a synthetic mine database. Benchmarks can then run
+# the tool on real BlockInventory blocks without an SDE connection.
+import json
+import os
+import sqlite3
+
+import shapely
+
+from query_builder import block_status_ids_query, chunk_list, default_chunk_size
+
+
+# This function creates the fixture key of a call
+def call_key(method_name, args):
+    return f"{method_name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+# Source class passing calls through to a live source and recording the results
+class RecordingSource:
+    def __init__(self, source, fixture_file):
+        self.source = source
+        self.fixture_file = fixture_file
+        self.calls = read_fixture(fixture_file)
+
+    def __getattr__(self, method_name):
+        method = getattr(self.source, method_name)
+
+        def record(*args):
+            result = method(*args)
+            # Round trip through JSON so that recorded and replayed results have the same types
+            result = json.loads(json.dumps(result, default=str))
+            self.calls[call_key(method_name, list(args))] = result
+            return result
+        return record
+
+    # This function writes the recorded calls to the fixture file
+    def save(self):
+        write_fixture(self.fixture_file, self.calls)
+
+
+def read_fixture(fixture_file):
+    if not os.path.exists(fixture_file):
+        return {}
+    with open(fixture_file) as file:
+        return json.load(file)
+
+
+def write_fixture(fixture_file, calls):
+    os.makedirs(os.path.dirname(os.path.abspath(fixture_file)), exist_ok=True)
+    temp_file = fixture_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(calls, file)
+    os.replace(temp_file, fixture_file)
+
+
+# Data access class reading block geometries through a query layer on the BlockInventory SDE connection
+class ArcpyBlockGeometrySource:
+    def __init__(self, sde_connection, spatial_reference, chunk_size=default_chunk_size):
+        self.sde_connection = sde_connection
+        self.spatial_reference = spatial_reference
+        self.chunk_size = chunk_size
+
+    # This function returns the BlockStatusId, BlockId and hex WKB shape of the block statuses
+    def fetch_block_geometries(self, block_status_ids):
+        import arcpy
+
+        rows = []
+        for chunk in chunk_list([int(block_status_id) for block_status_id in block_status_ids], self.chunk_size):
+            query_layer = arcpy.MakeQueryLayer_management(input_database=self.sde_connection,
+                                                          out_layer_name="FixtureBlocks",
+                                                          query=block_status_ids_query(chunk),
+                                                          oid_fields="BlockStatusId",
+                                                          shape_type="POLYGON",
+                                                          spatial_reference=self.spatial_reference)[0]
+            with arcpy.da.SearchCursor(query_layer, ["BlockStatusId", "BlockId", "SHAPE@WKB"]) as cursor:
+                rows.extend([row[0], row[1], bytes(row[2]).hex()] for row in cursor)
+            arcpy.Delete_management(query_layer)
+        return rows
+
+
+# This function records the query results of a blast from the live BlockInventory database into fixture files
+# One fixture file is written per source in fixture_dir
+# Return the fixture files
+def record_live_fixtures(fixture_dir, block_numbers):
+    import BlastClearance as blast_clearance
+    from block_validation import ArcpyBlockSource, validate_blocks
+    from lookup_cache import ArcpyLookupSource, LevelLookupCache
+    from query_builder import ArcpyBlockStatusSource, fetch_block_status_ids
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    fixture_files = fixture_file_names(fixture_dir)
+    block_source = RecordingSource(ArcpyBlockSource(blast_clearance.sde_block_path), fixture_files["block"])
+    block_status_source = RecordingSource(ArcpyBlockStatusSource(blast_clearance.sde_block_status_path),
+                                          fixture_files["block_status"])
+    lookup_source = RecordingSource(ArcpyLookupSource(blast_clearance.sde_level_path,
+                                                      blast_clearance.sde_elevation_datum_path),
+                                    fixture_files["lookup"])
+    geometry_source = RecordingSource(ArcpyBlockGeometrySource(blast_clearance.block_inventory_sde,
+                                                               blast_clearance.block_inventory_db_spatial_reference),
+                                      fixture_files["block_geometry"])
+
+    # Run the queries exactly as the pipeline does, with a single worker so that the chunks are recorded in order
+    block_array, missing_list = validate_blocks(block_numbers, block_source)
+    if len(missing_list) > 0:
+        raise ValueError(f"Blocks do not exist: {', '.join(missing_list)}")
+    block_status_ids = fetch_block_status_ids(block_array, block_status_source, max_workers=1)
+    geometry_source.fetch_block_geometries(block_status_ids)
+    LevelLookupCache(lookup_source, os.path.join(fixture_dir, "lookup_cache.json")).refresh(force=True)
+
+    for source in (block_source, block_status_source, lookup_source, geometry_source):
+        source.save()
+    write_fixture(fixture_files["blast"], {"blocks": [str(number) for number in block_numbers]})
+    return fixture_files
+
+
+# This function returns the fixture file of every source in a fixture folder
+def fixture_file_names(fixture_dir):
+    return {name: os.path.join(fixture_dir, f"{name}.json")
+            for name in ("blast", "block", "block_status", "lookup", "block_geometry")}
+
+
+# This function creates a mine database from the fixtures recorded in a fixture folder
+# Level, ElevationDatum, Block and BlockStatus hold the recorded rows (Tonnes was not recorded and is left empty), the
+# road_count synthetic roads are laid out around the recorded blocks
+# Return the path of the database
+def create_replay_database(fixture_dir, database_path, road_count):
+    from benchmarks.synthetic import create_mine_database
+
+    calls = {name: read_fixture(fixture_file) for name, fixture_file in fixture_file_names(fixture_dir).items()}
+    block_rows = [row for rows in calls["block"].values() for row in rows]
+    status_rows = {int(row[0]): row for rows in calls["block_status"].values() for row in rows}
+    geometry_rows = [row for rows in calls["block_geometry"].values() for row in rows]
+    shapes = [shapely.from_wkb(bytes.fromhex(row[2])) for row in geometry_rows]
+
+    create_mine_database(database_path, 0, road_count, block_extent=shapely.total_bounds(shapes))
+    connection = sqlite3.connect(database_path)
+    try:
+        connection.execute("DELETE FROM Level")
+        connection.execute("DELETE FROM ElevationDatum")
+        connection.executemany("INSERT INTO Level (LevelId, ElevationDatumId) VALUES (?, ?)",
+                               calls["lookup"][call_key("read_levels", [])])
+        connection.executemany("INSERT INTO ElevationDatum (ElevationDatumId, Name) VALUES (?, ?)",
+                               calls["lookup"][call_key("read_elevation_datums", [])])
+        connection.executemany("INSERT INTO Block VALUES (?, ?, ?, ?)", block_rows)
+        connection.executemany("INSERT INTO BlockStatus VALUES (?, ?, ?, NULL, ?)",
+                               [[row[0], row[1], status_rows[int(row[0])][2], bytes.fromhex(row[2])]
+                                for row in geometry_rows])
+        connection.commit()
+    finally:
+        connection.close()
+    return database_path
@@ -0,0 +1,155 @@
+# This module times the candidate road search of road_index.py on large synthetic road networks (100k+ segments)
+# The linear NumPy scan of RoadIndex is compared with the grid of cells the index used before, which is kept here as
+# GridRoadIndex for the comparison only, and both are checked against each other. Loading the saved index file is
+# timed as well, it is part of every blast.
+# Usage (from the repository folder):
+#     python -m benchmarks.road_candidates                          100k and 500k segments
+#     python -m benchmarks.road_candidates --segments 1000000 --blocks 200 --distance 1000
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from road_index import RoadIndex
+
+
+default_segment_counts = (100000, 500000)
+
+
+# Index class of the previous road index: a grid of cells pointing to the segments whose bounding box covers them
+class GridRoadIndex:
+    def __init__(self, oids, boxes, origin, cell_size, grid_shape, cell_offsets, cell_entries):
+        self.oids = oids
+        self.boxes = boxes
+        self.origin = origin
+        self.cell_size = cell_size
+        self.grid_shape = grid_shape
+        self.cell_offsets = cell_offsets
+        self.cell_entries = cell_entries
+
+    # This function builds the grid from ObjectIds and (xmin, ymin, xmax, ymax) bounding boxes
+    @classmethod
+    def build(cls, oids, boxes, cell_size=None):
+        oids = np.asarray(oids, dtype=np.int64)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        origin = boxes[:, :2].min(axis=0)
+        extent = boxes[:, 2:].max(axis=0) - origin
+        if cell_size is None:
+            # Cells about the size of a typical segment, but never more cells than segments
+            typical_size = float(np.median(np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])))
+            cell_size = max(typical_size, math.sqrt(max(extent[0] * extent[1], 1.0) / len(boxes)), 1.0)
+        cell_size = float(cell_size)
+
+        cell_min = np.floor((boxes[:, :2] - origin) / cell_size).astype(np.int64)
+        cell_max = np.floor((boxes[:, 2:] - origin) / cell_size).astype(np.int64)
+        grid_shape = (int(cell_max[:, 0].max()) + 1, int(cell_max[:, 1].max()) + 1)
+
+        # Expand every segment into the cells covered by its bounding box
+        widths = cell_max[:, 0] - cell_min[:, 0] + 1
+        counts = widths * (cell_max[:, 1] - cell_min[:, 1] + 1)
+        entries = np.repeat(np.arange(len(boxes)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = np.repeat(cell_min[:, 0], counts) + local % np.repeat(widths, counts)
+        cell_y = np.repeat(cell_min[:, 1], counts) + local // np.repeat(widths, counts)
+        cells = cell_y * grid_shape[0] + cell_x
+
+        order = np.argsort(cells, kind="stable")
+        cell_offsets = np.searchsorted(cells[order], np.arange(grid_shape[0] * grid_shape[1] + 1))
+        return cls(oids, boxes, origin, cell_size, grid_shape, cell_offsets, entries[order])
+
+    # This function returns the ObjectIds of the segments whose bounding box is within distance of any query box
+    def candidates(self, query_boxes, distance=0.0):
+        query_boxes = np.asarray(query_boxes, dtype=np.float64).reshape(-1, 4)
+        search_boxes = query_boxes + np.array([-distance, -distance, distance, distance])
+
+        # Collect the segments in the grid cells covered by the search boxes
+        cell_min = np.floor((search_boxes[:, :2] - self.origin) / self.cell_size).astype(np.int64)
+        cell_max = np.floor((search_boxes[:, 2:] - self.origin) / self.cell_size).astype(np.int64)
+        cell_min = np.maximum(cell_min, 0)
+        cell_max = np.minimum(cell_max, np.array(self.grid_shape) - 1)
+        cell_ranges = set()
+        for box_min, box_max in zip(cell_min, cell_max):
+            # Cells in a grid row are stored next to each other, so every row of a box is a single slice
+            for cell_y in range(box_min[1], box_max[1] + 1):
+                if box_min[0] <= box_max[0]:
+                    cell_ranges.add((cell_y * self.grid_shape[0] + box_min[0],
+                                     cell_y * self.grid_shape[0] + box_max[0] + 1))
+        if len(cell_ranges) == 0:
+            return np.zeros(0, dtype=np.int64)
+        entries = np.unique(np.concatenate([self.cell_entries[self.cell_offsets[start]:self.cell_offsets[end]]
+                                            for start, end in cell_ranges]))
+
+        # Exact bounding box test of the collected segments against every search box
+        boxes = self.boxes[entries]
+        overlap = np.zeros(len(entries), dtype=bool)
+        for xmin, ymin, xmax, ymax in search_boxes:
+            overlap |= (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)
+        return self.oids[entries[overlap]]
+
+
+# This function creates a synthetic road network of short segments in a square area
+# Return the (xmin, ymin, xmax, ymax) bounding boxes of the segments
+def synthetic_road_boxes(segment_count, area_size=20000.0, max_length=200.0, seed=1):
+    generator = np.random.default_rng(seed)
+    start = generator.uniform(0.0, area_size, size=(segment_count, 2))
+    end = start + generator.uniform(-max_length, max_length, size=(segment_count, 2))
+    return np.hstack([np.minimum(start, end), np.maximum(start, end)])
+
+
+# This function times loading the saved index and the linear scan of RoadIndex against building and querying the grid
+# Return a list of (segment count, load seconds, scan seconds, grid build seconds, grid query seconds) tuples
+def benchmark(segment_counts=default_segment_counts, block_count=60, distance=2000.0, repeat=5):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for segment_count in segment_counts:
+            boxes = synthetic_road_boxes(segment_count)
+            oids = np.arange(1, segment_count + 1)
+            block_boxes = synthetic_road_boxes(block_count, area_size=2000.0, max_length=30.0, seed=2) + 9000.0
+            index_path = os.path.join(temp_dir, f"RoadIndex_{segment_count}.npz")
+            RoadIndex.build(oids, boxes).save(index_path)
+
+            start = time.perf_counter()
+            index = RoadIndex.load(index_path)
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                scanned = index.candidates(block_boxes, distance)
+            scan_time = (time.perf_counter() - start) / repeat
+
+            start = time.perf_counter()
+            grid_index = GridRoadIndex.build(oids, boxes)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                gridded = grid_index.candidates(block_boxes, distance)
+            grid_time = (time.perf_counter() - start) / repeat
+
+            if not np.array_equal(np.sort(scanned), np.sort(gridded)):
+                raise AssertionError("Grid candidates differ from the linear scan")
+            results.append((segment_count, load_time, scan_time, build_time, grid_time))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the candidate road search on large road networks")
+    parser.add_argument("--segments", type=int, nargs="+", default=list(default_segment_counts))
+    parser.add_argument("--blocks", type=int, default=60)
+    parser.add_argument("--distance", type=float, default=2000.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args(argv)
+
+    print(f"{'Segments':>10} {'Load (s)':>10} {'Linear scan (s)':>16} {'Grid build (s)':>15} {'Grid query (s)':>15}")
+    for count, load_time, scan_time, build_time, grid_time in benchmark(arguments.segments, arguments.blocks,
+                                                                        arguments.distance, arguments.repeat):
+        print(f"{count:>10} {load_time:>10.3f} {scan_time:>16.5f} {build_time:>15.3f} {grid_time:>15.5f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# This module generates a synthetic mine in a SQLite database with the BlockInventory tables used by the tool
+# Blocks are laid out in benches, every block has a number of statuses of which the last one is current, levels
+# are spread over the elevation datums and a road network of short segments covers the pit and its surroundings.
+# Geometries are stored as WKB in the Shape columns read by fake_arcpy.py.
+import math
+import random
+import sqlite3
+
+import numpy as np
+import shapely
+
+from zone_engine import synthetic_blocks
+
+
+mine_names = ["North Mine", "South Mine", "Lylyveld South"]
+block_number_start = 100000
+default_statuses_per_block = 3
+default_level_count = 30
+
+
+# This function returns the block number of a synthetic BlockId
+def block_number(block_id):
+    return str(block_number_start + block_id)
+
+
+# This function creates a synthetic road network of straight two or three vertex roads around an extent
+def synthetic_roads(road_count, extent, max_length=200.0, seed=1):
+    generator = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = extent
+    start = np.column_stack([generator.uniform(min_x, max_x, road_count), generator.uniform(min_y, max_y, road_count)])
+    middle = start + generator.uniform(-max_length / 2, max_length / 2, size=(road_count, 2))
+    end = middle + generator.uniform(-max_length / 2, max_length / 2, size=(road_count, 2))
+    return shapely.linestrings(np.stack([start, middle, end], axis=1))
+
+
+# This function creates the reference tables (ElevationDatum and Level)
+def _create_lookup_tables(connection, level_count):
+    connection.execute("CREATE TABLE ElevationDatum (ElevationDatumId INTEGER PRIMARY KEY, Name TEXT, "
+                       "last_edited_date TEXT)")
+    connection.execute("CREATE TABLE Level (LevelId INTEGER PRIMARY KEY, ElevationDatumId INTEGER, "
+                       "last_edited_date TEXT)")
+    connection.executemany("INSERT INTO ElevationDatum VALUES (?, ?, ?)",
+                           [[datum_id, name, "2024-01-01 00:00:00"]
+                            for datum_id, name in enumerate(mine_names, start=1)])
+    connection.executemany("INSERT INTO Level VALUES (?, ?, ?)",
+                           [[level_id, (level_id - 1) % len(mine_names) + 1, "2024-01-01 00:00:00"]
+                            for level_id in range(1, level_count + 1)])
+
+
+# This function creates the Block and BlockStatus tables
+# Return the shapely geometries of the current block statuses
+def _create_block_tables(connection, block_count, statuses_per_block, level_count, seed):
+    connection.execute("CREATE TABLE Block (BlockId INTEGER PRIMARY KEY, Number TEXT, CurrentStatusID INTEGER, "
+                       "LevelId INTEGER)")
+    connection.execute("CREATE INDEX Block_Number ON Block (Number)")
+    connection.execute("CREATE TABLE BlockStatus (BlockStatusId INTEGER PRIMARY KEY, BlockId INTEGER, "
+                       "StatusId INTEGER, Tonnes REAL, Shape BLOB)")
+    connection.execute("CREATE INDEX BlockStatus_BlockId ON BlockStatus (BlockId, StatusId)")
+
+    # Square-ish pit: as many benches as blocks per bench
+    benches = max(1, round(math.sqrt(block_count)))
+    geometries = synthetic_blocks(block_count, benches=benches, bench_spacing=100.0, seed=seed)
+    per_bench = max(1, math.ceil(block_count / benches))
+    block_rows = []
+    status_rows = []
+    for index, geometry in enumerate(geometries):
+        block_id = index + 1
+        level_id = (index // per_bench) % level_count + 1
+        block_rows.append([block_id, block_number(block_id), block_id * 10 + statuses_per_block - 1, level_id])
+        for status in range(statuses_per_block):
+            # Older statuses are the design outlines, slightly larger than the current shape
+            status_geometry = geometry.buffer(statuses_per_block - 1 - status, join_style="mitre")
+            status_rows.append([block_id * statuses_per_block + status, block_id, block_id * 10 + status,
+                                round(status_geometry.area * 10.0 * 2.7, 1), shapely.to_wkb(status_geometry)])
+    connection.executemany("INSERT INTO Block VALUES (?, ?, ?, ?)", block_rows)
+    connection.executemany("INSERT INTO BlockStatus VALUES (?, ?, ?, ?, ?)", status_rows)
+    return geometries
+
+
+# This function creates the Road_Edge table with a network of straight segments around an extent
+def _create_road_table(connection, road_count, extent, level_count, seed, max_length=200.0):
+    connection.execute("CREATE TABLE Road_Edge (OBJECTID INTEGER PRIMARY KEY, Level TEXT, Shape BLOB)")
+    generator = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = extent
+    start = np.column_stack([generator.uniform(min_x, max_x, road_count), generator.uniform(min_y, max_y, road_count)])
+    end = start + generator.uniform(-max_length, max_length, size=(road_count, 2))
+    lines = shapely.linestrings(np.stack([start, end], axis=1))
+    levels = generator.integers(1, level_count + 1, road_count)
+    rows = ([object_id + 1, str(int(levels[object_id])), line_wkb]
+            for object_id, line_wkb in enumerate(shapely.to_wkb(lines)))
+    connection.executemany("INSERT INTO Road_Edge VALUES (?, ?, ?)", rows)
+
+
+# This function creates a synthetic mine database
+# The roads cover the pit, or the block_extent given (e.g. of recorded blocks), and a margin of road_margin meters
+# Return a dictionary with the number of blocks and roads and the extent of the roads
+def create_mine_database(database_path, block_count, road_count, statuses_per_block=default_statuses_per_block,
+                         level_count=default_level_count, road_margin=3000.0, block_extent=None, seed=1):
+    connection = sqlite3.connect(database_path)
+    try:
+        _create_lookup_tables(connection, level_count)
+        geometries = _create_block_tables(connection, block_count, statuses_per_block, level_count, seed)
+        min_x, min_y, max_x, max_y = shapely.total_bounds(geometries) if block_extent is None else block_extent
+        extent = [min_x - road_margin, min_y - road_margin, max_x + road_margin, max_y + road_margin]
+        _create_road_table(connection, road_count, extent, level_count, seed)
+        connection.commit()
+    finally:
+        connection.close()
+    return {"blocks": block_count, "roads": road_count, "extent": extent}
+
+
+# This function picks the block numbers of a blast, blasts are made of neighbouring blocks on a bench
+def blast_block_numbers(block_count, total_block_count, seed=1):
+    generator = random.Random(seed)
+    first_block_id = generator.randint(1, max(1, total_block_count - block_count + 1))
+    return [block_number(block_id) for block_id in range(first_block_id, first_block_id + block_count)]
@@ -0,0 +1,178 @@
+# This script is the command line of the blast clearance process, for schedulers, benchmarks and troubleshooting
+#     python blast_cli.py validate --blocks 1234 1235 --machine-radius 300 --people-radius 500
+#     python blast_cli.py dry-run --block-file blocks.txt --machine-radius 300 --people-radius 500
+#     python blast_cli.py run --blocks 1234 1235 --machine-radius 300 --people-radius 500 [--local]
+#     python blast_cli.py batch manifest.json [--machine-radius 300 --people-radius 500]
+#     python blast_cli.py snapshot                 (scheduled, e.g. daily with Task Scheduler)
+# validate and dry-run only read the configuration and the input, arcpy is not imported unless --check-database
+# is given. run, batch and snapshot need the ArcGIS Pro Python environment (propy).
+import argparse
+import os
+import sys
+import time
+
+import BlastClearance as blast_clearance
+from blast_config import check_config, read_config
+from block_input import file_block_entries, list_block_entries, read_block_input, rejected_message
+
+
+# This function reads the block numbers of the command line or of the block file (text or CSV)
+# Return the unique block numbers, the list of rejected [location, value] entries and the number of duplicates
+def read_blocks(arguments):
+    if arguments.block_file:
+        return read_block_input(file_block_entries(arguments.block_file))
+    return read_block_input(list_block_entries(arguments.blocks, "--blocks"))
+
+
+# This function checks the configuration and the input of a blast without connecting to any database
+# Return the list of problems found (empty when the input is valid)
+def check_input(config, block_input, machine_radius, people_radius):
+    problems = check_config(config)
+    if len(block_input) == 0:
+        problems.append("No blocks provided")
+    for name, radius in (("Machine radius", machine_radius), ("People radius", people_radius)):
+        try:
+            if float(radius) <= 0:
+                problems.append(f"{name} must be positive")
+        except (TypeError, ValueError):
+            problems.append(f"{name} {radius!r} is not a number")
+    return problems
+
+
+# This function checks whether the blocks exist in the BlockInventory database (imports arcpy)
+# Return the list of block numbers which do not exist
+def check_database(block_input):
+    from block_validation import ArcpyBlockSource, validate_blocks
+
+    _, missing_list = validate_blocks(block_input, blast_clearance.block_inventory(
+        ArcpyBlockSource(blast_clearance.sde_block_path, "Number")))
+    return missing_list
+
+
+# This function describes what a run would do with the current configuration
+# Return the list of report lines
+def describe_run(block_input, machine_radius, people_radius):
+    from blast_worker import JobSpool
+    from block_snapshot import open_current_snapshot
+
+    worker_alive = (blast_clearance.use_resident_worker and
+                    JobSpool(blast_clearance.worker_spool_dir, create=False).worker_alive())
+    lines = [f"Blocks: {len(block_input)} ({', '.join(block_input[:10])}{', ...' if len(block_input) > 10 else ''})",
+             f"Machine radius: {machine_radius} m, people radius: {people_radius} m",
+             f"Runs in: {'the resident worker' if worker_alive else 'this process'}",
+             f"Clearance zone engine: {blast_clearance.clearance_zone_engine}, "
+             f"scratch workspace: {blast_clearance.scratch_workspace_mode}",
+             f"Roads: clipped to the zones, conflicts checked within {blast_clearance.conflict_window_hours:g} hours"]
+    if blast_clearance.block_inventory_source == "snapshot":
+        snapshot, description = open_current_snapshot(blast_clearance.block_snapshot_dir,
+                                                      blast_clearance.block_snapshot_max_age_seconds)
+        lines.append(f"BlockInventory: {description}{'' if snapshot is not None else ', read live'}")
+    else:
+        lines.append("BlockInventory: read live")
+    for name, path in (("Workspace", blast_clearance.workspace),
+                       ("BlockInventory connection", blast_clearance.block_inventory_sde),
+                       ("Working geodatabase", blast_clearance.working_gdb),
+                       ("Archive geodatabase", blast_clearance.archive_gdb),
+                       ("Road index", blast_clearance.road_index_file),
+                       ("Lookup cache", blast_clearance.lookup_cache_file),
+                       ("Block shape cache", blast_clearance.block_geometry_cache_file
+                        if blast_clearance.use_block_geometry_cache else None),
+                       ("BlockInventory snapshot", blast_clearance.block_snapshot_dir),
+                       ("CAD output", blast_clearance.cad_output_dir),
+                       ("CAD artefact store", blast_clearance.cad_artefact_store_dir),
+                       ("CAD staging folder", blast_clearance.staging_dir),
+                       ("Traces", blast_clearance.trace_dir)):
+        if path is not None:
+            lines.append(f"{name}: {path}{'' if os.path.exists(path) else ' (not found)'}")
+    return lines
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Blast clearance zones, roads and CAD files for a blast")
+    parser.add_argument("--config", help="local configuration file overriding BlastClearance.ini")
+    parser.add_argument("--workspace", help="workspace folder (scratch.gdb, caches and traces)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("validate", "check the configuration and the input"),
+                            ("dry-run", "check the input and show what a run would do"),
+                            ("run", "run the blast clearance process for one blast")):
+        command = commands.add_parser(name, help=help_text)
+        blocks = command.add_mutually_exclusive_group(required=True)
+        blocks.add_argument("--blocks", nargs="+", help="block numbers")
+        blocks.add_argument("--block-file", help="text file with one block number per line or comma separated "
+                                                 "numbers (spaces do not separate numbers), or CSV file")
+        command.add_argument("--machine-radius", required=True)
+        command.add_argument("--people-radius", required=True)
+        if name == "run":
+            command.add_argument("--local", action="store_true", help="run in this process, not in the worker")
+        else:
+            command.add_argument("--check-database", action="store_true",
+                                 help="check that the blocks exist in the BlockInventory database")
+
+    batch = commands.add_parser("batch", help="run the blasts of a JSON manifest (see BlastClearanceBatch.py)")
+    batch.add_argument("manifest")
+    batch.add_argument("--machine-radius")
+    batch.add_argument("--people-radius")
+
+    commands.add_parser("snapshot", help="export the BlockInventory tables to the local snapshot")
+    return parser
+
+
+# This function runs a command
+# Return the exit code
+def main(argv=None):
+    start = time.perf_counter()
+    arguments = build_parser().parse_args(argv)
+    workspace = os.path.abspath(arguments.workspace) if arguments.workspace else None
+    # The folders inside the workspace (staging, snapshot) follow the workspace given on the command line
+    config = read_config(arguments.config, default_workspace=workspace)
+    if workspace is not None:
+        config.set("paths", "workspace", workspace)
+    blast_clearance.apply_config(config)
+
+    if arguments.command == "batch":
+        import BlastClearanceBatch as blast_clearance_batch
+
+        return 1 if blast_clearance_batch.run_manifest(arguments.manifest, arguments.machine_radius,
+                                                        arguments.people_radius) > 0 else 0
+    if arguments.command == "snapshot":
+        manifest = blast_clearance.export_block_snapshot()
+        print(f"BlockInventory snapshot {manifest['version']} exported to {blast_clearance.block_snapshot_dir} "
+              f"({time.perf_counter() - start:.1f}s)")
+        return 0
+
+    block_input, rejected, duplicate_count = read_blocks(arguments)
+    problems = check_input(config, block_input, arguments.machine_radius, arguments.people_radius)
+    if len(rejected) > 0:
+        problems.append(rejected_message(rejected))
+    if len(problems) == 0 and arguments.command != "run" and arguments.check_database:
+        missing_list = check_database(block_input)
+        if len(missing_list) > 0:
+            problems.append(f"Blocks do not exist: {', '.join(missing_list)}")
+    for problem in problems:
+        print(f"ERROR: {problem}", file=sys.stderr)
+    if len(problems) > 0:
+        return 2
+
+    if arguments.command == "validate":
+        print(f"Input valid ({len(block_input)} blocks, {duplicate_count} duplicates removed, "
+              f"{time.perf_counter() - start:.3f}s)")
+        return 0
+    if arguments.command == "dry-run":
+        for line in describe_run(block_input, arguments.machine_radius, arguments.people_radius):
+            print(line)
+        print(f"Dry run completed in {time.perf_counter() - start:.3f}s, nothing was written")
+        return 0
+
+    if blast_clearance.use_resident_worker and not arguments.local:
+        # A failed job raises arcpy.ExecuteError
+        if blast_clearance.submit_to_worker(block_input, arguments.machine_radius,
+                                            arguments.people_radius) is not None:
+            return 0
+    _, _, cad_files_copied = blast_clearance.run_blast(block_input, arguments.machine_radius,
+                                                       arguments.people_radius)
+    return 0 if cad_files_copied else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
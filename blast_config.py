@@ -0,0 +1,83 @@
+# This module reads the paths, spatial references and settings of the blast clearance tools from ini files
+# BlastClearance.ini next to the scripts holds the defaults. A local file passed as config_file, or named by the
+# BLAST_CLEARANCE_CONFIG environment variable, overrides the options it contains.
+# Only the standard library is used, so the configuration can be read and checked without ArcGIS Pro.
+import configparser
+import os
+
+
+default_config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BlastClearance.ini")
+
+
+# This function reads the default configuration and the local overrides
+# default_workspace is used when the workspace option is empty (the folder of the current ArcGIS Pro project)
+# Return the ConfigParser
+def read_config(config_file=None, default_workspace=None):
+    config = configparser.ConfigParser()
+    with open(default_config_file) as file:
+        config.read_file(file)
+    override_file = config_file or os.environ.get("BLAST_CLEARANCE_CONFIG")
+    if override_file:
+        with open(override_file) as file:
+            config.read_file(file)
+
+    if config.get("paths", "workspace").strip() == "":
+        config.set("paths", "workspace", default_workspace or os.environ.get(
+            "BLAST_CLEARANCE_WORKSPACE", os.path.dirname(os.path.abspath(__file__))))
+    if config.get("paths", "worker_spool_directory").strip() == "":
+        local_app_data = os.environ.get("LOCALAPPDATA", config.get("paths", "workspace"))
+        config.set("paths", "worker_spool_directory", os.path.join(local_app_data, "BlastClearance", "Spool"))
+    if config.get("paths", "cad_artefact_store").strip() == "":
+        config.set("paths", "cad_artefact_store",
+                   os.path.join(config.get("paths", "cad_output_directory"), "_ArtefactStore"))
+    if config.get("paths", "staging_directory").strip() == "":
+        config.set("paths", "staging_directory", os.path.join(config.get("paths", "workspace"), "Staging"))
+    if config.get("paths", "block_snapshot_directory").strip() == "":
+        config.set("paths", "block_snapshot_directory",
+                   os.path.join(config.get("paths", "workspace"), "BlockInventorySnapshot"))
+    return config
+
+
+# This function returns the spatial reference string of an option, WKT or the contents of a .prj file
+def spatial_reference_text(config, option):
+    value = config.get("spatial_references", option).strip()
+    if value.lower().endswith(".prj"):
+        with open(value) as file:
+            value = file.read()
+    return "".join(line.strip() for line in value.splitlines())
+
+
+# This function checks the settings which would only fail in the middle of a run
+# Return the list of problems found (empty when the configuration is valid)
+def check_config(config):
+    problems = []
+    for option, allowed in (("clearance_zone_engine", ("arcpy", "memory")),
+                            ("scratch_workspace_mode", ("memory", "gdb")),
+                            ("block_inventory_source", ("live", "snapshot"))):
+        if config.get("settings", option) not in allowed:
+            problems.append(f"settings.{option} must be one of {', '.join(allowed)}")
+    for option in ("conflict_window_hours", "archive_window_days", "block_geometry_cache_mb", "upload_retries",
+                   "block_snapshot_max_age_hours"):
+        try:
+            if config.getfloat("settings", option) <= 0:
+                problems.append(f"settings.{option} must be positive")
+        except ValueError:
+            problems.append(f"settings.{option} is not a number")
+    try:
+        if config.getfloat("settings", "upload_wait_seconds") < 0:
+            problems.append("settings.upload_wait_seconds must not be negative")
+    except ValueError:
+        problems.append("settings.upload_wait_seconds is not a number")
+    for option in ("profile_run", "use_resident_worker", "cad_hard_links", "stage_cad_output",
+                   "use_block_geometry_cache"):
+        try:
+            config.getboolean("settings", option)
+        except ValueError:
+            problems.append(f"settings.{option} must be true or false")
+    for option in ("sishen_local", "block_inventory"):
+        try:
+            if not spatial_reference_text(config, option).startswith(("PROJCS[", "GEOGCS[")):
+                problems.append(f"spatial_references.{option} is not a WKT spatial reference")
+        except OSError as error:
+            problems.append(f"spatial_references.{option}: {error}")
+    return problems
@@ -0,0 +1,199 @@
+# This module allocates blast clearance IDs from the SishenBlasts table
+# The ID is the ObjectID returned by the insert (an attribute rule sets BlastClearId equal to the ObjectID), so
+# no second query is needed to find the new row. Inserts are serialised with a lock file, which keeps the
+# IDs of a reserved range contiguous when several planners allocate at the same time.
+# Batch runs reserve a range of IDs up front, a reserved row has no Mine and the reservation time as DateTime until
+# its blast is processed. Unused rows are removed when the reservation is released, the rows of a batch run that
+# was killed are removed as orphans once they are older than a day.
+import getpass
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from file_lock import FileLock
+from query_builder import chunk_list, in_predicate
+
+
+# Age after which a reserved row that was neither used nor released is an orphan (one day)
+default_orphan_seconds = 24 * 60 * 60
+
+
+# Allocator class handing out reserved IDs first and inserting new rows when none are left
+class BlastIdAllocator:
+    def __init__(self):
+        self.reserved = []
+
+    # This function allocates the ID of one blast
+    # Return the BlastClearId and the user that created the row (editor tracking), or the login without a user
+    def allocate(self, mine, date_time):
+        if len(self.reserved) > 0:
+            object_id = self.reserved.pop(0)
+            self._update_row(object_id, mine, date_time)
+        else:
+            object_id = self._insert_rows([[mine, date_time]])[0]
+        return str(object_id), self._created_user(object_id) or self.user()
+
+    # This function reserves a contiguous range of IDs for a batch run
+    # Return the list of reserved IDs
+    def reserve(self, count):
+        reserved_time = datetime.now().replace(microsecond=0)
+        object_ids = self._insert_rows([[None, reserved_time]] * count) if count > 0 else []
+        if len(object_ids) > 1 and object_ids[-1] - object_ids[0] != len(object_ids) - 1:
+            raise RuntimeError(f"Reserved IDs are not contiguous: {object_ids[0]} - {object_ids[-1]}")
+        self.reserved.extend(object_ids)
+        return [str(object_id) for object_id in object_ids]
+
+    # This function removes the rows of the reserved IDs that were not used
+    # Return the number of rows removed
+    def release(self):
+        object_ids = self.reserved
+        self.reserved = []
+        return self._delete_rows(object_ids) if len(object_ids) > 0 else 0
+
+    # This function removes the reserved rows of runs that ended without releasing them (no Mine and reserved more
+    # than orphan_seconds ago, or without a DateTime)
+    # Return the number of rows removed
+    def remove_orphans(self, orphan_seconds=default_orphan_seconds):
+        return self._delete_orphans(datetime.now().replace(microsecond=0) - timedelta(seconds=orphan_seconds))
+
+    # This function returns the user recorded by editor tracking (the operating system login)
+    @staticmethod
+    def user():
+        return getpass.getuser()
+
+
+# Allocator class for the SishenBlasts table in a file geodatabase
+class ArcpyBlastIdAllocator(BlastIdAllocator):
+    def __init__(self, blast_table, lock_file=None):
+        super().__init__()
+        self.blast_table = blast_table
+        self.lock_file = lock_file or os.path.join(os.path.dirname(os.path.dirname(blast_table)),
+                                                   "SishenBlasts.lock")
+
+    def _insert_rows(self, rows):
+        import arcpy
+
+        with FileLock(self.lock_file):
+            with arcpy.da.InsertCursor(self.blast_table, ["Mine", "DateTime"]) as cursor:
+                return [cursor.insertRow(row) for row in rows]
+
+    def _created_user(self, object_id):
+        import arcpy
+
+        if len(arcpy.ListFields(self.blast_table, "created_user")) == 0:
+            return None
+        with arcpy.da.SearchCursor(self.blast_table, ["created_user"], f"OBJECTID = {int(object_id)}") as cursor:
+            for row in cursor:
+                return row[0]
+        return None
+
+    def _update_row(self, object_id, mine, date_time):
+        import arcpy
+
+        # File geodatabase tables accept one writer at a time, updates take the lock as well
+        with FileLock(self.lock_file):
+            where_clause = f"OBJECTID = {int(object_id)}"
+            with arcpy.da.UpdateCursor(self.blast_table, ["Mine", "DateTime"], where_clause) as cursor:
+                for _ in cursor:
+                    cursor.updateRow([mine, date_time])
+
+    def _delete_rows(self, object_ids):
+        import arcpy
+
+        deleted = 0
+        with FileLock(self.lock_file):
+            for chunk in chunk_list([int(object_id) for object_id in object_ids]):
+                where_clause, _ = in_predicate("OBJECTID", chunk, parameterised=False)
+                with arcpy.da.UpdateCursor(self.blast_table, ["OBJECTID"], where_clause) as cursor:
+                    for _ in cursor:
+                        cursor.deleteRow()
+                        deleted += 1
+        return deleted
+
+    def _delete_orphans(self, cutoff):
+        import arcpy
+
+        deleted = 0
+        with FileLock(self.lock_file):
+            with arcpy.da.UpdateCursor(self.blast_table, ["DateTime"], "Mine IS NULL") as cursor:
+                for row in cursor:
+                    if row[0] is None or row[0] < cutoff:
+                        cursor.deleteRow()
+                        deleted += 1
+        return deleted
+
+
+# Allocator class for a SQLite stand-in of the SishenBlasts table
+# BEGIN IMMEDIATE takes the database write lock, the trigger plays the part of the BlastClearId attribute rule
+class SqliteBlastIdAllocator(BlastIdAllocator):
+    def __init__(self, database_path, table_name="SishenBlasts"):
+        super().__init__()
+        self.database_path = database_path
+        self.table_name = table_name
+        connection = self._connect()
+        try:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (OBJECTID INTEGER PRIMARY KEY, "
+                               "BlastClearId TEXT, Mine TEXT, DateTime TEXT, created_user TEXT)")
+            connection.execute(f"CREATE TRIGGER IF NOT EXISTS {table_name}_BlastClearId AFTER INSERT ON "
+                               f"{table_name} BEGIN UPDATE {table_name} SET BlastClearId = NEW.OBJECTID "
+                               "WHERE OBJECTID = NEW.OBJECTID; END")
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+
+    def _insert_rows(self, rows):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            object_ids = []
+            for mine, date_time in rows:
+                cursor = connection.execute(f"INSERT INTO {self.table_name} (Mine, DateTime, created_user) "
+                                            "VALUES (?, ?, ?)", [mine, _date_text(date_time), self.user()])
+                object_ids.append(cursor.lastrowid)
+            connection.execute("COMMIT")
+            return object_ids
+        finally:
+            connection.close()
+
+    def _created_user(self, object_id):
+        connection = self._connect()
+        try:
+            row = connection.execute(f"SELECT created_user FROM {self.table_name} WHERE OBJECTID = ?",
+                                     [int(object_id)]).fetchone()
+            return None if row is None else row[0]
+        finally:
+            connection.close()
+
+    def _update_row(self, object_id, mine, date_time):
+        connection = self._connect()
+        try:
+            connection.execute(f"UPDATE {self.table_name} SET Mine = ?, DateTime = ? WHERE OBJECTID = ?",
+                               [mine, _date_text(date_time), int(object_id)])
+        finally:
+            connection.close()
+
+    def _delete_rows(self, object_ids):
+        connection = self._connect()
+        try:
+            deleted = 0
+            for chunk in chunk_list([int(object_id) for object_id in object_ids]):
+                predicate, parameters = in_predicate("OBJECTID", chunk)
+                deleted += connection.execute(f"DELETE FROM {self.table_name} WHERE {predicate}",
+                                              parameters).rowcount
+            return deleted
+        finally:
+            connection.close()
+
+    def _delete_orphans(self, cutoff):
+        connection = self._connect()
+        try:
+            return connection.execute(f"DELETE FROM {self.table_name} WHERE Mine IS NULL AND "
+                                      "(DateTime IS NULL OR DateTime < ?)", [_date_text(cutoff)]).rowcount
+        finally:
+            connection.close()
+
+
+def _date_text(date_time):
+    return date_time.isoformat(sep=" ") if isinstance(date_time, datetime) else date_time
@@ -0,0 +1,333 @@
+# This module runs blast clearance jobs in a long-lived worker process
+# The worker imports arcpy once and keeps the lookup tables, road index, block shape cache, conflict index and CAD
+# export pool warm between jobs. Staged CAD files are uploaded in the background while it waits for the next job.
+# Jobs are passed through a directory spool on the local machine:
+#     incoming/<job id>.json    jobs waiting for the worker (written by the client)
+#     working/<job id>.json     the job the worker is running (claimed with an atomic rename)
+#     progress/<job id>.log     progress messages, streamed back to the client
+#     results/<job id>.json     status, blast ID and errors of finished jobs
+# The worker writes a heartbeat file from a background thread, also while a job runs, so that clients know whether it
+# is running. A client stops waiting for its job when the heartbeat goes stale.
+# Start the worker with the ArcGIS Pro Python environment (the spool folder defaults to the configured one):
+#     propy blast_worker.py [spool folder]
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+
+heartbeat_seconds = 5
+
+
+# Spool class holding the job files shared by the worker and its clients
+# create=False only reads the spool (e.g. to check the heartbeat), the folders are not created
+class JobSpool:
+    def __init__(self, spool_dir, create=True):
+        self.spool_dir = spool_dir
+        self.folders = {name: os.path.join(spool_dir, name) for name in ("incoming", "working", "progress", "results")}
+        if create:
+            for folder in self.folders.values():
+                os.makedirs(folder, exist_ok=True)
+        self.heartbeat_file = os.path.join(spool_dir, "worker.heartbeat")
+
+    def _file(self, folder, job_id, extension=".json"):
+        return os.path.join(self.folders[folder], f"{job_id}{extension}")
+
+    # This function adds a job to the queue
+    # Return the job ID
+    def submit(self, job):
+        job_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        _write_json(self._file("incoming", job_id), dict(job, job_id=job_id))
+        return job_id
+
+    # This function takes the oldest waiting job, the rename makes sure only one worker gets it
+    # Return the job, None if no job is waiting
+    def claim(self):
+        for file_name in sorted(os.listdir(self.folders["incoming"])):
+            if not file_name.endswith(".json"):
+                continue
+            working_file = os.path.join(self.folders["working"], file_name)
+            try:
+                os.replace(os.path.join(self.folders["incoming"], file_name), working_file)
+            except OSError:
+                continue
+            with open(working_file) as file:
+                return json.load(file)
+        return None
+
+    # This function removes a job the worker has not claimed yet
+    # Return True if the job was removed, False if the worker claimed it
+    def withdraw(self, job_id):
+        try:
+            os.remove(self._file("incoming", job_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # This function appends a progress message of a job
+    def progress(self, job_id, message):
+        with open(self._file("progress", job_id, ".log"), "a") as file:
+            file.write(message.replace("\n", " ") + "\n")
+
+    # This function reads the progress messages written after offset
+    # Return the list of new messages and the new offset
+    def read_progress(self, job_id, offset=0):
+        progress_file = self._file("progress", job_id, ".log")
+        if not os.path.exists(progress_file):
+            return [], offset
+        with open(progress_file) as file:
+            file.seek(offset)
+            text = file.read()
+        # Only complete lines are returned, the worker may still be writing the last one
+        complete_text = text[:text.rfind("\n") + 1]
+        return complete_text.splitlines(), offset + len(complete_text)
+
+    # This function stores the result of a job and removes it from the working folder
+    def complete(self, job_id, result):
+        _write_json(self._file("results", job_id), result)
+        try:
+            os.remove(self._file("working", job_id))
+        except FileNotFoundError:
+            pass
+
+    # Return the result of a finished job, None while the job is waiting or running
+    def result(self, job_id):
+        result_file = self._file("results", job_id)
+        if not os.path.exists(result_file):
+            return None
+        with open(result_file) as file:
+            return json.load(file)
+
+    # This function fails the jobs left in the working folder by a worker that stopped during a job
+    # They are not run again, the stopped run may already have appended features or exported CAD files
+    # Return the IDs of the failed jobs
+    def fail_interrupted_jobs(self):
+        job_ids = [file_name[:-5] for file_name in os.listdir(self.folders["working"]) if file_name.endswith(".json")]
+        for job_id in job_ids:
+            self.complete(job_id, {"job_id": job_id, "status": "FAILED",
+                                   "errors": ["The worker stopped while the job was running, check the masters "
+                                              "before submitting it again"]})
+        return job_ids
+
+    # This function removes the progress and result files of jobs older than max_age_days
+    def purge(self, max_age_days=7):
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        for folder in ("progress", "results"):
+            for file_name in os.listdir(self.folders[folder]):
+                file_path = os.path.join(self.folders[folder], file_name)
+                if os.path.getmtime(file_path) < cutoff:
+                    os.remove(file_path)
+
+    def beat(self):
+        with open(self.heartbeat_file, "w") as file:
+            file.write(f"{os.getpid()} {datetime.now().isoformat(timespec='seconds')}")
+
+    # This function checks whether a worker wrote its heartbeat recently (within three heartbeats by default)
+    def worker_alive(self, max_age_seconds=None):
+        max_age_seconds = 3 * heartbeat_seconds if max_age_seconds is None else max_age_seconds
+        try:
+            return time.time() - os.path.getmtime(self.heartbeat_file) < max_age_seconds
+        except OSError:
+            return False
+
+
+def _write_json(json_file, value):
+    temp_file = json_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(value, file, default=str)
+    os.replace(temp_file, json_file)
+
+
+# This function submits a job and passes its progress messages to message until the job is finished
+# The client gives up when the job did not finish within the timeout or the heartbeat of the worker went stale, a job
+# the worker did not claim yet is withdrawn so that a restarted worker does not run it
+# Return the result of the job, None if the client gave up
+def submit_and_stream(spool, job, message, timeout=3600, poll_seconds=0.5):
+    job_id = spool.submit(job)
+    message(f"Job {job_id} submitted to the blast clearance worker")
+    offset = 0
+    start = time.monotonic()
+    while True:
+        lines, offset = spool.read_progress(job_id, offset)
+        for line in lines:
+            message(line)
+        result = spool.result(job_id)
+        if result is not None:
+            lines, offset = spool.read_progress(job_id, offset)
+            for line in lines:
+                message(line)
+            return result
+        if not spool.worker_alive():
+            # The worker may have finished the job just before it stopped
+            if spool.result(job_id) is not None:
+                continue
+            message(f"The blast clearance worker stopped{', job withdrawn' if spool.withdraw(job_id) else ''}")
+            return None
+        if time.monotonic() - start >= timeout:
+            message(f"The blast clearance worker did not finish the job within {timeout} seconds"
+                    f"{', job withdrawn' if spool.withdraw(job_id) else ''}")
+            return None
+        time.sleep(poll_seconds)
+
+
+# Worker class keeping the resources of the tool warm between jobs
+class BlastWorker:
+    def __init__(self, spool):
+        import BlastClearance as blast_clearance
+        from blast_ids import ArcpyBlastIdAllocator
+        from conflict_index import ConflictIndex
+        from lookup_cache import ArcpyLookupSource, LevelLookupCache
+
+        self.spool = spool
+        self.blast_clearance = blast_clearance
+        # With the snapshot source the warm caches follow every new snapshot export
+        self.level_lookup_cache = LevelLookupCache(blast_clearance.block_inventory(
+                                                       ArcpyLookupSource(blast_clearance.sde_level_path,
+                                                                         blast_clearance.sde_elevation_datum_path)),
+                                                   blast_clearance.lookup_cache_file)
+        self.level_lookup_cache.refresh()
+        self.block_geometry_cache = blast_clearance.open_block_geometry_cache(
+            blast_clearance.block_geometry_cache_file, blast_clearance.block_geometry_cache_bytes)
+        self.blast_id_allocator = ArcpyBlastIdAllocator(blast_clearance.sis_blasts_table)
+        self.cad_pool = blast_clearance.open_cad_pool(blast_clearance.cad_artefact_store_dir,
+                                                      blast_clearance.cad_hard_links, blast_clearance.staging_dir,
+                                                      blast_clearance.upload_retries)
+        self.conflict_index = ConflictIndex(blast_clearance.conflict_window_hours)
+        self.road_index = None
+        self.road_index_time = None
+        self.previous_datetime = None
+        self.archive_pending = False
+        self.refresh_road_index()
+
+    # This function reloads the road index when RoadPortalToGeodatabase.py rebuilt it
+    def refresh_road_index(self):
+        road_index_file = self.blast_clearance.road_index_file
+        road_index_time = os.path.getmtime(road_index_file) if os.path.exists(road_index_file) else None
+        if road_index_time != self.road_index_time or self.road_index is None:
+            self.road_index = self.blast_clearance.load_road_index(road_index_file)
+            self.road_index_time = road_index_time
+
+    # This function runs one job, every message of the tool is written to the progress stream of the job
+    # Return the result of the job
+    def run_job(self, job):
+        from block_input import list_block_entries, read_block_input, rejected_message
+        from block_validation import ArcpyBlockSource, validate_blocks
+        from tracing import start_tracer
+
+        job_id = job["job_id"]
+        blast_clearance = self.blast_clearance
+        blast_clearance.output_listener = lambda message: self.spool.progress(job_id, message)
+        result = {"job_id": job_id, "status": "FAILED", "errors": []}
+        tracer = start_tracer(message=blast_clearance.arc_output)
+        tracer.attributes["job_id"] = job_id
+        try:
+            blocks, rejected, _ = read_block_input(list_block_entries(job["blocks"], "Job blocks"))
+            if len(rejected) > 0:
+                result["errors"].append(rejected_message(rejected))
+                return result
+            blast_clearance.report_block_inventory_source()
+            block_array, missing_list = validate_blocks(blocks, blast_clearance.block_inventory(
+                ArcpyBlockSource(blast_clearance.sde_block_path, "Number")))
+            if len(missing_list) > 0 or len(block_array) == 0:
+                result["errors"].append(f"Blocks do not exist: {', '.join(missing_list)}" if len(missing_list) > 0
+                                        else "No blocks provided")
+                return result
+            blast_clearance.arc_output("Block Check Completed...")
+            self.refresh_road_index()
+
+            # Every blast gets its own timestamp, it is part of the blast folder and file names
+            run_datetime = datetime.today().replace(microsecond=0)
+            if self.previous_datetime is not None and run_datetime <= self.previous_datetime:
+                run_datetime = self.previous_datetime + timedelta(seconds=1)
+            self.previous_datetime = run_datetime
+
+            blast_id, user = blast_clearance.process_blast(block_select_array_p=block_array,
+                                                           machine_radius_p=job["machine_radius"],
+                                                           people_radius_p=job["people_radius"],
+                                                           level_lookup_cache_p=self.level_lookup_cache,
+                                                           road_index_p=self.road_index,
+                                                           run_datetime_p=run_datetime,
+                                                           cad_pool_p=self.cad_pool,
+                                                           block_geometry_cache_p=self.block_geometry_cache,
+                                                           blast_id_allocator_p=self.blast_id_allocator,
+                                                           conflict_index_p=self.conflict_index)
+            result.update({"blast_id": blast_id, "user": user})
+
+            # Completion barrier: the job is only done once its CAD files were written and copied
+            blast_clearance.arc_output("Waiting for CAD Files")
+            for job_name, file_name, error in self.cad_pool.wait():
+                result["errors"].append(f"{job_name}: {file_name} {error}")
+            result["status"] = "FAILED" if len(result["errors"]) > 0 else "SUCCESS"
+        except Exception as error:
+            result["errors"].append(f"{type(error).__name__}: {error}")
+            self.spool.progress(job_id, traceback.format_exc())
+        finally:
+            blast_clearance.write_run_trace(tracer, blast_clearance.trace_dir)
+            blast_clearance.output_listener = None
+        return result
+
+    # This function moves old master records to the archive, it runs when the queue is empty to keep jobs fast
+    def archive(self):
+        self.archive_pending = False
+        try:
+            archived = self.blast_clearance.archive_master_features(self.blast_clearance.archive_window_days)
+            print(f"{archived} master records archived")
+        except Exception as error:
+            print(f"Archiving failed: {type(error).__name__}: {error}")
+
+    # This function writes the heartbeat every heartbeat_seconds until stop is set, it runs on its own thread so that
+    # the heartbeat stays fresh while a job runs
+    def beat(self, stop):
+        while True:
+            try:
+                self.spool.beat()
+            except OSError as error:
+                print(f"Heartbeat failed: {error}")
+            if stop.wait(heartbeat_seconds):
+                return
+
+    # This function runs jobs until the worker is stopped (Ctrl+C) or was idle for idle_timeout seconds
+    def run(self, poll_seconds=1.0, idle_timeout=None):
+        for job_id in self.spool.fail_interrupted_jobs():
+            print(f"Job {job_id} was interrupted by a previous worker and marked as failed")
+        self.spool.purge()
+        idle_start = time.monotonic()
+        stop_beat = threading.Event()
+        beat_thread = threading.Thread(target=self.beat, args=[stop_beat], name="heartbeat", daemon=True)
+        beat_thread.start()
+        try:
+            while idle_timeout is None or time.monotonic() - idle_start < idle_timeout:
+                job = self.spool.claim()
+                if job is None:
+                    if self.archive_pending:
+                        self.archive()
+                    time.sleep(poll_seconds)
+                    continue
+                print(f"Running job {job['job_id']} ({len(job.get('blocks', []))} blocks)")
+                result = self.run_job(job)
+                self.spool.complete(job["job_id"], result)
+                print(f"Job {job['job_id']}: {result['status']}")
+                self.archive_pending = True
+                idle_start = time.monotonic()
+        finally:
+            self.cad_pool.shutdown()
+            self.blast_clearance.wait_for_uploads(self.cad_pool, self.blast_clearance.upload_wait_seconds)
+            if self.block_geometry_cache is not None:
+                self.block_geometry_cache.close()
+            stop_beat.set()
+            beat_thread.join()
+            if os.path.exists(self.spool.heartbeat_file):
+                os.remove(self.spool.heartbeat_file)
+
+
+if __name__ == "__main__":
+    from blast_config import read_config
+
+    worker_spool = JobSpool(sys.argv[1] if len(sys.argv) > 1 else
+                            read_config().get("paths", "worker_spool_directory"))
+    print(f"Blast clearance worker waiting for jobs in {worker_spool.spool_dir}")
+    BlastWorker(worker_spool).run()
@@ -0,0 +1,113 @@
+# This module reads the block numbers of a blast from the tool parameters, text files, CSV files and batch manifests
+# The entries are streamed through generators, normalised (surrounding whitespace, quotes and "/" removed), checked
+# and deduplicated in the order provided. Malformed numbers are rejected before any database is queried and every
+# unique block is only looked up once downstream, however often it appears in a planning file.
+import csv
+import os
+import re
+
+
+block_number_pattern = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+max_block_number_length = 32
+# Header names of the block number column of a CSV file (compared in lower case)
+csv_number_columns = ("number", "block", "blocks", "block_number", "block number", "blocknumber")
+comment_prefix = "#"
+
+
+# This function normalises a block number
+# Return the canonical block number, an empty string for an empty entry
+def normalise_block_number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().strip("\"'").replace("/", "").strip()
+
+
+# This function checks whether a normalised block number is well formed
+def is_valid_block_number(number):
+    return len(number) <= max_block_number_length and block_number_pattern.match(number) is not None
+
+
+# This function streams the entries of a list of block numbers (the tool parameter or a manifest list)
+# Return a generator of (location, value) tuples
+def list_block_entries(values, source="Block list"):
+    for count, value in enumerate(values or []):
+        yield f"{source} item {count + 1}", value
+
+
+# This function streams the entries of a text file, numbers are separated by line breaks or commas and lines
+# starting with # are comments
+# Spaces and semicolons do not separate numbers, an entry such as "1234 1235" is rejected as malformed instead of
+# being read as two blocks
+# Return a generator of (location, value) tuples
+def text_block_entries(blocks_file):
+    file_name = os.path.basename(blocks_file)
+    with open(blocks_file) as file:
+        for line_number, line in enumerate(file, start=1):
+            if line.lstrip().startswith(comment_prefix):
+                continue
+            for value in line.rstrip("\r\n").split(","):
+                if value.strip() != "":
+                    yield f"{file_name} line {line_number}", value
+
+
+# This function streams the entries of the block number column of a CSV file
+# The column is found by its header (see csv_number_columns), without a header the first column is used
+# Return a generator of (location, value) tuples
+def csv_block_entries(blocks_file):
+    file_name = os.path.basename(blocks_file)
+    with open(blocks_file, newline="") as file:
+        column = None
+        for row_number, row in enumerate(csv.reader(file), start=1):
+            if len(row) == 0 or row[0].lstrip().startswith(comment_prefix):
+                continue
+            if column is None:
+                headers = [value.strip().lower() for value in row]
+                column = next((count for count, header in enumerate(headers) if header in csv_number_columns), None)
+                if column is not None:
+                    continue
+                column = 0
+            if column < len(row):
+                yield f"{file_name} row {row_number}", row[column]
+
+
+# This function streams the entries of a block file, CSV files are read by column and other files as text
+# Return a generator of (location, value) tuples
+def file_block_entries(blocks_file):
+    if os.path.splitext(blocks_file)[1].lower() == ".csv":
+        return csv_block_entries(blocks_file)
+    return text_block_entries(blocks_file)
+
+
+# This function normalises and checks a stream of entries, empty entries are skipped
+# Malformed entries are added to the rejected list as [location, value] lists
+# Return a generator of the valid block numbers (including duplicates)
+def valid_block_numbers(entries, rejected):
+    for location, value in entries:
+        number = normalise_block_number(value)
+        if number == "":
+            continue
+        if is_valid_block_number(number):
+            yield number
+        else:
+            rejected.append([location, str(value)])
+
+
+# This function reads a stream of entries into one canonical block list
+# Return the unique block numbers in the order provided, the list of rejected [location, value] entries and the
+# number of duplicates removed
+def read_block_input(entries):
+    rejected = []
+    blocks = {}
+    entry_count = 0
+    for number in valid_block_numbers(entries, rejected):
+        entry_count += 1
+        blocks.setdefault(number, None)
+    return list(blocks), rejected, entry_count - len(blocks)
+
+
+# This function describes rejected entries for an error message (at most max_shown entries)
+def rejected_message(rejected, max_shown=10):
+    shown = [f"{location}: {value!r}" for location, value in rejected[:max_shown]]
+    if len(rejected) > max_shown:
+        shown.append(f"... and {len(rejected) - max_shown} more")
+    return f"{len(rejected)} malformed block numbers ({'; '.join(shown)})"
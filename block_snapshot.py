@@ -0,0 +1,424 @@
+# This module keeps a columnar snapshot of the BlockInventory tables used by the tool on the local disk
+# A scheduled export (python blast_cli.py snapshot) dumps Block, BlockStatus (with the shapes as WKB and the other
+# columns as JSON), Level and ElevationDatum into one folder of NumPy arrays per snapshot version. Readers memory-map
+# the arrays and look blocks up by number (and block statuses by BlockId and StatusId) with binary searches on the
+# sorted key columns, so a run does not wait for the SQL Server link.
+# The SnapshotSource wraps a live source and serves its reads from the snapshot. It falls back to the live source
+# when the snapshot is missing or older than its maximum age, and for blocks and block statuses created after the
+# export. Changes to existing blocks (e.g. a new current status) are only seen after the next export.
+# Layout: <snapshot_dir>/CURRENT (name of the current version), <snapshot_dir>/<version>/manifest.json and one
+# <column>.npy file per column.
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+from file_lock import FileLock
+from geometry_cache import attribute_field_names, decode_attributes, encode_attributes, status_key_fields
+from lookup_cache import ArcpyLookupSource, SqliteLookupSource
+
+
+snapshot_format = 2
+default_keep_versions = 2
+default_max_age_hours = 26
+# Value stored for empty IDs (e.g. a block without a current status)
+null_id = -1
+
+
+# Data access class reading the whole BlockInventory tables from the SDE connection with arcpy
+# The block statuses are read through a query layer, as the shapes of the BlockStatus table are
+class ArcpySnapshotSource:
+    def __init__(self, sde_connection, spatial_reference):
+        self.sde_connection = sde_connection
+        self.spatial_reference = spatial_reference
+        self.lookup_source = ArcpyLookupSource(self._table("Level"), self._table("ElevationDatum"))
+
+    def _table(self, table_name):
+        return os.path.join(self.sde_connection, f"BlockInventory.dbo.{table_name}")
+
+    # This function returns all rows of the Block table as (BlockId, Number, CurrentStatusID, LevelId)
+    def read_blocks(self):
+        import arcpy
+
+        with arcpy.da.SearchCursor(self._table("Block"), ["BlockId", "Number", "CurrentStatusID",
+                                                          "LevelId"]) as cursor:
+            for row in cursor:
+                yield list(row)
+
+    # This function returns all rows of the BlockStatus table as (BlockStatusId, BlockId, StatusId, WKB shape,
+    # attributes)
+    def read_block_statuses(self):
+        import arcpy
+
+        query_layer = arcpy.MakeQueryLayer_management(input_database=self.sde_connection,
+                                                      out_layer_name="SnapshotBlocks",
+                                                      query="select * from BlockStatus",
+                                                      oid_fields="BlockStatusId",
+                                                      shape_type="POLYGON",
+                                                      spatial_reference=self.spatial_reference)[0]
+        try:
+            attribute_fields = attribute_field_names(arcpy.ListFields(query_layer))
+            with arcpy.da.SearchCursor(query_layer, ["BlockStatusId", "BlockId", "StatusId", "SHAPE@WKB"]
+                                       + attribute_fields) as cursor:
+                for row in cursor:
+                    yield [row[0], row[1], row[2], bytes(row[3]) if row[3] is not None else None,
+                           dict(zip(attribute_fields, row[4:]))]
+        finally:
+            arcpy.Delete_management(query_layer)
+
+    def read_levels(self):
+        return self.lookup_source.read_levels()
+
+    def read_elevation_datums(self):
+        return self.lookup_source.read_elevation_datums()
+
+
+# Data access class reading the whole tables from a SQLite stand-in for the BlockInventory schema
+class SqliteSnapshotSource:
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.lookup_source = SqliteLookupSource(database_path)
+
+    def _query(self, query):
+        connection = sqlite3.connect(self.database_path)
+        try:
+            for row in connection.execute(query):
+                yield list(row)
+        finally:
+            connection.close()
+
+    def _query_rows(self, query):
+        connection = sqlite3.connect(self.database_path)
+        try:
+            cursor = connection.execute(query)
+            columns = [column[0] for column in cursor.description]
+            for values in cursor:
+                yield dict(zip(columns, values))
+        finally:
+            connection.close()
+
+    # This function returns all rows of the Block table as (BlockId, Number, CurrentStatusID, LevelId)
+    def read_blocks(self):
+        return self._query("SELECT BlockId, Number, CurrentStatusID, LevelId FROM Block")
+
+    # This function returns all rows of the BlockStatus table as (BlockStatusId, BlockId, StatusId, WKB shape,
+    # attributes)
+    def read_block_statuses(self):
+        key_fields = [field.lower() for field in status_key_fields]
+        for row in self._query_rows("SELECT * FROM BlockStatus"):
+            yield [row["BlockStatusId"], row["BlockId"], row["StatusId"],
+                   bytes(row["Shape"]) if row["Shape"] is not None else None,
+                   {column: value for column, value in row.items() if column.lower() not in key_fields}]
+
+    def read_levels(self):
+        return self.lookup_source.read_levels()
+
+    def read_elevation_datums(self):
+        return self.lookup_source.read_elevation_datums()
+
+
+def _ids(values):
+    import numpy as np
+
+    return np.array([null_id if value is None else int(value) for value in values], dtype=np.int64)
+
+
+# This function returns the int64 search key of (BlockId, StatusId) pairs
+def pair_keys(block_ids, status_ids):
+    import numpy as np
+
+    return (np.asarray(block_ids, dtype=np.int64) << 32) | np.asarray(status_ids, dtype=np.int64)
+
+
+# This function exports the BlockInventory tables of a source to a new snapshot version and makes it current
+# The version is written next to the current one and switched with an atomic replace of the CURRENT file, runs
+# reading the previous version are not affected. Only the newest keep_versions versions are kept.
+# Return the manifest of the new version
+def export_snapshot(snapshot_source, snapshot_dir, keep_versions=default_keep_versions):
+    import numpy as np
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    start = time.perf_counter()
+    created = time.time()
+    version = f"{time.strftime('%Y%m%d%H%M%S', time.localtime(created))}_{uuid.uuid4().hex[:8]}"
+    columns = {}
+
+    # Blocks sorted by number
+    block_rows = list(snapshot_source.read_blocks())
+    numbers = np.array([str(row[1]) for row in block_rows], dtype=str)
+    order = np.argsort(numbers, kind="stable")
+    columns["block_number"] = numbers[order]
+    for position, name in ((0, "block_id"), (2, "block_current_status_id"), (3, "block_level_id")):
+        columns[name] = _ids([row[position] for row in block_rows])[order]
+
+    # Block statuses sorted by (BlockId, StatusId), the shapes and the JSON attributes are concatenated with an
+    # offset per row
+    status_ids = []
+    shape_lengths = []
+    shape_data = bytearray()
+    attribute_lengths = []
+    attribute_data = bytearray()
+    for row in snapshot_source.read_block_statuses():
+        if row[1] is None or row[2] is None:
+            # A block status without a block cannot be looked up
+            continue
+        if not 0 <= int(row[1]) < 2 ** 31 or not 0 <= int(row[2]) < 2 ** 32:
+            raise ValueError(f"BlockStatus {row[0]}: BlockId {row[1]} and StatusId {row[2]} cannot be indexed")
+        status_ids.append([int(row[0]), int(row[1]), int(row[2])])
+        shape_lengths.append(len(row[3]) if row[3] is not None else 0)
+        shape_data.extend(row[3] or b"")
+        attributes = encode_attributes(row[4]).encode("utf-8")
+        attribute_lengths.append(len(attributes))
+        attribute_data.extend(attributes)
+    status_array = np.array(status_ids, dtype=np.int64).reshape(-1, 3)
+    shape_offsets = np.concatenate([[0], np.cumsum(shape_lengths, dtype=np.int64)])
+    keys = pair_keys(status_array[:, 1], status_array[:, 2])
+    order = np.argsort(keys, kind="stable")
+    columns["status_key"] = keys[order]
+    columns["status_block_status_id"] = status_array[order, 0]
+    columns["status_shape_start"] = shape_offsets[:-1][order]
+    columns["status_shape_end"] = shape_offsets[1:][order]
+    columns["status_shape_wkb"] = np.frombuffer(bytes(shape_data), dtype=np.uint8)
+    attribute_offsets = np.concatenate([[0], np.cumsum(attribute_lengths, dtype=np.int64)])
+    columns["status_attributes_start"] = attribute_offsets[:-1][order]
+    columns["status_attributes_end"] = attribute_offsets[1:][order]
+    columns["status_attributes_json"] = np.frombuffer(bytes(attribute_data), dtype=np.uint8)
+
+    # Reference tables
+    level_rows = snapshot_source.read_levels()
+    columns["level_id"] = _ids([row[0] for row in level_rows])
+    columns["level_elevation_datum_id"] = _ids([row[1] for row in level_rows])
+    datum_rows = snapshot_source.read_elevation_datums()
+    columns["elevation_datum_id"] = _ids([row[0] for row in datum_rows])
+    columns["elevation_datum_name"] = np.array([str(row[1]) for row in datum_rows], dtype=str)
+
+    manifest = {"format": snapshot_format, "version": version, "created": created,
+                "rows": {"Block": len(block_rows), "BlockStatus": len(status_ids), "Level": len(level_rows),
+                         "ElevationDatum": len(datum_rows)},
+                "seconds": 0.0}
+    temp_dir = os.path.join(snapshot_dir, f"{version}.tmp")
+    os.makedirs(temp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(temp_dir, f"{name}.npy"), values, allow_pickle=False)
+    manifest["seconds"] = time.perf_counter() - start
+    manifest["bytes"] = sum(os.path.getsize(os.path.join(temp_dir, name)) for name in os.listdir(temp_dir))
+    with open(os.path.join(temp_dir, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_dir, os.path.join(snapshot_dir, version))
+
+    with FileLock(os.path.join(snapshot_dir, "CURRENT.lock")):
+        temp_file = os.path.join(snapshot_dir, f"CURRENT.{uuid.uuid4().hex}.tmp")
+        with open(temp_file, "w") as file:
+            file.write(version)
+        os.replace(temp_file, os.path.join(snapshot_dir, "CURRENT"))
+        # The older versions are removed oldest first, by the creation time in their manifest
+        old_versions = sorted((name for name in snapshot_versions(snapshot_dir) if name != version),
+                              key=lambda name: _read_manifest(snapshot_dir, name)["created"])
+        for old_version in old_versions[:max(0, len(old_versions) - keep_versions + 1)]:
+            # A version still mapped by a running process cannot be deleted on Windows, it goes with the next export
+            shutil.rmtree(os.path.join(snapshot_dir, old_version), ignore_errors=True)
+    return manifest
+
+
+# This function returns the names of the complete snapshot versions
+def snapshot_versions(snapshot_dir):
+    return [name for name in os.listdir(snapshot_dir)
+            if not name.endswith(".tmp") and os.path.isfile(os.path.join(snapshot_dir, name, "manifest.json"))]
+
+
+def _read_manifest(snapshot_dir, version):
+    with open(os.path.join(snapshot_dir, version, "manifest.json")) as file:
+        return json.load(file)
+
+
+# This function returns the name of the current snapshot version, None if no snapshot was exported
+def current_version(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, "CURRENT")) as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+# Snapshot class holding the memory-mapped columns of one snapshot version
+# It has the methods of the block, block status, block geometry and lookup sources
+class BlockSnapshot:
+    def __init__(self, snapshot_dir, version=None):
+        import numpy as np
+
+        self.version = version or current_version(snapshot_dir)
+        if self.version is None:
+            raise FileNotFoundError(f"No BlockInventory snapshot in {snapshot_dir}")
+        version_dir = os.path.join(snapshot_dir, self.version)
+        self.manifest = _read_manifest(snapshot_dir, self.version)
+        if self.manifest["format"] != snapshot_format:
+            raise ValueError(f"BlockInventory snapshot {self.version} has format {self.manifest['format']}")
+        self.columns = {name[:-4]: np.load(os.path.join(version_dir, name), mmap_mode="r", allow_pickle=False)
+                        for name in os.listdir(version_dir) if name.endswith(".npy")}
+
+    # This function returns the age of the snapshot in seconds
+    def age_seconds(self):
+        return time.time() - self.manifest["created"]
+
+    # This function returns all rows whose block number is in the list of numbers
+    def fetch_blocks(self, numbers):
+        import numpy as np
+
+        block_numbers = self.columns["block_number"]
+        query = np.array([str(number) for number in numbers], dtype=str)
+        if len(query) == 0 or len(block_numbers) == 0:
+            return []
+        starts = np.searchsorted(block_numbers, query, side="left")
+        ends = np.searchsorted(block_numbers, query, side="right")
+        rows = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            for position in range(start, end):
+                rows.append([int(self.columns["block_id"][position]), str(block_numbers[position]),
+                             _row_id(self.columns["block_current_status_id"][position]),
+                             _row_id(self.columns["block_level_id"][position])])
+        return rows
+
+    def _status_positions(self, pairs):
+        import numpy as np
+
+        pairs = [[int(pair[0]), int(pair[1])] for pair in pairs]
+        if len(pairs) == 0:
+            return []
+        status_keys = self.columns["status_key"]
+        query = pair_keys([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+        starts = np.searchsorted(status_keys, query, side="left")
+        ends = np.searchsorted(status_keys, query, side="right")
+        return [[pair, range(start, end)] for pair, start, end in zip(pairs, starts.tolist(), ends.tolist())]
+
+    # This function returns the BlockStatusId, BlockId and StatusId of the block statuses of the pairs
+    def fetch_block_status(self, pairs):
+        block_status_ids = self.columns["status_block_status_id"]
+        return [[int(block_status_ids[position]), pair[0], pair[1]]
+                for pair, positions in self._status_positions(pairs) for position in positions]
+
+    # This function returns the BlockId, StatusId, BlockStatusId, WKB shape and attributes (field name -> value) of
+    # the (BlockId, StatusId) pairs
+    def fetch_geometries(self, pairs):
+        rows = []
+        for pair, positions in self._status_positions(pairs):
+            for position in positions:
+                start = int(self.columns["status_shape_start"][position])
+                end = int(self.columns["status_shape_end"][position])
+                if end > start:
+                    attributes_start = int(self.columns["status_attributes_start"][position])
+                    attributes_end = int(self.columns["status_attributes_end"][position])
+                    attributes = self.columns["status_attributes_json"][attributes_start:attributes_end].tobytes()
+                    rows.append([pair[0], pair[1], int(self.columns["status_block_status_id"][position]),
+                                 self.columns["status_shape_wkb"][start:end].tobytes(),
+                                 decode_attributes(attributes.decode("utf-8"))])
+        return rows
+
+    # This function returns all rows of the Level table as (LevelId, ElevationDatumId)
+    def read_levels(self):
+        return [list(row) for row in zip(self.columns["level_id"].tolist(),
+                                         self.columns["level_elevation_datum_id"].tolist())]
+
+    # This function returns all rows of the ElevationDatum table as (ElevationDatumId, Name)
+    def read_elevation_datums(self):
+        return [list(row) for row in zip(self.columns["elevation_datum_id"].tolist(),
+                                         self.columns["elevation_datum_name"].tolist())]
+
+    # This function returns the row count of a table and the version of the snapshot, a new export reloads the
+    # lookup cache
+    def fingerprint(self, table_name):
+        return [self.manifest["rows"][table_name], self.version]
+
+
+def _row_id(value):
+    value = int(value)
+    return None if value == null_id else value
+
+
+# This function opens the current snapshot version, the open snapshot is reused while it is the current version
+# Return the snapshot (None when the live source has to be used) and a description of the snapshot or of the reason
+# it cannot be used
+def open_current_snapshot(snapshot_dir, max_age_seconds, snapshot=None):
+    version = current_version(snapshot_dir)
+    if version is None:
+        return None, f"no BlockInventory snapshot in {snapshot_dir}"
+    if snapshot is None or snapshot.version != version:
+        try:
+            snapshot = BlockSnapshot(snapshot_dir, version)
+        except (OSError, ValueError) as error:
+            return None, f"BlockInventory snapshot {version} cannot be read ({error})"
+    age_hours = snapshot.age_seconds() / 3600
+    if snapshot.age_seconds() > max_age_seconds:
+        return None, f"BlockInventory snapshot {version} is {age_hours:.1f} hours old (stale)"
+    return snapshot, f"BlockInventory snapshot {version} ({age_hours:.1f} hours old)"
+
+
+# Source class serving the reads of a live source (block, block status, block geometry or lookup source) from the
+# current snapshot
+# The snapshot is reopened when a new version was exported, the live source is used while the snapshot is missing
+# or older than max_age_seconds and for the blocks and block statuses which are not in the snapshot
+class SnapshotSource:
+    def __init__(self, snapshot_dir, live_source, max_age_seconds=default_max_age_hours * 3600):
+        self.snapshot_dir = snapshot_dir
+        self.live_source = live_source
+        self.max_age_seconds = max_age_seconds
+        # The reads missing from the snapshot go to the live source, they run on as many threads as it allows
+        self.max_workers = getattr(live_source, "max_workers", 1)
+        self.snapshot = None
+        self.live_reads = 0
+
+    # This function returns the current snapshot, None when the live source has to be used
+    def current(self):
+        snapshot, _ = open_current_snapshot(self.snapshot_dir, self.max_age_seconds, self.snapshot)
+        if snapshot is not None:
+            self.snapshot = snapshot
+        return snapshot
+
+    # This function returns all rows whose block number is in the list of numbers
+    def fetch_blocks(self, numbers):
+        snapshot = self.current()
+        if snapshot is None:
+            return self.live_source.fetch_blocks(numbers)
+        rows = snapshot.fetch_blocks(numbers)
+        found = {str(row[1]) for row in rows}
+        missing = [number for number in numbers if str(number) not in found]
+        if len(missing) > 0:
+            self.live_reads += 1
+            rows.extend(self.live_source.fetch_blocks(missing))
+        return rows
+
+    def _fetch_pairs(self, pairs, fetch_name):
+        snapshot = self.current()
+        if snapshot is None:
+            return getattr(self.live_source, fetch_name)(pairs)
+        rows = getattr(snapshot, fetch_name)(pairs)
+        # BlockId and StatusId are the 2nd and 3rd columns of the block status rows, the 1st and 2nd of the shapes
+        columns = (1, 2) if fetch_name == "fetch_block_status" else (0, 1)
+        found = {(int(row[columns[0]]), int(row[columns[1]])) for row in rows}
+        missing = [pair for pair in pairs if (int(pair[0]), int(pair[1])) not in found]
+        if len(missing) > 0:
+            self.live_reads += 1
+            rows.extend(getattr(self.live_source, fetch_name)(missing))
+        return rows
+
+    # This function returns the BlockStatusId, BlockId and StatusId of rows matching a chunk of pairs
+    def fetch_block_status(self, pairs):
+        return self._fetch_pairs(pairs, "fetch_block_status")
+
+    # This function returns the BlockId, StatusId, BlockStatusId, WKB shape and attributes of the (BlockId, StatusId)
+    # pairs
+    def fetch_geometries(self, pairs):
+        return self._fetch_pairs(pairs, "fetch_geometries")
+
+    def read_levels(self):
+        snapshot = self.current()
+        return self.live_source.read_levels() if snapshot is None else snapshot.read_levels()
+
+    def read_elevation_datums(self):
+        snapshot = self.current()
+        return self.live_source.read_elevation_datums() if snapshot is None else snapshot.read_elevation_datums()
+
+    def fingerprint(self, table_name):
+        snapshot = self.current()
+        return self.live_source.fingerprint(table_name) if snapshot is None else snapshot.fingerprint(table_name)
@@ -0,0 +1,82 @@
+# This module checks whether blocks exist in the BlockInventory Block table using as few round trips as possible
+# The data access is pluggable so that the check can run against the SDE connection or a local SQLite copy
+import sqlite3
+from query_builder import chunk_list, default_chunk_size, in_predicate
+
+
+# Fields returned for every matched block (same order as the block array used by BlastClearance.py)
+block_fields = ["BlockId", "Number", "CurrentStatusID", "LevelId"]
+
+
+# Data access class reading blocks from the BlockInventory SDE connection with arcpy
+class ArcpyBlockSource:
+    def __init__(self, sde_block_table, number_field="Number", chunk_size=default_chunk_size):
+        self.sde_block_table = sde_block_table
+        self.number_field = number_field
+        self.chunk_size = chunk_size
+
+    # This function returns all rows whose block number is in the list of numbers
+    def fetch_blocks(self, numbers):
+        import arcpy
+
+        rows = []
+        for chunk in chunk_list(numbers, self.chunk_size):
+            where_clause, _ = in_predicate(self.number_field, [str(number) for number in chunk],
+                                           parameterised=False)
+            with arcpy.da.SearchCursor(self.sde_block_table, block_fields, where_clause) as cursor:
+                for row in cursor:
+                    rows.append(list(row))
+        return rows
+
+
+# Data access class reading blocks from a SQLite stand-in for the BlockInventory schema
+class SqliteBlockSource:
+    def __init__(self, connection, table_name="Block", chunk_size=default_chunk_size):
+        if isinstance(connection, str):
+            connection = sqlite3.connect(connection)
+        self.connection = connection
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+
+    # This function returns all rows whose block number is in the list of numbers
+    def fetch_blocks(self, numbers):
+        rows = []
+        for chunk in chunk_list(numbers, self.chunk_size):
+            predicate, parameters = in_predicate("Number", [str(number) for number in chunk])
+            query = f"SELECT {', '.join(block_fields)} FROM {self.table_name} WHERE {predicate}"
+            for row in self.connection.execute(query, parameters):
+                rows.append(list(row))
+        return rows
+
+
+# This function checks a list of block numbers against the Block table with batched queries
+# Return the matched rows (in the order the blocks were provided) and the list of missing block numbers
+def validate_blocks(block_list_input, block_source):
+    # Remove duplicate block numbers while keeping the order provided by the user
+    numbers = list(dict.fromkeys(str(block) for block in block_list_input))
+
+    rows_by_number = {}
+    for row in block_source.fetch_blocks(numbers):
+        rows_by_number.setdefault(str(row[1]), row)
+
+    missing_numbers = set(numbers) - set(rows_by_number)
+    missing_list = [number for number in numbers if number in missing_numbers]
+    block_array = [rows_by_number[number] for number in numbers if number in rows_by_number]
+
+    return block_array, missing_list
+
+
+# This function checks several block lists (e.g. the blasts of a batch) with one batched validation
+# Return a list with the block array and the list of missing block numbers of every block list
+def validate_block_lists(block_lists_input, block_source):
+    all_numbers = [str(block) for block_list_input in block_lists_input for block in block_list_input]
+    block_array, missing_list = validate_blocks(all_numbers, block_source)
+    rows_by_number = {str(row[1]): row for row in block_array}
+    missing_numbers = set(missing_list)
+
+    results = []
+    for block_list_input in block_lists_input:
+        numbers = list(dict.fromkeys(str(block) for block in block_list_input))
+        results.append([[rows_by_number[number] for number in numbers if number in rows_by_number],
+                        [number for number in numbers if number in missing_numbers]])
+    return results
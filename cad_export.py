@@ -0,0 +1,123 @@
+# This module runs the copies of the CAD files to the network drive on a worker pool
+# arcpy is not thread-safe, so the CAD export itself (and every read of the exported features) runs on the thread
+# of the run. The copies of the exported files continue on the pool while the run appends its features and, in batch
+# runs, processes the next blasts. Copies of the reference file of a mine are serialised with a per-mine lock.
+# With an artefact store (cad_store.py) the files are stored once and linked into the blast folders instead of copied.
+# With an upload queue (upload_queue.py) the files are staged locally and uploaded to the network drive in the
+# background, the job is done once its files are staged.
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from file_lock import FileLock
+
+
+default_max_workers = 4
+
+
+# This function replaces a file with a copy of another file while holding the lock of the destination
+# Shared files (the reference file of a mine) are written by one run at a time and are never seen half written
+def publish_file(source_file, destination_file):
+    temp_file = f"{destination_file}.{uuid.uuid4().hex}.tmp"
+    with FileLock(f"{destination_file}.lock"):
+        try:
+            shutil.copyfile(source_file, temp_file)
+            os.replace(temp_file, destination_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+# Job class tracking the export and copies of one blast
+class CadJob:
+    def __init__(self, name):
+        self.name = name
+        self.export_error = None
+        self.copied_files = []
+        self.errors = []
+        self.future = None
+
+
+# Pool class running CAD jobs and collecting the errors of every file
+class CadExportPool:
+    def __init__(self, max_workers=default_max_workers, artefact_store=None, upload_queue=None):
+        self.artefact_store = artefact_store
+        self.upload_queue = upload_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cad_export")
+        self.jobs = []
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, lock_key):
+        with self._locks_lock:
+            return self._locks.setdefault(str(lock_key).lower(), threading.Lock())
+
+    # This function exports the CAD files of a blast and submits the file copies that follow the export
+    # export_function runs on the calling thread (it uses arcpy), the exported features can be deleted when it returns
+    # The locked copies (e.g. to the shared reference file of the mine, lock_key) are done under the lock of the mine,
+    # the other copies run afterwards. The temp_files (the run's own export) are deleted once the copies are done
+    # copies are lists of [source file, destination file] or [source file, destination file, "copy"] for files which
+    # must be plain copies (not linked to the artefact store)
+    # Return the job
+    def submit(self, name, lock_key, export_function, locked_copies, copies, temp_files=()):
+        job = CadJob(name)
+        try:
+            export_function()
+        except Exception as error:
+            job.export_error = error
+            job.errors.append([str(lock_key), f"Export failed: {error}"])
+
+        def run():
+            if job.export_error is None:
+                with self._lock_for(lock_key):
+                    self._copy_files(job, locked_copies, snapshot=True)
+                self._copy_files(job, copies)
+            for temp_file in temp_files:
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+        job.future = self.executor.submit(run)
+        self.jobs.append(job)
+        return job
+
+    # This function copies files one by one, a failed copy is recorded and does not stop the other copies
+    # With an upload queue the files are staged instead, snapshot=True takes a local copy of files which are
+    # overwritten before the upload
+    def _copy_files(self, job, copies, snapshot=False):
+        for source_file, destination_file, *mode in copies:
+            mode = mode[0] if len(mode) > 0 else ("store" if self.artefact_store is not None else "copy")
+            try:
+                if self.upload_queue is not None:
+                    self.upload_queue.stage_file(source_file, destination_file, mode, snapshot)
+                elif mode == "store":
+                    self.artefact_store.materialise(source_file, destination_file)
+                else:
+                    publish_file(source_file, destination_file)
+                job.copied_files.append(destination_file)
+            except Exception as error:
+                job.errors.append([destination_file, f"Copy failed: {error}"])
+
+    # This function waits for all submitted jobs (completion barrier)
+    # Return a list of [job name, file, error] lists for every failed export or copy
+    def wait(self):
+        failures = []
+        for job in self.jobs:
+            try:
+                job.future.result()
+            except Exception as error:
+                job.errors.append(["", f"CAD job failed: {error}"])
+            for file_name, error in job.errors:
+                failures.append([job.name, file_name, error])
+        self.jobs = []
+        return failures
+
+    # This function waits for all jobs and stops the worker threads
+    # Return the failures of the remaining jobs
+    def shutdown(self):
+        failures = self.wait()
+        self.executor.shutdown(wait=True)
+        return failures
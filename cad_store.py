@@ -0,0 +1,154 @@
+# This module keeps the CAD files of the blast folders in a content-addressed artefact store on the network drive
+# Every file is stored once as a read-only blob named by its SHA-256 hash. The files of a blast folder are hard
+# links to the blobs where the file system allows it, otherwise copies of the blob. The master DGN of a mine is
+# the same for most blasts, so a blast folder costs a few directory entries instead of megabytes of copies.
+# The reference export of a blast is keyed by a hash of its block, zone and road geometry: when an earlier run
+# exported the same geometry, its blob is reused and ExportCAD is skipped.
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import uuid
+
+
+hash_chunk_size = 1024 * 1024
+
+
+# This function returns the SHA-256 hash of a file
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(hash_chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Store class holding the blobs (blobs/<first two characters>/<hash><extension>) and the export keys
+# (exports/<key>, holding the name of the blob of the export)
+class ArtefactStore:
+    def __init__(self, store_dir, hard_links=True):
+        self.store_dir = store_dir
+        self.hard_links = hard_links
+        self.blob_dir = os.path.join(store_dir, "blobs")
+        self.export_dir = os.path.join(store_dir, "exports")
+        self.bytes_written = 0
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    # This function returns the hash of a source file, the hash is kept while the size and time of the file are the
+    # same so the master DGN files are only read once per process
+    def digest(self, file_path):
+        file_stat = os.stat(file_path)
+        signature = (file_stat.st_size, file_stat.st_mtime_ns)
+        with self._lock:
+            cached = self._digests.get(os.path.abspath(file_path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = file_digest(file_path)
+        with self._lock:
+            self._digests[os.path.abspath(file_path)] = (signature, digest)
+        return digest
+
+    def _blob_path(self, blob_name):
+        return os.path.join(self.blob_dir, blob_name[:2], blob_name)
+
+    # This function adds a file to the store, a blob which already exists is not written again
+    # Return the name of the blob
+    def put(self, source_file):
+        blob_name = self.digest(source_file) + os.path.splitext(source_file)[1].lower()
+        blob_path = self._blob_path(blob_name)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(source_file, temp_path)
+            os.chmod(temp_path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+            try:
+                os.replace(temp_path, blob_path)
+            except OSError:
+                # Another process stored the same blob first (Windows does not replace read-only files)
+                _remove_file(temp_path)
+                if not os.path.exists(blob_path):
+                    raise
+            with self._lock:
+                self.bytes_written += os.path.getsize(blob_path)
+        return blob_name
+
+    # This function writes a blob to a file of a blast folder, as a hard link where possible, otherwise as a copy
+    # Return "link" or "copy"
+    def materialise_blob(self, blob_name, destination_file):
+        blob_path = self._blob_path(blob_name)
+        temp_path = f"{destination_file}.{uuid.uuid4().hex}.tmp"
+        method = "copy"
+        if self.hard_links:
+            try:
+                os.link(blob_path, temp_path)
+                method = "link"
+            except OSError:
+                pass
+        if method == "copy":
+            shutil.copyfile(blob_path, temp_path)
+            with self._lock:
+                self.bytes_written += os.path.getsize(blob_path)
+        try:
+            os.replace(temp_path, destination_file)
+        except OSError:
+            _remove_file(temp_path)
+            raise
+        return method
+
+    # This function stores a file and writes it to a blast folder (the copy function of the CAD export pool)
+    # Return "link" or "copy"
+    def materialise(self, source_file, destination_file):
+        return self.materialise_blob(self.put(source_file), destination_file)
+
+    # This function returns the blob of an earlier export with the same key, None if there is none
+    def export_blob(self, export_key):
+        try:
+            with open(os.path.join(self.export_dir, export_key)) as file:
+                blob_name = file.read().strip()
+        except OSError:
+            return None
+        return blob_name if os.path.exists(self._blob_path(blob_name)) else None
+
+    # This function stores an exported file and records its export key
+    # Return the name of the blob
+    def record_export(self, export_key, exported_file):
+        blob_name = self.put(exported_file)
+        os.makedirs(self.export_dir, exist_ok=True)
+        temp_path = os.path.join(self.export_dir, f"{export_key}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w") as file:
+            file.write(blob_name)
+        os.replace(temp_path, os.path.join(self.export_dir, export_key))
+        return blob_name
+
+    # This function restores the output file of an earlier export with the same key
+    # The output file is rewritten (copied, it is overwritten by the next export) only when its content differs
+    # Return True if the export can be skipped
+    def restore_export(self, export_key, output_file):
+        blob_name = self.export_blob(export_key)
+        if blob_name is None:
+            return False
+        if not os.path.exists(output_file) or self.digest(output_file) != blob_name.split(".")[0]:
+            shutil.copyfile(self._blob_path(blob_name), output_file)
+            with self._lock:
+                self.bytes_written += os.path.getsize(output_file)
+        return True
+
+
+def _remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+# This function returns the export key of a set of features (an iterable of byte strings, e.g. the level and WKB of
+# every row of every exported feature) and the export settings (spatial reference, seed file hash)
+def export_key(rows, *settings):
+    digest = hashlib.sha256()
+    for value in settings:
+        digest.update(str(value).encode("utf-8") + b"\0")
+    for row in rows:
+        digest.update(len(row).to_bytes(8, "little") + row)
+    return digest.hexdigest()
@@ -0,0 +1,191 @@
+# This module finds planned blasts whose clearance zones overlap, or which close the same roads, in the same shift
+# The index keeps the clearance zones in a grid of (time bucket, cell) keys: a time bucket is one conflict window
+# long and a cell is cell_size meters wide, so a check only looks at the zones of the neighbouring buckets and the
+# cells under the new zones, however many years of history were added. Zones whose bounding boxes overlap are
+# tested exactly with shapely. Roads are keyed by (time bucket, road ID).
+# Blasts are added incrementally as they are appended to the masters, the index is loaded from the masters at the
+# start of a run (the hot masters hold far more than one conflict window, see master_archive.py).
+import math
+import sqlite3
+from datetime import datetime
+
+from master_archive import date_literal
+
+
+# Blasts within this number of hours of each other are in the same shift
+default_window_hours = 12
+default_cell_size = 1000.0
+road_id_field = "SourceObjectId"
+
+
+# Index class holding the clearance zones and closed roads of planned blasts
+class ConflictIndex:
+    def __init__(self, window_hours=default_window_hours, cell_size=default_cell_size):
+        self.window_seconds = float(window_hours) * 3600.0
+        self.cell_size = float(cell_size)
+        self.zones = []
+        self.zone_cells = {}
+        self.road_buckets = {}
+        self.blasts = set()
+
+    def _time_bucket(self, date_time):
+        return math.floor(date_time.timestamp() / self.window_seconds)
+
+    def _cells(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        for cell_x in range(math.floor(min_x / self.cell_size), math.floor(max_x / self.cell_size) + 1):
+            for cell_y in range(math.floor(min_y / self.cell_size), math.floor(max_y / self.cell_size) + 1):
+                yield cell_x, cell_y
+
+    # This function adds the clearance zones and roads of a blast
+    # zones is a list of [ClearanceType, WKB shape, (xmin, ymin, xmax, ymax)] lists, the bounds may be None
+    def add_blast(self, blast_id, date_time, zones, road_ids=()):
+        blast_id = str(blast_id)
+        self.blasts.add(blast_id)
+        time_bucket = self._time_bucket(date_time)
+        for clearance_type, shape_wkb, bounds in zones:
+            bounds = tuple(bounds) if bounds is not None else _wkb_bounds(shape_wkb)
+            self.zones.append([blast_id, date_time, clearance_type, shape_wkb, bounds, None])
+            for cell in self._cells(bounds):
+                self.zone_cells.setdefault((time_bucket, *cell), []).append(len(self.zones) - 1)
+        for road_id in set(road_ids):
+            self.road_buckets.setdefault((time_bucket, road_id), []).append([blast_id, date_time])
+
+    # This function finds the planned blasts in the same shift as a new blast that overlap its zones or roads
+    # The new blast itself (blast_id) is ignored, so a blast can be checked after it was added
+    # Return a list of [blast ID, date time, existing ClearanceType, new ClearanceType] zone conflicts and a
+    # dictionary of blast ID -> sorted list of shared road IDs
+    def find_conflicts(self, blast_id, date_time, zones, road_ids=()):
+        blast_id = str(blast_id)
+        time_bucket = self._time_bucket(date_time)
+        zone_conflicts = {}
+        for clearance_type, shape_wkb, bounds in zones:
+            bounds = tuple(bounds) if bounds is not None else _wkb_bounds(shape_wkb)
+            new_zone = [shape_wkb, None]
+            candidates = set()
+            for bucket in (time_bucket - 1, time_bucket, time_bucket + 1):
+                for cell in self._cells(bounds):
+                    candidates.update(self.zone_cells.get((bucket, *cell), []))
+            for zone_index in sorted(candidates):
+                other_blast_id, other_date_time, other_type, other_wkb, other_bounds, _ = self.zones[zone_index]
+                key = (other_blast_id, other_type, clearance_type)
+                if (other_blast_id == blast_id or key in zone_conflicts or
+                        abs((other_date_time - date_time).total_seconds()) > self.window_seconds or
+                        not _boxes_overlap(bounds, other_bounds) or
+                        not self._overlaps(zone_index, new_zone)):
+                    continue
+                zone_conflicts[key] = [other_blast_id, other_date_time, other_type, clearance_type]
+
+        road_conflicts = {}
+        for road_id in set(road_ids):
+            for bucket in (time_bucket - 1, time_bucket, time_bucket + 1):
+                for other_blast_id, other_date_time in self.road_buckets.get((bucket, road_id), []):
+                    if (other_blast_id != blast_id and
+                            abs((other_date_time - date_time).total_seconds()) <= self.window_seconds):
+                        road_conflicts.setdefault(other_blast_id, set()).add(road_id)
+        return (sorted(zone_conflicts.values(), key=lambda row: (row[1], row[0])),
+                {other_blast_id: sorted(shared) for other_blast_id, shared in sorted(road_conflicts.items())})
+
+    # This function tests whether the interiors of an indexed zone and a new zone ([WKB, parsed shape]) overlap
+    # The shapes are only parsed once their bounding boxes overlap
+    def _overlaps(self, zone_index, new_zone):
+        zone = self.zones[zone_index]
+        if new_zone[0] is None or zone[3] is None:
+            return True
+        import shapely
+
+        if zone[5] is None:
+            zone[5] = shapely.from_wkb(zone[3])
+            shapely.prepare(zone[5])
+        if new_zone[1] is None:
+            new_zone[1] = shapely.from_wkb(new_zone[0])
+        return zone[5].intersects(new_zone[1]) and not zone[5].touches(new_zone[1])
+
+    # This function loads the zones and roads of the blasts between start and end from a conflict source
+    # Return the number of blasts added
+    def load(self, conflict_source, start, end):
+        zones_by_blast = {}
+        for blast_id, date_time, clearance_type, shape_wkb, bounds in conflict_source.read_zones(start, end):
+            zones_by_blast.setdefault((str(blast_id), date_time), []).append([clearance_type, shape_wkb, bounds])
+        roads_by_blast = {}
+        for blast_id, date_time, road_id in conflict_source.read_roads(start, end):
+            roads_by_blast.setdefault((str(blast_id), date_time), []).append(road_id)
+        added = 0
+        for blast_id, date_time in set(zones_by_blast) | set(roads_by_blast):
+            if blast_id not in self.blasts:
+                self.add_blast(blast_id, date_time, zones_by_blast.get((blast_id, date_time), []),
+                               roads_by_blast.get((blast_id, date_time), []))
+                added += 1
+        return added
+
+
+def _boxes_overlap(box, other_box):
+    return box[0] <= other_box[2] and box[2] >= other_box[0] and box[1] <= other_box[3] and box[3] >= other_box[1]
+
+
+def _wkb_bounds(shape_wkb):
+    import shapely
+
+    return tuple(shapely.from_wkb(shape_wkb).bounds)
+
+
+# Data access class reading the clearance zones and roads of planned blasts from the master feature classes
+class ArcpyConflictSource:
+    def __init__(self, master_clearance_fc, master_roads_fc):
+        self.master_clearance_fc = master_clearance_fc
+        self.master_roads_fc = master_roads_fc
+
+    @staticmethod
+    def _where_clause(start, end):
+        return f"DateTime >= {date_literal(start)} AND DateTime <= {date_literal(end)}"
+
+    # This function returns the BlastClearId, DateTime, ClearanceType, WKB shape and bounds of the zones
+    def read_zones(self, start, end):
+        import arcpy
+
+        fields = ["BlastClearId", "DateTime", "ClearanceType", "SHAPE@WKB", "SHAPE@"]
+        with arcpy.da.SearchCursor(self.master_clearance_fc, fields, self._where_clause(start, end)) as cursor:
+            for blast_id, date_time, clearance_type, shape_wkb, shape in cursor:
+                if shape is not None:
+                    extent = shape.extent
+                    yield [blast_id, date_time, clearance_type, bytes(shape_wkb),
+                           (extent.XMin, extent.YMin, extent.XMax, extent.YMax)]
+
+    # This function returns the BlastClearId, DateTime and road ID of the roads
+    def read_roads(self, start, end):
+        import arcpy
+
+        if len(arcpy.ListFields(self.master_roads_fc, road_id_field)) == 0:
+            return
+        fields = ["BlastClearId", "DateTime", road_id_field]
+        with arcpy.da.SearchCursor(self.master_roads_fc, fields, self._where_clause(start, end)) as cursor:
+            for row in cursor:
+                if row[2] is not None:
+                    yield list(row)
+
+
+# Data access class reading the clearance zones (WKB in the Shape column) and roads from a SQLite stand-in
+class SqliteConflictSource:
+    def __init__(self, database_path, clearance_table="Clearance_Master", roads_table="Roads_Master",
+                 road_id_column=road_id_field):
+        self.database_path = database_path
+        self.clearance_table = clearance_table
+        self.roads_table = roads_table
+        self.road_id_column = road_id_column
+
+    def _query(self, query, start, end):
+        connection = sqlite3.connect(self.database_path)
+        try:
+            return connection.execute(query, [start.isoformat(sep=" "), end.isoformat(sep=" ")]).fetchall()
+        finally:
+            connection.close()
+
+    def read_zones(self, start, end):
+        rows = self._query(f"SELECT BlastClearId, DateTime, ClearanceType, Shape FROM {self.clearance_table} "
+                           "WHERE DateTime >= ? AND DateTime <= ?", start, end)
+        return [[row[0], datetime.fromisoformat(row[1]), row[2], bytes(row[3]), None] for row in rows]
+
+    def read_roads(self, start, end):
+        rows = self._query(f"SELECT BlastClearId, DateTime, {self.road_id_column} FROM {self.roads_table} "
+                           "WHERE DateTime >= ? AND DateTime <= ?", start, end)
+        return [[row[0], datetime.fromisoformat(row[1]), row[2]] for row in rows if row[2] is not None]
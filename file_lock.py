@@ -0,0 +1,121 @@
+# This module provides a lock file that works across processes and machines sharing a network folder
+# The lock is taken by creating the lock file exclusively, a lock file left behind by a crashed process is removed
+# once it is older than stale_seconds. Only the process holding the break file (also created exclusively) removes a
+# stale lock, after checking again that it is still stale, so a lock taken in the meantime is never removed.
+# While the lock is held a background thread refreshes the modification time of the lock file, so a lock held for
+# longer than stale_seconds (e.g. a long archive run) is not taken for the lock of a crashed process.
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+
+default_timeout = 120
+default_stale_seconds = 600
+
+
+# Lock class held with a context manager: with FileLock(path): ...
+class FileLock:
+    def __init__(self, lock_file, timeout=default_timeout, poll_seconds=0.05, stale_seconds=default_stale_seconds):
+        self.lock_file = lock_file
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.locked = False
+        self._stop_heartbeat = None
+        self._heartbeat_thread = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+    # This function waits until the lock file could be created
+    # Raise TimeoutError if the lock is held by another process for longer than the timeout
+    def acquire(self):
+        start = time.monotonic()
+        while True:
+            try:
+                handle = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self._remove_stale_lock()
+                if self.timeout is not None and time.monotonic() - start > self.timeout:
+                    raise TimeoutError(f"{self.lock_file} is locked by {self.owner()}")
+                time.sleep(self.poll_seconds)
+                continue
+            with os.fdopen(handle, "w") as file:
+                file.write(f"{socket.gethostname()} {os.getpid()} {datetime.now().isoformat(timespec='seconds')}")
+            self.locked = True
+            self._start_heartbeat()
+            return self
+
+    def release(self):
+        if self.locked:
+            self.locked = False
+            self._stop_heartbeat.set()
+            self._heartbeat_thread.join()
+            try:
+                os.remove(self.lock_file)
+            except FileNotFoundError:
+                pass
+
+    # This function starts the thread refreshing the modification time of the lock file four times per stale_seconds
+    def _start_heartbeat(self):
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, args=(self._stop_heartbeat,),
+                                                  name="file_lock_heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self, stop_event):
+        while not stop_event.wait(self.stale_seconds / 4):
+            try:
+                os.utime(self.lock_file)
+            except OSError:
+                # The share is unavailable for a moment, the next beat tries again
+                pass
+
+    # This function returns the host, process and time written to the lock file by the current owner
+    def owner(self):
+        try:
+            with open(self.lock_file) as file:
+                return file.read().strip()
+        except OSError:
+            return "unknown"
+
+    def _remove_stale_lock(self):
+        if not _is_stale(self.lock_file, self.stale_seconds):
+            return
+        break_file = self.lock_file + ".break"
+        try:
+            os.close(os.open(break_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # Another process is removing the stale lock, or crashed while removing it
+            if _is_stale(break_file, self.stale_seconds):
+                _remove_file(break_file)
+            return
+        except OSError:
+            return
+        try:
+            # The lock may have been removed and taken again since it was checked
+            if _is_stale(self.lock_file, self.stale_seconds):
+                _remove_file(self.lock_file)
+        finally:
+            _remove_file(break_file)
+
+
+def _is_stale(path, stale_seconds):
+    try:
+        return time.time() - os.path.getmtime(path) > stale_seconds
+    except OSError:
+        return False
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
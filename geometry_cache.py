@@ -0,0 +1,219 @@
+# This module keeps a local cache of block shapes keyed by (BlockId, StatusId)
+# A block status shape never changes once it is written, so the shapes of known status versions are read from a
+# SQLite file on disk instead of the BlockInventory SDE connection. Only the missing shapes are fetched from the
+# source. Shapes are stored once per content hash (WKB), and the least recently used block statuses are evicted
+# when the cache grows beyond its size cap.
+# The other BlockStatus columns (e.g. Tonnes) are cached with the shape, a re-plan of cached blocks does not read
+# the BlockStatus table at all.
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from query_builder import chunk_list, default_chunk_size, pair_predicate
+
+
+# Default size cap of the cached shapes (256 MB)
+default_max_bytes = 256 * 1024 * 1024
+# Columns of a block status which are not cached as attributes
+status_key_fields = ["BlockStatusId", "BlockId", "StatusId", "Shape"]
+
+
+# This function returns the names of the attribute fields of a BlockStatus table or layer (arcpy fields)
+def attribute_field_names(fields):
+    key_fields = [field.lower() for field in status_key_fields]
+    return [field.name for field in fields
+            if field.type not in ("OID", "Geometry", "Blob", "Raster") and field.name.lower() not in key_fields]
+
+
+# This function encodes the attributes of a block status (field name -> value) as JSON text, dates are written as
+# {"$datetime": ISO date}
+def encode_attributes(attributes):
+    return json.dumps(attributes, sort_keys=True, default=_encode_value)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    return str(value)
+
+
+# This function decodes the JSON text of encode_attributes
+# Return a dictionary of field name -> value
+def decode_attributes(text):
+    return json.loads(text, object_hook=_decode_value)
+
+
+def _decode_value(value):
+    if list(value) == ["$datetime"]:
+        return datetime.fromisoformat(value["$datetime"])
+    return value
+
+
+# Data access class reading block shapes through a query layer on the BlockInventory SDE connection
+class ArcpyBlockGeometrySource:
+    def __init__(self, sde_connection, spatial_reference, table_name="BlockStatus", chunk_size=default_chunk_size):
+        self.sde_connection = sde_connection
+        self.spatial_reference = spatial_reference
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+
+    # This function returns the BlockId, StatusId, BlockStatusId, WKB shape and attributes (field name -> value) of
+    # the (BlockId, StatusId) pairs
+    def fetch_geometries(self, pairs):
+        import arcpy
+
+        rows = []
+        for chunk in chunk_list(list(pairs), self.chunk_size):
+            # SQL Server does not support row values, the cross product predicate can return additional rows
+            predicate, _ = pair_predicate(chunk, parameterised=False, row_values=False)
+            query_layer = arcpy.MakeQueryLayer_management(input_database=self.sde_connection,
+                                                          out_layer_name="CacheBlocks",
+                                                          query=f"select * from {self.table_name} where {predicate}",
+                                                          oid_fields="BlockStatusId",
+                                                          shape_type="POLYGON",
+                                                          spatial_reference=self.spatial_reference)[0]
+            attribute_fields = attribute_field_names(arcpy.ListFields(query_layer))
+            with arcpy.da.SearchCursor(query_layer, ["BlockId", "StatusId", "BlockStatusId", "SHAPE@WKB"]
+                                       + attribute_fields) as cursor:
+                rows.extend([row[0], row[1], row[2], bytes(row[3]), dict(zip(attribute_fields, row[4:]))]
+                            for row in cursor if row[3] is not None)
+            arcpy.Delete_management(query_layer)
+        return rows
+
+
+# Data access class reading block shapes (WKB in the Shape column) from a SQLite stand-in
+class SqliteBlockGeometrySource:
+    def __init__(self, database_path, table_name="BlockStatus", chunk_size=default_chunk_size):
+        self.database_path = database_path
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+
+    # This function returns the BlockId, StatusId, BlockStatusId, WKB shape and attributes (field name -> value) of
+    # the (BlockId, StatusId) pairs
+    def fetch_geometries(self, pairs):
+        key_fields = [field.lower() for field in status_key_fields]
+        connection = sqlite3.connect(self.database_path)
+        try:
+            rows = []
+            for chunk in chunk_list(list(pairs), self.chunk_size):
+                predicate, parameters = pair_predicate(chunk)
+                cursor = connection.execute(f"SELECT * FROM {self.table_name} WHERE {predicate}", parameters)
+                columns = [column[0] for column in cursor.description]
+                for values in cursor:
+                    row = dict(zip(columns, values))
+                    rows.append([row["BlockId"], row["StatusId"], row["BlockStatusId"], bytes(row["Shape"]),
+                                 {column: value for column, value in row.items() if column.lower() not in key_fields}])
+            return rows
+        finally:
+            connection.close()
+
+
+# Cache class serving block shapes from disk and fetching the misses from the geometry source
+class BlockGeometryCache:
+    def __init__(self, cache_path, geometry_source, max_bytes=default_max_bytes):
+        self.cache_path = cache_path
+        self.geometry_source = geometry_source
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS BlockShape (BlockId INTEGER, StatusId INTEGER, "
+                                "BlockStatusId INTEGER, Digest TEXT, LastUsed REAL, Attributes TEXT, "
+                                "PRIMARY KEY (BlockId, StatusId))")
+        # Caches written before the attributes were cached have no Attributes column, their rows are misses
+        if "Attributes" not in [row[1] for row in self.connection.execute("PRAGMA table_info(BlockShape)")]:
+            self.connection.execute("ALTER TABLE BlockShape ADD COLUMN Attributes TEXT")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS Shape (Digest TEXT PRIMARY KEY, Wkb BLOB, Size INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS BlockShape_LastUsed ON BlockShape (LastUsed)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    # This function returns the shapes of (BlockId, StatusId) pairs, missing shapes are fetched and cached
+    # Return a dictionary of (BlockId, StatusId) -> [BlockStatusId, WKB, attributes], pairs without a shape are left
+    # out
+    def geometries(self, pairs):
+        pairs = list(dict.fromkeys((int(pair[0]), int(pair[1])) for pair in pairs))
+        with self._lock:
+            shapes = self._read(pairs)
+            self.hits += len(shapes)
+            missing_pairs = [pair for pair in pairs if pair not in shapes]
+            self.misses += len(missing_pairs)
+
+            if len(missing_pairs) > 0:
+                # Only keep the exact pairs, the source can return additional rows
+                wanted_pairs = set(missing_pairs)
+                fetched = {(int(row[0]), int(row[1])): [int(row[2]), bytes(row[3]), row[4]]
+                           for row in self.geometry_source.fetch_geometries(missing_pairs)
+                           if (int(row[0]), int(row[1])) in wanted_pairs}
+                self._write(fetched)
+                shapes.update(fetched)
+                self._evict()
+
+            self._touch(list(shapes))
+            self.connection.commit()
+        return shapes
+
+    def _read(self, pairs):
+        shapes = {}
+        for chunk in chunk_list(pairs, default_chunk_size):
+            predicate, parameters = pair_predicate(chunk, fields=("BlockShape.BlockId", "BlockShape.StatusId"))
+            query = ("SELECT BlockShape.BlockId, BlockShape.StatusId, BlockShape.BlockStatusId, Shape.Wkb, "
+                     "BlockShape.Attributes FROM BlockShape JOIN Shape ON Shape.Digest = BlockShape.Digest "
+                     f"WHERE BlockShape.Attributes IS NOT NULL AND ({predicate})")
+            for block_id, status_id, block_status_id, shape_wkb, attributes in self.connection.execute(query,
+                                                                                                      parameters):
+                shapes[(block_id, status_id)] = [block_status_id, bytes(shape_wkb), decode_attributes(attributes)]
+        return shapes
+
+    def _write(self, shapes):
+        now = time.time()
+        shape_rows = {}
+        block_rows = []
+        for (block_id, status_id), (block_status_id, shape_wkb, attributes) in shapes.items():
+            digest = hashlib.sha1(shape_wkb).hexdigest()
+            shape_rows[digest] = [digest, shape_wkb, len(shape_wkb)]
+            block_rows.append([block_id, status_id, block_status_id, digest, now, encode_attributes(attributes)])
+        self.connection.executemany("INSERT OR IGNORE INTO Shape VALUES (?, ?, ?)", list(shape_rows.values()))
+        self.connection.executemany("INSERT OR REPLACE INTO BlockShape (BlockId, StatusId, BlockStatusId, Digest, "
+                                    "LastUsed, Attributes) VALUES (?, ?, ?, ?, ?, ?)", block_rows)
+
+    def _touch(self, pairs):
+        now = time.time()
+        self.connection.executemany("UPDATE BlockShape SET LastUsed = ? WHERE BlockId = ? AND StatusId = ?",
+                                    [[now, pair[0], pair[1]] for pair in pairs])
+
+    # This function returns the size of the cached shapes in bytes
+    def size(self):
+        return self.connection.execute("SELECT COALESCE(SUM(Size), 0) FROM Shape").fetchone()[0]
+
+    # This function removes the least recently used block statuses until the shapes fit in the size cap
+    # Shapes used by the current request were just written or touched and are evicted last
+    def _evict(self):
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        rows = self.connection.execute("SELECT BlockShape.BlockId, BlockShape.StatusId, Shape.Size "
+                                       "FROM BlockShape JOIN Shape ON Shape.Digest = BlockShape.Digest "
+                                       "ORDER BY BlockShape.LastUsed").fetchall()
+        evicted = []
+        for block_id, status_id, shape_size in rows:
+            if excess <= 0:
+                break
+            evicted.append([block_id, status_id])
+            excess -= shape_size
+        self.connection.executemany("DELETE FROM BlockShape WHERE BlockId = ? AND StatusId = ?", evicted)
+        self.connection.execute("DELETE FROM Shape WHERE Digest NOT IN (SELECT Digest FROM BlockShape)")
+
+    # This function removes all cached shapes
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM BlockShape")
+            self.connection.execute("DELETE FROM Shape")
+            self.connection.commit()
+            self.connection.execute("VACUUM")
@@ -0,0 +1,169 @@
+# This module caches the BlockInventory Level and ElevationDatum reference tables
+# The tables rarely change, so the LevelId -> ElevationDatumId -> mine Name lookup is kept in memory and on disk
+# The cache is only reloaded when the TTL expired AND the row count or latest edit date of a source table changed,
+# or when a level is not found in the cached tables
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+
+# Default time after which the source tables are checked for changes (one day)
+default_ttl_seconds = 24 * 60 * 60
+
+
+# Data access class reading the reference tables from the BlockInventory SDE connection with arcpy
+class ArcpyLookupSource:
+    def __init__(self, sde_level_table, sde_elevation_datum_table, edit_date_field="last_edited_date"):
+        self.tables = {"Level": sde_level_table, "ElevationDatum": sde_elevation_datum_table}
+        self.edit_date_field = edit_date_field
+
+    # This function returns all rows of the Level table as (LevelId, ElevationDatumId)
+    def read_levels(self):
+        import arcpy
+
+        with arcpy.da.SearchCursor(self.tables["Level"], ["LevelId", "ElevationDatumId"]) as cursor:
+            return [list(row) for row in cursor]
+
+    # This function returns all rows of the ElevationDatum table as (ElevationDatumId, Name)
+    def read_elevation_datums(self):
+        import arcpy
+
+        with arcpy.da.SearchCursor(self.tables["ElevationDatum"], ["ElevationDatumId", "Name"]) as cursor:
+            return [list(row) for row in cursor]
+
+    # This function returns the row count and the latest edit date of a table
+    # The edit date is None when the table does not have the edit date field
+    def fingerprint(self, table_name):
+        import arcpy
+
+        table = self.tables[table_name]
+        row_count = int(arcpy.management.GetCount(table)[0])
+        max_edit_date = None
+        if self.edit_date_field in [field.name for field in arcpy.ListFields(table)]:
+            with arcpy.da.SearchCursor(table, [self.edit_date_field],
+                                       sql_clause=(None, f"ORDER BY {self.edit_date_field} DESC")) as cursor:
+                for row in cursor:
+                    max_edit_date = str(row[0]) if row[0] is not None else None
+                    break
+        return [row_count, max_edit_date]
+
+
+# Data access class reading the reference tables from a SQLite stand-in for the BlockInventory schema
+class SqliteLookupSource:
+    def __init__(self, database_path, edit_date_field="last_edited_date"):
+        self.database_path = database_path
+        self.edit_date_field = edit_date_field
+
+    def _query(self, query):
+        connection = sqlite3.connect(self.database_path)
+        try:
+            return [list(row) for row in connection.execute(query)]
+        finally:
+            connection.close()
+
+    # This function returns all rows of the Level table as (LevelId, ElevationDatumId)
+    def read_levels(self):
+        return self._query("SELECT LevelId, ElevationDatumId FROM Level")
+
+    # This function returns all rows of the ElevationDatum table as (ElevationDatumId, Name)
+    def read_elevation_datums(self):
+        return self._query("SELECT ElevationDatumId, Name FROM ElevationDatum")
+
+    # This function returns the row count and the latest edit date of a table
+    def fingerprint(self, table_name):
+        columns = [row[1] for row in self._query(f"PRAGMA table_info({table_name})")]
+        if self.edit_date_field in columns:
+            row = self._query(f"SELECT COUNT(*), MAX({self.edit_date_field}) FROM {table_name}")[0]
+            return [row[0], str(row[1]) if row[1] is not None else None]
+        return [self._query(f"SELECT COUNT(*) FROM {table_name}")[0][0], None]
+
+
+# Cache class holding the LevelId -> ElevationDatumId and ElevationDatumId -> Name dictionaries
+class LevelLookupCache:
+    table_names = ["Level", "ElevationDatum"]
+
+    def __init__(self, lookup_source, cache_path, ttl_seconds=default_ttl_seconds):
+        self.lookup_source = lookup_source
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.levels = None
+        self.elevation_datums = None
+        self.fingerprints = None
+        self.checked_time = None
+
+    # This function clears the cache in memory and on disk, the next lookup reloads the source tables
+    def invalidate(self):
+        self.levels = None
+        self.elevation_datums = None
+        self.fingerprints = None
+        self.checked_time = None
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    # This function makes sure the cache is loaded and up to date
+    # Return True if the source tables were read, False if the cached copy was used
+    def refresh(self, force=False):
+        if force:
+            self.invalidate()
+        if self.levels is None:
+            self._read_cache_file()
+        if self.levels is not None and time.time() - self.checked_time < self.ttl_seconds:
+            return False
+
+        # The TTL expired (or nothing is cached): only reload when the source tables changed
+        fingerprints = {table_name: self.lookup_source.fingerprint(table_name) for table_name in self.table_names}
+        if self.levels is not None and fingerprints == self.fingerprints:
+            self.checked_time = time.time()
+            self._write_cache_file()
+            return False
+
+        self.levels = {int(row[0]): int(row[1]) for row in self.lookup_source.read_levels() if row[1] is not None}
+        self.elevation_datums = {int(row[0]): row[1] for row in self.lookup_source.read_elevation_datums()}
+        self.fingerprints = fingerprints
+        self.checked_time = time.time()
+        self._write_cache_file()
+        return True
+
+    # This function returns the mine name (elevation datum name) of a level
+    # A level which is not cached (e.g. added within the TTL) reloads the source tables once before it fails
+    def mine_name(self, level_id):
+        self.refresh()
+        if self.levels.get(int(level_id)) not in self.elevation_datums:
+            self.refresh(force=True)
+        elevation_datum_id = self.levels.get(int(level_id))
+        if elevation_datum_id is None:
+            raise KeyError(f"Level {level_id} does not exist in the Level table")
+        if elevation_datum_id not in self.elevation_datums:
+            raise KeyError(f"Elevation datum {elevation_datum_id} does not exist in the ElevationDatum table")
+        return self.elevation_datums[elevation_datum_id]
+
+    # This function returns a dictionary with the mine name of every level in the block array
+    def mine_names(self, block_array_p):
+        return {int(block[3]): self.mine_name(block[3]) for block in block_array_p}
+
+    def _read_cache_file(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as file:
+                cache = json.load(file)
+            self.levels = {int(key): value for key, value in cache["levels"].items()}
+            self.elevation_datums = {int(key): value for key, value in cache["elevation_datums"].items()}
+            self.fingerprints = cache["fingerprints"]
+            self.checked_time = cache["checked_time"]
+        except (ValueError, KeyError, TypeError):
+            # A damaged cache file is ignored and replaced on the next reload
+            self.levels = None
+
+    def _write_cache_file(self):
+        cache = {"checked_time": self.checked_time,
+                 "fingerprints": self.fingerprints,
+                 "levels": self.levels,
+                 "elevation_datums": self.elevation_datums}
+        # Runs sharing the workspace write the cache at the same time, every writer has its own temporary file
+        temp_path = f"{self.cache_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(cache, file)
+        os.replace(temp_path, self.cache_path)
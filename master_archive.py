@@ -0,0 +1,258 @@
+# This module keeps the master feature classes small by moving old records into monthly partitions
+# Records whose DateTime is older than the archive window are appended to <master>_<YYYYMM> feature classes in
+# Archive.gdb and deleted from the master. The masters and partitions keep attribute indexes on BlastClearId and
+# DateTime, and the query functions read the hot master and the archived partitions as if they were one table.
+# The storage is pluggable so that the archiving can run on the file geodatabases or a local SQLite stand-in.
+# Appends and archive moves of a master hold the lock file of the master (see master_lock), so concurrent runs of
+# several planners write to a master one at a time.
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from file_lock import FileLock
+from query_builder import chunk_list, default_chunk_size, in_predicate
+
+
+# Records older than this number of days are archived
+default_window_days = 90
+index_fields = ["BlastClearId", "DateTime"]
+
+
+# This function returns the name of the monthly partition of a master
+def partition_name(master_name, month):
+    return f"{master_name}_{month.year:04d}{month.month:02d}"
+
+
+# This function returns the first day of the month of a date
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+# This function returns the first day of the next month
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+# This function returns the lock of a master (a feature class path or a database path and table name)
+# The lock file is next to the geodatabase: <geodatabase>.<master>.lock
+def master_lock(master_path, table_name=None, timeout=600):
+    if table_name is not None:
+        master_path = os.path.join(master_path, table_name)
+    database_path, master_name = os.path.split(master_path)
+    return FileLock(f"{database_path}.{master_name}.lock", timeout=timeout)
+
+
+# This function formats a datetime as a file geodatabase date literal
+def date_literal(value):
+    return value.strftime("date '%Y-%m-%d %H:%M:%S'")
+
+
+# Store class archiving a master feature class in a file geodatabase into partitions in Archive.gdb
+class ArcpyMasterStore:
+    def __init__(self, master_fc, archive_gdb, chunk_size=default_chunk_size):
+        self.master_fc = master_fc
+        self.archive_gdb = archive_gdb
+        self.master_name = os.path.basename(master_fc)
+        self.chunk_size = chunk_size
+        self.lock = master_lock(master_fc)
+
+    # This function creates the archive geodatabase if it does not exist yet
+    def prepare(self):
+        import arcpy
+
+        if not arcpy.Exists(self.archive_gdb):
+            arcpy.CreateFileGDB_management(os.path.dirname(self.archive_gdb), os.path.basename(self.archive_gdb))
+
+    # This function adds the BlastClearId and DateTime attribute indexes which do not exist yet
+    # Return the list of indexed fields that were added
+    @staticmethod
+    def ensure_indexes(table):
+        import arcpy
+
+        indexed_fields = {field.name.lower() for index in arcpy.ListIndexes(table) for field in index.fields}
+        added = []
+        for field_name in index_fields:
+            if field_name.lower() not in indexed_fields:
+                arcpy.AddIndex_management(table, [field_name], f"{field_name}_idx")
+                added.append(field_name)
+        return added
+
+    # This function returns the partitions in the archive geodatabase
+    # Return a dictionary of month -> partition path
+    def partitions(self):
+        import arcpy
+
+        if not arcpy.Exists(self.archive_gdb):
+            return {}
+        partitions = {}
+        with arcpy.EnvManager(workspace=self.archive_gdb):
+            for name in arcpy.ListFeatureClasses(f"{self.master_name}_*") or []:
+                suffix = name[len(self.master_name) + 1:]
+                if len(suffix) == 6 and suffix.isdigit():
+                    partitions[datetime(int(suffix[:4]), int(suffix[4:]), 1)] = os.path.join(self.archive_gdb, name)
+        return partitions
+
+    # This function returns the BlastClearIds per month of the records older than the cutoff
+    def months_before(self, cutoff):
+        import arcpy
+
+        months = {}
+        where_clause = f"DateTime < {date_literal(cutoff)}"
+        with arcpy.da.SearchCursor(self.master_fc, ["BlastClearId", "DateTime"], where_clause) as cursor:
+            for blast_clear_id, date_time in cursor:
+                months.setdefault(month_start(date_time), set()).add(blast_clear_id)
+        return months
+
+    # This function moves the records of a month (older than the cutoff) from the master into its partition
+    # Records of the same blasts left in the partition by an interrupted run are replaced, not duplicated
+    # Return the number of records moved
+    def move_month(self, month, blast_clear_ids, cutoff):
+        import arcpy
+
+        partition = os.path.join(self.archive_gdb, partition_name(self.master_name, month))
+        if not arcpy.Exists(partition):
+            spatial_reference = arcpy.Describe(self.master_fc).spatialReference
+            arcpy.CreateFeatureclass_management(self.archive_gdb, os.path.basename(partition),
+                                                template=self.master_fc, spatial_reference=spatial_reference)
+            self.ensure_indexes(partition)
+        else:
+            for chunk in chunk_list(sorted(blast_clear_ids, key=str), self.chunk_size):
+                where_clause, _ = in_predicate("BlastClearId", chunk, parameterised=False)
+                with arcpy.da.UpdateCursor(partition, ["BlastClearId"], where_clause) as cursor:
+                    for _ in cursor:
+                        cursor.deleteRow()
+
+        where_clause = (f"DateTime >= {date_literal(month)} AND DateTime < "
+                        f"{date_literal(min(next_month(month), cutoff))}")
+        month_layer = arcpy.MakeFeatureLayer_management(self.master_fc, "archive_month", where_clause)[0]
+        try:
+            moved = int(arcpy.GetCount_management(month_layer)[0])
+            arcpy.Append_management(month_layer, partition, "TEST")
+            arcpy.DeleteRows_management(month_layer)
+        finally:
+            arcpy.Delete_management(month_layer)
+        return moved
+
+    @staticmethod
+    def date_literal(value):
+        return date_literal(value)
+
+    # This function reads records from a master or partition
+    def read(self, table, fields, where_clause=None):
+        import arcpy
+
+        with arcpy.da.SearchCursor(table, fields, where_clause) as cursor:
+            for row in cursor:
+                yield list(row)
+
+
+# Store class archiving a master table of a SQLite stand-in into partition tables of an archive database
+# The tables have at least the BlastClearId and DateTime (ISO text) columns, master_fc is the master table name
+class SqliteMasterStore:
+    def __init__(self, database_path, master_table, archive_database_path, chunk_size=default_chunk_size):
+        self.master_fc = master_table
+        self.master_name = master_table
+        self.chunk_size = chunk_size
+        self.lock = master_lock(database_path, master_table)
+        self.connection = sqlite3.connect(database_path)
+        self.connection.execute("ATTACH DATABASE ? AS archive", [archive_database_path])
+
+    def prepare(self):
+        pass
+
+    @staticmethod
+    def date_literal(value):
+        return f"'{value.isoformat(sep=' ')}'"
+
+    def ensure_indexes(self, table):
+        schema, _, name = table.rpartition(".")
+        prefix = f"{schema}." if schema else ""
+        for field_name in index_fields:
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {prefix}{name}_{field_name}_idx ON {name} "
+                                    f"({field_name})")
+        self.connection.commit()
+        return list(index_fields)
+
+    def partitions(self):
+        partitions = {}
+        query = "SELECT name FROM archive.sqlite_master WHERE type = 'table' AND name LIKE ?"
+        for (name,) in self.connection.execute(query, [f"{self.master_name}_%"]):
+            suffix = name[len(self.master_name) + 1:]
+            if len(suffix) == 6 and suffix.isdigit():
+                partitions[datetime(int(suffix[:4]), int(suffix[4:]), 1)] = f"archive.{name}"
+        return partitions
+
+    def months_before(self, cutoff):
+        months = {}
+        query = f"SELECT BlastClearId, DateTime FROM {self.master_name} WHERE DateTime < ?"
+        for blast_clear_id, date_time in self.connection.execute(query, [cutoff.isoformat(sep=" ")]):
+            months.setdefault(month_start(datetime.fromisoformat(date_time)), set()).add(blast_clear_id)
+        return months
+
+    def move_month(self, month, blast_clear_ids, cutoff):
+        partition = f"archive.{partition_name(self.master_name, month)}"
+        if partition not in self.partitions().values():
+            self.connection.execute(f"CREATE TABLE {partition} AS SELECT * FROM {self.master_name} WHERE 0")
+            self.ensure_indexes(partition)
+        else:
+            for chunk in chunk_list(sorted(blast_clear_ids, key=str), self.chunk_size):
+                predicate, parameters = in_predicate("BlastClearId", chunk)
+                self.connection.execute(f"DELETE FROM {partition} WHERE {predicate}", parameters)
+
+        month_predicate = "DateTime >= ? AND DateTime < ?"
+        parameters = [month.isoformat(sep=" "), min(next_month(month), cutoff).isoformat(sep=" ")]
+        with self.connection:
+            self.connection.execute(f"INSERT INTO {partition} SELECT * FROM {self.master_name} "
+                                    f"WHERE {month_predicate}", parameters)
+            moved = self.connection.execute(f"DELETE FROM {self.master_name} WHERE {month_predicate}",
+                                            parameters).rowcount
+        return moved
+
+    def read(self, table, fields, where_clause=None):
+        query = f"SELECT {', '.join(fields)} FROM {table}" + (f" WHERE {where_clause}" if where_clause else "")
+        for row in self.connection.execute(query):
+            yield list(row)
+
+
+# This function moves the records older than the archive window of every master into monthly partitions
+# Return a dictionary of master name -> number of records archived
+def archive_masters(master_stores, window_days=default_window_days, now=None):
+    cutoff = (now or datetime.now()) - timedelta(days=window_days)
+    archived = {}
+    for store in master_stores:
+        store.prepare()
+        with store.lock:
+            store.ensure_indexes(store.master_fc)
+        archived[store.master_name] = 0
+        for month, blast_clear_ids in sorted(store.months_before(cutoff).items()):
+            # The master is locked per month so that appends of other runs only wait for one move
+            with store.lock:
+                archived[store.master_name] += store.move_month(month, blast_clear_ids, cutoff)
+    return archived
+
+
+# This function reads records from the master and the partitions that can hold records in the date range
+# where_clause is added to the DateTime range and must use the syntax of the store
+# Return a generator of rows (lists of the requested fields), hot records first, then the newest partitions
+def query_records(master_store, fields, where_clause=None, start=None, end=None):
+    clauses = [f"({where_clause})"] if where_clause else []
+    if start is not None:
+        clauses.append(f"DateTime >= {master_store.date_literal(start)}")
+    if end is not None:
+        clauses.append(f"DateTime < {master_store.date_literal(end)}")
+    combined_clause = " AND ".join(clauses) or None
+
+    tables = [master_store.master_fc]
+    for month, partition in sorted(master_store.partitions().items(), reverse=True):
+        if (start is None or next_month(month) > start) and (end is None or month < end):
+            tables.append(partition)
+    for table in tables:
+        for row in master_store.read(table, fields, combined_clause):
+            yield row
+
+
+# This function finds the records of one blast in the master and the archive
+# Return the list of rows
+def find_blast_records(master_store, blast_clear_id, fields):
+    where_clause, _ = in_predicate("BlastClearId", [str(blast_clear_id)], parameterised=False)
+    return list(query_records(master_store, fields, where_clause))
@@ -0,0 +1,186 @@
+# This module exports and downloads portal items as file geodatabases on a bounded thread pool
+# A checkpoint manifest records every item, so an interrupted run resumes where it stopped and items whose
+# 'modified' timestamp did not change since the last backup are skipped.
+# Items can be arcgis.gis.Item objects or RestPortalItem objects, which only use the portal REST API and can be
+# pointed at a local stand-in portal.
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+default_max_workers = 3
+
+
+# Engine class running the backups and keeping the checkpoint manifest
+class BackupEngine:
+    def __init__(self, backup_location, manifest_file, max_workers=default_max_workers, message=print):
+        self.backup_location = backup_location
+        self.manifest_file = manifest_file
+        self.max_workers = max_workers
+        self.message = message
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return {}
+        with open(self.manifest_file) as file:
+            return json.load(file)
+
+    def _write_manifest(self):
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(temp_file, self.manifest_file)
+
+    def _checkpoint(self, item_id, entry):
+        with self._lock:
+            self.manifest[item_id] = entry
+            self._write_manifest()
+
+    # This function checks whether an item was backed up before and did not change since
+    def is_current(self, item):
+        entry = self.manifest.get(item.id)
+        return (entry is not None and entry.get("status") == "done" and entry.get("modified") == item.modified
+                and os.path.exists(entry.get("file", "")))
+
+    # This function exports, downloads and deletes the export of a single item
+    # Return the manifest entry of the item
+    def backup_item(self, item):
+        entry = {"title": item.title, "modified": item.modified, "status": "started",
+                 "started": datetime.now().isoformat(timespec="seconds")}
+        self._checkpoint(item.id, entry)
+        start = time.perf_counter()
+        export_item = None
+        try:
+            version = datetime.now().strftime("%d_%b_%Y")
+            export_item = item.export(f"{item.title}_{version}", "File Geodatabase")
+            downloaded_file = export_item.download(self.backup_location)
+            entry.update({"status": "done", "file": str(downloaded_file),
+                          "bytes": os.path.getsize(downloaded_file)})
+        except Exception as error:
+            entry.update({"status": "failed", "error": str(error)})
+        finally:
+            if export_item is not None:
+                try:
+                    export_item.delete()
+                except Exception as error:
+                    entry["cleanup_error"] = str(error)
+            entry["seconds"] = round(time.perf_counter() - start, 3)
+            self._checkpoint(item.id, entry)
+        return entry
+
+    # This function backs up a list of items, view services and unchanged items are skipped
+    # Return a dictionary of item title -> manifest entry for the items processed in this run
+    def run(self, items):
+        to_backup = []
+        results = {}
+        for item in items:
+            if "View Service" in (item.typeKeywords or []):
+                self.message(f"{item.title} is view, not downloading")
+            elif self.is_current(item):
+                self.message(f"{item.title} not modified since the last backup, skipping")
+                results[item.title] = dict(self.manifest[item.id], status="skipped")
+            else:
+                to_backup.append(item)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item, entry in zip(to_backup, executor.map(self.backup_item, to_backup)):
+                results[item.title] = entry
+                if entry["status"] == "done":
+                    self.message(f"Successfully downloaded {item.title} ({entry['bytes']} bytes in "
+                                 f"{entry['seconds']}s)")
+                else:
+                    self.message(f"An error occurred downloading {item.title}: {entry.get('error')}")
+        return results
+
+
+# Client class for the portal sharing REST API
+class PortalRestClient:
+    def __init__(self, portal_url, username, token=None, timeout=300, poll_seconds=5):
+        self.portal_url = portal_url.rstrip("/")
+        self.username = username
+        self.token = token
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+
+    # This function sends a request to the sharing REST API
+    # Return the response as JSON, or the open response when raw=True
+    def request(self, path, parameters=None, post=False, raw=False):
+        parameters = dict(parameters or {}, f="json")
+        if self.token:
+            parameters["token"] = self.token
+        url = f"{self.portal_url}/sharing/rest/{path}"
+        data = urllib.parse.urlencode(parameters).encode()
+        if post:
+            response = urllib.request.urlopen(url, data=data, timeout=self.timeout)
+        else:
+            response = urllib.request.urlopen(f"{url}?{data.decode()}", timeout=self.timeout)
+        if raw:
+            return response
+        with response:
+            result = json.load(response)
+        if "error" in result:
+            raise RuntimeError(f"Portal error: {result['error']}")
+        return result
+
+    # This function searches for feature services
+    # Return a list of RestPortalItem objects
+    def search(self, query, item_type="Feature Service", max_items=10000):
+        items = []
+        start = 1
+        while start > 0 and len(items) < max_items:
+            result = self.request("search", {"q": f'{query} AND type:"{item_type}"', "start": start, "num": 100})
+            items.extend(RestPortalItem(self, properties) for properties in result.get("results", []))
+            start = result.get("nextStart", -1)
+        return items[:max_items]
+
+
+# Item class with the export, download and delete methods used by the BackupEngine (same as arcgis.gis.Item)
+class RestPortalItem:
+    def __init__(self, client, properties):
+        self.client = client
+        self.id = properties["id"]
+        self.title = properties.get("title", self.id)
+        self.modified = properties.get("modified")
+        self.typeKeywords = properties.get("typeKeywords", [])
+
+    # This function exports the item and waits for the export job, the export item of a failed job is deleted
+    # Return the exported item
+    def export(self, title, export_format):
+        user_path = f"content/users/{self.client.username}"
+        result = self.client.request(f"{user_path}/export", {"itemId": self.id, "exportFormat": export_format,
+                                                             "title": title}, post=True)
+        export_item = RestPortalItem(self.client, {"id": result["exportItemId"], "title": title})
+        while True:
+            status = self.client.request(f"{user_path}/items/{export_item.id}/status",
+                                         {"jobId": result.get("jobId", ""), "jobType": "export"})
+            if status.get("status") == "completed":
+                return export_item
+            if status.get("status") == "failed":
+                export_item.delete()
+                raise RuntimeError(f"Export of {self.title} failed: {status.get('statusMessage', '')}")
+            time.sleep(self.client.poll_seconds)
+
+    # This function downloads the item data to a folder
+    # Return the path of the downloaded file
+    def download(self, save_path):
+        file_path = os.path.join(save_path, f"{self.title}.zip")
+        with self.client.request(f"content/items/{self.id}/data", raw=True) as response:
+            with open(file_path, "wb") as file:
+                while True:
+                    block = response.read(1024 * 1024)
+                    if not block:
+                        break
+                    file.write(block)
+        return file_path
+
+    # This function deletes the item from the portal
+    def delete(self):
+        self.client.request(f"content/users/{self.client.username}/items/{self.id}/delete", post=True)
+        return True
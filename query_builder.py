@@ -0,0 +1,138 @@
+# This module builds chunked IN (...) predicates for the BlockInventory queries and runs the chunks concurrently
+# It replaces the long "x = 'a' OR x = 'b' OR ..." where clauses previously built by string concatenation
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+# SQL Server accepts at most 2100 parameters per statement, chunks are kept well below that limit
+default_chunk_size = 500
+default_max_workers = 4
+
+
+# This function splits a list into smaller lists of at most chunk_size items
+# Return a list of lists
+def chunk_list(values, chunk_size=default_chunk_size):
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    return [values[count:count + chunk_size] for count in range(0, len(values), chunk_size)]
+
+
+# This function quotes a value for use in a text where clause
+def quote_text(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# This function formats a value as an SQL literal, integers are validated and text is quoted
+def sql_literal(value):
+    if isinstance(value, bool):
+        raise TypeError("Boolean values are not supported in where clauses")
+    if isinstance(value, int):
+        return str(int(value))
+    return quote_text(value)
+
+
+# This function creates an IN (...) predicate for a single field
+# With parameterised=True the predicate uses "?" placeholders and the values are returned as parameters
+# With parameterised=False (arcpy where clauses do not accept parameters) the values are rendered as safe literals
+# Return the predicate and the list of parameters
+def in_predicate(field, values, parameterised=True):
+    if len(values) == 0:
+        raise ValueError(f"No values provided for {field}")
+    if parameterised:
+        return f"{field} IN ({', '.join('?' for _ in values)})", list(values)
+    return f"{field} IN ({', '.join(sql_literal(value) for value in values)})", []
+
+
+# This function creates a tuple membership predicate for (BlockId, StatusId) pairs
+# Row values are used where the database supports them (SQLite), otherwise the predicate selects the
+# cross product of the BlockId and StatusId lists and the caller must filter the exact pairs
+# Return the predicate and the list of parameters
+def pair_predicate(pairs, parameterised=True, row_values=True, fields=("BlockId", "StatusId")):
+    if len(pairs) == 0:
+        raise ValueError("No (BlockId, StatusId) pairs provided")
+    if row_values:
+        if parameterised:
+            values = ", ".join("(?, ?)" for _ in pairs)
+            parameters = [value for pair in pairs for value in pair]
+        else:
+            values = ", ".join(f"({sql_literal(pair[0])}, {sql_literal(pair[1])})" for pair in pairs)
+            parameters = []
+        return f"({fields[0]}, {fields[1]}) IN (VALUES {values})", parameters
+
+    first_predicate, first_parameters = in_predicate(fields[0], sorted({pair[0] for pair in pairs}), parameterised)
+    second_predicate, second_parameters = in_predicate(fields[1], sorted({pair[1] for pair in pairs}), parameterised)
+    return f"{first_predicate} AND {second_predicate}", first_parameters + second_parameters
+
+
+# This function runs fetch_chunk for every chunk of values on a thread pool and merges the returned rows
+# Return a single list of rows in chunk order
+def fetch_chunked(values, fetch_chunk, chunk_size=default_chunk_size, max_workers=default_max_workers):
+    chunks = chunk_list(list(values), chunk_size)
+    if len(chunks) <= 1 or max_workers <= 1:
+        results = [fetch_chunk(chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(fetch_chunk, chunks))
+    return [row for chunk_rows in results for row in chunk_rows]
+
+
+# Data access class reading BlockStatus rows from the BlockInventory SDE connection with arcpy
+# arcpy is not thread safe, the chunks are read one after the other
+class ArcpyBlockStatusSource:
+    max_workers = 1
+
+    def __init__(self, sde_block_status_table):
+        self.sde_block_status_table = sde_block_status_table
+
+    # This function returns the BlockStatusId, BlockId and StatusId of rows matching a chunk of pairs
+    def fetch_block_status(self, pairs):
+        import arcpy
+
+        where_clause, _ = pair_predicate(pairs, parameterised=False, row_values=False)
+        with arcpy.da.SearchCursor(self.sde_block_status_table, ["BlockStatusId", "BlockId", "StatusId"],
+                                   where_clause) as cursor:
+            return [list(row) for row in cursor]
+
+
+# Data access class reading BlockStatus rows from a SQLite stand-in for the BlockInventory schema
+# A connection is opened per chunk because SQLite connections cannot be shared between threads
+class SqliteBlockStatusSource:
+    max_workers = default_max_workers
+
+    def __init__(self, database_path, table_name="BlockStatus"):
+        self.database_path = database_path
+        self.table_name = table_name
+
+    # This function returns the BlockStatusId, BlockId and StatusId of rows matching a chunk of pairs
+    def fetch_block_status(self, pairs):
+        predicate, parameters = pair_predicate(pairs)
+        connection = sqlite3.connect(self.database_path)
+        try:
+            query = f"SELECT BlockStatusId, BlockId, StatusId FROM {self.table_name} WHERE {predicate}"
+            return [list(row) for row in connection.execute(query, parameters)]
+        finally:
+            connection.close()
+
+
+# This function finds the BlockStatusId of the current status of every block in the block array
+# The (BlockId, StatusId) pairs are queried in chunks and merged into one record set, the chunks run concurrently
+# on up to max_workers threads. By default the max_workers of the source is used, sources without it (and the arcpy
+# source) are read on the calling thread.
+# Return a sorted list of BlockStatusIds
+def fetch_block_status_ids(block_array_p, block_status_source, chunk_size=default_chunk_size, max_workers=None):
+    if max_workers is None:
+        max_workers = getattr(block_status_source, "max_workers", 1)
+    pairs = list(dict.fromkeys((int(block[0]), int(block[2])) for block in block_array_p))
+    rows = fetch_chunked(pairs, block_status_source.fetch_block_status, chunk_size, max_workers)
+
+    # Only keep the exact pairs, the cross product predicate can return additional rows
+    wanted_pairs = set(pairs)
+    return sorted({int(row[0]) for row in rows if (int(row[1]), int(row[2])) in wanted_pairs})
+
+
+# This function creates the query used by the block query layer from a list of BlockStatusIds
+# Return the Search String
+def block_status_ids_query(block_status_ids, table_name="BlockStatus"):
+    predicate, _ = in_predicate("BlockStatusId", [int(block_status_id) for block_status_id in block_status_ids],
+                                parameterised=False)
+    return f"select * from {table_name} where {predicate}"
@@ -0,0 +1,169 @@
+# This module classifies the roads near a blast by the clearance zone they are in and clips them to the zones
+# The minimum distance of every road segment to the blocks is computed in one vectorised NumPy pass against the
+# edges of the dissolved blocks (shared block edges drop out), comparing only segments and edges in nearby cells.
+# Roads within the machine radius are clipped to the machine zones, roads within the people radius to the part of
+# the people zones outside the machine zones, and roads further away are left out.
+import numpy as np
+import shapely
+
+from zone_engine import clearance_zones
+
+
+# This function splits line geometries into straight segments
+# Return the segment start points, end points and the index of the geometry of every segment
+def line_segments(geometries):
+    parts, part_geometry = shapely.get_parts(np.asarray(geometries, dtype=object), return_index=True)
+    coordinates, coordinate_part = shapely.get_coordinates(parts, return_index=True)
+    same_part = coordinate_part[1:] == coordinate_part[:-1]
+    return (coordinates[:-1][same_part], coordinates[1:][same_part],
+            part_geometry[coordinate_part[:-1][same_part]])
+
+
+# This function returns the distances of points to segments (arrays broadcast against each other)
+def _point_segment_distances(points, starts, ends):
+    directions = ends - starts
+    lengths = np.einsum("...i,...i->...", directions, directions)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        positions = np.einsum("...i,...i->...", points - starts, directions) / lengths
+    positions = np.clip(np.nan_to_num(positions), 0.0, 1.0)
+    nearest = starts + positions[..., None] * directions
+    return np.linalg.norm(points - nearest, axis=-1)
+
+
+def _cross(origins, first, second):
+    return ((first[..., 0] - origins[..., 0]) * (second[..., 1] - origins[..., 1]) -
+            (first[..., 1] - origins[..., 1]) * (second[..., 0] - origins[..., 0]))
+
+
+# This function returns the cells of a grid covered by boxes
+# Return the index of the box and the cell key of every (box, cell) pair
+def _box_cells(boxes, origin, cell_size, grid_width):
+    cell_min = np.floor((boxes[:, :2] - origin) / cell_size).astype(np.int64)
+    cell_max = np.floor((boxes[:, 2:] - origin) / cell_size).astype(np.int64)
+    widths = cell_max[:, 0] - cell_min[:, 0] + 1
+    counts = widths * (cell_max[:, 1] - cell_min[:, 1] + 1)
+    items = np.repeat(np.arange(len(boxes)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_x = np.repeat(cell_min[:, 0], counts) + local % np.repeat(widths, counts)
+    cell_y = np.repeat(cell_min[:, 1], counts) + local // np.repeat(widths, counts)
+    return items, cell_y * grid_width + cell_x
+
+
+# Number of (segment, edge) pairs compared at a time, about 250 MB of temporary arrays
+max_pairs = 1000000
+
+
+# This function returns the minimum distance of every segment to a set of edges, up to max_distance
+# Only the (segment, edge) pairs whose boxes overlap once the edges are grown by max_distance are compared (joined
+# on a grid), so the work grows with the number of nearby pairs instead of all pairs. Segments further away get
+# infinity.
+def segment_distances(starts, ends, edge_starts, edge_ends, max_distance):
+    distances = np.full(len(starts), np.inf)
+    if len(starts) == 0 or len(edge_starts) == 0:
+        return distances
+    max_distance = float(max_distance)
+    segment_boxes = np.hstack([np.minimum(starts, ends), np.maximum(starts, ends)])
+    edge_boxes = np.hstack([np.minimum(edge_starts, edge_ends) - max_distance,
+                            np.maximum(edge_starts, edge_ends) + max_distance])
+
+    # Join the segments and edges on the grid cells their boxes cover
+    origin = np.minimum(segment_boxes[:, :2].min(axis=0), edge_boxes[:, :2].min(axis=0))
+    extent = np.maximum(segment_boxes[:, 2:].max(axis=0), edge_boxes[:, 2:].max(axis=0)) - origin
+    cell_size = max(max_distance, float(np.median(segment_boxes[:, 2:] - segment_boxes[:, :2])), 1.0)
+    grid_width = int(extent[0] // cell_size) + 1
+    segment_items, segment_cells = _box_cells(segment_boxes, origin, cell_size, grid_width)
+    edge_items, edge_cells = _box_cells(edge_boxes, origin, cell_size, grid_width)
+    order = np.argsort(edge_cells, kind="stable")
+    edge_items, edge_cells = edge_items[order], edge_cells[order]
+    first = np.searchsorted(edge_cells, segment_cells, side="left")
+    counts = np.searchsorted(edge_cells, segment_cells, side="right") - first
+
+    # Compare the pairs of a bounded number of segment cells at a time, a dense blast has tens of millions of pairs
+    pair_ends = np.cumsum(counts)
+    start = 0
+    while start < len(segment_cells):
+        stop = max(int(np.searchsorted(pair_ends, pair_ends[start] - counts[start] + max_pairs, side="right")),
+                   start + 1)
+        chunk_counts = counts[start:stop]
+        pair_cells = np.repeat(segment_cells[start:stop], chunk_counts)
+        pair_segments = np.repeat(segment_items[start:stop], chunk_counts)
+        pair_edges = edge_items[np.repeat(first[start:stop], chunk_counts) + np.arange(chunk_counts.sum()) -
+                                np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)]
+        start = stop
+
+        # Keep the pairs whose boxes overlap, once: in the cell holding the lower left corner of the overlap
+        overlap_min = np.maximum(segment_boxes[pair_segments, :2], edge_boxes[pair_edges, :2])
+        overlap_max = np.minimum(segment_boxes[pair_segments, 2:], edge_boxes[pair_edges, 2:])
+        corner_cells = np.floor((overlap_min - origin) / cell_size).astype(np.int64)
+        keep = ((overlap_min <= overlap_max).all(axis=1) &
+                (corner_cells[:, 1] * grid_width + corner_cells[:, 0] == pair_cells))
+        pair_segments, pair_edges = pair_segments[keep], pair_edges[keep]
+
+        # Segment to segment distance: the smallest end point distance, 0 when the segments cross
+        segment_starts, segment_ends = starts[pair_segments], ends[pair_segments]
+        pair_edge_starts, pair_edge_ends = edge_starts[pair_edges], edge_ends[pair_edges]
+        pair_distances = np.minimum.reduce([
+            _point_segment_distances(segment_starts, pair_edge_starts, pair_edge_ends),
+            _point_segment_distances(segment_ends, pair_edge_starts, pair_edge_ends),
+            _point_segment_distances(pair_edge_starts, segment_starts, segment_ends),
+            _point_segment_distances(pair_edge_ends, segment_starts, segment_ends)])
+        crossing = ((_cross(pair_edge_starts, pair_edge_ends, segment_starts) *
+                     _cross(pair_edge_starts, pair_edge_ends, segment_ends) < 0) &
+                    (_cross(segment_starts, segment_ends, pair_edge_starts) *
+                     _cross(segment_starts, segment_ends, pair_edge_ends) < 0))
+        pair_distances[crossing] = 0.0
+        np.minimum.at(distances, pair_segments, pair_distances)
+    distances[distances > max_distance] = np.inf
+    return distances
+
+
+# This function returns the minimum distance of every road to the blocks, up to max_distance
+# Roads further than max_distance get infinity
+def road_distances(road_geometries, block_geometries, max_distance):
+    road_geometries = np.asarray(road_geometries, dtype=object)
+    distances = np.full(len(road_geometries), np.inf)
+    if len(road_geometries) == 0 or len(block_geometries) == 0:
+        return distances
+    blocks_union = shapely.union_all(np.asarray(block_geometries, dtype=object))
+    starts, ends, segment_road = line_segments(road_geometries)
+    edge_starts, edge_ends, _ = line_segments([shapely.boundary(blocks_union)])
+    segment_distance = segment_distances(starts, ends, edge_starts, edge_ends, max_distance)
+    # Segments which do not cross the boundary can lie inside a block
+    segment_distance[shapely.contains_xy(blocks_union, starts[:, 0], starts[:, 1])] = 0.0
+    np.minimum.at(distances, segment_road, segment_distance)
+    return distances
+
+
+def _line_parts(geometry):
+    lines = [part for part in shapely.get_parts(geometry)
+             if part.geom_type in ("LineString", "MultiLineString") and part.length > 0]
+    if len(lines) == 0:
+        return None
+    return lines[0] if len(lines) == 1 else shapely.multilinestrings(lines)
+
+
+# This function classifies the roads by clearance zone and clips them to the zones
+# Without zones the blocks are buffered with the zone engine
+# Return a list of [road index, ClearanceType, clipped geometry] lists, a road crossing both zones has two entries
+def classify_roads(road_geometries, block_geometries, machine_radius, people_radius, machine_zones=None,
+                   people_zones=None):
+    road_geometries = np.asarray(road_geometries, dtype=object)
+    machine_radius = float(machine_radius)
+    people_radius = float(people_radius)
+    distances = road_distances(road_geometries, block_geometries, max(machine_radius, people_radius))
+    if machine_zones is None or people_zones is None:
+        machine_zones, people_zones = clearance_zones(block_geometries, machine_radius, people_radius)
+    machine_union = shapely.union_all(np.asarray(machine_zones, dtype=object))
+    people_union = shapely.union_all(np.asarray(people_zones, dtype=object))
+
+    classified = []
+    machine_roads = np.flatnonzero(distances <= machine_radius)
+    for road, clipped in zip(machine_roads, shapely.intersection(road_geometries[machine_roads], machine_union)):
+        classified.append([int(road), "Machine", _line_parts(clipped)])
+    people_roads = np.flatnonzero(distances <= max(people_radius, machine_radius))
+    people_clipped = shapely.difference(shapely.intersection(road_geometries[people_roads], people_union),
+                                        machine_union)
+    for road, clipped in zip(people_roads, people_clipped):
+        classified.append([int(road), "People", _line_parts(clipped)])
+    return sorted([row for row in classified if row[2] is not None], key=lambda row: (row[0], row[1]))
+
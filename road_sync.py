@@ -0,0 +1,267 @@
+# This module keeps the Road_Edge backup in sync with the road layer of the Sishen_Infrastructure feature service
+# Only features edited since the last sync (high-water mark of edit date and ObjectID) are downloaded, features
+# deleted from the service are removed and the 'Level_' field is renamed to 'Level' on ingest.
+# Every local road keeps the ObjectID of the service feature in the SourceObjectId field.
+# The client only uses the ArcGIS REST API (paged JSON), so it can be pointed at a local stand-in service.
+import json
+import os
+import sqlite3
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+from query_builder import chunk_list, in_predicate
+
+
+# Fields renamed when features are ingested
+field_renames = {"Level_": "Level"}
+source_oid_field = "SourceObjectId"
+
+
+# Client class reading a feature service layer through the ArcGIS REST API
+class FeatureServiceClient:
+    def __init__(self, layer_url, token=None, page_size=None, timeout=60):
+        self.layer_url = layer_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self._layer_info = None
+        self._page_size = page_size
+
+    def _request(self, path, parameters):
+        parameters = dict(parameters, f="json")
+        if self.token:
+            parameters["token"] = self.token
+        data = urllib.parse.urlencode(parameters).encode()
+        with urllib.request.urlopen(self.layer_url + path, data=data, timeout=self.timeout) as response:
+            result = json.load(response)
+        if "error" in result:
+            raise RuntimeError(f"Feature service error: {result['error']}")
+        return result
+
+    # This function returns the layer description (fields, ObjectID field, edit date field, max record count)
+    def layer_info(self):
+        if self._layer_info is None:
+            self._layer_info = self._request("", {})
+        return self._layer_info
+
+    def object_id_field(self):
+        return self.layer_info().get("objectIdField", "OBJECTID")
+
+    # Return the edit date field name, None if editor tracking is not enabled on the layer
+    def edit_date_field(self):
+        return (self.layer_info().get("editFieldsInfo") or {}).get("editDateField")
+
+    def page_size(self):
+        return self._page_size or int(self.layer_info().get("maxRecordCount", 1000))
+
+    # This function returns the ObjectIDs of all features matching a where clause
+    def query_ids(self, where="1=1"):
+        result = self._request("/query", {"where": where, "returnIdsOnly": "true"})
+        return set(result.get("objectIds") or [])
+
+    # This function returns all features matching a where clause, page by page
+    def query_features(self, where="1=1"):
+        offset = 0
+        while True:
+            result = self._request("/query", {"where": where, "outFields": "*", "returnGeometry": "true",
+                                              "orderByFields": self.object_id_field(),
+                                              "resultOffset": offset, "resultRecordCount": self.page_size()})
+            features = result.get("features", [])
+            for feature in features:
+                yield feature
+            offset += len(features)
+            if len(features) == 0 or not result.get("exceededTransferLimit", False):
+                break
+
+
+# This function renames the fields of a feature as configured in field_renames
+def rename_fields(attributes):
+    return {field_renames.get(name, name): value for name, value in attributes.items()}
+
+
+# This function converts an epoch milliseconds value to a REST timestamp literal (UTC)
+def timestamp_literal(epoch_ms):
+    return datetime.fromtimestamp(epoch_ms / 1000.0, tz=timezone.utc).strftime("timestamp '%Y-%m-%d %H:%M:%S'")
+
+
+# This function reads the high-water mark of the last sync
+# Return a dictionary with the edit_date (epoch ms) and object_id, empty if the road backup was never synced
+def read_high_water_mark(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as file:
+        return json.load(file)
+
+
+def write_high_water_mark(state_file, high_water_mark):
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(high_water_mark, file)
+    os.replace(temp_file, state_file)
+
+
+# This function synchronises the local road store with the feature service
+# With full=True (or without a usable high-water mark) all local roads are replaced
+# Return a dictionary with the number of upserted and deleted roads and whether a full rebuild was done
+def sync_roads(client, road_store, state_file, full=False):
+    oid_field = client.object_id_field()
+    edit_field = client.edit_date_field()
+    high_water_mark = {} if full else read_high_water_mark(state_file)
+    full = full or edit_field is None or "edit_date" not in high_water_mark
+
+    if full:
+        where = "1=1"
+        road_store.truncate()
+    else:
+        where = (f"{edit_field} >= {timestamp_literal(high_water_mark['edit_date'])} OR "
+                 f"{oid_field} > {int(high_water_mark['object_id'])}")
+
+    upserted = 0
+    batch = []
+    max_edit_date = high_water_mark.get("edit_date", 0)
+    max_object_id = high_water_mark.get("object_id", 0)
+    for feature in client.query_features(where):
+        attributes = feature.get("attributes", {})
+        max_object_id = max(max_object_id, int(attributes[oid_field]))
+        if edit_field is not None and attributes.get(edit_field) is not None:
+            max_edit_date = max(max_edit_date, int(attributes[edit_field]))
+        batch.append([int(attributes[oid_field]), rename_fields(attributes), feature.get("geometry")])
+        if len(batch) >= 1000:
+            upserted += road_store.upsert(batch)
+            batch = []
+    if len(batch) > 0:
+        upserted += road_store.upsert(batch)
+
+    # Features which are in the backup but no longer in the service were deleted
+    deleted = 0
+    if not full:
+        deleted_ids = road_store.object_ids() - client.query_ids()
+        deleted = road_store.delete(sorted(deleted_ids))
+
+    write_high_water_mark(state_file, {"edit_date": max_edit_date, "object_id": max_object_id,
+                                       "synced": datetime.now(timezone.utc).isoformat()})
+    return {"upserted": upserted, "deleted": deleted, "full": full}
+
+
+# Store class writing the roads to the Road_Edge feature class with arcpy
+class ArcpyRoadStore:
+    def __init__(self, road_fc, spatial_reference=None, chunk_size=500):
+        self.road_fc = road_fc
+        self.spatial_reference = spatial_reference
+        self.chunk_size = chunk_size
+        self._fields = None
+        self._prepared = False
+
+    # This function adds the SourceObjectId field if the feature class does not have it yet
+    def prepare(self):
+        import arcpy
+
+        if self._prepared:
+            return
+        if source_oid_field not in [field.name for field in arcpy.ListFields(self.road_fc)]:
+            arcpy.AddField_management(self.road_fc, source_oid_field, "LONG")
+            arcpy.AddIndex_management(self.road_fc, [source_oid_field], f"{source_oid_field}_idx")
+        self._fields = None
+        self._prepared = True
+
+    def _editable_fields(self):
+        import arcpy
+
+        if self._fields is None:
+            self._fields = [field.name for field in arcpy.ListFields(self.road_fc)
+                            if field.editable and field.type not in ("OID", "Geometry", "GlobalID")
+                            and field.name != source_oid_field]
+        return self._fields
+
+    def _row(self, source_oid, attributes, geometry):
+        import arcpy
+
+        attributes_lower = {name.lower(): value for name, value in attributes.items()}
+        shape = None
+        if geometry is not None:
+            geometry = dict(geometry)
+            if self.spatial_reference is not None:
+                geometry.setdefault("spatialReference", self.spatial_reference)
+            shape = arcpy.AsShape(geometry, True)
+        return [source_oid, shape] + [attributes_lower.get(field.lower()) for field in self._editable_fields()]
+
+    # This function returns the SourceObjectIds of all local roads
+    def object_ids(self):
+        import arcpy
+
+        with arcpy.da.SearchCursor(self.road_fc, [source_oid_field]) as cursor:
+            return {row[0] for row in cursor if row[0] is not None}
+
+    # This function deletes all local roads
+    def truncate(self):
+        import arcpy
+
+        self.prepare()
+        arcpy.TruncateTable_management(self.road_fc)
+
+    # This function updates existing roads and inserts new roads
+    # features is a list of [source ObjectID, attributes, geometry] lists
+    # Return the number of roads written
+    def upsert(self, features):
+        import arcpy
+
+        self.prepare()
+        fields = [source_oid_field, "SHAPE@"] + self._editable_fields()
+        rows_by_oid = {feature[0]: self._row(*feature) for feature in features}
+        for chunk in chunk_list(sorted(rows_by_oid), self.chunk_size):
+            where_clause, _ = in_predicate(source_oid_field, chunk, parameterised=False)
+            with arcpy.da.UpdateCursor(self.road_fc, fields, where_clause) as cursor:
+                for row in cursor:
+                    new_row = rows_by_oid.pop(row[0], None)
+                    if new_row is not None:
+                        cursor.updateRow(new_row)
+        with arcpy.da.InsertCursor(self.road_fc, fields) as cursor:
+            for new_row in rows_by_oid.values():
+                cursor.insertRow(new_row)
+        return len(features)
+
+    # This function deletes the roads with the given SourceObjectIds
+    # Return the number of deleted roads
+    def delete(self, source_oids):
+        import arcpy
+
+        deleted = 0
+        for chunk in chunk_list(list(source_oids), self.chunk_size):
+            where_clause, _ = in_predicate(source_oid_field, chunk, parameterised=False)
+            with arcpy.da.UpdateCursor(self.road_fc, [source_oid_field], where_clause) as cursor:
+                for _ in cursor:
+                    cursor.deleteRow()
+                    deleted += 1
+        return deleted
+
+
+# Store class writing the roads to a SQLite stand-in (attributes and geometry stored as JSON)
+class SqliteRoadStore:
+    def __init__(self, database_path, table_name="Road_Edge"):
+        self.connection = sqlite3.connect(database_path)
+        self.table_name = table_name
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({source_oid_field} INTEGER PRIMARY KEY, "
+                                "attributes TEXT, geometry TEXT)")
+
+    def object_ids(self):
+        return {row[0] for row in self.connection.execute(f"SELECT {source_oid_field} FROM {self.table_name}")}
+
+    def truncate(self):
+        self.connection.execute(f"DELETE FROM {self.table_name}")
+        self.connection.commit()
+
+    def upsert(self, features):
+        self.connection.executemany(f"INSERT OR REPLACE INTO {self.table_name} VALUES (?, ?, ?)",
+                                    [[feature[0], json.dumps(feature[1]), json.dumps(feature[2])]
+                                     for feature in features])
+        self.connection.commit()
+        return len(features)
+
+    def delete(self, source_oids):
+        deleted = 0
+        for chunk in chunk_list(list(source_oids), 500):
+            predicate, parameters = in_predicate(source_oid_field, chunk)
+            deleted += self.connection.execute(f"DELETE FROM {self.table_name} WHERE {predicate}",
+                                               parameters).rowcount
+        self.connection.commit()
+        return deleted
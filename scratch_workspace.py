@@ -0,0 +1,95 @@
+# This module manages the intermediate feature classes created during a blast clearance run
+# Intermediates are kept in the arcpy memory workspace by default, the file geodatabase scratch workspace can be
+# used instead to inspect the intermediates when debugging
+# The names of the intermediates end with the namespace of the run (blast ID and user), so runs of several planners
+# sharing the scratch geodatabase of a project do not overwrite each other's intermediates
+import os
+import re
+
+
+# This function returns the namespace of the intermediates of a run, keyed by blast ID and user
+def run_namespace(blast_id, user):
+    return re.sub(r"[^A-Za-z0-9_]", "_", f"ID{blast_id}_{user}")
+
+
+# Workspace class handing out paths for intermediates and deleting them when the run is done
+class ScratchWorkspace:
+    def __init__(self, scratch_gdb, mode="memory", namespace=None):
+        if mode not in ("memory", "gdb"):
+            raise ValueError(f"Unknown scratch workspace mode: {mode}")
+        self.scratch_gdb = scratch_gdb
+        self.mode = mode
+        self.namespace = namespace
+        self.workspace = "memory" if mode == "memory" else scratch_gdb
+        self.intermediates = []
+        self.start_bytes = None
+        self.peak_bytes = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    # This function records the size of the scratch geodatabase before anything is written
+    def start(self):
+        self.start_bytes = self._scratch_gdb_bytes()
+        self.peak_bytes = 0
+        return self
+
+    # This function returns the path of an intermediate (in the namespace of the run) and registers it for deletion
+    def path(self, name):
+        if self.namespace:
+            name = f"{name}_{self.namespace}"
+        intermediate_path = f"memory\\{name}" if self.mode == "memory" else os.path.join(self.scratch_gdb, name)
+        return self.register(intermediate_path)
+
+    # This function registers an intermediate created outside of the workspace (e.g. a query layer) for deletion
+    def register(self, intermediate_path):
+        intermediate_path = str(intermediate_path)
+        if intermediate_path not in self.intermediates:
+            self.intermediates.append(intermediate_path)
+        return intermediate_path
+
+    # This function deletes one intermediate as soon as it is not needed anymore
+    def release(self, intermediate_path):
+        import arcpy
+
+        self._measure()
+        intermediate_path = str(intermediate_path)
+        if arcpy.Exists(intermediate_path):
+            arcpy.Delete_management(intermediate_path)
+        if intermediate_path in self.intermediates:
+            self.intermediates.remove(intermediate_path)
+
+    # This function deletes all remaining intermediates
+    # Return the names of the deleted intermediates
+    def cleanup(self):
+        deleted_names = []
+        for intermediate_path in list(self.intermediates):
+            self.release(intermediate_path)
+            deleted_names.append(re.split(r"[\\/]", intermediate_path)[-1])
+        return deleted_names
+
+    # This function returns the (approximate) number of bytes written to disk by the run
+    # It is the largest growth of the scratch geodatabase measured before intermediates were deleted
+    def bytes_written(self):
+        self._measure()
+        return self.peak_bytes
+
+    def _measure(self):
+        if self.start_bytes is None:
+            return
+        self.peak_bytes = max(self.peak_bytes, self._scratch_gdb_bytes() - self.start_bytes)
+
+    def _scratch_gdb_bytes(self):
+        total_bytes = 0
+        for directory, _, file_names in os.walk(self.scratch_gdb):
+            for file_name in file_names:
+                try:
+                    total_bytes += os.path.getsize(os.path.join(directory, file_name))
+                except OSError:
+                    # Files can disappear while a geoprocessing tool compacts the geodatabase
+                    pass
+        return total_bytes
@@ -0,0 +1,5 @@
+# The tool modules are flat modules in the repository folder, the tests import them like the tools do
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,58 @@
+import sys
+
+import pytest
+
+from attribute_writer import add_missing_fields, block_number_lookup, check_append_fields, stamp_attributes
+from benchmarks import fake_arcpy
+
+
+@pytest.fixture
+def arcpy():
+    fake_arcpy.install()
+    fake_arcpy.reset()
+    yield fake_arcpy
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+
+
+# This function creates an in-memory block feature class with the BlockId of every row
+def block_feature(arcpy, block_ids):
+    feature = arcpy.CreateFeatureclass_management("memory", "Blocks", "POLYGON")
+    arcpy.AddFields_management(feature, [["BlockId", "LONG"], ["Number", "TEXT"]])
+    with arcpy.da.InsertCursor(feature, ["BlockId", "SHAPE@WKB"]) as cursor:
+        for block_id in block_ids:
+            cursor.insertRow([block_id, None])
+    return feature
+
+
+def test_stamp_attributes_writes_values_and_block_numbers(arcpy):
+    feature = block_feature(arcpy, [1, 2, 3])
+    add_missing_fields(feature, [["Mine", "TEXT"], ["Level", "TEXT"], ["Number", "TEXT"]])
+
+    row_count = stamp_attributes(feature, {"Mine": "North Mine", "Level": "500"},
+                                 block_number_lookup([[1, 100001], [3, 100003]]))
+
+    assert row_count == 3
+    with arcpy.da.SearchCursor(feature, ["BlockId", "Mine", "Level", "Number"]) as cursor:
+        assert [list(row) for row in cursor] == [[1, "North Mine", "500", "100001"],
+                                                 [2, "North Mine", "500", None],
+                                                 [3, "North Mine", "500", "100003"]]
+
+
+def test_add_missing_fields_only_adds_new_fields(arcpy):
+    feature = block_feature(arcpy, [])
+
+    assert add_missing_fields(feature, [["blockid", "LONG"], ["Mine", "TEXT"]]) == ["Mine"]
+    assert add_missing_fields(feature, [["Mine", "TEXT"]]) == []
+
+
+def test_check_append_fields_names_the_differences(arcpy):
+    feature = block_feature(arcpy, [])
+    master = arcpy.CreateFeatureclass_management("memory", "Master", "POLYGON")
+    arcpy.AddFields_management(master, [["blockid", "LONG"], ["Number", "TEXT"], ["Mine", "TEXT"]])
+
+    with pytest.raises(arcpy.ExecuteError, match=r"missing \['mine'\], extra \[\]"):
+        check_append_fields(feature, master)
+
+    add_missing_fields(feature, [["Mine", "TEXT"]])
+    check_append_fields(feature, master)
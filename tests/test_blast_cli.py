@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+import BlastClearance as blast_clearance
+import blast_cli
+from benchmarks.environment import environment_paths, write_config
+from blast_config import read_config
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    for path in environment_paths(str(tmp_path)).values():
+        os.makedirs(path, exist_ok=True)
+    yield write_config(str(tmp_path), {"clearance_zone_engine": "memory", "use_resident_worker": "true",
+                                       "use_block_geometry_cache": "false"})
+    blast_clearance.apply_config(read_config())
+
+
+def test_dry_run_describes_the_run_without_arcpy(config_file, tmp_path, capsys):
+    sys.modules.pop("arcpy", None)
+    workspace = str(tmp_path / "Workspace")
+
+    exit_code = blast_cli.main(["--config", config_file, "dry-run", "--blocks", "100001", "100002", "100001",
+                                "--machine-radius", "300", "--people-radius", "500"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert exit_code == 0
+    assert lines[:5] == ["Blocks: 2 (100001, 100002)", "Machine radius: 300 m, people radius: 500 m",
+                         "Runs in: this process", "Clearance zone engine: memory, scratch workspace: memory",
+                         "Roads: clipped to the zones, conflicts checked within 12 hours"]
+    assert "BlockInventory: read live" in lines
+    assert f"Workspace: {workspace}" in lines
+    assert f"Lookup cache: {os.path.join(workspace, 'LookupCache.json')} (not found)" in lines
+    assert not any(line.startswith("Block shape cache") for line in lines)
+    assert lines[-1].startswith("Dry run completed in ") and lines[-1].endswith("s, nothing was written")
+    assert "arcpy" not in sys.modules
+    assert os.listdir(workspace) == []
+
+
+def test_dry_run_lists_every_problem(config_file, capsys):
+    exit_code = blast_cli.main(["--config", config_file, "dry-run", "--blocks", "100001", "10 0002",
+                                "--machine-radius", "0", "--people-radius", "wide"])
+
+    errors = capsys.readouterr().err.splitlines()
+    assert exit_code == 2
+    assert errors[:2] == ["ERROR: Machine radius must be positive", "ERROR: People radius 'wide' is not a number"]
+    assert len(errors) == 3 and "10 0002" in errors[2]
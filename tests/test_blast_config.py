@@ -0,0 +1,58 @@
+import pytest
+
+from blast_config import check_config, read_config
+
+
+def test_default_configuration_is_valid():
+    assert check_config(read_config()) == []
+
+
+@pytest.mark.parametrize("option, value, problem", [
+    ("clearance_zone_engine", "gpu", "settings.clearance_zone_engine must be one of arcpy, memory"),
+    ("scratch_workspace_mode", "disk", "settings.scratch_workspace_mode must be one of memory, gdb"),
+    ("block_inventory_source", "cache", "settings.block_inventory_source must be one of live, snapshot"),
+    ("conflict_window_hours", "0", "settings.conflict_window_hours must be positive"),
+    ("block_geometry_cache_mb", "-5", "settings.block_geometry_cache_mb must be positive"),
+    ("archive_window_days", "ninety", "settings.archive_window_days is not a number"),
+    ("upload_wait_seconds", "-1", "settings.upload_wait_seconds must not be negative"),
+    ("upload_wait_seconds", "soon", "settings.upload_wait_seconds is not a number"),
+    ("profile_run", "maybe", "settings.profile_run must be true or false"),
+    ("use_block_geometry_cache", "2", "settings.use_block_geometry_cache must be true or false"),
+])
+def test_invalid_settings_are_rejected(option, value, problem):
+    config = read_config()
+    config.set("settings", option, value)
+
+    assert check_config(config) == [problem]
+
+
+def test_invalid_spatial_references_are_rejected(tmp_path):
+    config = read_config()
+    config.set("spatial_references", "sishen_local", "EPSG:2048")
+    config.set("spatial_references", "block_inventory", str(tmp_path / "Missing.prj"))
+
+    problems = check_config(config)
+
+    assert problems[0] == "spatial_references.sishen_local is not a WKT spatial reference"
+    assert problems[1].startswith("spatial_references.block_inventory: ") and "Missing.prj" in problems[1]
+    assert len(problems) == 2
+
+
+def test_spatial_reference_is_read_from_a_prj_file(tmp_path):
+    config = read_config()
+    prj_file = tmp_path / "BlockInventory.prj"
+    prj_file.write_text(config.get("spatial_references", "block_inventory"))
+    config.set("spatial_references", "block_inventory", str(prj_file))
+
+    assert check_config(config) == []
+
+
+def test_local_file_overrides_the_defaults(tmp_path):
+    config_file = tmp_path / "Local.ini"
+    config_file.write_text("[settings]\nclearance_zone_engine = memory\n[paths]\nworkspace = \n")
+
+    config = read_config(str(config_file), default_workspace=str(tmp_path))
+
+    assert config.get("settings", "clearance_zone_engine") == "memory"
+    assert config.get("settings", "scratch_workspace_mode") == read_config().get("settings", "scratch_workspace_mode")
+    assert config.get("paths", "staging_directory") == str(tmp_path / "Staging")
@@ -0,0 +1,119 @@
+import getpass
+import multiprocessing
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+from benchmarks import fake_arcpy
+from benchmarks.environment import create_blast_table
+from blast_ids import ArcpyBlastIdAllocator, SqliteBlastIdAllocator
+
+
+# This function allocates IDs in one process: single IDs and reserved ranges of which half is used, in turn
+# With a geodatabase path the fake arcpy is installed and the ArcpyBlastIdAllocator runs as user process_number
+# Return the list of used IDs, the list of reserved ranges and the users returned
+def allocate_ids(table_path, process_number, rounds, range_size):
+    if table_path.endswith("SishenBlasts"):
+        fake_arcpy.install()
+        fake_arcpy.reset()
+        fake_arcpy.editor_user = f"user{process_number}"
+        allocator = ArcpyBlastIdAllocator(table_path)
+    else:
+        allocator = SqliteBlastIdAllocator(table_path)
+    used_ids = []
+    ranges = []
+    users = set()
+    for _ in range(rounds):
+        blast_id, user = allocator.allocate("North Mine", datetime.now().replace(microsecond=0))
+        used_ids.append(blast_id)
+        users.add(user)
+        ranges.append(allocator.reserve(range_size))
+        for _ in range(range_size // 2):
+            blast_id, user = allocator.allocate("South Mine", datetime.now().replace(microsecond=0))
+            used_ids.append(blast_id)
+            users.add(user)
+        allocator.release()
+    return used_ids, ranges, users
+
+
+# This function returns the BlastClearId, Mine and created_user of the rows of a SishenBlasts table
+def table_rows(database_path):
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute("SELECT BlastClearId, Mine, created_user FROM SishenBlasts").fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def blast_table(tmp_path):
+    fake_arcpy.install()
+    fake_arcpy.reset()
+    gdb_path = os.path.join(str(tmp_path), "Working.gdb")
+    fake_arcpy.CreateFileGDB_management(str(tmp_path), "Working.gdb")
+    yield create_blast_table(gdb_path)
+    fake_arcpy.editor_user = getpass.getuser()
+    sys.modules.pop("arcpy", None)
+
+
+def check_concurrent_allocation(table_path, database_path, processes=6, rounds=10, range_size=6):
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(allocate_ids, [[table_path, process_number, rounds, range_size]
+                                              for process_number in range(processes)])
+
+    used_ids = [blast_id for ids, _, _ in results for blast_id in ids]
+    assert len(set(used_ids)) == len(used_ids) == processes * rounds * (1 + range_size // 2)
+    for _, ranges, _ in results:
+        for reserved in ranges:
+            numbers = [int(object_id) for object_id in reserved]
+            assert numbers == list(range(numbers[0], numbers[0] + range_size))
+    rows = table_rows(database_path)
+    assert {row[0] for row in rows} == set(used_ids)
+    assert all(row[1] is not None for row in rows)
+    return results, rows
+
+
+def test_sqlite_allocator_under_contention(tmp_path):
+    database_path = str(tmp_path / "SishenBlasts.sqlite")
+    SqliteBlastIdAllocator(database_path)
+
+    check_concurrent_allocation(database_path, database_path)
+
+
+def test_arcpy_allocator_under_contention(blast_table):
+    results, rows = check_concurrent_allocation(blast_table, fake_arcpy.database_path(os.path.dirname(blast_table)))
+
+    # Every process gets back the user editor tracking recorded for its rows
+    assert [users for _, _, users in results] == [{f"user{number}"} for number in range(len(results))]
+    users_by_id = {blast_id: f"user{number}" for number, (ids, _, _) in enumerate(results) for blast_id in ids}
+    assert all(users_by_id[row[0]] == row[2] for row in rows)
+
+
+def test_allocate_returns_the_created_user(blast_table):
+    fake_arcpy.editor_user = "planner"
+
+    blast_id, user = ArcpyBlastIdAllocator(blast_table).allocate("North Mine", datetime(2024, 5, 1, 8, 0))
+
+    assert user == "planner"
+    assert table_rows(fake_arcpy.database_path(os.path.dirname(blast_table))) == [(blast_id, "North Mine", "planner")]
+
+
+def test_orphaned_reservations_are_removed(blast_table):
+    database_path = fake_arcpy.database_path(os.path.dirname(blast_table))
+    killed_batch = ArcpyBlastIdAllocator(blast_table)
+    killed_batch.reserve(3)
+    with fake_arcpy.da.InsertCursor(blast_table, ["Mine", "DateTime"]) as cursor:
+        cursor.insertRow([None, None])
+    running_batch = ArcpyBlastIdAllocator(blast_table)
+    running_batch.reserve(2)
+    blast_id, _ = running_batch.allocate("South Mine", datetime(2024, 5, 1, 8, 0))
+
+    # Rows reserved within the last day belong to a batch that may still be running
+    assert running_batch.remove_orphans() == 1
+    assert len(table_rows(database_path)) == 5
+
+    assert running_batch.remove_orphans(orphan_seconds=-60) == 4
+    assert table_rows(database_path) == [(blast_id, "South Mine", getpass.getuser())]
@@ -0,0 +1,132 @@
+import getpass
+import os
+import sqlite3
+import sys
+
+import pytest
+
+import BlastClearance as blast_clearance
+import tracing
+from benchmarks import fake_arcpy
+from benchmarks.environment import create_environment
+from benchmarks.recording import create_replay_database, record_live_fixtures
+from benchmarks.synthetic import blast_block_numbers, create_mine_database
+from blast_config import read_config
+
+
+master_tables = ["SishenBlasts", "SisBlastBlocks", "SisBlastClearanceZones", "SisBlastRoads"]
+
+
+# This function creates a synthetic mine and the environment of the tool around it, run_blast then runs against the
+# fake arcpy. The configuration of the repository is applied again afterwards.
+@pytest.fixture
+def environment(tmp_path, request):
+    database_path = str(tmp_path / "mine.sqlite")
+    create_mine_database(database_path, 60, 3000)
+    create_environment(str(tmp_path), database_path, getattr(request, "param", None))
+    yield database_path
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+    blast_clearance.apply_config(read_config())
+
+
+# This function runs a query on the working geodatabase
+def query_masters(query):
+    connection = sqlite3.connect(fake_arcpy.database_path(blast_clearance.working_gdb))
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+# This function returns the number of rows of the master tables
+def master_counts():
+    return {table: query_masters(f"SELECT COUNT(*) FROM {table}")[0][0] for table in master_tables}
+
+
+# This function returns the tables left in the in-memory workspace
+def memory_tables():
+    rows, _ = fake_arcpy._Connection(None).query("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return [row[0] for row in rows if row[0] != fake_arcpy.metadata_table]
+
+
+@pytest.mark.parametrize("environment", [{"clearance_zone_engine": "arcpy"}, {"clearance_zone_engine": "memory"},
+                                         {"scratch_workspace_mode": "gdb"}, {"use_block_geometry_cache": "false"}],
+                         indirect=True)
+def test_blast_fills_the_masters(environment):
+    block_numbers = blast_block_numbers(10, 60)
+
+    blast_id, user, cad_files_copied = blast_clearance.run_blast(block_numbers, 300, 500)
+
+    assert user == getpass.getuser() and cad_files_copied
+    counts = master_counts()
+    assert counts["SishenBlasts"] == 1 and counts["SisBlastBlocks"] == 10
+    assert counts["SisBlastClearanceZones"] >= 2 and counts["SisBlastRoads"] > 0
+    blocks = query_masters("SELECT DISTINCT BlastClearId, Mine FROM SisBlastBlocks")
+    assert len(blocks) == 1 and blocks[0][0] == str(blast_id) and blocks[0][1] is not None
+    assert query_masters("SELECT DISTINCT ClearanceType FROM SisBlastClearanceZones ORDER BY 1") == [("Machine",),
+                                                                                                    ("People",)]
+    assert "SourceObjectId" in [field.name for field in fake_arcpy.ListFields(blast_clearance.master_roads_fc)]
+    assert memory_tables() == []
+    assert set(tracing.active_tracer.totals()) >= {"blocks_check", "buffering", "road_selection", "cad_export",
+                                                   "append"}
+    # Without the geometry cache the shapes are read through the query layer
+    geometry_stages = {"sql_building", "query_layer"} if not blast_clearance.use_block_geometry_cache else {
+        "block_geometry_cache"}
+    assert set(tracing.active_tracer.totals()) >= geometry_stages
+    assert os.path.exists(blast_clearance.block_geometry_cache_file) == blast_clearance.use_block_geometry_cache
+
+
+def test_schema_mismatch_fails_before_the_append(environment):
+    fake_arcpy.AddField_management(blast_clearance.master_roads_fc, "Extra", "TEXT")
+
+    with pytest.raises(fake_arcpy.ExecuteError, match=r"missing \['extra'\]"):
+        blast_clearance.run_blast(blast_block_numbers(5, 60), 300, 500)
+
+    assert master_counts()["SisBlastRoads"] == 0
+    assert memory_tables() == []
+    assert os.listdir(blast_clearance.trace_dir) != []
+
+
+def test_recorded_blast_replays(environment, tmp_path):
+    block_numbers = blast_block_numbers(8, 60)
+    fixture_dir = str(tmp_path / "fixtures")
+    record_live_fixtures(fixture_dir, block_numbers)
+    replay_database_path = create_replay_database(fixture_dir, str(tmp_path / "replay.sqlite"), 3000)
+    fake_arcpy.register_workspace(blast_clearance.block_inventory_sde, replay_database_path)
+
+    blast_clearance.run_blast(block_numbers, 300, 500)
+
+    assert master_counts()["SisBlastBlocks"] == 8
+
+
+# This function drops the BlockStatus table of the mine database, every later read of it fails
+def drop_block_status(database_path):
+    connection = sqlite3.connect(database_path)
+    try:
+        connection.execute("DROP TABLE BlockStatus")
+    finally:
+        connection.close()
+
+
+def test_cached_replan_does_not_read_block_status(environment):
+    block_numbers = blast_block_numbers(10, 60)
+    first_blast_id, _, _ = blast_clearance.run_blast(block_numbers, 300, 500)
+    drop_block_status(environment)
+
+    blast_id, _, _ = blast_clearance.run_blast(block_numbers, 300, 500)
+
+    blocks = [query_masters(f"SELECT BlockId, StatusId, Tonnes FROM SisBlastBlocks WHERE BlastClearId = '{blast}' "
+                            "ORDER BY BlockId") for blast in (first_blast_id, blast_id)]
+    assert len(blocks[1]) == 10 and None not in [row[2] for row in blocks[1]]
+    assert blocks[1] == blocks[0]
+
+
+@pytest.mark.parametrize("environment", [{"block_inventory_source": "snapshot"}], indirect=True)
+def test_snapshot_blast_does_not_read_block_status(environment):
+    blast_clearance.export_block_snapshot()
+    drop_block_status(environment)
+
+    blast_clearance.run_blast(blast_block_numbers(10, 60), 300, 500)
+
+    assert query_masters("SELECT COUNT(Tonnes) FROM SisBlastBlocks")[0][0] == 10
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+import BlastClearance as blast_clearance
+import blast_worker
+from benchmarks import fake_arcpy
+from benchmarks.environment import create_environment, load_environment
+from benchmarks.synthetic import blast_block_numbers, create_mine_database
+from blast_config import read_config
+from blast_worker import BlastWorker, JobSpool
+
+
+# This function runs the worker of an environment until it was idle for idle_timeout seconds
+# job_delay makes every job wait before it runs, longer than the heartbeat may be stale
+def run_worker(config_file, database_path, idle_timeout, job_delay):
+    load_environment(config_file, database_path)
+    worker = BlastWorker(JobSpool(blast_clearance.worker_spool_dir))
+    run_job = worker.run_job
+
+    def delayed_job(job):
+        time.sleep(job_delay)
+        return run_job(job)
+
+    worker.run_job = delayed_job
+    worker.run(poll_seconds=0.05, idle_timeout=idle_timeout)
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(blast_worker, "heartbeat_seconds", 0.1)
+    database_path = str(tmp_path / "mine.sqlite")
+    create_mine_database(database_path, 40, 2000)
+    config_file = create_environment(str(tmp_path), database_path, {"use_resident_worker": "true"})
+    yield config_file, database_path
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+    blast_clearance.apply_config(read_config())
+
+
+# This function starts a worker process and waits for its first heartbeat
+def start_worker(environment, idle_timeout=3.0, job_delay=0.0):
+    worker = multiprocessing.Process(target=run_worker, args=[*environment, idle_timeout, job_delay])
+    worker.start()
+    spool = JobSpool(blast_clearance.worker_spool_dir, create=False)
+    start = time.monotonic()
+    while not spool.worker_alive() and time.monotonic() - start < 30:
+        time.sleep(0.05)
+    return worker
+
+
+def test_worker_keeps_beating_during_a_long_job(environment):
+    # The job waits ten heartbeats before it runs, the heartbeat thread keeps the client waiting
+    worker = start_worker(environment, job_delay=1.0)
+    try:
+        job_result = blast_clearance.submit_to_worker(blast_block_numbers(5, 40), 300, 500)
+    finally:
+        worker.join(30)
+
+    assert job_result["status"] == "SUCCESS" and job_result["errors"] == []
+    assert worker.exitcode == 0
+    assert not os.path.exists(JobSpool(blast_clearance.worker_spool_dir).heartbeat_file)
+
+
+def test_failed_job_raises(environment):
+    worker = start_worker(environment)
+    try:
+        with pytest.raises(fake_arcpy.ExecuteError, match="failed job"):
+            blast_clearance.submit_to_worker(["999999"], 300, 500)
+    finally:
+        worker.join(30)
+
+    assert any("Blocks do not exist: 999999" in text for kind, text in fake_arcpy.messages if kind == "error")
+
+
+def test_client_gives_up_when_the_heartbeat_is_stale(environment):
+    # A worker that stopped without removing its heartbeat file
+    spool = JobSpool(blast_clearance.worker_spool_dir)
+    spool.beat()
+
+    with pytest.raises(fake_arcpy.ExecuteError, match="did not finish"):
+        blast_clearance.submit_to_worker(blast_block_numbers(5, 40), 300, 500)
+
+    # The job was withdrawn, a restarted worker does not run it
+    assert os.listdir(spool.folders["incoming"]) == []
+    assert spool.claim() is None
+
+
+def test_no_worker_runs_the_blast_locally(environment):
+    assert blast_clearance.submit_to_worker(blast_block_numbers(5, 40), 300, 500) is None
@@ -0,0 +1,53 @@
+import pytest
+
+from block_input import (file_block_entries, list_block_entries, read_block_input, rejected_message,
+                         text_block_entries)
+
+
+def test_numbers_are_normalised_and_deduplicated_in_order():
+    blocks, rejected, duplicate_count = read_block_input(list_block_entries([" 1235/", "'1234'", 1235.0, "", "12?34",
+                                                                             "1234"]))
+
+    assert blocks == ["1235", "1234"]
+    assert rejected == [["Block list item 5", "12?34"]]
+    assert duplicate_count == 2
+
+
+def test_text_file_is_split_on_line_breaks_and_commas(tmp_path):
+    blocks_file = tmp_path / "planning.txt"
+    blocks_file.write_text("# Blast 14 North\n1234, 1235\n\n1236\r\n1234 1237\n")
+
+    blocks, rejected, duplicate_count = read_block_input(text_block_entries(str(blocks_file)))
+
+    assert blocks == ["1234", "1235", "1236"]
+    assert rejected == [["planning.txt line 5", "1234 1237"]]
+    assert duplicate_count == 0
+
+
+@pytest.mark.parametrize("header", ["Mine,Block Number,Level\n", ""])
+def test_csv_file_is_read_by_column(tmp_path, header):
+    blocks_file = tmp_path / "planning.csv"
+    rows = "North,1234,500\nNorth,\"1235\",500\n" if header else "1234,North\n1235,North\n"
+    blocks_file.write_text(header + rows + ("North,1234,515\n" if header else "1234,North\n"))
+
+    blocks, rejected, duplicate_count = read_block_input(file_block_entries(str(blocks_file)))
+
+    assert blocks == ["1234", "1235"]
+    assert rejected == []
+    assert duplicate_count == 1
+
+
+def test_large_planning_file(tmp_path):
+    blocks_file = tmp_path / "planning.txt"
+    with open(blocks_file, "w") as file:
+        for count in range(100000):
+            file.write("12?34\n" if count % 1000 == 999 else f" {100000 + count % 5000}/\n")
+
+    blocks, rejected, duplicate_count = read_block_input(file_block_entries(str(blocks_file)))
+
+    # Every 1000th entry is malformed, so the numbers at those positions never appear
+    assert blocks == [str(100000 + count) for count in range(5000) if count % 1000 != 999]
+    assert len(rejected) == 100 and rejected[0] == ["planning.txt line 1000", "12?34"]
+    assert duplicate_count == 100000 - 100 - 4995
+    assert rejected_message(rejected, 2) == ("100 malformed block numbers (planning.txt line 1000: '12?34'; "
+                                             "planning.txt line 2000: '12?34'; ... and 98 more)")
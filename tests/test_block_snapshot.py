@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.synthetic import blast_block_numbers, block_number, create_mine_database
+from block_snapshot import (SnapshotSource, SqliteSnapshotSource, current_version, export_snapshot,
+                            open_current_snapshot, snapshot_versions)
+from block_validation import SqliteBlockSource, validate_blocks
+from geometry_cache import SqliteBlockGeometrySource
+from lookup_cache import SqliteLookupSource
+from query_builder import SqliteBlockStatusSource, fetch_block_status_ids
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    database_path = str(tmp_path / "BlockInventory.sqlite")
+    create_mine_database(database_path, 300, 10)
+    return database_path
+
+
+# This function returns the block, block status, block geometry and lookup sources of a database
+def live_sources(database_path):
+    return [SqliteBlockSource(database_path), SqliteBlockStatusSource(database_path),
+            SqliteBlockGeometrySource(database_path), SqliteLookupSource(database_path)]
+
+
+# This function reads the BlockInventory rows of a blast the way the tool does
+def read_blast(numbers, sources):
+    block_source, block_status_source, geometry_source, lookup_source = sources
+    block_array, missing = validate_blocks(numbers, block_source)
+    return {"blocks": block_array, "missing": missing,
+            "block_status_ids": fetch_block_status_ids(block_array, block_status_source),
+            "geometries": sorted(geometry_source.fetch_geometries([[block[0], block[2]] for block in block_array])),
+            "levels": sorted(lookup_source.read_levels()),
+            "elevation_datums": sorted(lookup_source.read_elevation_datums())}
+
+
+def test_snapshot_reads_match_the_live_reads(database_path, tmp_path):
+    snapshot_dir = str(tmp_path / "Snapshot")
+    manifest = export_snapshot(SqliteSnapshotSource(database_path), snapshot_dir)
+    numbers = blast_block_numbers(40, 300) + ["999999"]
+    snapshot_sources = [SnapshotSource(snapshot_dir, source) for source in live_sources(database_path)]
+
+    assert manifest["rows"]["Block"] == 300
+    assert read_blast(numbers, snapshot_sources) == read_blast(numbers, live_sources(database_path))
+    # Only the unknown block number was looked up in the live source
+    assert [source.live_reads for source in snapshot_sources] == [1, 0, 0, 0]
+
+
+def test_blocks_created_after_the_export_are_read_live(database_path, tmp_path):
+    snapshot_dir = str(tmp_path / "Snapshot")
+    export_snapshot(SqliteSnapshotSource(database_path), snapshot_dir)
+    connection = sqlite3.connect(database_path)
+    block_id, status_id = connection.execute("SELECT BlockId, StatusId FROM BlockStatus WHERE BlockId = 1").fetchone()
+    shape = connection.execute("SELECT Shape FROM BlockStatus WHERE BlockId = 1").fetchone()[0]
+    connection.execute("INSERT INTO Block (BlockId, Number, CurrentStatusID, LevelId) "
+                       "SELECT 301, ?, ?, LevelId FROM Block WHERE BlockId = 1", [block_number(301), status_id])
+    connection.execute("INSERT INTO BlockStatus (BlockId, StatusId, Shape) VALUES (301, ?, ?)", [status_id, shape])
+    connection.commit()
+    connection.close()
+    sources = [SnapshotSource(snapshot_dir, source) for source in live_sources(database_path)]
+
+    blast = read_blast([block_number(1), block_number(301)], sources)
+
+    assert [block[0] for block in blast["blocks"]] == [block_id, 301]
+    assert blast["missing"] == []
+    assert len(blast["block_status_ids"]) == 2 and len(blast["geometries"]) == 2
+    assert [source.live_reads for source in sources[:3]] == [1, 1, 1]
+
+
+def test_missing_or_stale_snapshot_uses_the_live_source(database_path, tmp_path):
+    snapshot_dir = str(tmp_path / "Snapshot")
+    os.makedirs(snapshot_dir)
+    block_source = SnapshotSource(snapshot_dir, SqliteBlockSource(database_path), max_age_seconds=0)
+
+    assert open_current_snapshot(snapshot_dir, 3600) == (None, f"no BlockInventory snapshot in {snapshot_dir}")
+    assert [row[0] for row in block_source.fetch_blocks([block_number(5)])] == [5]
+
+    export_snapshot(SqliteSnapshotSource(database_path), snapshot_dir)
+    snapshot, description = open_current_snapshot(snapshot_dir, 0)
+
+    assert snapshot is None and description.endswith("(stale)")
+    assert block_source.current() is None
+    assert [row[0] for row in block_source.fetch_blocks([block_number(5)])] == [5]
+
+
+def test_export_keeps_the_newest_versions(database_path, tmp_path):
+    snapshot_dir = str(tmp_path / "Snapshot")
+    versions = [export_snapshot(SqliteSnapshotSource(database_path), snapshot_dir, keep_versions=2)["version"]
+                for _ in range(3)]
+    block_source = SnapshotSource(snapshot_dir, SqliteBlockSource(database_path))
+
+    assert sorted(snapshot_versions(snapshot_dir)) == sorted(versions[1:])
+    assert current_version(snapshot_dir) == versions[2]
+    assert block_source.current().version == versions[2]
+
+
+def test_numpy_is_not_imported_with_the_module():
+    # A new interpreter, numpy is already imported in this one
+    code = "import sys, block_snapshot; sys.exit('numpy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__))).returncode == 0
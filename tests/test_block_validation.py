@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+from benchmarks import fake_arcpy
+from benchmarks.synthetic import block_number, create_mine_database
+from block_validation import ArcpyBlockSource, SqliteBlockSource, validate_block_lists, validate_blocks
+
+
+@pytest.fixture(scope="module")
+def database_path(tmp_path_factory):
+    database_path = str(tmp_path_factory.mktemp("mine") / "mine.sqlite")
+    create_mine_database(database_path, 30, 10)
+    return database_path
+
+
+def test_blocks_are_returned_in_input_order(database_path):
+    block_list = [block_number(7), block_number(2), "424242", block_number(7), block_number(30), "17"]
+
+    block_array, missing_list = validate_blocks(block_list, SqliteBlockSource(database_path))
+
+    assert [row[1] for row in block_array] == [block_number(7), block_number(2), block_number(30)]
+    assert [row[0] for row in block_array] == [7, 2, 30]
+    assert missing_list == ["424242", "17"]
+
+
+def test_chunked_queries_give_the_same_rows(database_path):
+    block_list = [block_number(block_id) for block_id in range(30, 0, -1)] + ["1"]
+
+    expected = validate_blocks(block_list, SqliteBlockSource(database_path))
+
+    assert validate_blocks(block_list, SqliteBlockSource(database_path, chunk_size=4)) == expected
+    assert len(expected[0]) == 30 and expected[1] == ["1"]
+
+
+def test_block_lists_are_validated_together(database_path):
+    block_lists = [[block_number(1), block_number(2)], [block_number(2), "99"], []]
+
+    results = validate_block_lists(block_lists, SqliteBlockSource(database_path))
+
+    assert [[row[1] for row in block_array] for block_array, _ in results] == [[block_number(1), block_number(2)],
+                                                                                [block_number(2)], []]
+    assert [missing_list for _, missing_list in results] == [[], ["99"], []]
+
+
+def test_arcpy_source_matches_the_sqlite_source(database_path, tmp_path):
+    fake_arcpy.install()
+    fake_arcpy.reset()
+    sde_connection = str(tmp_path / "BlockInventory.sde")
+    fake_arcpy.register_workspace(sde_connection, database_path)
+    block_list = [block_number(block_id) for block_id in (3, 9, 27)] + ["5"]
+    try:
+        arcpy_result = validate_blocks(block_list, ArcpyBlockSource(os.path.join(sde_connection, "dbo.Block"),
+                                                                    chunk_size=2))
+    finally:
+        sys.modules.pop("arcpy", None)
+
+    assert arcpy_result == validate_blocks(block_list, SqliteBlockSource(database_path))
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import cad_export
+from cad_export import CadExportPool
+
+
+def write_file(file_path, contents):
+    with open(file_path, "w") as file:
+        file.write(contents)
+    return str(file_path)
+
+
+def read_file(file_path):
+    with open(file_path) as file:
+        return file.read()
+
+
+def test_failed_export_and_copies_are_reported(tmp_path):
+    pool = CadExportPool(max_workers=2)
+    export_file = write_file(tmp_path / "REF_ID1.DGN", "blast 1")
+    second_export_file = write_file(tmp_path / "REF_ID2.DGN", "blast 2")
+
+    def failed_export():
+        raise RuntimeError("ERROR 000210: Cannot create output")
+
+    failed_job = pool.submit("Blast 1", tmp_path / "REF.DGN", failed_export,
+                             [[export_file, str(tmp_path / "ID1_REF.dgn")]], [], temp_files=[export_file])
+    job = pool.submit("Blast 2", tmp_path / "REF.DGN", lambda: None, [],
+                      [[str(tmp_path / "Missing.dgn"), str(tmp_path / "ID2" / "Blast.dgn")],
+                       [second_export_file, str(tmp_path / "ID2_REF.dgn")]])
+    failures = pool.shutdown()
+
+    assert failed_job.copied_files == [] and str(failed_job.export_error) == "ERROR 000210: Cannot create output"
+    assert [failure[0] for failure in failures] == ["Blast 1", "Blast 2"]
+    assert failures[0][2] == "Export failed: ERROR 000210: Cannot create output"
+    assert failures[1][1] == str(tmp_path / "ID2" / "Blast.dgn") and failures[1][2].startswith("Copy failed")
+    # The copy after the failed one is still done, the export of the failed job is deleted
+    assert job.copied_files == [str(tmp_path / "ID2_REF.dgn")]
+    assert read_file(tmp_path / "ID2_REF.dgn") == "blast 2"
+    assert not (tmp_path / "REF_ID1.DGN").exists()
+
+
+def test_failed_job_is_reported_by_wait(tmp_path, monkeypatch):
+    pool = CadExportPool(max_workers=1)
+
+    def broken_copies(job, copies, snapshot=False):
+        raise ValueError("broken")
+
+    monkeypatch.setattr(pool, "_copy_files", broken_copies)
+    pool.submit("Blast 1", tmp_path / "REF.DGN", lambda: None, [], [])
+
+    assert pool.wait() == [["Blast 1", "", "CAD job failed: broken"]]
+    assert pool.jobs == []
+    pool.shutdown()
+
+
+def test_reference_copies_of_a_mine_are_serialised(tmp_path, monkeypatch):
+    active = {}
+    overlaps = {"same_mine": 0, "other_mine": 0}
+    active_lock = threading.Lock()
+
+    # A slow share, the copies record which copies run at the same time
+    def slow_publish(source_file, destination_file):
+        mine = read_file(source_file)
+        with active_lock:
+            if active.get(mine, 0) > 0:
+                overlaps["same_mine"] += 1
+            if sum(active.values()) - active.get(mine, 0) > 0:
+                overlaps["other_mine"] += 1
+            active[mine] = active.get(mine, 0) + 1
+        time.sleep(0.05)
+        with active_lock:
+            active[mine] -= 1
+
+    monkeypatch.setattr(cad_export, "publish_file", slow_publish)
+    pool = CadExportPool(max_workers=4)
+    for count in range(8):
+        mine = "North Mine" if count % 2 == 0 else "South Mine"
+        export_file = write_file(tmp_path / f"export{count}.dgn", mine)
+        # The lock key of the mine is not case sensitive, like the paths of the share
+        reference_file = str(tmp_path / mine / ("REF.DGN" if count < 4 else "ref.dgn"))
+        pool.submit(f"Blast {count}", reference_file, lambda: None, [[export_file, reference_file, "copy"]], [])
+
+    assert pool.shutdown() == []
+    assert overlaps["same_mine"] == 0
+    assert overlaps["other_mine"] > 0
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cad_store import ArtefactStore, export_key, file_digest
+
+
+# This function writes a file and returns its path
+def write_file(file_path, data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as file:
+        file.write(data)
+    return file_path
+
+
+def read_file(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+@pytest.fixture
+def master_file(tmp_path):
+    return write_file(str(tmp_path / "Resources" / "NorthMaster.dgn"), os.urandom(256 * 1024))
+
+
+def test_master_is_stored_once_for_every_blast(tmp_path, master_file):
+    store = ArtefactStore(str(tmp_path / "_ArtefactStore"))
+    destination_files = [str(tmp_path / f"ID{blast}" / "Blast.dgn") for blast in range(10)]
+    for destination_file in destination_files:
+        os.makedirs(os.path.dirname(destination_file))
+
+    methods = [store.materialise(master_file, destination_file) for destination_file in destination_files]
+
+    assert methods == ["link"] * 10
+    assert store.bytes_written == os.path.getsize(master_file)
+    assert all(read_file(destination_file) == read_file(master_file) for destination_file in destination_files)
+    blob_path = store._blob_path(file_digest(master_file) + ".dgn")
+    assert os.stat(blob_path).st_nlink == 11
+    assert os.stat(blob_path).st_mode & 0o222 == 0
+
+
+def test_blast_files_are_copies_without_hard_links(tmp_path, master_file):
+    store = ArtefactStore(str(tmp_path / "_ArtefactStore"), hard_links=False)
+    destination_file = str(tmp_path / "Blast.dgn")
+
+    assert store.materialise(master_file, destination_file) == "copy"
+    assert store.materialise(master_file, destination_file) == "copy"
+    assert read_file(destination_file) == read_file(master_file)
+    assert store.bytes_written == 3 * os.path.getsize(master_file)
+
+
+def test_same_geometry_reuses_the_export(tmp_path):
+    store = ArtefactStore(str(tmp_path / "_ArtefactStore"))
+    reference_file = write_file(str(tmp_path / "BLAST_REFERENCE.DGN"), b"blast 1" * 1000)
+    key = export_key([b"500", b"block wkb"], "WGS 1984", "seed")
+    store.record_export(key, reference_file)
+    bytes_written = store.bytes_written
+
+    # The output file still holds the export, nothing is written
+    assert store.restore_export(key, reference_file)
+    assert store.bytes_written == bytes_written
+
+    # The output file was overwritten by the export of another blast
+    write_file(reference_file, b"blast 2" * 1000)
+    assert store.restore_export(key, reference_file)
+    assert read_file(reference_file) == b"blast 1" * 1000
+
+    assert not store.restore_export(export_key([b"500", b"other block wkb"], "WGS 1984", "seed"), reference_file)
+
+
+def test_export_key_depends_on_rows_and_settings():
+    key = export_key([b"ab", b"c"], "WGS 1984")
+
+    assert key == export_key([b"ab", b"c"], "WGS 1984")
+    assert key != export_key([b"a", b"bc"], "WGS 1984")
+    assert key != export_key([b"ab", b"c"], "Hartebeesthoek94")
+
+
+def test_concurrent_puts_store_one_blob(tmp_path, master_file):
+    store = ArtefactStore(str(tmp_path / "_ArtefactStore"))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        blob_names = list(executor.map(lambda _: ArtefactStore(store.store_dir).put(master_file), range(16)))
+
+    assert len(set(blob_names)) == 1
+    blob_dir = os.path.dirname(store._blob_path(blob_names[0]))
+    assert os.listdir(blob_dir) == [blob_names[0]]
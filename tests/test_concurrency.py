@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+import BlastClearance as blast_clearance
+from benchmarks import fake_arcpy
+from benchmarks.concurrency import stress_test
+from blast_config import read_config
+
+
+@pytest.fixture(autouse=True)
+def restore_config():
+    yield
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+    blast_clearance.apply_config(read_config())
+
+
+@pytest.mark.parametrize("scratch_mode", ["gdb", "memory"])
+def test_concurrent_blasts_keep_their_outputs_apart(scratch_mode):
+    result = stress_test(process_count=3, blast_count=3, blocks_per_blast=6, road_count=2000,
+                         scratch_mode=scratch_mode)
+
+    assert result["problems"] == []
+    assert result["blasts"] == 9
+    assert result["scratch_left"] == []
@@ -0,0 +1,110 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import shapely
+
+from conflict_index import ConflictIndex, SqliteConflictSource
+
+start_time = datetime(2026, 3, 1, 6, 0)
+
+
+# This function returns the machine and people zones of a blast as squares around a point
+def square_zones(x, y, machine_radius=300.0, people_radius=500.0):
+    zones = []
+    for clearance_type, radius in (("Machine", machine_radius), ("People", people_radius)):
+        zone = shapely.box(x - radius, y - radius, x + radius, y + radius)
+        zones.append([clearance_type, shapely.to_wkb(zone), zone.bounds])
+    return zones
+
+
+def test_zones_overlapping_in_the_same_shift_conflict():
+    index = ConflictIndex(window_hours=12)
+    index.add_blast(1, start_time, square_zones(0.0, 0.0), [11, 12])
+    index.add_blast(2, start_time + timedelta(hours=15), square_zones(0.0, 0.0), [12])
+    # The people zones of blast 3 only touch the people zone of blast 1
+    index.add_blast(3, start_time, square_zones(1700.0, 0.0), [13])
+
+    zone_conflicts, road_conflicts = index.find_conflicts(4, start_time + timedelta(hours=2),
+                                                          square_zones(700.0, 0.0), [12, 13, 14])
+
+    assert sorted(zone_conflicts) == [["1", start_time, "Machine", "People"], ["1", start_time, "People", "Machine"],
+                                      ["1", start_time, "People", "People"]]
+    assert road_conflicts == {"1": [12], "3": [13]}
+
+
+def test_blasts_in_neighbouring_buckets_conflict():
+    index = ConflictIndex(window_hours=12)
+    bucket_end = datetime.fromtimestamp((index._time_bucket(start_time) + 1) * index.window_seconds)
+    index.add_blast(1, bucket_end - timedelta(minutes=30), square_zones(0.0, 0.0), [7])
+
+    zone_conflicts, road_conflicts = index.find_conflicts(2, bucket_end + timedelta(minutes=30),
+                                                          square_zones(100.0, 100.0), [7])
+
+    assert len(zone_conflicts) == 4 and road_conflicts == {"1": [7]}
+    # A blast does not conflict with itself
+    assert index.find_conflicts(1, bucket_end - timedelta(minutes=30), square_zones(0.0, 0.0), [7]) == ([], {})
+
+
+def test_index_finds_the_same_conflicts_as_a_full_scan():
+    generator = random.Random(3)
+    index = ConflictIndex(window_hours=12, cell_size=500.0)
+    history = []
+    for blast in range(2000):
+        date_time = start_time + timedelta(hours=blast * 2.0)
+        zones = square_zones(generator.uniform(0.0, 6000.0), generator.uniform(0.0, 6000.0))
+        road_ids = [generator.randrange(300) for _ in range(5)]
+        index.add_blast(blast, date_time, zones, road_ids)
+        history.append([str(blast), date_time, zones, road_ids])
+
+    for check in range(100):
+        date_time = start_time + timedelta(hours=generator.uniform(0.0, 4000.0))
+        zones = square_zones(generator.uniform(0.0, 6000.0), generator.uniform(0.0, 6000.0))
+        road_ids = [generator.randrange(300) for _ in range(5)]
+        expected_zones = []
+        expected_roads = {}
+        for blast_id, other_date_time, other_zones, other_road_ids in history:
+            if abs((other_date_time - date_time).total_seconds()) > 12 * 3600:
+                continue
+            for other_type, other_wkb, _ in other_zones:
+                for clearance_type, shape_wkb, _ in zones:
+                    other_zone, zone = shapely.from_wkb(other_wkb), shapely.from_wkb(shape_wkb)
+                    if other_zone.intersects(zone) and not other_zone.touches(zone):
+                        expected_zones.append([blast_id, other_date_time, other_type, clearance_type])
+            shared = sorted(set(road_ids) & set(other_road_ids))
+            if len(shared) > 0:
+                expected_roads[blast_id] = shared
+
+        zone_conflicts, road_conflicts = index.find_conflicts(f"new {check}", date_time, zones, road_ids)
+
+        assert sorted(zone_conflicts) == sorted(expected_zones)
+        assert road_conflicts == expected_roads
+
+
+def test_load_adds_each_blast_of_the_masters_once(tmp_path):
+    database_path = str(tmp_path / "BlastClearance.sqlite")
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE Clearance_Master (BlastClearId TEXT, DateTime TEXT, ClearanceType TEXT, "
+                       "Shape BLOB)")
+    connection.execute("CREATE TABLE Roads_Master (BlastClearId TEXT, DateTime TEXT, SourceObjectId INTEGER)")
+    for blast, hours in ((1, 0), (2, 5), (3, 48)):
+        date_time = (start_time + timedelta(hours=hours)).isoformat(sep=" ")
+        connection.executemany("INSERT INTO Clearance_Master VALUES (?, ?, ?, ?)",
+                               [[str(blast), date_time, clearance_type, shape_wkb]
+                                for clearance_type, shape_wkb, _ in square_zones(blast * 100.0, 0.0)])
+        connection.executemany("INSERT INTO Roads_Master VALUES (?, ?, ?)",
+                               [[str(blast), date_time, road_id] for road_id in (blast, 99, None)])
+    connection.commit()
+    connection.close()
+    index = ConflictIndex(window_hours=12)
+    source = SqliteConflictSource(database_path)
+
+    assert index.load(source, start_time - timedelta(hours=12), start_time + timedelta(hours=12)) == 2
+    assert index.load(source, start_time - timedelta(hours=12), start_time + timedelta(hours=60)) == 1
+    assert sorted(index.blasts) == ["1", "2", "3"]
+
+    zone_conflicts, road_conflicts = index.find_conflicts(4, start_time + timedelta(hours=3),
+                                                          square_zones(150.0, 0.0), [2, 99])
+
+    assert sorted({row[0] for row in zone_conflicts}) == ["1", "2"]
+    assert road_conflicts == {"1": [99], "2": [2, 99]}
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import file_lock
+from file_lock import FileLock
+
+
+# This function increments the counter file a number of times while holding the lock
+def increment_counter(lock_file, counter_file, rounds):
+    for _ in range(rounds):
+        with FileLock(lock_file, poll_seconds=0.001):
+            with open(counter_file) as file:
+                value = int(file.read())
+            with open(counter_file, "w") as file:
+                file.write(str(value + 1))
+
+
+# This function writes a lock file last modified seconds ago
+def write_lock_file(lock_file, seconds_ago):
+    with open(lock_file, "w") as file:
+        file.write("crashed 1 2024-01-01T00:00:00")
+    modified_time = time.time() - seconds_ago
+    os.utime(lock_file, (modified_time, modified_time))
+
+
+def test_concurrent_processes_take_turns(tmp_path):
+    lock_file = str(tmp_path / "counter.lock")
+    counter_file = str(tmp_path / "counter.txt")
+    with open(counter_file, "w") as file:
+        file.write("0")
+
+    with multiprocessing.Pool(8) as pool:
+        pool.starmap(increment_counter, [[lock_file, counter_file, 50]] * 8)
+
+    with open(counter_file) as file:
+        assert int(file.read()) == 8 * 50
+    assert not os.path.exists(lock_file)
+
+
+def test_held_lock_times_out(tmp_path):
+    lock_file = str(tmp_path / "held.lock")
+    with FileLock(lock_file):
+        with pytest.raises(TimeoutError, match=f"{os.getpid()}"):
+            FileLock(lock_file, timeout=0.2).acquire()
+
+
+def test_stale_lock_is_removed(tmp_path):
+    lock_file = str(tmp_path / "stale.lock")
+    write_lock_file(lock_file, 3600)
+
+    with FileLock(lock_file, timeout=1, stale_seconds=60) as lock:
+        assert str(os.getpid()) in lock.owner()
+    assert not os.path.exists(lock_file + ".break")
+
+
+def test_lock_taken_after_the_stale_check_is_kept(tmp_path, monkeypatch):
+    lock_file = str(tmp_path / "taken.lock")
+    write_lock_file(lock_file, 3600)
+    is_stale = file_lock._is_stale
+    checks = []
+
+    # Another process removes the stale lock and takes the lock between the first check and the removal
+    def stale_then_taken(path, stale_seconds):
+        checks.append(path)
+        stale = is_stale(path, stale_seconds)
+        if len(checks) == 1:
+            os.remove(lock_file)
+            write_lock_file(lock_file, 0)
+        return stale
+
+    monkeypatch.setattr(file_lock, "_is_stale", stale_then_taken)
+    FileLock(lock_file, stale_seconds=60)._remove_stale_lock()
+
+    assert checks == [lock_file, lock_file]
+    assert os.path.exists(lock_file) and not os.path.exists(lock_file + ".break")
+
+
+def test_stale_lock_is_left_while_another_process_removes_it(tmp_path):
+    lock_file = str(tmp_path / "breaking.lock")
+    write_lock_file(lock_file, 3600)
+    write_lock_file(lock_file + ".break", 0)
+
+    FileLock(lock_file, stale_seconds=60)._remove_stale_lock()
+    assert os.path.exists(lock_file)
+
+    # A break file left by a crashed process is removed once it is stale itself
+    write_lock_file(lock_file + ".break", 3600)
+    FileLock(lock_file, stale_seconds=60)._remove_stale_lock()
+    assert not os.path.exists(lock_file + ".break")
+    FileLock(lock_file, stale_seconds=60)._remove_stale_lock()
+    assert not os.path.exists(lock_file)
+
+
+def test_lock_held_longer_than_stale_seconds_is_kept(tmp_path):
+    lock_file = str(tmp_path / "long.lock")
+
+    with FileLock(lock_file, stale_seconds=0.4):
+        # Another process waits for the lock longer than the stale time but does not remove it
+        with pytest.raises(TimeoutError):
+            FileLock(lock_file, timeout=1.5, stale_seconds=0.4).acquire()
+        assert os.path.exists(lock_file)
+    assert not os.path.exists(lock_file)
+
+    with FileLock(lock_file, timeout=0.2, stale_seconds=0.4):
+        pass
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.synthetic import create_mine_database
+from lookup_cache import LevelLookupCache, SqliteLookupSource
+
+
+# Lookup source counting the reads of the reference tables
+class CountingLookupSource(SqliteLookupSource):
+    def __init__(self, database_path):
+        super().__init__(database_path)
+        self.table_reads = 0
+
+    def read_levels(self):
+        self.table_reads += 1
+        return super().read_levels()
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    database_path = str(tmp_path / "BlockInventory.sqlite")
+    create_mine_database(database_path, 10, 10)
+    return database_path
+
+
+# This function runs a statement on the mine database
+def execute(database_path, statement, parameters=()):
+    connection = sqlite3.connect(database_path)
+    try:
+        connection.execute(statement, parameters)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def test_cache_file_is_used_until_the_ttl_expired(database_path, tmp_path):
+    cache_path = str(tmp_path / "LookupCache.json")
+    source = CountingLookupSource(database_path)
+    cache = LevelLookupCache(source, cache_path)
+
+    assert cache.refresh() and cache.mine_name(1) == "North Mine"
+    # A new process reads the cache file
+    reopened = LevelLookupCache(source, cache_path)
+    assert not reopened.refresh() and reopened.mine_name(1) == "North Mine"
+    assert source.table_reads == 1
+
+    execute(database_path, "UPDATE ElevationDatum SET Name = 'North Pit', last_edited_date = '2025-01-01 00:00:00' "
+                           "WHERE ElevationDatumId = 1")
+
+    assert reopened.mine_name(1) == "North Mine"
+    reopened.checked_time -= reopened.ttl_seconds + 1
+    assert reopened.mine_name(1) == "North Pit"
+    assert source.table_reads == 2
+
+
+def test_unchanged_tables_are_not_reloaded_after_the_ttl(database_path, tmp_path):
+    source = CountingLookupSource(database_path)
+    cache = LevelLookupCache(source, str(tmp_path / "LookupCache.json"), ttl_seconds=0)
+    cache.refresh()
+
+    assert not cache.refresh()
+    assert source.table_reads == 1
+
+    # Only the fingerprint (row count and latest edit date) of the tables is compared
+    execute(database_path, "UPDATE Level SET last_edited_date = '2025-01-01 00:00:00' WHERE LevelId = 2")
+
+    assert cache.refresh()
+    assert source.table_reads == 2
+
+
+def test_level_added_within_the_ttl_reloads_the_tables(database_path, tmp_path):
+    source = CountingLookupSource(database_path)
+    cache = LevelLookupCache(source, str(tmp_path / "LookupCache.json"))
+    cache.refresh()
+    execute(database_path, "INSERT INTO Level VALUES (99, 3, '2025-01-01 00:00:00')")
+
+    assert cache.mine_name(99) == "Lylyveld South"
+    assert cache.mine_names([[1, "100001", 12, 1], [2, "100002", 22, 99]]) == {1: "North Mine", 99: "Lylyveld South"}
+    assert source.table_reads == 2
+
+    with pytest.raises(KeyError, match="Level 100 does not exist"):
+        cache.mine_name(100)
+    assert source.table_reads == 3
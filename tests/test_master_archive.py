@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+from benchmarks import fake_arcpy
+from master_archive import ArcpyMasterStore, SqliteMasterStore, archive_masters, find_blast_records, query_records
+
+now = datetime(2026, 6, 15, 12, 0, 0)
+
+# BlastClearId, DateTime of the master records, the cutoff of a 90 day window is 2026-03-17 12:00
+records = [["101", datetime(2026, 1, 5, 8, 0)], ["101", datetime(2026, 1, 5, 8, 0)],
+           ["102", datetime(2026, 1, 30, 9, 0)], ["103", datetime(2026, 2, 10, 7, 30)],
+           ["104", datetime(2026, 3, 2, 14, 0)], ["105", datetime(2026, 3, 20, 6, 0)],
+           ["106", datetime(2026, 6, 1, 10, 0)]]
+
+
+# This function creates a SQLite master table with the records and returns its store
+def sqlite_store(folder):
+    database_path = os.path.join(folder, "BlastClearance.sqlite")
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE SisBlastBlocks (BlastClearId TEXT, DateTime TEXT, Number TEXT)")
+    connection.executemany("INSERT INTO SisBlastBlocks VALUES (?, ?, ?)",
+                           [[blast_clear_id, date_time.isoformat(sep=" "), f"N{row}"]
+                            for row, (blast_clear_id, date_time) in enumerate(records)])
+    connection.commit()
+    connection.close()
+    return SqliteMasterStore(database_path, "SisBlastBlocks", os.path.join(folder, "Archive.sqlite"))
+
+
+# This function creates a master feature class with the records in a fake file geodatabase and returns its store
+def arcpy_store(folder):
+    arcpy = fake_arcpy
+    arcpy.CreateFileGDB_management(folder, "BlastClearance.gdb")
+    master_fc = arcpy.CreateFeatureclass_management(os.path.join(folder, "BlastClearance.gdb"), "SisBlastBlocks",
+                                                    "POLYGON")[0]
+    arcpy.AddFields_management(master_fc, [["BlastClearId", "TEXT"], ["DateTime", "DATE"], ["Number", "TEXT"]])
+    with arcpy.da.InsertCursor(master_fc, ["BlastClearId", "DateTime", "Number"]) as cursor:
+        for row, (blast_clear_id, date_time) in enumerate(records):
+            cursor.insertRow([blast_clear_id, date_time, f"N{row}"])
+    return ArcpyMasterStore(master_fc, os.path.join(folder, "Archive.gdb"))
+
+
+@pytest.fixture(params=["sqlite", "arcpy"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        yield sqlite_store(str(tmp_path))
+        return
+    fake_arcpy.install()
+    fake_arcpy.reset()
+    yield arcpy_store(str(tmp_path))
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+
+
+# This function returns the BlastClearIds of a master or partition table
+def blast_ids(store, table):
+    return sorted(row[0] for row in store.read(table, ["BlastClearId"]))
+
+
+def test_old_records_are_moved_into_monthly_partitions(store):
+    assert archive_masters([store], 90, now) == {"SisBlastBlocks": 5}
+
+    partitions = store.partitions()
+    assert sorted(partitions) == [datetime(2026, 1, 1), datetime(2026, 2, 1), datetime(2026, 3, 1)]
+    assert blast_ids(store, partitions[datetime(2026, 1, 1)]) == ["101", "101", "102"]
+    assert blast_ids(store, partitions[datetime(2026, 3, 1)]) == ["104"]
+    assert blast_ids(store, store.master_fc) == ["105", "106"]
+
+    # Nothing is left to move on a second run
+    assert archive_masters([store], 90, now) == {"SisBlastBlocks": 0}
+
+
+def test_interrupted_move_is_not_duplicated(store):
+    archive_masters([store], 90, now)
+    january = store.partitions()[datetime(2026, 1, 1)]
+    rows = list(store.read(january, ["BlastClearId", "DateTime", "Number"]))
+    if isinstance(store, SqliteMasterStore):
+        store.connection.executemany(f"INSERT INTO {store.master_fc} VALUES (?, ?, ?)", rows)
+        store.connection.commit()
+    else:
+        with fake_arcpy.da.InsertCursor(store.master_fc, ["BlastClearId", "DateTime", "Number"]) as cursor:
+            for row in rows:
+                cursor.insertRow(row)
+
+    # The rows were copied to the partition but not yet deleted from the master when the run stopped
+    assert archive_masters([store], 90, now) == {"SisBlastBlocks": 3}
+    assert blast_ids(store, january) == ["101", "101", "102"]
+
+
+def test_queries_read_the_master_and_the_partitions(store):
+    archive_masters([store], 90, now)
+
+    assert sorted(row[0] for row in query_records(store, ["BlastClearId"])) == ["101", "101", "102", "103",
+                                                                               "104", "105", "106"]
+    assert sorted(row[0] for row in query_records(store, ["BlastClearId"], start=datetime(2026, 2, 1),
+                                                  end=datetime(2026, 3, 10))) == ["103", "104"]
+    assert [row[1] for row in find_blast_records(store, 102, ["BlastClearId", "Number"])] == ["N2"]
+    assert [row[1] for row in find_blast_records(store, "106", ["BlastClearId", "Number"])] == ["N6"]
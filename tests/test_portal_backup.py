@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from portal_backup import BackupEngine, PortalRestClient
+
+
+# Stand-in for the sharing REST API of a portal with feature service items
+# Export jobs are reported as processing once before they complete, search results are paged two items at a time
+class Portal:
+    def __init__(self):
+        self.items = {}
+        self.exports = {}
+        self.deleted = []
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def add_item(self, item_id, title, modified, type_keywords=()):
+        self.items[item_id] = {"id": item_id, "title": title, "modified": modified,
+                               "typeKeywords": list(type_keywords)}
+
+    def search(self, parameters):
+        start = int(parameters["start"])
+        results = list(self.items.values())[start - 1:start + 1]
+        return {"results": results, "nextStart": start + 2 if start + 1 < len(self.items) else -1}
+
+    def export(self, parameters):
+        item = self.items[parameters["itemId"]]
+        with self.lock:
+            export_id = f"export{len(self.exports) + 1}"
+            self.exports[export_id] = {"source": item["id"], "polls": 0}
+        return {"exportItemId": export_id, "jobId": f"job_{export_id}"}
+
+    def status(self, export_id):
+        export = self.exports[export_id]
+        export["polls"] += 1
+        if export["source"] in self.failing:
+            return {"status": "failed", "statusMessage": "Export job timed out"}
+        return {"status": "completed" if export["polls"] > 1 else "processing"}
+
+    def data(self, export_id):
+        item = self.items[self.exports[export_id]["source"]]
+        return f"{item['id']} {item['modified']} ".encode() * 50000
+
+    # This function answers a request to a sharing REST API path
+    # Return the response body and content type
+    def respond(self, path, parameters):
+        parts = path.split("/")
+        if parts[-1] == "search":
+            result = self.search(parameters)
+        elif parts[-1] == "export":
+            result = self.export(parameters)
+        elif parts[-1] == "status":
+            result = self.status(parts[-2])
+        elif parts[-1] == "delete":
+            self.deleted.append(parts[-2])
+            result = {"success": True}
+        elif parts[-1] == "data":
+            return self.data(parts[-2]), "application/zip"
+        else:
+            result = {"error": {"code": 400, "message": f"Unknown path {path}"}}
+        return json.dumps(result).encode(), "application/json"
+
+
+# This function serves a Portal on a local port
+# Return the server and the portal URL
+def serve(portal):
+    class Handler(BaseHTTPRequestHandler):
+        def answer(self, path, query):
+            data, content_type = portal.respond(path, dict(urllib.parse.parse_qsl(query)))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            self.answer(path, query)
+
+        def do_POST(self):
+            self.answer(self.path, self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/portal"
+
+
+@pytest.fixture
+def portal():
+    portal = Portal()
+    portal.add_item("a1", "Roads", 1000)
+    portal.add_item("b2", "Blocks", 1000)
+    portal.add_item("c3", "Blocks_View", 1000, ["View Service"])
+    portal.add_item("d4", "Clearance_Zones", 1000)
+    portal.add_item("e5", "Pits", 1000)
+    server, portal.url = serve(portal)
+    yield portal
+    server.shutdown()
+    server.server_close()
+
+
+# This function backs up every feature service of the portal into a folder
+# Return the engine results and the messages
+def run_backup(portal, folder):
+    messages = []
+    client = PortalRestClient(portal.url, "backup_user", poll_seconds=0.01)
+    engine = BackupEngine(folder, os.path.join(folder, "manifest.json"), max_workers=3, message=messages.append)
+    return engine.run(client.search("owner:backup_user")), messages
+
+
+def test_backup_downloads_every_item(portal, tmp_path):
+    results, messages = run_backup(portal, str(tmp_path))
+
+    assert sorted(results) == ["Blocks", "Clearance_Zones", "Pits", "Roads"]
+    assert all(entry["status"] == "done" for entry in results.values())
+    with open(results["Roads"]["file"], "rb") as file:
+        assert file.read() == b"a1 1000 " * 50000
+    assert "Blocks_View is view, not downloading" in messages
+    assert sorted(portal.deleted) == sorted(portal.exports)
+    with open(tmp_path / "manifest.json") as file:
+        assert json.load(file)["d4"]["bytes"] == 400000
+
+
+def test_unchanged_items_are_skipped(portal, tmp_path):
+    run_backup(portal, str(tmp_path))
+    portal.add_item("a1", "Roads", 2000)
+    export_count = len(portal.exports)
+
+    results, messages = run_backup(portal, str(tmp_path))
+
+    assert results["Roads"]["status"] == "done"
+    assert [results[title]["status"] for title in ("Blocks", "Clearance_Zones", "Pits")] == ["skipped"] * 3
+    assert "Pits not modified since the last backup, skipping" in messages
+    assert len(portal.exports) == export_count + 1
+    with open(results["Roads"]["file"], "rb") as file:
+        assert file.read(8) == b"a1 2000 "
+
+
+def test_failed_export_is_retried_on_the_next_run(portal, tmp_path):
+    portal.failing.add("b2")
+
+    results, messages = run_backup(portal, str(tmp_path))
+
+    assert results["Blocks"]["status"] == "failed"
+    assert "An error occurred downloading Blocks: Export of Blocks failed: Export job timed out" in messages
+    assert [results[title]["status"] for title in ("Clearance_Zones", "Pits", "Roads")] == ["done"] * 3
+    assert sorted(portal.deleted) == sorted(portal.exports)
+
+    portal.failing.clear()
+    results, _ = run_backup(portal, str(tmp_path))
+
+    assert results["Blocks"]["status"] == "done"
+    assert [results[title]["status"] for title in ("Clearance_Zones", "Pits", "Roads")] == ["skipped"] * 3
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+from benchmarks import fake_arcpy
+from benchmarks.synthetic import create_mine_database
+from query_builder import (ArcpyBlockStatusSource, SqliteBlockStatusSource, block_status_ids_query, chunk_list,
+                           fetch_block_status_ids, fetch_chunked, in_predicate, pair_predicate)
+
+
+@pytest.fixture(scope="module")
+def database_path(tmp_path_factory):
+    database_path = str(tmp_path_factory.mktemp("mine") / "BlockInventory.sqlite")
+    create_mine_database(database_path, 2000, 10)
+    return database_path
+
+
+# This function returns the BlockStatusIds of (BlockId, StatusId) pairs with one query per pair
+def expected_block_status_ids(database_path, pairs):
+    connection = sqlite3.connect(database_path)
+    try:
+        return sorted(row[0] for pair in pairs
+                      for row in connection.execute("SELECT BlockStatusId FROM BlockStatus WHERE BlockId = ? AND "
+                                                    "StatusId = ?", pair))
+    finally:
+        connection.close()
+
+
+# This function returns a block array (BlockId, Number, StatusId, LevelId) with every status of the first blocks
+def block_array(database_path, block_count):
+    connection = sqlite3.connect(database_path)
+    try:
+        return [[row[0], str(row[0]), row[1], 1]
+                for row in connection.execute("SELECT BlockId, StatusId FROM BlockStatus WHERE BlockId <= ?",
+                                              [block_count])]
+    finally:
+        connection.close()
+
+
+def test_chunk_list():
+    assert chunk_list(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert chunk_list([], 3) == []
+    with pytest.raises(ValueError):
+        chunk_list([1], 0)
+
+
+def test_in_predicate_renders_safe_literals():
+    assert in_predicate("Number", ["100001", 7]) == ("Number IN (?, ?)", ["100001", 7])
+    assert in_predicate("Number", ["O'Brien", 7], parameterised=False) == ("Number IN ('O''Brien', 7)", [])
+    assert block_status_ids_query([3, 1]) == "select * from BlockStatus where BlockStatusId IN (3, 1)"
+    with pytest.raises(ValueError):
+        in_predicate("Number", [])
+    with pytest.raises(TypeError):
+        in_predicate("Number", [True], parameterised=False)
+
+
+def test_pair_predicates_select_the_pairs(database_path):
+    pairs = [[row[0], row[2]] for row in block_array(database_path, 20)][::3]
+    connection = sqlite3.connect(database_path)
+    try:
+        for parameterised in (True, False):
+            predicate, parameters = pair_predicate(pairs, parameterised)
+            rows = connection.execute(f"SELECT BlockStatusId FROM BlockStatus WHERE {predicate}", parameters)
+            assert sorted(row[0] for row in rows) == expected_block_status_ids(database_path, pairs)
+
+        # The cross product predicate returns every pair of the BlockIds and StatusIds
+        predicate, parameters = pair_predicate(pairs, row_values=False)
+        rows = connection.execute(f"SELECT BlockStatusId FROM BlockStatus WHERE {predicate}", parameters)
+        assert set(expected_block_status_ids(database_path, pairs)) <= {row[0] for row in rows}
+    finally:
+        connection.close()
+
+
+def test_fetch_chunked_keeps_the_chunk_order():
+    thread_names = set()
+
+    def fetch_chunk(chunk):
+        thread_names.add(threading.current_thread().name)
+        time.sleep(0.01 * (len(chunk) % 3))
+        return [value * 2 for value in chunk]
+
+    assert fetch_chunked(list(range(50)), fetch_chunk, chunk_size=4, max_workers=4) == [value * 2
+                                                                                         for value in range(50)]
+    assert len(thread_names) > 1
+
+
+def test_block_status_ids_of_a_large_blast(database_path):
+    blocks = block_array(database_path, 2000)
+    pairs = [[block[0], block[2]] for block in blocks]
+
+    block_status_ids = fetch_block_status_ids(blocks, SqliteBlockStatusSource(database_path), chunk_size=300)
+
+    assert len(blocks) > 2000
+    assert block_status_ids == expected_block_status_ids(database_path, pairs)
+
+
+def test_arcpy_source_filters_the_cross_product(database_path, tmp_path):
+    fake_arcpy.install()
+    fake_arcpy.reset()
+    sde_connection = str(tmp_path / "BlockInventory.sde")
+    fake_arcpy.register_workspace(sde_connection, database_path)
+    blocks = block_array(database_path, 30)[::2]
+    source = ArcpyBlockStatusSource(os.path.join(sde_connection, "dbo.BlockStatus"))
+    thread_names = set()
+    fetch_block_status = source.fetch_block_status
+
+    def fetch_chunk(pairs):
+        thread_names.add(threading.current_thread().name)
+        return fetch_block_status(pairs)
+
+    source.fetch_block_status = fetch_chunk
+    try:
+        block_status_ids = fetch_block_status_ids(blocks, source, chunk_size=4)
+    finally:
+        sys.modules.pop("arcpy", None)
+
+    assert block_status_ids == expected_block_status_ids(database_path, [[block[0], block[2]] for block in blocks])
+    # arcpy is not thread safe, the chunks are read on the calling thread
+    assert thread_names == {threading.current_thread().name}
@@ -0,0 +1,63 @@
+import numpy as np
+import shapely
+
+import road_impact
+from benchmarks.synthetic import synthetic_roads
+from road_impact import classify_roads, road_distances
+from zone_engine import clearance_zones, synthetic_blocks
+
+
+# This function returns the shapely distances of roads to blocks, infinity beyond max_distance
+def reference_distances(roads, blocks, max_distance):
+    distances = shapely.distance(roads, shapely.union_all(np.asarray(blocks, dtype=object)))
+    distances[distances > max_distance] = np.inf
+    return distances
+
+
+def test_road_distances_match_shapely():
+    blocks = synthetic_blocks(60)
+    min_x, min_y, max_x, max_y = shapely.total_bounds(np.asarray(blocks, dtype=object))
+    roads = synthetic_roads(3000, (min_x - 1000.0, min_y - 1000.0, max_x + 1000.0, max_y + 1000.0))
+
+    distances = road_distances(roads, blocks, 500.0)
+
+    assert np.isfinite(distances).sum() > 0
+    assert np.allclose(distances, reference_distances(roads, blocks, 500.0), atol=1e-6)
+
+
+def test_road_distances_in_small_chunks(monkeypatch):
+    blocks = synthetic_blocks(200)
+    min_x, min_y, max_x, max_y = shapely.total_bounds(np.asarray(blocks, dtype=object))
+    roads = synthetic_roads(2000, (min_x - 600.0, min_y - 600.0, max_x + 600.0, max_y + 600.0))
+    expected = road_distances(roads, blocks, 300.0)
+
+    monkeypatch.setattr(road_impact, "max_pairs", 500)
+
+    assert np.array_equal(road_distances(roads, blocks, 300.0), expected)
+    assert np.allclose(expected, reference_distances(roads, blocks, 300.0), atol=1e-6)
+
+
+def test_roads_are_clipped_to_their_clearance_zone():
+    blocks = synthetic_blocks(60)
+    min_x, min_y, max_x, max_y = shapely.total_bounds(np.asarray(blocks, dtype=object))
+    roads = synthetic_roads(3000, (min_x - 1500.0, min_y - 1500.0, max_x + 1500.0, max_y + 1500.0))
+    machine_zones, people_zones = clearance_zones(blocks, 300.0, 500.0)
+    machine_union = shapely.union_all(np.asarray(machine_zones, dtype=object))
+    people_union = shapely.difference(shapely.union_all(np.asarray(people_zones, dtype=object)), machine_union)
+
+    classified = classify_roads(roads, blocks, 300.0, 500.0, machine_zones, people_zones)
+
+    lengths = {}
+    for road, clearance_type, clipped in classified:
+        lengths[(road, clearance_type)] = clipped.length
+    expected = {}
+    for clearance_type, zone in (("Machine", machine_union), ("People", people_union)):
+        for road, length in enumerate(shapely.length(shapely.intersection(roads, zone))):
+            if length > 1e-6:
+                expected[(road, clearance_type)] = length
+    assert len(classified) == len(lengths)
+    assert sorted(lengths) == sorted(expected)
+    assert np.allclose([lengths[key] for key in sorted(lengths)], [expected[key] for key in sorted(expected)])
+    # Roads further than the people radius are left out
+    far_roads = set(np.flatnonzero(reference_distances(roads, blocks, 500.0) == np.inf).tolist())
+    assert len(far_roads) > 0 and far_roads.isdisjoint(road for road, _, _ in classified)
@@ -0,0 +1,62 @@
+import numpy as np
+
+from road_index import RoadIndex
+
+
+# This function creates short road segment boxes scattered over a square area
+def road_boxes(segment_count, area_size=20000.0, max_length=200.0, seed=1):
+    generator = np.random.default_rng(seed)
+    start = generator.uniform(0.0, area_size, size=(segment_count, 2))
+    end = start + generator.uniform(-max_length, max_length, size=(segment_count, 2))
+    return np.hstack([np.minimum(start, end), np.maximum(start, end)])
+
+
+def test_candidates_match_a_box_by_box_check():
+    boxes = road_boxes(5000)
+    index = RoadIndex.build(np.arange(1, 5001), boxes)
+    block_boxes = [[9000.0, 9000.0, 9040.0, 9020.0], [12000.0, 4000.0, 12040.0, 4020.0]]
+
+    expected = [oid for oid, (xmin, ymin, xmax, ymax) in zip(range(1, 5001), boxes)
+                if any(xmin <= block[2] + 500.0 and xmax >= block[0] - 500.0 and
+                       ymin <= block[3] + 500.0 and ymax >= block[1] - 500.0 for block in block_boxes)]
+
+    candidates = index.candidates(block_boxes, 500.0)
+
+    assert len(expected) > 0
+    assert sorted(candidates.tolist()) == expected
+
+
+def test_candidates_include_boxes_at_the_distance():
+    index = RoadIndex.build([1, 2], [[100.0, 0.0, 200.0, 10.0], [100.1, 0.0, 200.0, 10.0]])
+
+    assert index.candidates([[0.0, 0.0, 50.0, 10.0]], 50.0).tolist() == [1]
+
+
+def test_empty_index_and_empty_query():
+    empty = RoadIndex.build([], [])
+    index = RoadIndex.build([7], [[0.0, 0.0, 1.0, 1.0]])
+
+    assert len(empty.candidates([[0.0, 0.0, 1.0, 1.0]], 10.0)) == 0
+    assert len(index.candidates([], 10.0)) == 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index_path = str(tmp_path / "Road_Edge_index.npz")
+    RoadIndex.build([3, 5], [[0.0, 0.0, 1.0, 1.0], [5.0, 5.0, 6.0, 6.0]], spatial_reference="WKID 22293").save(
+        index_path)
+
+    loaded = RoadIndex.load(index_path)
+
+    assert loaded.oids.tolist() == [3, 5]
+    assert loaded.boxes.tolist() == [[0.0, 0.0, 1.0, 1.0], [5.0, 5.0, 6.0, 6.0]]
+    assert loaded.spatial_reference == "WKID 22293"
+    assert loaded.candidates([[4.0, 4.0, 4.5, 4.5]], 1.0).tolist() == [5]
+
+
+def test_load_ignores_the_grid_of_older_index_files(tmp_path):
+    index_path = str(tmp_path / "Road_Edge_index.npz")
+    np.savez_compressed(index_path, oids=np.array([9]), boxes=np.array([[0.0, 0.0, 2.0, 2.0]]), origin=np.zeros(2),
+                        cell_size=np.array(2.0), grid_shape=np.array([1, 1]), cell_offsets=np.array([0, 1]),
+                        cell_entries=np.array([0]), spatial_reference=np.array(""))
+
+    assert RoadIndex.load(index_path).candidates([[1.0, 1.0, 1.0, 1.0]]).tolist() == [9]
@@ -0,0 +1,153 @@
+import json
+import re
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from road_sync import FeatureServiceClient, SqliteRoadStore, read_high_water_mark, sync_roads
+
+edit_filter = re.compile(r"^(\w+) >= timestamp '([^']+)' OR (\w+) > (\d+)$")
+
+
+# Stand-in for the road layer of a feature service, answering the layer description and paged JSON queries
+class RoadLayer:
+    def __init__(self, page_size=3, edit_tracking=True):
+        self.page_size = page_size
+        self.edit_tracking = edit_tracking
+        self.features = {}
+        self.queries = []
+        self.error = None
+
+    def edit(self, object_id, edit_date, name):
+        self.features[object_id] = {"attributes": {"OBJECTID": object_id, "Name": name, "Level_": "500",
+                                                   "EditDate": edit_date},
+                                    "geometry": {"paths": [[[object_id, 0], [object_id, 10]]]}}
+
+    def layer_info(self):
+        info = {"objectIdField": "OBJECTID", "maxRecordCount": self.page_size}
+        if self.edit_tracking:
+            info["editFieldsInfo"] = {"editDateField": "EditDate"}
+        return info
+
+    # This function returns the ObjectIDs of the features matching the where clauses sent by road_sync
+    def matching_ids(self, where):
+        if where == "1=1":
+            return sorted(self.features)
+        match = edit_filter.match(where)
+        edit_date = datetime.strptime(match.group(2), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        edit_ms = int(edit_date.timestamp() * 1000)
+        return sorted(object_id for object_id, feature in self.features.items()
+                      if feature["attributes"]["EditDate"] >= edit_ms or object_id > int(match.group(4)))
+
+    def query(self, parameters):
+        self.queries.append(parameters)
+        object_ids = self.matching_ids(parameters["where"])
+        if parameters.get("returnIdsOnly") == "true":
+            return {"objectIds": object_ids}
+        offset = int(parameters["resultOffset"])
+        count = int(parameters["resultRecordCount"])
+        return {"features": [self.features[object_id] for object_id in object_ids[offset:offset + count]],
+                "exceededTransferLimit": offset + count < len(object_ids)}
+
+
+# This function serves a RoadLayer on a local port
+# Return the server and the layer URL
+def serve(layer):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+            parameters = dict(urllib.parse.parse_qsl(body))
+            if layer.error is not None:
+                result = {"error": layer.error}
+            elif self.path.endswith("/query"):
+                result = layer.query(parameters)
+            else:
+                result = layer.layer_info()
+            data = json.dumps(result).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/arcgis/rest/services/Roads/FeatureServer/0"
+
+
+@pytest.fixture
+def layer():
+    layer = RoadLayer()
+    for object_id in range(1, 8):
+        layer.edit(object_id, 1767225600000 + object_id * 1000, f"Road {object_id}")
+    server, layer.url = serve(layer)
+    yield layer
+    server.shutdown()
+    server.server_close()
+
+
+# This function returns the local roads as a dictionary of SourceObjectId -> attributes
+def local_roads(road_store):
+    return {row[0]: json.loads(row[1]) for row in road_store.connection.execute("SELECT * FROM Road_Edge")}
+
+
+def test_first_sync_downloads_every_page(layer, tmp_path):
+    road_store = SqliteRoadStore(str(tmp_path / "roads.sqlite"))
+    state_file = str(tmp_path / "road_sync.json")
+
+    result = sync_roads(FeatureServiceClient(layer.url), road_store, state_file)
+
+    assert result == {"upserted": 7, "deleted": 0, "full": True}
+    assert [query["resultOffset"] for query in layer.queries] == ["0", "3", "6"]
+    roads = local_roads(road_store)
+    assert sorted(roads) == list(range(1, 8))
+    assert roads[4]["Level"] == "500" and "Level_" not in roads[4]
+    assert read_high_water_mark(state_file)["object_id"] == 7
+    assert read_high_water_mark(state_file)["edit_date"] == 1767225607000
+
+
+def test_later_sync_only_downloads_changes(layer, tmp_path):
+    road_store = SqliteRoadStore(str(tmp_path / "roads.sqlite"))
+    state_file = str(tmp_path / "road_sync.json")
+    sync_roads(FeatureServiceClient(layer.url), road_store, state_file)
+    layer.edit(2, 1767225700000, "Road 2 realigned")
+    layer.edit(8, 1767225600000, "Road 8")
+    del layer.features[5]
+    layer.queries = []
+
+    result = sync_roads(FeatureServiceClient(layer.url, page_size=1), road_store, state_file)
+
+    assert result == {"upserted": 3, "deleted": 1, "full": False}
+    roads = local_roads(road_store)
+    assert sorted(roads) == [1, 2, 3, 4, 6, 7, 8]
+    assert roads[2]["Name"] == "Road 2 realigned"
+    # Road 7 is downloaded again because its edit date equals the high-water mark
+    assert [query["resultOffset"] for query in layer.queries if "resultOffset" in query] == ["0", "1", "2"]
+    assert read_high_water_mark(state_file)["object_id"] == 8
+
+
+def test_layer_without_edit_tracking_is_rebuilt(layer, tmp_path):
+    layer.edit_tracking = False
+    road_store = SqliteRoadStore(str(tmp_path / "roads.sqlite"))
+    state_file = str(tmp_path / "road_sync.json")
+    sync_roads(FeatureServiceClient(layer.url), road_store, state_file)
+    del layer.features[1]
+
+    result = sync_roads(FeatureServiceClient(layer.url), road_store, state_file)
+
+    assert result == {"upserted": 6, "deleted": 0, "full": True}
+    assert sorted(local_roads(road_store)) == list(range(2, 8))
+
+
+def test_service_error_raises(layer, tmp_path):
+    layer.error = {"code": 498, "message": "Invalid token."}
+
+    with pytest.raises(RuntimeError, match="Invalid token"):
+        sync_roads(FeatureServiceClient(layer.url), SqliteRoadStore(str(tmp_path / "roads.sqlite")),
+                   str(tmp_path / "road_sync.json"))
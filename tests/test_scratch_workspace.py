@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+import shapely
+
+from benchmarks import fake_arcpy
+from scratch_workspace import ScratchWorkspace, run_namespace
+
+
+@pytest.fixture
+def arcpy(tmp_path):
+    arcpy = fake_arcpy.install()
+    fake_arcpy.reset()
+    arcpy.CreateFileGDB_management(str(tmp_path), "scratch.gdb")
+    yield arcpy
+    fake_arcpy.reset()
+    sys.modules.pop("arcpy", None)
+
+
+# This function creates an intermediate feature class with a number of large polygons
+def create_intermediate(arcpy, intermediate_path, row_count=0):
+    if intermediate_path.startswith("memory\\"):
+        arcpy.CreateFeatureclass_management("memory", intermediate_path.split("\\")[-1], "POLYGON")
+    else:
+        arcpy.CreateFeatureclass_management(*os.path.split(intermediate_path), "POLYGON")
+    with arcpy.da.InsertCursor(intermediate_path, ["SHAPE@WKB"]) as cursor:
+        for count in range(row_count):
+            cursor.insertRow([shapely.to_wkb(shapely.Point(count, 0).buffer(100.0, quad_segs=256))])
+
+
+def test_run_namespace_is_a_valid_name():
+    assert run_namespace(1234, "SISHEN\\j.smith") == "ID1234_SISHEN_j_smith"
+    assert run_namespace("12", "a b-c") == "ID12_a_b_c"
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown scratch workspace mode: disk"):
+        ScratchWorkspace(str(tmp_path / "scratch.gdb"), "disk")
+
+
+def test_memory_intermediates_are_deleted(arcpy, tmp_path):
+    scratch_gdb = str(tmp_path / "scratch.gdb")
+    with ScratchWorkspace(scratch_gdb, "memory", run_namespace(1, "planner")) as scratch:
+        blocks = scratch.path("TEMP_BLOCKS")
+        machine = scratch.path("TEMP_MACHINE")
+        for intermediate_path in (blocks, machine):
+            create_intermediate(arcpy, intermediate_path, 3)
+
+        assert [blocks, machine] == ["memory\\TEMP_BLOCKS_ID1_planner", "memory\\TEMP_MACHINE_ID1_planner"]
+        assert scratch.path("TEMP_BLOCKS") == blocks and scratch.intermediates == [blocks, machine]
+        scratch.release(machine)
+        assert not arcpy.Exists(machine) and arcpy.Exists(blocks)
+        assert scratch.intermediates == [blocks]
+
+    assert not arcpy.Exists(blocks)
+    assert scratch.bytes_written() == 0
+
+
+def test_gdb_intermediates_are_measured_and_deleted(arcpy, tmp_path):
+    scratch_gdb = str(tmp_path / "scratch.gdb")
+    scratch = ScratchWorkspace(scratch_gdb, "gdb", run_namespace(2, "planner")).start()
+    roads = scratch.path("TEMP_ROADS")
+    create_intermediate(arcpy, roads, 200)
+
+    assert roads == os.path.join(scratch_gdb, "TEMP_ROADS_ID2_planner")
+    assert scratch.cleanup() == ["TEMP_ROADS_ID2_planner"]
+    assert not arcpy.Exists(roads) and scratch.intermediates == []
+    assert scratch.bytes_written() > 200 * 1000
+
+
+def test_runs_only_delete_their_own_intermediates(arcpy, tmp_path):
+    scratch_gdb = str(tmp_path / "scratch.gdb")
+    first = ScratchWorkspace(scratch_gdb, "gdb", run_namespace(3, "planner")).start()
+    second = ScratchWorkspace(scratch_gdb, "gdb", run_namespace(4, "planner")).start()
+    for scratch in (first, second):
+        create_intermediate(arcpy, scratch.path("TEMP_BLOCKS"))
+    # A layer created outside of the workspace is deleted with the intermediates
+    query_layer = arcpy.MakeFeatureLayer_management(first.path("TEMP_BLOCKS"), "TempBlocks_ID3_planner")[0]
+    first.register(query_layer)
+
+    assert first.cleanup() == ["TEMP_BLOCKS_ID3_planner", "TempBlocks_ID3_planner"]
+    assert not arcpy.Exists("TempBlocks_ID3_planner") and not arcpy.Exists(first.path("TEMP_BLOCKS"))
+    assert arcpy.Exists(second.path("TEMP_BLOCKS"))
@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+from tracing import Tracer
+
+
+def test_spans_nest_and_report_their_measurements():
+    messages = []
+    tracer = Tracer(messages.append)
+
+    with tracer.span("run") as run:
+        with tracer.span("buffering", engine="memory") as stage:
+            stage.rows = 12
+            stage.bytes_written = 2048
+        with tracer.span("append"):
+            pass
+    with tracer.span("delete"):
+        pass
+
+    assert [span.name for span in tracer.spans] == ["buffering", "append", "run", "delete"]
+    assert [span.parent for span in tracer.spans] == [run, run, None, None]
+    assert tracer.spans[0].attributes == {"engine": "memory"}
+    assert messages[0].startswith("[buffering] ") and messages[0].endswith("s, 12 rows, 2048 bytes written")
+    assert set(tracer.totals()) == {"run", "buffering", "append", "delete"}
+    assert tracer.totals()["run"] >= tracer.totals()["buffering"] + tracer.totals()["append"]
+
+
+def test_failed_span_records_the_error_and_leaves_the_stack():
+    tracer = Tracer()
+
+    with pytest.raises(ValueError):
+        with tracer.span("road_selection"):
+            raise ValueError("no roads")
+    with tracer.span("append"):
+        pass
+
+    assert tracer.spans[0].error == "ValueError: no roads"
+    assert tracer.spans[1].parent is None and tracer.spans[1].error is None
+
+
+def test_spans_of_other_threads_are_not_nested():
+    tracer = Tracer()
+
+    def copy_files():
+        with tracer.span("copy"):
+            pass
+
+    with tracer.span("cad_export") as cad_export:
+        with tracer.span("export"):
+            worker = threading.Thread(target=copy_files)
+            worker.start()
+            worker.join()
+
+    assert [[span.name, span.parent] for span in tracer.spans] == [["copy", None], ["export", cad_export],
+                                                                   ["cad_export", None]]
+
+
+def test_trace_json_holds_the_totals_and_spans(tmp_path):
+    tracer = Tracer()
+    tracer.attributes["blast_id"] = 7
+    with tracer.span("run"):
+        with tracer.span("blocks_check") as stage:
+            stage.rows = 3
+
+    trace_file = tracer.write_json(str(tmp_path / "Traces" / "trace.json"))
+
+    with open(trace_file) as file:
+        trace = json.load(file)
+    assert trace["attributes"] == {"blast_id": 7} and trace["started"] == tracer.started
+    assert set(trace["totals"]) == {"run", "blocks_check"}
+    assert [[span["name"], span["parent"], span["rows"]] for span in trace["spans"]] == [["blocks_check", "run", 3],
+                                                                                       ["run", None, None]]
+
+
+def test_trace_decorator_uses_the_active_tracer_at_call_time(monkeypatch):
+    monkeypatch.setattr(tracing, "active_tracer", tracing.active_tracer)
+
+    @tracing.trace()
+    def read_blocks():
+        return 5
+
+    tracer = tracing.start_tracer()
+
+    assert read_blocks() == 5
+    with tracing.span("elevation_lookup"):
+        pass
+    assert [span.name for span in tracer.spans] == ["read_blocks", "elevation_lookup"]
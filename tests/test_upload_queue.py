@@ -0,0 +1,93 @@
+import json
+import os
+
+from upload_queue import UploadQueue, _copy_file
+
+
+def read_file(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def test_files_left_by_a_flaky_share_are_uploaded_by_the_next_process(tmp_path):
+    staging_dir = str(tmp_path / "Staging")
+    share_dir = tmp_path / "Share"
+    attempts = {"count": 0}
+
+    # A share that fails every other upload
+    def flaky_copy(source_file, destination_file):
+        attempts["count"] += 1
+        if attempts["count"] % 2 == 0:
+            raise OSError("The specified network name is no longer available")
+        _copy_file(source_file, destination_file)
+
+    queue = UploadQueue(staging_dir, {"copy": flaky_copy}, retries=1, retry_seconds=0.0)
+    local_file = str(tmp_path / "export.dgn")
+    contents = []
+    for count in range(20):
+        contents.append(os.urandom(64 * 1024))
+        # The local file is overwritten by the next export before it is uploaded
+        with open(local_file, "wb") as file:
+            file.write(contents[-1])
+        queue.stage_file(local_file, str(share_dir / f"ID{count}" / "REF.dgn"), snapshot=True)
+    first_pending = queue.drain(timeout=60)
+
+    assert first_pending == len(queue.failures) == 20 - queue.uploaded_count
+    assert 0 < queue.uploaded_count < 20
+
+    reopened = UploadQueue(staging_dir, retries=3, retry_seconds=0.0)
+
+    assert reopened.drain(timeout=60) == 0
+    assert reopened.uploaded_count == first_pending
+    assert [read_file(share_dir / f"ID{count}" / "REF.dgn") for count in range(20)] == contents
+
+
+def test_upload_with_a_wrong_checksum_stays_pending(tmp_path):
+    source_file = tmp_path / "Blast.dgn"
+    source_file.write_bytes(b"master dgn")
+
+    def truncating_copy(source_file, destination_file):
+        with open(destination_file, "wb") as file:
+            file.write(read_file(source_file)[:4])
+
+    queue = UploadQueue(str(tmp_path / "Staging"), {"copy": truncating_copy}, retries=2, retry_seconds=0.0)
+    upload_id = queue.stage_file(str(source_file), str(tmp_path / "Share" / "Blast.dgn"))
+
+    assert queue.drain(timeout=30) == 1
+    assert "does not match" in queue.failures[upload_id][1]
+    assert [record["id"] for record in queue.pending()] == [upload_id]
+
+
+def test_record_cut_short_by_a_crash_is_ignored(tmp_path):
+    staging_dir = tmp_path / "Staging"
+    source_file = tmp_path / "Blast.dgn"
+    source_file.write_bytes(b"master dgn")
+    staging_dir.mkdir()
+    record = {"op": "add", "id": "1", "source": str(source_file), "destination": str(tmp_path / "Share" / "Blast.dgn"),
+              "mode": "copy", "sha256": None, "snapshot": False}
+    (staging_dir / "UploadJournal.jsonl").write_text(json.dumps(record) + "\n" + '{"op": "done", "i')
+
+    queue = UploadQueue(str(staging_dir))
+
+    assert queue.drain(timeout=30) == 0
+    assert queue.uploaded_count == 1
+    assert read_file(tmp_path / "Share" / "Blast.dgn") == b"master dgn"
+
+
+def test_unexpected_error_fails_the_file_and_the_thread_carries_on(tmp_path):
+    source_file = tmp_path / "Blast.dgn"
+    source_file.write_bytes(b"master dgn")
+
+    def broken_copy(source_file, destination_file):
+        raise ValueError("unexpected")
+
+    queue = UploadQueue(str(tmp_path / "Staging"), {"broken": broken_copy}, retries=3, retry_seconds=0.0)
+    failed_id = queue.stage_file(str(source_file), str(tmp_path / "Share" / "Broken.dgn"), mode="broken")
+    unknown_id = queue.stage_file(str(source_file), str(tmp_path / "Share" / "Unknown.dgn"), mode="unknown")
+    queue.stage_file(str(source_file), str(tmp_path / "Share" / "Blast.dgn"))
+
+    assert queue.drain(timeout=30) == 2
+    assert queue.failures[failed_id][1] == "ValueError: unexpected"
+    assert queue.failures[unknown_id][1].startswith("KeyError")
+    assert queue.uploaded_count == 1
+    assert read_file(tmp_path / "Share" / "Blast.dgn") == b"master dgn"
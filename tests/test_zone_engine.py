@@ -0,0 +1,95 @@
+import math
+
+import pytest
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+
+from zone_engine import buffer_zones, clearance_zones, find_clusters, from_wkb_list, parity_ratio, single_parts
+
+
+# The round buffers are approximated with 32 segments per quarter circle, the area of the 128-gon is 0.04% smaller
+# than the area of the true circle (arcpy buffers with true curves)
+area_tolerance = 1e-3
+
+
+# This function returns the area of a w x h rectangle buffered by a radius with round corners (the true curve area)
+def rounded_rectangle_area(width, height, radius):
+    return width * height + 2 * radius * (width + height) + math.pi * radius ** 2
+
+
+# This function creates a row of touching width x height blocks starting at (x, y)
+def block_row(x, y, count, width=40.0, height=20.0):
+    return [Polygon.from_bounds(x + index * width, y, x + (index + 1) * width, y + height) for index in range(count)]
+
+
+def total_area(zones):
+    return sum(zone.area for zone in zones)
+
+
+def test_single_block_matches_reference_area():
+    machine_zones, people_zones = clearance_zones(block_row(0.0, 0.0, 1), 300, 500)
+
+    assert len(machine_zones) == 1 and len(people_zones) == 1
+    assert total_area(machine_zones) == pytest.approx(319543.3388, rel=area_tolerance)
+    assert total_area(people_zones) == pytest.approx(rounded_rectangle_area(40.0, 20.0, 500.0), rel=area_tolerance)
+
+
+def test_separate_clusters_give_one_zone_each():
+    # Three rows of three touching blocks, 2000 m apart: every row is one 120 x 20 m cluster
+    blocks = block_row(0.0, 0.0, 3) + block_row(2000.0, 0.0, 3) + block_row(0.0, 3000.0, 3)
+
+    machine_zones, people_zones = clearance_zones(blocks, 300, 500)
+
+    assert len(machine_zones) == 3 and len(people_zones) == 3
+    for zone in machine_zones:
+        assert zone.area == pytest.approx(rounded_rectangle_area(120.0, 20.0, 300.0), rel=area_tolerance)
+    for zone in people_zones:
+        assert zone.area == pytest.approx(rounded_rectangle_area(120.0, 20.0, 500.0), rel=area_tolerance)
+
+
+def test_clusters_merge_only_at_the_larger_radius():
+    # 800 m between the rows: the 300 m zones stay apart, the 500 m zones overlap
+    blocks = block_row(0.0, 0.0, 2) + block_row(880.0, 0.0, 2)
+
+    machine_zones, people_zones = clearance_zones(blocks, 300, 500)
+
+    assert len(machine_zones) == 2
+    assert total_area(machine_zones) == pytest.approx(2 * rounded_rectangle_area(80.0, 20.0, 300.0),
+                                                      rel=area_tolerance)
+    assert len(people_zones) == 1
+    assert people_zones[0].area < 2 * rounded_rectangle_area(80.0, 20.0, 500.0)
+    assert parity_ratio(people_zones, [block.buffer(500.0, quad_segs=32) for block in blocks]) < 1e-9
+
+
+def test_zones_match_the_union_of_block_buffers():
+    # Four clusters of scattered blocks, the dissolve per cluster gives the same zones as one union of all buffers
+    blocks = []
+    for cluster_x, cluster_y in ((0.0, 0.0), (5000.0, 0.0), (0.0, 5000.0), (5000.0, 5000.0)):
+        for index in range(6):
+            x = cluster_x + (index % 3) * 55.0
+            y = cluster_y + (index // 3) * 35.0
+            blocks.append(Polygon.from_bounds(x, y, x + 40.0, y + 20.0))
+
+    zones = buffer_zones(blocks, 300.0)
+
+    reference = single_parts(unary_union([block.buffer(300.0, quad_segs=32) for block in blocks]))
+    assert len(zones) == len(reference) == 4
+    assert parity_ratio(zones, reference) < 1e-9
+    assert all(zone.geom_type == "Polygon" for zone in zones)
+
+
+def test_find_clusters_groups_blocks_within_distance():
+    blocks = block_row(0.0, 0.0, 2) + block_row(500.0, 0.0, 1) + block_row(2000.0, 0.0, 1)
+
+    clusters = sorted(sorted(cluster) for cluster in find_clusters(blocks, 600.0))
+
+    assert clusters == [[0, 1, 2], [3]]
+
+
+def test_zones_from_wkb_shapes():
+    blocks = from_wkb_list([block.wkb for block in block_row(0.0, 0.0, 2)])
+
+    machine_zones, _ = clearance_zones(blocks, 300, 500)
+
+    assert len(machine_zones) == 1
+    assert machine_zones[0].area == pytest.approx(rounded_rectangle_area(80.0, 20.0, 300.0), rel=area_tolerance)
@@ -0,0 +1,148 @@
+# This module records how long each stage of a run takes
+# Stages are wrapped in spans (context manager or decorator) which record the wall time, row counts and bytes
+# written. Finished spans are reported through the message function (arc_output in the tools), and the trace of a
+# run can be written as JSON, optionally together with a cProfile dump.
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+# Span class holding the measurements of one stage
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.rows = None
+        self.bytes_written = None
+        self.start_time = None
+        self.seconds = None
+        self.error = None
+
+    def to_dict(self):
+        return {"name": self.name,
+                "parent": self.parent.name if self.parent is not None else None,
+                "start": self.start_time,
+                "seconds": round(self.seconds, 6) if self.seconds is not None else None,
+                "rows": self.rows,
+                "bytes_written": self.bytes_written,
+                "error": self.error,
+                "attributes": self.attributes}
+
+
+# Tracer class collecting the spans of a run
+class Tracer:
+    def __init__(self, message=None):
+        self.message = message
+        self.spans = []
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.attributes = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiler = None
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    # This function is used as a context manager around a stage, the yielded span can be given rows and bytes
+    def span(self, name, **attributes):
+        return _SpanContext(self, name, attributes)
+
+    # This function starts a cProfile profiler for the run
+    def start_profile(self):
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    # This function stops the profiler and writes the profile (readable with pstats or snakeviz)
+    def stop_profile(self, profile_file):
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        self._profiler.dump_stats(profile_file)
+        self._profiler = None
+        return profile_file
+
+    # This function returns the total seconds per stage name
+    def totals(self):
+        totals = {}
+        for span in self.spans:
+            if span.seconds is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.seconds
+        return totals
+
+    # This function writes the machine-readable trace of the run
+    def write_json(self, trace_file):
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        trace = {"started": self.started,
+                 "attributes": self.attributes,
+                 "totals": {name: round(seconds, 6) for name, seconds in self.totals().items()},
+                 "spans": [span.to_dict() for span in self.spans]}
+        with open(trace_file, "w") as file:
+            json.dump(trace, file, indent=2, default=str)
+        return trace_file
+
+
+class _SpanContext:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        stack = tracer._stack()
+        self.span = Span(name, stack[-1] if len(stack) > 0 else None, attributes)
+        self._start = None
+
+    def __enter__(self):
+        self.tracer._stack().append(self.span)
+        self.span.start_time = datetime.now().isoformat(timespec="milliseconds")
+        self._start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.span.seconds = time.perf_counter() - self._start
+        if exc_value is not None:
+            self.span.error = f"{exc_type.__name__}: {exc_value}"
+        stack = self.tracer._stack()
+        if len(stack) > 0 and stack[-1] is self.span:
+            stack.pop()
+        with self.tracer._lock:
+            self.tracer.spans.append(self.span)
+        if self.tracer.message is not None:
+            details = f"{self.span.seconds:.2f}s"
+            if self.span.rows is not None:
+                details += f", {self.span.rows} rows"
+            if self.span.bytes_written is not None:
+                details += f", {self.span.bytes_written} bytes written"
+            self.tracer.message(f"[{self.span.name}] {details}")
+        return False
+
+
+# Tracer used by the module level span() and trace() functions
+active_tracer = Tracer()
+
+
+# This function replaces the active tracer, e.g. at the start of a run
+# Return the new active tracer
+def start_tracer(message=None):
+    global active_tracer
+    active_tracer = Tracer(message)
+    return active_tracer
+
+
+# This function wraps a stage in a span of the active tracer
+def span(name, **attributes):
+    return active_tracer.span(name, **attributes)
+
+
+# This function traces every call of a function with the active tracer at call time
+def trace(name=None):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with active_tracer.span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+# This module stages the CAD files of a run on the local disk and uploads them to the network drive in the background
+# Every file to upload is recorded in a journal (UploadJournal.jsonl in the staging folder) before the run carries
+# on, a background thread uploads the files in the order they were staged, retries failed uploads with a growing
+# delay and checks the SHA-256 hash of every uploaded file. Files still pending when the process stops (a flaky
+# share, ArcGIS Pro closed) are uploaded by the next process that opens the staging folder.
+# Journal records: {"op": "add", "id", "source", "destination", "mode", "sha256", "snapshot"} and {"op": "done", "id"}
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from cad_store import file_digest
+from file_lock import FileLock
+
+
+default_retries = 5
+default_retry_seconds = 2.0
+logger = logging.getLogger(__name__)
+
+
+# Queue class holding the staging folder, the journal and the background upload thread
+# upload_functions maps the mode of a file to the function uploading it (source file, destination file), the
+# default mode "copy" copies the file
+class UploadQueue:
+    def __init__(self, staging_dir, upload_functions=None, retries=default_retries,
+                 retry_seconds=default_retry_seconds):
+        self.staging_dir = staging_dir
+        self.outbox_dir = os.path.join(staging_dir, "Outbox")
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        self.journal_file = os.path.join(staging_dir, "UploadJournal.jsonl")
+        self.lock_file = os.path.join(staging_dir, "UploadJournal.lock")
+        self.upload_functions = {"copy": _copy_file, **(upload_functions or {})}
+        self.retries = retries
+        self.retry_seconds = retry_seconds
+        self.failures = {}
+        self.uploaded_count = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        if len(self.pending()) > 0:
+            self.start()
+
+    def _append(self, record):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with FileLock(self.lock_file):
+            with open(self.journal_file, "ab+") as file:
+                # A record cut short by a crash is ended first, otherwise it swallows the new record
+                if file.seek(0, os.SEEK_END) > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        line = b"\n" + line
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _read_journal(self):
+        records = []
+        try:
+            with open(self.journal_file) as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A record cut short by a crash
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    # This function returns the files waiting for upload in the order they were staged
+    # Return a list of journal records
+    def pending(self):
+        added = {}
+        for record in self._read_journal():
+            if record.get("op") == "add":
+                added[record["id"]] = record
+            elif record.get("op") == "done":
+                added.pop(record["id"], None)
+        return list(added.values())
+
+    # This function adds a file to the upload queue
+    # snapshot=True copies the file to the outbox first, for local files which are overwritten before the upload
+    # (the reference file of a mine)
+    # Return the ID of the upload
+    def stage_file(self, source_file, destination_file, mode="copy", snapshot=False):
+        upload_id = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        sha256 = None
+        if snapshot:
+            snapshot_file = os.path.join(self.outbox_dir, f"{upload_id}{os.path.splitext(source_file)[1]}")
+            shutil.copyfile(source_file, snapshot_file)
+            source_file = snapshot_file
+            sha256 = file_digest(snapshot_file)
+        self._append({"op": "add", "id": upload_id, "source": source_file, "destination": destination_file,
+                      "mode": mode, "sha256": sha256, "snapshot": snapshot})
+        self.start()
+        with self._condition:
+            self._condition.notify_all()
+        return upload_id
+
+    # This function starts the background upload thread if it is not running
+    def start(self):
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="upload_queue", daemon=True)
+                self._thread.start()
+
+    # This function returns the pending files which did not fail in this process
+    def _waiting(self):
+        return [record for record in self.pending() if record["id"] not in self.failures]
+
+    def _run(self):
+        while True:
+            records = self._waiting()
+            if len(records) == 0:
+                self._compact()
+                with self._condition:
+                    self._condition.notify_all()
+                    # A file staged since the check above has already notified, it would wait for the timeout
+                    if len(self._waiting()) > 0:
+                        continue
+                    if not self._condition.wait(timeout=60):
+                        if len(self._waiting()) == 0:
+                            self._thread = None
+                            return
+                continue
+            for record in records:
+                self._upload(record)
+                with self._condition:
+                    self._condition.notify_all()
+
+    # This function uploads one file, retrying with a growing delay
+    # A file which still fails stays in the journal and is retried by the next process. Any other error (e.g. an
+    # unknown upload mode) fails the file at once, the thread carries on with the next file.
+    def _upload(self, record):
+        for attempt in range(self.retries):
+            try:
+                upload_function = self.upload_functions[record.get("mode", "copy")]
+                expected = record["sha256"] or file_digest(record["source"])
+                os.makedirs(os.path.dirname(record["destination"]), exist_ok=True)
+                upload_function(record["source"], record["destination"])
+                if file_digest(record["destination"]) != expected:
+                    raise OSError(f"Checksum of {record['destination']} does not match {record['source']}")
+            except OSError as error:
+                if attempt == self.retries - 1:
+                    self.failures[record["id"]] = [record["destination"], str(error)]
+                    return False
+                time.sleep(self.retry_seconds * 2 ** attempt)
+                continue
+            except Exception as error:
+                logger.exception("Upload %s to %s failed", record["id"], record["destination"])
+                self.failures[record["id"]] = [record["destination"], f"{type(error).__name__}: {error}"]
+                return False
+            # The count is raised before the done record, drain returns as soon as the record is written
+            self.uploaded_count += 1
+            self._append({"op": "done", "id": record["id"]})
+            if record.get("snapshot"):
+                try:
+                    os.remove(record["source"])
+                except OSError:
+                    pass
+            return True
+
+    # This function rewrites the journal with the pending records only, so it does not grow forever
+    def _compact(self):
+        with FileLock(self.lock_file):
+            pending = self.pending()
+            temp_file = f"{self.journal_file}.{uuid.uuid4().hex}.tmp"
+            with open(temp_file, "w") as file:
+                for record in pending:
+                    file.write(json.dumps(record) + "\n")
+            os.replace(temp_file, self.journal_file)
+
+    # This function waits until every file staged by this process was uploaded or failed, or until the timeout
+    # Return the number of files still pending (including failed files)
+    def drain(self, timeout=None):
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                waiting = self._waiting()
+                remaining = None if end is None else end - time.monotonic()
+                if len(waiting) == 0 or (remaining is not None and remaining <= 0):
+                    break
+                self._condition.wait(timeout=1.0 if remaining is None else min(remaining, 1.0))
+        return len(self.pending())
+
+
+def _copy_file(source_file, destination_file):
+    temp_file = f"{destination_file}.{uuid.uuid4().hex}.tmp"
+    shutil.copyfile(source_file, temp_file)
+    os.replace(temp_file, destination_file)
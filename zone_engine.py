@@ -0,0 +1,102 @@
+# This module creates the machine and people clearance zones in memory with shapely
+# Blocks are grouped into clusters of blocks whose zones touch, every cluster is buffered and dissolved once
+# and the zones are returned as single part polygons (the same result as Buffer "ALL" + MultipartToSinglepart)
+# tests/test_zone_engine.py checks the zones against reference areas of multi-cluster block layouts
+import math
+import random
+
+import shapely
+from shapely import wkb
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+
+
+# Number of segments used to approximate a quarter circle, arcpy uses true curves for round buffers
+default_quad_segs = 32
+
+
+# This function groups geometries into clusters in which every geometry is within distance of another one
+# Return a list of lists of geometry indexes
+def find_clusters(geometries, distance):
+    parents = list(range(len(geometries)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    tree = STRtree(geometries)
+    for index, geometry in enumerate(geometries):
+        min_x, min_y, max_x, max_y = geometry.bounds
+        search_box = Polygon.from_bounds(min_x - distance, min_y - distance, max_x + distance, max_y + distance)
+        for other_index in tree.query(search_box):
+            other_index = int(other_index)
+            if other_index <= index or find(index) == find(other_index):
+                continue
+            if geometry.distance(geometries[other_index]) <= distance:
+                parents[find(other_index)] = find(index)
+
+    clusters = {}
+    for index in range(len(geometries)):
+        clusters.setdefault(find(index), []).append(index)
+    return list(clusters.values())
+
+
+# This function splits a polygon or multipolygon into a list of single part polygons
+def single_parts(geometry):
+    if geometry.is_empty:
+        return []
+    if geometry.geom_type == "Polygon":
+        return [geometry]
+    return [part for part in geometry.geoms if part.geom_type == "Polygon" and not part.is_empty]
+
+
+# This function buffers the blocks by a radius and dissolves every cluster of touching zones
+# The blocks are buffered in one vectorised call, unioning the simple buffers is much faster than buffering
+# the union of many blocks
+# Return a list of single part polygons
+def buffer_zones(block_geometries, radius, quad_segs=default_quad_segs):
+    block_buffers = shapely.buffer(block_geometries, radius, quad_segs=quad_segs)
+    zones = []
+    # Buffers of blocks further than twice the radius apart can never touch
+    for cluster in find_clusters(block_geometries, 2 * radius):
+        zones.extend(single_parts(unary_union([block_buffers[index] for index in cluster])))
+    return zones
+
+
+# This function creates the machine and people clearance zones from block geometries
+# Return the list of machine zones and the list of people zones
+def clearance_zones(block_geometries, machine_radius, people_radius, quad_segs=default_quad_segs):
+    machine_zones = buffer_zones(block_geometries, float(machine_radius), quad_segs)
+    people_zones = buffer_zones(block_geometries, float(people_radius), quad_segs)
+    return machine_zones, people_zones
+
+
+# This function converts WKB geometries (e.g. read with the SHAPE@WKB cursor token) to shapely geometries
+def from_wkb_list(wkb_list):
+    return [wkb.loads(bytes(geometry_wkb)) for geometry_wkb in wkb_list]
+
+
+# This function compares two sets of zones
+# Return the area of the symmetric difference as a fraction of the reference area
+def parity_ratio(engine_zones, reference_zones):
+    engine_union = unary_union(engine_zones)
+    reference_union = unary_union(reference_zones)
+    if reference_union.area == 0:
+        return 0.0 if engine_union.area == 0 else math.inf
+    return engine_union.symmetric_difference(reference_union).area / reference_union.area
+
+
+# This function creates a synthetic layout of rectangular blocks in a number of benches
+def synthetic_blocks(block_count, benches=4, block_size=(40.0, 20.0), bench_spacing=500.0, seed=1):
+    generator = random.Random(seed)
+    blocks = []
+    per_bench = max(1, math.ceil(block_count / benches))
+    for index in range(block_count):
+        bench = index // per_bench
+        x = (index % per_bench) * (block_size[0] + generator.uniform(0.0, 5.0))
+        y = bench * bench_spacing + generator.uniform(-2.0, 2.0)
+        blocks.append(Polygon.from_bounds(x, y, x + block_size[0], y + block_size[1]))
+    return blocks